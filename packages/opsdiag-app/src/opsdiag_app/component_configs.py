@@ -108,6 +108,9 @@ def _initialize_resource_manager(system_app: SystemApp):
     from opsdiag.agent.resource.memory import MemoryResource
     from opsdiag.agent.expand.resources.fetch_tool import fetch
     from opsdiag_ext.agent.agents.open_rca.resource.open_rca_resource import OpenRcaSceneResource
+    from opsdiag_ext.agent.agents.open_rca.resource.kpi_anomaly import (
+        open_rca_kpi_anomaly_detection,
+    )
     from opsdiag_serve.agent.resource.tool.mcp import MCPSSEToolPack
     from opsdiag_serve.agent.resource.tool.local_tool import LocalToolPack
 
@@ -128,6 +131,8 @@ def _initialize_resource_manager(system_app: SystemApp):
     rm.register_resource(resource_instance=get_current_host_cpu_status)
     rm.register_resource(resource_instance=get_current_host_memory_status)
     rm.register_resource(resource_instance=get_current_host_system_load)
+    # Register OpenRCA tools
+    rm.register_resource(resource_instance=open_rca_kpi_anomaly_detection)
 
 
 
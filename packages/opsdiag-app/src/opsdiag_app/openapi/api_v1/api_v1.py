@@ -45,6 +45,10 @@ from opsdiag_app.openapi.api_view_model import (
     MessageVo,
     Result,
 )
+from opsdiag_serve.agent.agents.chat.chunk_stream import (
+    coalesce_chunks,
+    merge_sse_frames,
+)
 from opsdiag_serve.agent.agents.controller import multi_agents
 from opsdiag_serve.agent.db.gpts_app import UserRecentAppsDao
 from opsdiag_serve.agent.team.base import TeamMode
@@ -435,7 +439,7 @@ async def chat_completions(
                     ):
                         yield chunk
                 return StreamingResponse(
-                    chat_wrapper(),
+                    coalesce_chunks(chat_wrapper(), merge_sse_frames),
                     headers=headers,
                     media_type="text/event-stream",
                 )
@@ -461,7 +465,7 @@ async def chat_completions(
                 ):
                     yield chunk
             return StreamingResponse(
-                chat_wrapper(),
+                coalesce_chunks(chat_wrapper(), merge_sse_frames),
                 headers=headers,
                 media_type="text/event-stream",
             )
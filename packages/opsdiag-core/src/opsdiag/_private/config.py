@@ -379,6 +379,10 @@ class Config(metaclass=Singleton):
         self.MESSAGES_KEEP_END_ROUNDS: int = int(
             os.getenv("MESSAGES_KEEP_END_ROUNDS", 2)
         )
+        # Persist the agent messages and plans in batches, after a local WAL
+        self.GPTS_MEMORY_WRITE_BEHIND: bool = (
+            os.getenv("GPTS_MEMORY_WRITE_BEHIND", "False").lower() == "true"
+        )
 
     @property
     def local_db_manager(self) -> "ConnectorManager":
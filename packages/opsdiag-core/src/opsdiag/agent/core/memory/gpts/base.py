@@ -337,6 +337,15 @@ class GptsMessageMemory(ABC):
 
         """
 
+    def batch_update(self, messages: List[GptsMessage]) -> None:
+        """Update or add the messages.
+
+        Args:
+            messages(List[GptsMessage]): Message objects
+        """
+        for message in messages:
+            self.update(message)
+
     @abstractmethod
     def get_by_agent(self, conv_id: str, agent: str) -> Optional[List[GptsMessage]]:
         """Return all messages of the agent in the conversation.
@@ -1,7 +1,6 @@
 """GPTs Memory Module (Optimized Version)"""
 from __future__ import annotations
 
-import asyncio
 import json
 import logging
 import threading
@@ -15,6 +14,7 @@ from cachetools import TTLCache
 from opsdiag.util.executor_utils import blocking_func_to_async
 from .base import GptsMessage, GptsMessageMemory, GptsPlansMemory, GptsPlan
 from .default_gpts_memory import DefaultGptsMessageMemory, DefaultGptsPlansMemory
+from .write_behind import GptsWriteBehindJournal
 from ...action.base import ActionOutput
 from .....util.id_generator import IdGenerator
 from .....vis.vis_converter import VisProtocolConverter, DefaultVisConverter
@@ -106,13 +106,29 @@ class GptsMemory:
             default_vis_converter: VisProtocolConverter = DefaultVisConverter(),
             *,
             cache_ttl: int = 1800,
-            cache_maxsize: int = 1000
+            cache_maxsize: int = 1000,
+            write_behind: bool = False,
+            write_behind_wal_dir: Optional[str] = None,
+            write_behind_max_pending: int = 100,
+            write_behind_interval: float = 1.0,
     ):
         # 持久化存储
         self._plans_memory = plans_memory
         self._message_memory = message_memory
         self._executor = executor
 
+        # 延迟批量持久化（先写本地WAL，按数量、时间或会话结束批量落库）
+        self._journal: Optional[GptsWriteBehindJournal] = None
+        if write_behind:
+            self._journal = GptsWriteBehindJournal(
+                message_memory,
+                plans_memory,
+                executor,
+                wal_dir=write_behind_wal_dir,
+                max_pending=write_behind_max_pending,
+                flush_interval=write_behind_interval,
+            )
+
         # 可视化默认转换器
         self._default_vis_converter = default_vis_converter
 
@@ -143,6 +159,25 @@ class GptsMemory:
     def message_memory(self) -> GptsMessageMemory:
         return self._message_memory
 
+    async def startup(self):
+        """启动时将上次未落库的写入（WAL中恢复的）在后台落库"""
+        if self._journal:
+            self._journal.start()
+
+    async def shutdown(self):
+        """停止时将所有延迟写入落库"""
+        if self._journal:
+            await self._journal.stop()
+
+    async def flush(self, conv_id: Optional[str] = None):
+        """将延迟写入的消息和计划落库"""
+        if not self._journal:
+            return
+        if conv_id:
+            await self._journal.flush(conv_id)
+        else:
+            await self._journal.flush_all()
+
     # --------------------------
     # 内部结构功能区
     # --------------------------
@@ -220,6 +255,9 @@ class GptsMemory:
             messages = await blocking_func_to_async(
                 self._executor, self._message_memory.get_by_conv_id, conv_id
             )
+            if self._journal:
+                # 叠加尚未落库的写入
+                messages = self._journal.overlay_messages(conv_id, messages)
             self._cache_messages(conv_id, messages)
 
         ## 加载持久化的规划信息
@@ -227,6 +265,8 @@ class GptsMemory:
             plans = await blocking_func_to_async(
                 self._executor, self._plans_memory.get_by_conv_id, conv_id
             )
+            if self._journal:
+                plans = self._journal.overlay_plans(conv_id, plans)
             cache.plans.update({p.task_uid: p for p in plans})
 
     # --------------------------
@@ -382,11 +422,11 @@ class GptsMemory:
                 break
             else:
                 yield item
-                await asyncio.sleep(0.005)
 
     async def complete(self, conv_id: str):
         """标记对话完成"""
         cache = self._get_cache(conv_id)
+        await self.flush(conv_id)
         await cache.channel.put("[DONE]")
 
     async def stop(self, conv_id: str):
@@ -420,9 +460,12 @@ class GptsMemory:
 
         # 持久化存储
         if save_db:
-            await blocking_func_to_async(
-                self._executor, self._message_memory.update, message
-            )
+            if self._journal:
+                self._journal.add_message(conv_id, message)
+            else:
+                await blocking_func_to_async(
+                    self._executor, self._message_memory.update, message
+                )
 
         # 推送显示消息
         await self.push_message(
@@ -441,6 +484,7 @@ class GptsMemory:
             self, conv_id: str, agent_role: str
     ) -> List[ActionOutput]:
         """获取代理历史记忆"""
+        await self.flush(conv_id)
         agent_messages = await blocking_func_to_async(
             self._executor, self._message_memory.get_by_agent, conv_id, agent_role
         )
@@ -485,9 +529,12 @@ class GptsMemory:
         )
         if need_storage:
             # 持久化存储
-            await blocking_func_to_async(
-                self._executor, self._plans_memory.batch_save, plans
-            )
+            if self._journal:
+                self._journal.add_plans(conv_id, plans)
+            else:
+                await blocking_func_to_async(
+                    self._executor, self._plans_memory.batch_save, plans
+                )
 
     async def update_plan(
             self,
@@ -500,11 +547,14 @@ class GptsMemory:
 
         plan.updated_at = datetime.now()
         # 持久化更新
-        await blocking_func_to_async(
-            self._executor, self._plans_memory.update_by_uid,
-            conv_id, plan.task_uid, plan.state, plan.retry_times,
-            model=plan.agent_model, result=plan.result
-        )
+        if self._journal:
+            self._journal.update_plan(conv_id, plan)
+        else:
+            await blocking_func_to_async(
+                self._executor, self._plans_memory.update_by_uid,
+                conv_id, plan.task_uid, plan.state, plan.retry_times,
+                model=plan.agent_model, result=plan.result
+            )
 
         # 更新缓存
         cache = self._get_cache(conv_id)
@@ -0,0 +1,223 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pytest
+
+from .. import (
+    DefaultGptsMessageMemory,
+    DefaultGptsPlansMemory,
+    GptsMemory,
+    GptsMessage,
+    GptsPlan,
+)
+from ..write_behind import GptsWriteBehindJournal
+
+
+class _MessageStore(DefaultGptsMessageMemory):
+    def __init__(self, fail_times: int = 0):
+        super().__init__()
+        self.batches: List[List[GptsMessage]] = []
+        self.stored: Dict[str, GptsMessage] = {}
+        self.fail_times = fail_times
+
+    def batch_update(self, messages: List[GptsMessage]) -> None:
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("db is down")
+        self.batches.append(messages)
+        self.stored.update({m.message_id: m for m in messages})
+
+    def get_by_agent(self, conv_id: str, agent: str) -> List[GptsMessage]:
+        return [
+            m
+            for m in self.stored.values()
+            if m.conv_id == conv_id and agent in (m.sender, m.receiver)
+        ]
+
+
+class _PlansStore(DefaultGptsPlansMemory):
+    def __init__(self):
+        super().__init__()
+        self.saves: List[List[GptsPlan]] = []
+        self.updates: List[tuple] = []
+
+    def batch_save(self, plans: List[GptsPlan]):
+        self.saves.append(plans)
+        super().batch_save(plans)
+
+    def update_by_uid(self, conv_id, task_uid, state, retry_times, **kwargs):
+        self.updates.append((conv_id, task_uid, state))
+
+
+def _message(message_id: str, content: str, conv_id: str = "c1") -> GptsMessage:
+    return GptsMessage(
+        conv_id=conv_id,
+        conv_session_id=conv_id,
+        sender="agent",
+        sender_name="agent",
+        receiver="Human",
+        message_id=message_id,
+        role="assistant",
+        content=content,
+    )
+
+
+def _plan(task_uid: str, conv_id: str = "c1") -> GptsPlan:
+    return GptsPlan(
+        conv_id=conv_id,
+        conv_session_id=conv_id,
+        conv_round=1,
+        sub_task_id=task_uid,
+        task_uid=task_uid,
+    )
+
+
+def _journal(messages, plans, wal_dir=None, **kwargs) -> GptsWriteBehindJournal:
+    return GptsWriteBehindJournal(
+        messages, plans, ThreadPoolExecutor(1), wal_dir=wal_dir, **kwargs
+    )
+
+
+def _wal_files(wal_dir) -> List[str]:
+    return sorted(os.listdir(wal_dir))
+
+
+@pytest.mark.asyncio
+async def test_merge_writes(tmp_path):
+    messages, plans = _MessageStore(), _PlansStore()
+    journal = _journal(messages, plans, str(tmp_path), flush_interval=60)
+    journal.add_message("c1", _message("m1", "thinking"))
+    journal.add_message("c1", _message("m2", "hello"))
+    journal.add_message("c1", _message("m1", "done"))
+    plan = _plan("t1")
+    journal.add_plans("c1", [plan])
+    plan.state = "complete"
+    journal.update_plan("c1", plan)
+    journal.update_plan("c1", _plan("t0"))
+    assert journal.pending_count("c1") == 4
+    assert _wal_files(tmp_path) == ["c1.0.wal"]
+
+    assert await journal.flush("c1")
+    assert [[m.content for m in b] for b in messages.batches] == [["done", "hello"]]
+    assert [[p.state for p in b] for b in plans.saves] == [["complete"]]
+    assert plans.updates == [("c1", "t0", "todo")]
+    assert journal.pending_count("c1") == 0
+    assert _wal_files(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_flush_on_size_and_time():
+    messages, plans = _MessageStore(), _PlansStore()
+    journal = _journal(messages, plans, max_pending=2, flush_interval=0.05)
+    journal.add_message("c1", _message("m1", "a"))
+    journal.add_message("c1", _message("m2", "b"))
+    await asyncio.sleep(0.01)
+    assert len(messages.batches) == 1
+
+    journal.add_message("c1", _message("m3", "c"))
+    await asyncio.sleep(0.01)
+    assert len(messages.batches) == 1
+    await asyncio.sleep(0.1)
+    assert [m.message_id for m in messages.batches[-1]] == ["m3"]
+
+
+@pytest.mark.asyncio
+async def test_retry_failed_writes(tmp_path):
+    messages, plans = _MessageStore(fail_times=1), _PlansStore()
+    journal = _journal(messages, plans, str(tmp_path), flush_interval=60)
+    journal.add_plans("c1", [_plan("t1")])
+    journal.add_message("c1", _message("m1", "a"))
+    assert not await journal.flush("c1")
+    # The plans were saved before the messages failed
+    assert len(plans.saves) == 1
+
+    journal.add_message("c1", _message("m1", "b"))
+    assert _wal_files(tmp_path) == ["c1.0.wal", "c1.1.wal"]
+    assert await journal.flush("c1")
+    assert [m.content for m in messages.batches[-1]] == ["b"]
+    # Not saved again
+    assert len(plans.saves) == 1
+    assert plans.updates == [("c1", "t1", "todo")]
+    assert _wal_files(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_recover_from_wal(tmp_path):
+    crashed = _journal(_MessageStore(), _PlansStore(), str(tmp_path))
+    crashed.add_message("c/1", _message("m1", "a", conv_id="c/1"))
+    crashed.add_plans("c/1", [_plan("t1", conv_id="c/1")])
+    crashed.add_message("c/1", _message("m2", "b", conv_id="c/1"))
+    crashed.close()
+    # A broken record at the end of the log
+    with open(tmp_path / _wal_files(tmp_path)[0], "a") as f:
+        f.write('{"op": "mess')
+
+    messages, plans = _MessageStore(), _PlansStore()
+    journal = _journal(messages, plans, str(tmp_path))
+    assert journal.pending_count("c/1") == 3
+    await journal.flush_all()
+    assert [m.content for m in messages.batches[0]] == ["a", "b"]
+    assert messages.batches[0][0].created_at is not None
+    assert [p.task_uid for p in plans.saves[0]] == ["t1"]
+    assert _wal_files(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_gpts_memory_write_behind(tmp_path):
+    messages, plans = _MessageStore(), _PlansStore()
+    memory = GptsMemory(
+        plans_memory=plans,
+        message_memory=messages,
+        write_behind=True,
+        write_behind_wal_dir=str(tmp_path),
+        write_behind_interval=60,
+    )
+    memory.init("c1")
+    await memory.append_message("c1", _message("m1", "a"))
+    await memory.append_plans("c1", [_plan("t1")])
+    assert not messages.batches
+    assert [m.content for m in await memory.get_messages("c1")] == ["a"]
+    # Not in the storage yet, read from the journal
+    memory.clear("c1")
+    assert [m.content for m in await memory.get_messages("c1")] == ["a"]
+    assert [p.task_uid for p in await memory.get_plans("c1")] == ["t1"]
+    assert not messages.batches
+
+    # The pending writes are persisted before reading the storage
+    await memory.get_agent_history_memory("c1", "agent")
+    assert len(messages.batches) == 1
+
+    await memory.append_message("c1", _message("m2", "b"))
+    await memory.complete("c1")
+    assert [m.message_id for m in messages.batches[-1]] == ["m2"]
+    assert len(plans.saves) == 1
+
+
+@pytest.mark.asyncio
+async def test_start_and_stop(tmp_path):
+    crashed = _journal(_MessageStore(), _PlansStore(), str(tmp_path))
+    crashed.add_message("c1", _message("m1", "a"))
+    crashed.close()
+
+    messages, plans = _MessageStore(), _PlansStore()
+    memory = GptsMemory(
+        plans_memory=plans,
+        message_memory=messages,
+        write_behind=True,
+        write_behind_wal_dir=str(tmp_path),
+        write_behind_interval=60,
+    )
+    # The recovered writes are persisted at the start, without a new write
+    await memory.startup()
+    await asyncio.sleep(0.05)
+    assert [m.message_id for m in messages.batches[0]] == ["m1"]
+    assert _wal_files(tmp_path) == []
+
+    memory.init("c2")
+    await memory.append_message("c2", _message("m2", "b", conv_id="c2"))
+    assert len(messages.batches) == 1
+    await memory.shutdown()
+    assert [m.message_id for m in messages.batches[-1]] == ["m2"]
+    assert _wal_files(tmp_path) == []
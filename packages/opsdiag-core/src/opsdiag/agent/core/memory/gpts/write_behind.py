@@ -0,0 +1,435 @@
+"""Write-behind persistence of the GPTs messages and plans.
+
+The writes of a conversation are merged in memory, a message or a plan written
+again replaces its pending write, and are persisted in one batch when there are
+enough of them, after a short delay or when the conversation ends. Every write is
+appended to a local write-ahead log first, the log segments left by a crash are
+loaded back and persisted again, so a message is not lost before it's persisted.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import weakref
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import IO, Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+from opsdiag.util.executor_utils import blocking_func_to_async
+
+from .base import GptsMessage, GptsMessageMemory, GptsPlan, GptsPlansMemory
+
+logger = logging.getLogger(__name__)
+
+_WAL_SUFFIX = ".wal"
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _load_datetimes(data: Dict[str, Any]) -> Dict[str, Any]:
+    for key in ("created_at", "updated_at"):
+        value = data.get(key)
+        if isinstance(value, str):
+            try:
+                data[key] = datetime.fromisoformat(value)
+            except ValueError:
+                data[key] = None
+    return data
+
+
+class GptsMemoryWAL:
+    """The local write-ahead log, a file per segment of a conversation.
+
+    The records are appended to the open segment of the conversation. The segment is
+    rotated before its writes are persisted, and removed after.
+
+    Args:
+        wal_dir (str): The directory of the segments.
+        fsync (bool): Sync every record to the disk, the records are only flushed to
+            the OS by default, which is enough if the process crashes.
+    """
+
+    def __init__(self, wal_dir: str, fsync: bool = False):
+        self.wal_dir = wal_dir
+        self.fsync = fsync
+        self._files: Dict[str, Tuple[int, IO]] = {}
+        self._next_seq: Dict[str, int] = {}
+        os.makedirs(wal_dir, exist_ok=True)
+
+    def _path(self, conv_id: str, seq: int) -> str:
+        name = f"{quote(conv_id, safe='')}.{seq}{_WAL_SUFFIX}"
+        return os.path.join(self.wal_dir, name)
+
+    def append(self, conv_id: str, record: Dict[str, Any]):
+        if conv_id not in self._files:
+            seq = self._next_seq.get(conv_id, 0)
+            self._next_seq[conv_id] = seq + 1
+            self._files[conv_id] = (seq, open(self._path(conv_id, seq), "a"))
+        _, file = self._files[conv_id]
+        file.write(json.dumps(record, default=_json_default, ensure_ascii=False))
+        file.write("\n")
+        file.flush()
+        if self.fsync:
+            os.fsync(file.fileno())
+
+    def rotate(self, conv_id: str) -> Optional[int]:
+        """Close the open segment, the next records go to a new segment."""
+        if conv_id not in self._files:
+            return None
+        seq, file = self._files.pop(conv_id)
+        file.close()
+        return seq
+
+    def remove(self, conv_id: str, seqs: List[int]):
+        for seq in seqs:
+            try:
+                os.remove(self._path(conv_id, seq))
+            except FileNotFoundError:
+                pass
+        if conv_id not in self._files:
+            # All the segments of the conversation are removed
+            self._next_seq.pop(conv_id, None)
+
+    def recover(self) -> Dict[str, List[Tuple[int, List[Dict[str, Any]]]]]:
+        """Read the segments left in the directory, in the order of the writes."""
+        segments: Dict[str, List[Tuple[int, List[Dict[str, Any]]]]] = {}
+        for name in os.listdir(self.wal_dir):
+            if not name.endswith(_WAL_SUFFIX):
+                continue
+            encoded_conv_id, _, seq = name[: -len(_WAL_SUFFIX)].rpartition(".")
+            if not seq.isdigit():
+                continue
+            conv_id = unquote(encoded_conv_id)
+            records = []
+            with open(os.path.join(self.wal_dir, name)) as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # The last record of a crashed write
+                        logger.warning(f"Skip a broken record in the WAL {name}")
+            segments.setdefault(conv_id, []).append((int(seq), records))
+            self._next_seq[conv_id] = max(self._next_seq.get(conv_id, 0), int(seq) + 1)
+        for conv_segments in segments.values():
+            conv_segments.sort(key=lambda s: s[0])
+        return segments
+
+    def close(self):
+        for _, file in self._files.values():
+            file.close()
+        self._files.clear()
+
+
+class _PendingWrites:
+    """The merged writes of a conversation which are not persisted yet."""
+
+    def __init__(self):
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.plans: Dict[str, Dict[str, Any]] = {}
+        self.plan_updates: Dict[str, Dict[str, Any]] = {}
+        self.segments: List[int] = []
+        # Some writes may be persisted already, by a failed or crashed flush
+        self.maybe_persisted = False
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.messages) + len(self.plans) + len(self.plan_updates)
+
+    def apply(self, record: Dict[str, Any]):
+        op, data = record["op"], record["data"]
+        if op == "message":
+            self.messages[data["message_id"]] = data
+        elif op == "plans":
+            for plan in data:
+                self.plans[plan["task_uid"]] = plan
+                self.plan_updates.pop(plan["task_uid"], None)
+        elif op == "plan_update":
+            plan = self.plans.get(data["task_uid"])
+            if plan is not None:
+                plan.update(
+                    state=data["state"],
+                    retry_times=data["retry_times"],
+                    agent_model=data["agent_model"],
+                    result=data["result"],
+                    updated_at=data["updated_at"],
+                )
+            else:
+                self.plan_updates[data["task_uid"]] = data
+
+    def merge(self, newer: "_PendingWrites"):
+        """Apply the newer writes over these writes."""
+        for message in newer.messages.values():
+            self.apply({"op": "message", "data": message})
+        if newer.plans:
+            self.apply({"op": "plans", "data": list(newer.plans.values())})
+        for update in newer.plan_updates.values():
+            self.apply({"op": "plan_update", "data": update})
+        self.segments.extend(newer.segments)
+        self.maybe_persisted = self.maybe_persisted or newer.maybe_persisted
+
+
+class GptsWriteBehindJournal:
+    """Batch the writes of the GPTs messages and plans per conversation.
+
+    Args:
+        message_memory (GptsMessageMemory): The storage of the messages.
+        plans_memory (GptsPlansMemory): The storage of the plans.
+        executor (Executor): The executor to run the storage calls.
+        wal_dir (Optional[str]): The directory of the write-ahead log, None to keep
+            the pending writes in memory only.
+        max_pending (int): Persist the writes of a conversation when it has this
+            many pending writes.
+        flush_interval (float): Persist the writes of a conversation after this many
+            seconds since its first pending write.
+        fsync (bool): Sync every record of the log to the disk.
+    """
+
+    def __init__(
+        self,
+        message_memory: GptsMessageMemory,
+        plans_memory: GptsPlansMemory,
+        executor: Executor,
+        wal_dir: Optional[str] = None,
+        max_pending: int = 100,
+        flush_interval: float = 1.0,
+        fsync: bool = False,
+    ):
+        self._message_memory = message_memory
+        self._plans_memory = plans_memory
+        self._executor = executor
+        self._max_pending = max_pending
+        self._flush_interval = flush_interval
+        self._wal = GptsMemoryWAL(wal_dir, fsync) if wal_dir else None
+        self._pending: Dict[str, _PendingWrites] = {}
+        self._flushing: Dict[str, _PendingWrites] = {}
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+        self._tasks: Set[asyncio.Task] = set()
+        self._recovered = False
+        if self._wal:
+            self._recover()
+
+    def _recover(self):
+        for conv_id, segments in self._wal.recover().items():
+            pending = _PendingWrites()
+            pending.maybe_persisted = True
+            for seq, records in segments:
+                for record in records:
+                    pending.apply(record)
+                pending.segments.append(seq)
+            self._pending[conv_id] = pending
+            logger.info(
+                f"Recovered {pending.size} writes of the conversation {conv_id} "
+                "from the WAL"
+            )
+        self._recovered = bool(self._pending)
+
+    def pending_count(self, conv_id: str) -> int:
+        pending = self._pending.get(conv_id)
+        return pending.size if pending else 0
+
+    def _unpersisted(self, conv_id: str) -> List[_PendingWrites]:
+        return [
+            writes
+            for writes in (self._flushing.get(conv_id), self._pending.get(conv_id))
+            if writes
+        ]
+
+    def overlay_messages(
+        self, conv_id: str, messages: List[GptsMessage]
+    ) -> List[GptsMessage]:
+        """Apply the writes not persisted yet to the messages read from the storage."""
+        unpersisted = self._unpersisted(conv_id)
+        if not unpersisted:
+            return messages
+        merged = {m.message_id: m for m in messages}
+        for writes in unpersisted:
+            for message_id, data in writes.messages.items():
+                merged[message_id] = GptsMessage(**_load_datetimes(dict(data)))
+        return list(merged.values())
+
+    def overlay_plans(self, conv_id: str, plans: List[GptsPlan]) -> List[GptsPlan]:
+        """Apply the writes not persisted yet to the plans read from the storage."""
+        unpersisted = self._unpersisted(conv_id)
+        if not unpersisted:
+            return plans
+        merged = {p.task_uid: p for p in plans}
+        for writes in unpersisted:
+            for task_uid, data in writes.plans.items():
+                merged[task_uid] = GptsPlan(**_load_datetimes(dict(data)))
+            for task_uid, update in writes.plan_updates.items():
+                plan = merged.get(task_uid)
+                if plan:
+                    plan.state = update["state"]
+                    plan.retry_times = update["retry_times"]
+                    plan.agent_model = update["agent_model"]
+                    plan.result = update["result"]
+        return list(merged.values())
+
+    def start(self):
+        """Persist the writes recovered from the log in the background.
+
+        Must be called in the running loop, the first write does it otherwise.
+        """
+        if self._recovered:
+            self._recovered = False
+            for conv_id in list(self._pending):
+                self._spawn(self.flush(conv_id))
+
+    def _write(self, conv_id: str, record: Dict[str, Any]):
+        self.start()
+        if self._wal:
+            self._wal.append(conv_id, record)
+        pending = self._pending.get(conv_id)
+        if pending is None:
+            pending = self._pending[conv_id] = _PendingWrites()
+        pending.apply(record)
+        self._schedule(conv_id, pending)
+
+    def _schedule(self, conv_id: str, pending: _PendingWrites):
+        if pending.size >= self._max_pending:
+            if pending.timer:
+                pending.timer.cancel()
+                pending.timer = None
+            self._spawn(self.flush(conv_id))
+        elif pending.timer is None:
+            pending.timer = asyncio.get_running_loop().call_later(
+                self._flush_interval, lambda: self._spawn(self.flush(conv_id))
+            )
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def add_message(self, conv_id: str, message: GptsMessage):
+        """Write a message, a pending write of the same message is replaced."""
+        self._write(conv_id, {"op": "message", "data": dataclasses.asdict(message)})
+
+    def add_plans(self, conv_id: str, plans: List[GptsPlan]):
+        """Save the new plans."""
+        if plans:
+            data = [dataclasses.asdict(plan) for plan in plans]
+            self._write(conv_id, {"op": "plans", "data": data})
+
+    def update_plan(self, conv_id: str, plan: GptsPlan):
+        """Update the state and the result of a plan."""
+        data = {
+            "conv_id": conv_id,
+            "task_uid": plan.task_uid,
+            "state": plan.state,
+            "retry_times": plan.retry_times,
+            "agent_model": plan.agent_model,
+            "result": plan.result,
+            "updated_at": plan.updated_at,
+        }
+        self._write(conv_id, {"op": "plan_update", "data": data})
+
+    async def flush(self, conv_id: str) -> bool:
+        """Persist the pending writes of a conversation.
+
+        Returns:
+            bool: False if the writes failed, they are retried later.
+        """
+        lock = self._locks.get(conv_id)
+        if lock is None:
+            lock = self._locks[conv_id] = asyncio.Lock()
+        async with lock:
+            pending = self._pending.pop(conv_id, None)
+            if pending is None:
+                return True
+            if pending.timer:
+                pending.timer.cancel()
+                pending.timer = None
+            if self._wal:
+                seq = self._wal.rotate(conv_id)
+                if seq is not None:
+                    pending.segments.append(seq)
+            self._flushing[conv_id] = pending
+            try:
+                await blocking_func_to_async(
+                    self._executor, self._persist, conv_id, pending
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Failed to persist {pending.size} writes of the conversation "
+                    f"{conv_id}, retry later: {e}"
+                )
+                pending.maybe_persisted = True
+                newer = self._pending.get(conv_id)
+                if newer:
+                    if newer.timer:
+                        newer.timer.cancel()
+                    pending.merge(newer)
+                self._pending[conv_id] = pending
+                pending.timer = asyncio.get_running_loop().call_later(
+                    self._flush_interval, lambda: self._spawn(self.flush(conv_id))
+                )
+                return False
+            finally:
+                self._flushing.pop(conv_id, None)
+            if self._wal:
+                self._wal.remove(conv_id, pending.segments)
+            return True
+
+    async def flush_all(self):
+        """Persist the pending writes of all the conversations."""
+        await asyncio.gather(*[self.flush(conv_id) for conv_id in list(self._pending)])
+
+    def _persist(self, conv_id: str, pending: _PendingWrites):
+        plans = [GptsPlan(**_load_datetimes(dict(p))) for p in pending.plans.values()]
+        plan_updates = list(pending.plan_updates.values())
+        if plans and pending.maybe_persisted:
+            # Saving the plans is not idempotent, update the saved plans instead
+            saved = {p.task_uid for p in self._plans_memory.get_by_conv_id(conv_id)}
+            plan_updates.extend(
+                {**dataclasses.asdict(p), "conv_id": conv_id}
+                for p in plans
+                if p.task_uid in saved
+            )
+            plans = [p for p in plans if p.task_uid not in saved]
+        if plans:
+            self._plans_memory.batch_save(plans)
+        if pending.messages:
+            self._message_memory.batch_update(
+                [
+                    GptsMessage(**_load_datetimes(dict(m)))
+                    for m in pending.messages.values()
+                ]
+            )
+        for update in plan_updates:
+            self._plans_memory.update_by_uid(
+                update["conv_id"],
+                update["task_uid"],
+                update["state"],
+                update["retry_times"],
+                model=update["agent_model"],
+                result=update["result"],
+            )
+
+    async def stop(self):
+        """Persist all the pending writes and close the log.
+
+        The writes failed to persist are left in the log, they are recovered by the
+        next start.
+        """
+        self._recovered = False
+        await self.flush_all()
+        for pending in self._pending.values():
+            if pending.timer:
+                pending.timer.cancel()
+                pending.timer = None
+        self.close()
+
+    def close(self):
+        if self._wal:
+            self._wal.close()
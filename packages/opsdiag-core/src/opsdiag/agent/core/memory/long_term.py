@@ -4,6 +4,8 @@ from concurrent.futures import Executor
 from datetime import datetime
 from typing import Any, Dict, Generic, List, Optional
 
+import numpy as np
+
 from opsdiag.core import Chunk
 from opsdiag.rag.retriever.time_weighted import TimeWeightedEmbeddingRetriever
 from opsdiag.storage.vector_store.base import VectorStoreBase
@@ -55,58 +57,51 @@ class LongTermRetriever(TimeWeightedEmbeddingRetriever):
             # with custom adjustments for long-term memory
             return self._retrieve_vector_store_only(query, filters, current_time)
 
-        # Process all memories in memory_stream
-        docs_and_scores = {}
-        for doc in self.memory_stream:
-            if _METADATA_BUFFER_IDX in doc.metadata:
-                buffer_idx = doc.metadata[_METADATA_BUFFER_IDX]
-                docs_and_scores[buffer_idx] = (doc, self.default_salience)
-
-        # If a doc is considered salient, update the salience score
+        # All memories have the default salience, the salient ones their relevance
+        docs_and_scores = {
+            doc.metadata[_METADATA_BUFFER_IDX]: (doc, self.default_salience)
+            for doc in self.memory_stream
+            if _METADATA_BUFFER_IDX in doc.metadata
+        }
         docs_and_scores.update(self.get_salient_docs(query, filters))
 
         # If no documents found and we're in vector store only mode, fall back
         if not docs_and_scores and self._use_vector_store_only:
             return self._retrieve_vector_store_only(query, filters, current_time)
 
-        # Calculate combined scores for all documents
-        rescored_docs = [
-            (doc, self._get_combined_score(doc, relevance, current_time))
-            for doc, relevance in docs_and_scores.values()
-        ]
-
-        # Sort by score
-        rescored_docs.sort(key=lambda x: x[1], reverse=True)
+        # Calculate combined scores for all documents at once
+        docs = [doc for doc, _ in docs_and_scores.values()]
+        scores = self._get_combined_scores(
+            docs, [relevance for _, relevance in docs_and_scores.values()], current_time
+        )
 
         result = []
-        retrieved_num = 0
+        accessed = []
 
         # Process documents in order of score
-        for doc, _ in rescored_docs:
+        for i in np.argsort(-scores, kind="stable"):
+            if len(result) >= self._k:
+                break
+            doc = docs[i]
             # Skip documents that are marked for forgetting or merging
             if (
-                retrieved_num < self._k
-                and doc.content.find(_FORGET_PLACEHOLDER) == -1
-                and doc.content.find(_MERGE_PLACEHOLDER) == -1
+                doc.content.find(_FORGET_PLACEHOLDER) != -1
+                or doc.content.find(_MERGE_PLACEHOLDER) != -1
             ):
-                retrieved_num += 1
-
-                # Get the document from memory stream
-                if _METADATA_BUFFER_IDX in doc.metadata and 0 <= doc.metadata[
-                    _METADATA_BUFFER_IDX
-                ] < len(self.memory_stream):
-                    buffered_doc = self.memory_stream[
-                        doc.metadata[_METADATA_BUFFER_IDX]
-                    ]
-                    buffered_doc.metadata[_METADATA_LAST_ACCESSED_AT] = current_time
-                    result.append(buffered_doc)
-                else:
-                    # Handle case where buffer_idx is invalid
-                    doc.metadata[_METADATA_LAST_ACCESSED_AT] = current_time
-                    result.append(doc)
-
-        # Save memory stream after updating access times
-        self._save_memory_stream()
+                continue
+
+            # Get the document from memory stream
+            buffer_idx = doc.metadata.get(_METADATA_BUFFER_IDX)
+            if buffer_idx is not None and 0 <= buffer_idx < len(self.memory_stream):
+                accessed.append(buffer_idx)
+                result.append(self.memory_stream[buffer_idx])
+            else:
+                # Handle case where buffer_idx is invalid
+                doc.metadata[_METADATA_LAST_ACCESSED_AT] = current_time
+                result.append(doc)
+
+        # Persist the updated access times only
+        self._record_access(accessed, current_time)
 
         return result
 
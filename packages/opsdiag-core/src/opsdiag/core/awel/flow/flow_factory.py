@@ -586,6 +586,13 @@ class FlowFactory:
         """Init the flow factory."""
         self._dag_prefix = dag_prefix
 
+    def get_dag_id(self, flow_panel: FlowPanel) -> str:
+        """Get the id of the DAG built from the flow panel."""
+        if flow_panel.dag_id:
+            return flow_panel.dag_id
+        formatted_name = flow_panel.name.replace(" ", "_")
+        return f"{self._dag_prefix}_{formatted_name}_{flow_panel.uid}"
+
     def build(self, flow_panel: FlowPanel) -> DAG:
         """Build the flow."""
         if not flow_panel.flow_data:
@@ -832,9 +839,8 @@ class FlowFactory:
         """Build the DAG."""
         from ..dag.base import DAGVariables, _DAGVariablesItem
 
-        formatted_name = flow_panel.name.replace(" ", "_")
         if not dag_id:
-            dag_id = f"{self._dag_prefix}_{formatted_name}_{flow_panel.uid}"
+            dag_id = self.get_dag_id(flow_panel)
 
         default_dag_variables: Optional[DAGVariables] = None
         if flow_panel.variables:
@@ -1,14 +1,19 @@
 """File storage interface."""
 
+import contextlib
 import dataclasses
 import hashlib
 import io
+import json
 import logging
 import os
+import re
+import threading
 import uuid
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from io import BytesIO
-from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
 from urllib.parse import parse_qs, urlencode, urlparse
 
 import requests
@@ -29,6 +34,14 @@ from .storage import (
 logger = logging.getLogger(__name__)
 _SCHEMA = "derisk-fs"
 
+# Custom metadata keys of the deduplicated files
+# The file id whose data in the storage backend is shared by the file
+_CONTENT_FILE_ID_KEY = "content_file_id"
+# The SHA-256 of the file data, MD5 alone is not safe to share the data
+_CONTENT_SHA256_KEY = "content_sha256"
+
+_MD5_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
 
 @dataclasses.dataclass
 class FileMetadataIdentifier(ResourceIdentifier):
@@ -232,6 +245,37 @@ class StorageBackend(ABC):
             bool: True if the file was deleted, False otherwise
         """
 
+    def load_range(self, fm: FileMetadata, offset: int, size: int) -> bytes:
+        """Load a part of the file data.
+
+        Args:
+            fm (FileMetadata): The file metadata
+            offset (int): The offset of the first byte
+            size (int): The max number of bytes to load
+
+        Returns:
+            bytes: The file data in the range
+        """
+        file_data = self.load(fm)
+        try:
+            file_data.seek(offset)
+            return file_data.read(size)
+        finally:
+            file_data.close()
+
+    def is_hash_verified(self, fm: FileMetadata) -> bool:
+        """Whether the data returned by `load` is already verified with the hash.
+
+        The file storage system doesn't hash the loaded file data again if it is.
+
+        Args:
+            fm (FileMetadata): The file metadata
+
+        Returns:
+            bool: True if the loaded file data is verified
+        """
+        return False
+
     def get_public_url(
         self, fm: FileMetadata, expire: Optional[int] = None
     ) -> Optional[str]:
@@ -319,23 +363,150 @@ def calculate_file_hash(file_data: BinaryIO, buffer_size: int) -> str:
     return hasher.hexdigest()
 
 
+class _HashingReader:
+    """Wrap the file data, count and hash the bytes while the backend reads them.
+
+    The bytes are hashed in order, so the bytes read again after the backend seeks
+    back are not hashed twice. The bytes never read by the backend are read by
+    `finish`.
+    """
+
+    def __init__(self, file_data: BinaryIO, hashers: List[Any]):
+        self._file_data = file_data
+        self._hashers = hashers
+        self._pos = file_data.tell()
+        # The bytes before this position are hashed
+        self._hashed = 0
+        self._eof = False
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        """Read the data and hash the bytes not hashed yet."""
+        data = self._file_data.read(size)
+        start = self._pos
+        self._pos += len(data)
+        if start <= self._hashed < self._pos:
+            view = memoryview(data)[self._hashed - start :]
+            for hasher in self._hashers:
+                hasher.update(view)
+            self._hashed = self._pos
+        to_end = size is None or size < 0
+        if self._hashed == self._pos and (to_end or (size and not data)):
+            self._eof = True
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Seek the file data."""
+        self._file_data.seek(offset, whence)
+        self._pos = self._file_data.tell()
+        return self._pos
+
+    def tell(self) -> int:
+        """Get the current position."""
+        return self._pos
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._file_data, name)
+
+    def finish(self, chunk_size: int) -> int:
+        """Hash the bytes not read by the backend, return the file size."""
+        if not self._eof:
+            self.seek(self._hashed)
+            while self.read(chunk_size):
+                pass
+        self._file_data.seek(0)
+        return self._hashed
+
+
+class _KeyedLocks:
+    """The locks of the keys, a key is only locked by one thread at a time.
+
+    Used to fill a cache once for the concurrent requests of the same file, the
+    lock of a key is removed when no thread holds or waits for it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (lock, the number of threads holding or waiting for it)
+        self._locks: Dict[str, Tuple[threading.Lock, int]] = {}
+
+    @contextlib.contextmanager
+    def hold(self, key: str) -> Iterator[None]:
+        with self._lock:
+            lock, users = self._locks.get(key) or (threading.Lock(), 0)
+            self._locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._locks[key]
+                if users > 1:
+                    self._locks[key] = (lock, users - 1)
+                else:
+                    del self._locks[key]
+
+
+# The downloads of the same target path in this process
+_download_locks = _KeyedLocks()
+
+
+def _hash_record_path(file_path: str) -> str:
+    """The hidden file next to a downloaded file, records its verified hash."""
+    dir_name, file_name = os.path.split(file_path)
+    return os.path.join(dir_name, f".{file_name}.hash")
+
+
+def _write_hash_record(file_path: str, file_hash: str):
+    stat = os.stat(file_path)
+    record = {"hash": file_hash, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    with open(_hash_record_path(file_path), "w") as f:
+        json.dump(record, f)
+
+
+def _is_hash_recorded(file_path: str, file_hash: str) -> bool:
+    """Whether the file is not changed since its hash was recorded."""
+    try:
+        with open(_hash_record_path(file_path)) as f:
+            record = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return False
+    return record == {
+        "hash": file_hash,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+    }
+
+
 class FileStorageSystem:
-    """File storage system."""
+    """File storage system.
+
+    The size and the hash of a file are computed while the storage backend reads it,
+    the file data is read only once.
+
+    With ``deduplicate``, a file whose data is already stored in the same bucket
+    and storage backend is saved as metadata only, it shares the data of the stored
+    file. The shared data is deleted with the last file which references it.
+    """
 
     def __init__(
         self,
         storage_backends: Dict[str, StorageBackend],
         metadata_storage: Optional[StorageInterface[FileMetadata, Any]] = None,
         check_hash: bool = True,
+        deduplicate: bool = False,
     ):
         """Initialize the file storage system."""
         metadata_storage = metadata_storage or InMemoryStorage()
         self.storage_backends = storage_backends
         self.metadata_storage = metadata_storage
         self.check_hash = check_hash
+        self.deduplicate = deduplicate
         self._save_chunk_size = min(
             backend.save_chunk_size for backend in storage_backends.values()
         )
+        # Guard the references of the shared file data
+        self._content_lock = threading.Lock()
 
     def _calculate_file_hash(self, file_data: BinaryIO) -> str:
         """Calculate the MD5 hash of the file data."""
@@ -361,6 +532,62 @@ class FileStorageSystem:
         if not backend:
             raise ValueError(f"Unsupported storage type: {storage_type}")
 
+        # filter None value
+        custom_metadata = (
+            {k: v for k, v in custom_metadata.items() if v is not None}
+            if custom_metadata
+            else {}
+        )
+        uri = str(
+            FileStorageURI(storage_type, bucket, file_id, custom_params=custom_metadata)
+        )
+
+        def _build_metadata(storage_path: str, file_size: int, file_hash: str):
+            return FileMetadata(
+                file_id=file_id,
+                bucket=bucket,
+                file_name=file_name,
+                file_size=file_size,
+                storage_type=storage_type,
+                storage_path=storage_path,
+                uri=uri,
+                custom_metadata=custom_metadata,
+                file_hash=file_hash,
+            )
+
+        md5 = None
+        if self.deduplicate:
+            # Hash the file before saving it, a known file is not saved again
+            with root_tracer.start_span(
+                "file_storage_system.save_file.calculate_hash",
+            ):
+                md5, sha256 = hashlib.md5(), hashlib.sha256()
+                reader = _HashingReader(file_data, [md5, sha256])
+                file_size = reader.finish(self._save_chunk_size)
+            file_hash = md5.hexdigest()
+            custom_metadata[_CONTENT_SHA256_KEY] = sha256.hexdigest()
+            with self._content_lock:
+                content = self._find_content(
+                    bucket, storage_type, file_hash, file_size, sha256.hexdigest()
+                )
+                if content:
+                    custom_metadata[_CONTENT_FILE_ID_KEY] = self._content_file_id(
+                        content
+                    )
+                    metadata = _build_metadata(
+                        content.storage_path, file_size, file_hash
+                    )
+                    self.metadata_storage.save(metadata)
+                    logger.info(
+                        f"File {file_name} is deduplicated, it shares the data of "
+                        f"file {custom_metadata[_CONTENT_FILE_ID_KEY]}"
+                    )
+                    return uri
+            reader = _HashingReader(file_data, [])
+        else:
+            md5 = hashlib.md5() if self.check_hash else None
+            reader = _HashingReader(file_data, [md5] if md5 else [])
+
         with root_tracer.start_span(
             "file_storage_system.save_file.backend_save",
             metadata={
@@ -373,45 +600,70 @@ class FileStorageSystem:
             storage_path = backend.save(
                 bucket,
                 file_id,
-                file_data,
+                reader,
                 public_url=public_url,
                 public_url_expire=public_url_expire,
             )
+        if not self.deduplicate:
+            # The file size and hash are computed while the backend reads the file
+            file_size = reader.finish(self._save_chunk_size)
+            file_hash = md5.hexdigest() if md5 else "-1"
 
-        file_data.seek(0, 2)  # Move to the end of the file
-        file_size = file_data.tell()  # Get the file size
-        file_data.seek(0)  # Reset file pointer
+        metadata = _build_metadata(storage_path, file_size, file_hash)
+        self.metadata_storage.save(metadata)
+        return uri
 
-        # filter None value
-        custom_metadata = (
-            {k: v for k, v in custom_metadata.items() if v is not None}
-            if custom_metadata
-            else {}
+    def _find_content(
+        self,
+        bucket: str,
+        storage_type: str,
+        file_hash: str,
+        file_size: int,
+        sha256: str,
+    ) -> Optional[FileMetadata]:
+        """Find a stored file with the same data."""
+        candidates = self.metadata_storage.query(
+            QuerySpec(conditions={"bucket": bucket, "file_hash": file_hash}),
+            FileMetadata,
         )
+        for fm in candidates:
+            if (
+                fm.storage_type == storage_type
+                and fm.file_size == file_size
+                and (fm.custom_metadata or {}).get(_CONTENT_SHA256_KEY) == sha256
+            ):
+                return fm
+        return None
 
-        with root_tracer.start_span(
-            "file_storage_system.save_file.calculate_hash",
-        ):
-            file_hash = self._calculate_file_hash(file_data)
-        uri = FileStorageURI(
-            storage_type, bucket, file_id, custom_params=custom_metadata
+    @staticmethod
+    def _content_file_id(fm: FileMetadata) -> str:
+        """Get the file id of the file data in the storage backend."""
+        return (fm.custom_metadata or {}).get(_CONTENT_FILE_ID_KEY) or fm.file_id
+
+    def _content_metadata(self, fm: FileMetadata) -> FileMetadata:
+        """Get the metadata to access the file data in the storage backend."""
+        content_file_id = self._content_file_id(fm)
+        if content_file_id == fm.file_id:
+            return fm
+        return dataclasses.replace(fm, file_id=content_file_id)
+
+    def _has_other_references(self, fm: FileMetadata) -> bool:
+        """Whether other files share the file data of the file."""
+        if _CONTENT_SHA256_KEY not in (fm.custom_metadata or {}):
+            # Not saved with deduplication, its data is never shared
+            return False
+        content_file_id = self._content_file_id(fm)
+        candidates = self.metadata_storage.query(
+            QuerySpec(conditions={"bucket": fm.bucket, "file_hash": fm.file_hash}),
+            FileMetadata,
         )
-
-        metadata = FileMetadata(
-            file_id=file_id,
-            bucket=bucket,
-            file_name=file_name,
-            file_size=file_size,
-            storage_type=storage_type,
-            storage_path=storage_path,
-            uri=str(uri),
-            custom_metadata=custom_metadata,
-            file_hash=file_hash,
+        return any(
+            c.file_id != fm.file_id
+            and c.storage_type == fm.storage_type
+            and self._content_file_id(c) == content_file_id
+            for c in candidates
         )
 
-        self.metadata_storage.save(metadata)
-        return str(uri)
-
     @trace("file_storage_system.get_file")
     def get_file(self, uri: str) -> Tuple[BinaryIO, FileMetadata]:
         """Get the file data from the storage backend."""
@@ -457,8 +709,11 @@ class FileStorageSystem:
                 "storage_type": metadata.storage_type,
             },
         ):
-            file_data = backend.load(metadata)
+            content_metadata = self._content_metadata(metadata)
+            file_data = backend.load(content_metadata)
 
+        if backend.is_hash_verified(content_metadata):
+            return file_data, metadata
         with root_tracer.start_span(
             "file_storage_system.get_file.verify_hash",
         ):
@@ -468,6 +723,33 @@ class FileStorageSystem:
 
         return file_data, metadata
 
+    @trace("file_storage_system.get_file_range")
+    def get_file_range(self, uri: str, offset: int, size: int) -> bytes:
+        """Get a part of the file data, without loading the whole file.
+
+        The hash of the file can't be verified with a part of it.
+
+        Args:
+            uri (str): The file URI
+            offset (int): The offset of the first byte
+            size (int): The max number of bytes to read
+
+        Returns:
+            bytes: The file data in the range
+        """
+        if FileStorageURI.is_local_file(uri):
+            with open(uri, "rb") as f:
+                f.seek(offset)
+                return f.read(size)
+
+        metadata = self.get_file_metadata_by_uri(uri)
+        if not metadata:
+            raise FileNotFoundError(f"No metadata found for URI: {uri}")
+        backend = self.storage_backends.get(metadata.storage_type)
+        if not backend:
+            raise ValueError(f"Unsupported storage type: {metadata.storage_type}")
+        return backend.load_range(self._content_metadata(metadata), offset, size)
+
     def get_file_metadata(self, bucket: str, file_id: str) -> Optional[FileMetadata]:
         """Get the file metadata.
 
@@ -514,13 +796,18 @@ class FileStorageSystem:
         if not backend:
             raise ValueError(f"Unsupported storage type: {metadata.storage_type}")
 
-        if backend.delete(metadata):
-            try:
+        with self._content_lock:
+            if self._has_other_references(metadata):
+                # Keep the file data for the other files
                 self.metadata_storage.delete(fid)
                 return True
-            except Exception:
-                # If the metadata deletion fails, log the error and return False
-                return False
+            if backend.delete(self._content_metadata(metadata)):
+                try:
+                    self.metadata_storage.delete(fid)
+                    return True
+                except Exception:
+                    # If the metadata deletion fails, log the error and return False
+                    return False
         return False
 
     def get_public_url(
@@ -553,7 +840,7 @@ class FileStorageSystem:
         if not backend:
             raise ValueError(f"Unsupported storage type: {metadata.storage_type}")
 
-        pub_url = backend.get_public_url(metadata, expire)
+        pub_url = backend.get_public_url(self._content_metadata(metadata), expire)
         return pub_url if pub_url else uri
 
     def list_files(
@@ -666,7 +953,9 @@ class FileStorageClient(BaseComponent):
         Returns:
             str: The file URI
         """
-        logger.info(f"save_file storage_type is {storage_type}, file_name is {file_name}")
+        logger.info(
+            f"save_file storage_type is {storage_type}, file_name is {file_name}"
+        )
 
         if not storage_type:
             storage_type = self.default_storage_type
@@ -718,24 +1007,55 @@ class FileStorageClient(BaseComponent):
             base_path = str(Path.home() / ".cache" / "derisk" / "files")
             os.makedirs(base_path, exist_ok=True)
             target_path = os.path.join(base_path, file_metadata.file_id + extension)
-        file_hash = file_metadata.file_hash
-        if os.path.exists(target_path) and cache:
-            logger.debug(f"File {target_path} already exists, begin hash check")
-            with open(target_path, "rb") as f:
-                if file_hash == calculate_file_hash(f, self.save_chunk_size):
-                    logger.info(f"File {uri} already exists at {target_path}")
-                    return target_path, file_metadata
-        logger.info(f"Downloading file {uri} to {target_path}")
-        file_data, _ = self.storage_system.get_file(uri)
-
-        with open(target_path, "wb") as f:
-            while True:
-                chunk = file_data.read(self.save_chunk_size)
-                if not chunk:
-                    break
-                f.write(chunk)
+        # Only one thread downloads the file, the others wait and reuse it
+        with _download_locks.hold(target_path):
+            if cache and self._is_downloaded(target_path, file_metadata):
+                logger.info(f"File {uri} already exists at {target_path}")
+                return target_path, file_metadata
+            logger.info(f"Downloading file {uri} to {target_path}")
+            # The hash is verified by the storage system
+            file_data, _ = self.storage_system.get_file(uri)
+
+            tmp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    while True:
+                        chunk = file_data.read(self.save_chunk_size)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                os.replace(tmp_path, target_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            _write_hash_record(target_path, file_metadata.file_hash)
         return target_path, file_metadata
 
+    def _is_downloaded(self, target_path: str, file_metadata: FileMetadata) -> bool:
+        """Whether the file is already downloaded to the target path.
+
+        The file is hashed only if it has no hash record or is changed since then.
+        """
+        if not os.path.exists(target_path):
+            return False
+        file_size = file_metadata.file_size
+        if (
+            file_size is not None
+            and file_size >= 0
+            and os.path.getsize(target_path) != file_size
+        ):
+            return False
+        file_hash = file_metadata.file_hash
+        if _is_hash_recorded(target_path, file_hash):
+            return True
+        logger.debug(f"File {target_path} already exists, begin hash check")
+        with open(target_path, "rb") as f:
+            if file_hash != calculate_file_hash(f, self.save_chunk_size):
+                return False
+        _write_hash_record(target_path, file_hash)
+        return True
+
     def get_file(self, uri: str) -> Tuple[BinaryIO, FileMetadata]:
         """Get the file data from the storage system.
 
@@ -747,6 +1067,19 @@ class FileStorageClient(BaseComponent):
         """
         return self.storage_system.get_file(uri)
 
+    def get_file_range(self, uri: str, offset: int, size: int) -> bytes:
+        """Get a part of the file data from the storage system.
+
+        Args:
+            uri (str): The file URI
+            offset (int): The offset of the first byte
+            size (int): The max number of bytes to read
+
+        Returns:
+            bytes: The file data in the range
+        """
+        return self.storage_system.get_file_range(uri, offset, size)
+
     def get_file_by_id(
         self, bucket: str, file_id: str
     ) -> Tuple[BinaryIO, FileMetadata]:
@@ -823,7 +1156,13 @@ class FileStorageClient(BaseComponent):
 
 
 class SimpleDistributedStorage(StorageBackend):
-    """Simple distributed storage backend."""
+    """Simple distributed storage backend.
+
+    The files of the remote nodes are cached in the local storage when they are
+    loaded, the cache is bounded by ``cache_max_size`` bytes and the least recently
+    used files are evicted first. A file is cached only after its hash is checked,
+    so a cached file can be used without checking it again.
+    """
 
     storage_type: str = "distributed"
 
@@ -835,8 +1174,16 @@ class SimpleDistributedStorage(StorageBackend):
         transfer_chunk_size: int = 1024 * 1024,
         transfer_timeout: int = 360,
         api_prefix: str = "/api/v2/serve/file/files",
+        cache_max_size: int = 1024 * 1024 * 1024,
+        pool_maxsize: int = 10,
     ):
-        """Initialize the simple distributed storage backend."""
+        """Initialize the simple distributed storage backend.
+
+        Args:
+            cache_max_size (int): The max size in bytes of the cached remote files,
+                0 to disable the cache.
+            pool_maxsize (int): The max number of connections kept for each node.
+        """
         self.node_address = node_address
         self.local_storage_path = local_storage_path
         os.makedirs(self.local_storage_path, exist_ok=True)
@@ -844,6 +1191,24 @@ class SimpleDistributedStorage(StorageBackend):
         self._transfer_chunk_size = transfer_chunk_size
         self._transfer_timeout = transfer_timeout
         self._api_prefix = api_prefix
+        self._cache_max_size = cache_max_size
+
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_maxsize, pool_maxsize=pool_maxsize
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._cache_path = os.path.join(self.local_storage_path, ".cache")
+        self._cache_lock = threading.Lock()
+        # The cache paths being filled, a file is only downloaded once at a time
+        self._fill_locks = _KeyedLocks()
+        # cache file path -> size, the least recently used first
+        self._cache_index: "OrderedDict[str, int]" = OrderedDict()
+        self._cache_size = 0
+        if self._cache_max_size > 0:
+            self._load_cache_index()
 
     @property
     def save_chunk_size(self) -> int:
@@ -860,6 +1225,113 @@ class SimpleDistributedStorage(StorageBackend):
             raise ValueError("Invalid storage path")
         return storage_path.split("//")[1].split("/")[0]
 
+    def _get_file_url(self, fm: FileMetadata, node_address: str) -> str:
+        return f"http://{node_address}{self._api_prefix}/{fm.bucket}/{fm.file_id}"
+
+    def _get_cache_path(self, fm: FileMetadata) -> str:
+        # The hash is a part of the name, a changed file is never read from the cache
+        return os.path.join(self._cache_path, fm.bucket, f"{fm.file_id}.{fm.file_hash}")
+
+    def _is_cacheable(self, fm: FileMetadata) -> bool:
+        if self._cache_max_size <= 0 or not _MD5_PATTERN.match(fm.file_hash or ""):
+            return False
+        return fm.file_size is None or 0 <= fm.file_size <= self._cache_max_size
+
+    def _load_cache_index(self):
+        """Rebuild the cache index from the cached files, the oldest first."""
+        entries = []
+        for root, _, files in os.walk(self._cache_path):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    # Left by an interrupted download
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self._cache_index[path] = size
+            self._cache_size += size
+        self._evict_cache()
+
+    def _evict_cache(self):
+        """Remove the least recently used files until the cache fits, need lock."""
+        while self._cache_size > self._cache_max_size and self._cache_index:
+            path, size = self._cache_index.popitem(last=False)
+            self._cache_size -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _open_cached(self, cache_path: str) -> Optional[BinaryIO]:
+        with self._cache_lock:
+            if cache_path not in self._cache_index:
+                return None
+            try:
+                f = open(cache_path, "rb")  # noqa: SIM115
+            except FileNotFoundError:
+                self._cache_size -= self._cache_index.pop(cache_path)
+                return None
+            self._cache_index.move_to_end(cache_path)
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return f
+
+    def _remove_cached(self, fm: FileMetadata):
+        cache_path = self._get_cache_path(fm)
+        with self._cache_lock:
+            size = self._cache_index.pop(cache_path, None)
+            if size is None:
+                return
+            self._cache_size -= size
+            try:
+                os.remove(cache_path)
+            except FileNotFoundError:
+                pass
+
+    def _fetch_to_cache(self, fm: FileMetadata, node_address: str) -> BinaryIO:
+        """Download the file to the cache, check its hash, then open it."""
+        cache_path = self._get_cache_path(fm)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        hasher = hashlib.md5()
+        size = 0
+        try:
+            with self._session.get(
+                self._get_file_url(fm, node_address),
+                timeout=self._transfer_timeout,
+                stream=True,
+            ) as response:
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(
+                        chunk_size=self._transfer_chunk_size
+                    ):
+                        hasher.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+            if hasher.hexdigest() != fm.file_hash:
+                raise ValueError("File integrity check failed. Hash mismatch.")
+            # Open it before it can be evicted by other threads
+            f = open(tmp_path, "rb")  # noqa: SIM115
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._cache_lock:
+            old_size = self._cache_index.pop(cache_path, None)
+            if old_size is not None:
+                self._cache_size -= old_size
+            self._cache_index[cache_path] = size
+            self._cache_size += size
+            self._evict_cache()
+        return f
+
     def save(
         self,
         bucket: str,
@@ -895,6 +1367,7 @@ class SimpleDistributedStorage(StorageBackend):
         """Load the file data from the distributed storage backend.
 
         If the file is stored on the local node, load it from the local storage.
+        Otherwise, load it from the local cache or download it from the remote node.
 
         Args:
             fm (FileMetadata): The file metadata
@@ -907,24 +1380,103 @@ class SimpleDistributedStorage(StorageBackend):
         node_address = self._parse_node_address(fm)
         file_path = self._get_file_path(bucket, file_id, node_address)
 
-        # TODO: check if the file is cached in local storage
         if node_address == self.node_address:
             if os.path.exists(file_path):
                 return open(file_path, "rb")  # noqa: SIM115
             else:
                 raise FileNotFoundError(f"File {file_id} not found on the local node")
+        elif self._is_cacheable(fm):
+            cache_path = self._get_cache_path(fm)
+            cached = self._open_cached(cache_path)
+            if cached is not None:
+                return cached
+            with self._fill_locks.hold(cache_path):
+                # Filled by the other thread while waiting
+                cached = self._open_cached(cache_path)
+                if cached is not None:
+                    return cached
+                return self._fetch_to_cache(fm, node_address)
         else:
-            response = requests.get(
-                f"http://{node_address}{self._api_prefix}/{bucket}/{file_id}",
+            response = self._session.get(
+                self._get_file_url(fm, node_address),
                 timeout=self._transfer_timeout,
                 stream=True,
             )
             response.raise_for_status()
-            # TODO: cache the file in local storage
             return StreamedBytesIO(
                 response.iter_content(chunk_size=self._transfer_chunk_size)
             )
 
+    def load_range(self, fm: FileMetadata, offset: int, size: int) -> bytes:
+        """Load a part of the file data.
+
+        A remote file which is not cached is requested with an HTTP Range header,
+        only the requested part is transferred.
+
+        Args:
+            fm (FileMetadata): The file metadata
+            offset (int): The offset of the first byte
+            size (int): The max number of bytes to load
+
+        Returns:
+            bytes: The file data in the range
+        """
+        if size <= 0:
+            return b""
+        node_address = self._parse_node_address(fm)
+        if node_address == self.node_address:
+            file_path = self._get_file_path(fm.bucket, fm.file_id, node_address)
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(
+                    f"File {fm.file_id} not found on the local node"
+                )
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                return f.read(size)
+
+        cached = (
+            self._open_cached(self._get_cache_path(fm))
+            if self._is_cacheable(fm)
+            else None
+        )
+        if cached is not None:
+            with cached:
+                cached.seek(offset)
+                return cached.read(size)
+
+        with self._session.get(
+            self._get_file_url(fm, node_address),
+            headers={"Range": f"bytes={offset}-{offset + size - 1}"},
+            timeout=self._transfer_timeout,
+            stream=True,
+        ) as response:
+            if response.status_code == 416:
+                # The range is out of the file
+                return b""
+            response.raise_for_status()
+            if response.status_code == 206:
+                return response.content[:size]
+            # The node doesn't support the range requests, skip the leading data
+            buffer = BytesIO()
+            position = 0
+            for chunk in response.iter_content(chunk_size=self._transfer_chunk_size):
+                start = max(offset - position, 0)
+                position += len(chunk)
+                if start < len(chunk):
+                    buffer.write(chunk[start : start + size - buffer.tell()])
+                if buffer.tell() >= size:
+                    break
+            return buffer.getvalue()
+
+    def is_hash_verified(self, fm: FileMetadata) -> bool:
+        """Whether the loaded file data is verified with the hash.
+
+        The remote files are checked when they are cached.
+        """
+        return self._parse_node_address(fm) != self.node_address and (
+            self._is_cacheable(fm)
+        )
+
     def delete(self, fm: FileMetadata) -> bool:
         """Delete the file data from the distributed storage backend.
 
@@ -948,9 +1500,10 @@ class SimpleDistributedStorage(StorageBackend):
                 return True
             return False
         else:
+            self._remove_cached(fm)
             try:
-                response = requests.delete(
-                    f"http://{node_address}{self._api_prefix}/{bucket}/{file_id}",
+                response = self._session.delete(
+                    self._get_file_url(fm, node_address),
                     timeout=self._transfer_timeout,
                 )
                 response.raise_for_status()
@@ -113,6 +113,38 @@ class LLMDeployModelParameters(BaseDeployModelParameters, RegisterParameters):
             )
         },
     )
+    max_requests_per_minute: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": _(
+                "The max requests per minute sent to the provider, shared by the "
+                "models of the provider with the same API base. Just for proxy "
+                "models."
+            )
+        },
+    )
+    max_tokens_per_minute: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": _(
+                "The max prompt and completion tokens per minute sent to the "
+                "provider, shared by the models of the provider with the same API "
+                "base. Just for proxy models."
+            )
+        },
+    )
+    proxy_max_workers: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": _(
+                "The max threads calling the provider, shared by the models of the "
+                "provider. A stream of a provider with a blocking SDK holds a thread, "
+                "so it is also the max concurrent streams. If None, it is min(32, "
+                "CPU count + 4). Just for proxy models, the first model of the "
+                "provider sets it."
+            )
+        },
+    )
 
     @property
     def real_provider_model_name(self) -> str:
@@ -144,6 +176,29 @@ class EmbeddingDeployModelParameters(BaseDeployModelParameters, RegisterParamete
     concurrency: Optional[int] = field(
         default=100, metadata={"help": _("Model concurrency limit")}
     )
+    batch_max_size: Optional[int] = field(
+        default=32,
+        metadata={
+            "help": _(
+                "The max number of texts embedded in one batch, the concurrent "
+                "requests are merged into batches. Set it to 1 to disable the "
+                "dynamic batching"
+            )
+        },
+    )
+    batch_max_tokens: Optional[int] = field(
+        default=8192,
+        metadata={"help": _("The max number of estimated tokens in one batch")},
+    )
+    batch_wait_ms: Optional[float] = field(
+        default=5,
+        metadata={
+            "help": _(
+                "The max time(milliseconds) to wait for more requests after the "
+                "first request of a batch"
+            )
+        },
+    )
 
     @classmethod
     def worker_type(cls) -> "WorkerType":
@@ -162,6 +217,38 @@ class RerankerDeployModelParameters(BaseDeployModelParameters, RegisterParameter
     concurrency: Optional[int] = field(
         default=50, metadata={"help": _("Model concurrency limit")}
     )
+    batch_max_size: Optional[int] = field(
+        default=32,
+        metadata={
+            "help": _(
+                "The max number of (query, document) pairs scored in one batch, the "
+                "concurrent requests are merged into batches. Set it to 1 to "
+                "disable the dynamic batching"
+            )
+        },
+    )
+    batch_max_tokens: Optional[int] = field(
+        default=16384,
+        metadata={"help": _("The max number of estimated tokens in one batch")},
+    )
+    batch_wait_ms: Optional[float] = field(
+        default=5,
+        metadata={
+            "help": _(
+                "The max time(milliseconds) to wait for more requests after the "
+                "first request of a batch"
+            )
+        },
+    )
+    score_cache_size: Optional[int] = field(
+        default=10000,
+        metadata={
+            "help": _(
+                "The max number of cached scores of (query, document) pairs, set "
+                "it to 0 to disable the cache"
+            )
+        },
+    )
 
     @classmethod
     def worker_type(cls) -> "WorkerType":
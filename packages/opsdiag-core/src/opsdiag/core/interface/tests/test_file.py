@@ -1,6 +1,8 @@
 import hashlib
 import io
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 import pytest
@@ -119,7 +121,9 @@ def test_get_file_not_found(file_storage_system):
 
 
 def test_delete_file_not_found(file_storage_system):
-    result = file_storage_system.delete_file("derisk-fs://local/test-bucket/nonexistent")
+    result = file_storage_system.delete_file(
+        "derisk-fs://local/test-bucket/nonexistent"
+    )
     assert result is False
 
 
@@ -222,6 +226,87 @@ def test_file_hash_verification_failure(file_storage_client, sample_file_path):
         storage_system.get_file(uri)
 
 
+class _CountingBytesIO(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_save_file_reads_data_once(file_storage_system):
+    content = os.urandom(3 * 1024 * 1024 + 7)
+    file_data = _CountingBytesIO(content)
+    uri = file_storage_system.save_file("test-bucket", "a.bin", file_data, "local")
+
+    assert file_data.bytes_read == len(content)
+    metadata = file_storage_system.get_file_metadata_by_uri(uri)
+    assert metadata.file_size == len(content)
+    assert metadata.file_hash == hashlib.md5(content).hexdigest()
+
+
+def test_save_file_backend_seeks_back(file_storage_system):
+    """The backend measures the size and reads the file twice"""
+
+    class SeekingStorage(LocalFileStorage):
+        def save(self, bucket, file_id, file_data, **kwargs):
+            file_data.seek(0, io.SEEK_END)
+            file_data.seek(0)
+            file_data.read(5)
+            file_data.seek(0)
+            return super().save(bucket, file_id, file_data, **kwargs)
+
+    local = file_storage_system.storage_backends["local"]
+    file_storage_system.storage_backends["local"] = SeekingStorage(local.base_path)
+    content = b"Sample file content"
+    uri = file_storage_system.save_file(
+        "test-bucket", "a.txt", io.BytesIO(content), "local"
+    )
+    metadata = file_storage_system.get_file_metadata_by_uri(uri)
+    assert metadata.file_size == len(content)
+    assert metadata.file_hash == hashlib.md5(content).hexdigest()
+
+
+def test_deduplicate_files(local_storage_backend):
+    storage_system = FileStorageSystem(
+        {"local": local_storage_backend}, InMemoryStorage(), deduplicate=True
+    )
+    bucket = "test-bucket"
+    content = b"Same content"
+    uri1 = storage_system.save_file(bucket, "a.txt", io.BytesIO(content), "local")
+    file_data = _CountingBytesIO(content)
+    uri2 = storage_system.save_file(bucket, "b.txt", file_data, "local")
+    uri3 = storage_system.save_file(bucket, "c.txt", io.BytesIO(b"Other"), "local")
+    # Not deduplicated across buckets
+    uri4 = storage_system.save_file("other", "a.txt", io.BytesIO(content), "local")
+
+    assert uri1 != uri2
+    # Only hashed, not saved again
+    assert file_data.bytes_read == len(content)
+    bucket_path = os.path.join(local_storage_backend.base_path, bucket)
+    assert len(os.listdir(bucket_path)) == 2
+    assert "content_file_id" not in uri2
+
+    # The data is deleted with the last reference
+    assert storage_system.delete_file(uri1)
+    assert storage_system.get_file_metadata_by_uri(uri1) is None
+    file_data, metadata = storage_system.get_file(uri2)
+    assert file_data.read() == content
+    file_data.close()
+    assert metadata.file_name == "b.txt"
+    assert len(os.listdir(bucket_path)) == 2
+
+    assert storage_system.delete_file(uri2)
+    assert len(os.listdir(bucket_path)) == 1
+    with pytest.raises(FileNotFoundError):
+        storage_system.get_file(uri2)
+    assert storage_system.get_file(uri3)[0].read() == b"Other"
+    assert storage_system.get_file(uri4)[0].read() == content
+
+
 def test_file_isolation_across_buckets(file_storage_client, sample_file_path):
     bucket1 = "bucket1"
     bucket2 = "bucket2"
@@ -346,6 +431,59 @@ def test_file_download_from_different_buckets(
     assert open(download_path2, "rb").read() == b"Sample file content"
 
 
+def test_download_file_hash_record(
+    file_storage_client, sample_file_path, temp_storage_path
+):
+    uri = file_storage_client.upload_file(
+        bucket="test-bucket", file_path=sample_file_path, storage_type="local"
+    )
+    download_path = os.path.join(temp_storage_path, "downloaded.txt")
+    file_storage_client.download_file(uri, download_path)
+
+    storage_system = file_storage_client.storage_system
+    with (
+        mock.patch.object(storage_system, "get_file") as get_file,
+        mock.patch("opsdiag.core.interface.file.calculate_file_hash") as calculate,
+    ):
+        # The recorded hash is trusted, the file is not hashed again
+        file_storage_client.download_file(uri, download_path)
+        get_file.assert_not_called()
+        calculate.assert_not_called()
+
+    # The changed file is hashed and downloaded again
+    with open(download_path, "wb") as f:
+        f.write(b"Sample file changed")
+    file_storage_client.download_file(uri, download_path)
+    assert open(download_path, "rb").read() == b"Sample file content"
+
+
+def test_download_file_concurrently(
+    file_storage_client, sample_file_path, temp_storage_path
+):
+    uri = file_storage_client.upload_file(
+        bucket="test-bucket", file_path=sample_file_path, storage_type="local"
+    )
+    download_path = os.path.join(temp_storage_path, "downloaded.txt")
+    storage_system = file_storage_client.storage_system
+    get_file = storage_system.get_file
+    calls = []
+
+    def _get_file(*args):
+        calls.append(args)
+        return get_file(*args)
+
+    with mock.patch.object(storage_system, "get_file", side_effect=_get_file):
+        with ThreadPoolExecutor(8) as executor:
+            list(
+                executor.map(
+                    lambda _: file_storage_client.download_file(uri, download_path),
+                    range(8),
+                )
+            )
+    assert len(calls) == 1
+    assert open(download_path, "rb").read() == b"Sample file content"
+
+
 def test_delete_all_files_in_bucket(file_storage_client, sample_file_path):
     bucket1 = "bucket1"
     bucket2 = "bucket2"
@@ -408,7 +546,7 @@ def test_simple_distributed_storage_load_file_local(
     assert file_data.read() == b"Sample file content for distributed storage"
 
 
-@mock.patch("requests.get")
+@mock.patch("requests.Session.get")
 def test_simple_distributed_storage_load_file_remote(
     mock_get, distributed_storage_backend, sample_file_data
 ):
@@ -474,7 +612,7 @@ def test_simple_distributed_storage_delete_file_local(
     assert not os.path.exists(file_path)
 
 
-@mock.patch("requests.delete")
+@mock.patch("requests.Session.delete")
 def test_simple_distributed_storage_delete_file_remote(
     mock_delete, distributed_storage_backend, sample_file_data
 ):
@@ -504,3 +642,161 @@ def test_simple_distributed_storage_delete_file_remote(
         f"http://{remote_node_address}/api/v2/serve/file/files/{bucket}/{file_id}",
         timeout=360,
     )
+
+
+class _FakeResponse:
+    """A streamed response of a remote node, supports the range requests."""
+
+    def __init__(self, content: bytes, range_header=None, support_range=True):
+        self.status_code = 200
+        self._content = content
+        if range_header and support_range:
+            start, end = map(int, range_header[len("bytes=") :].split("-"))
+            self.status_code = 416 if start >= len(content) else 206
+            self._content = content[start : end + 1]
+        self.transferred = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    @property
+    def content(self):
+        self.transferred += len(self._content)
+        return self._content
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self._content), 4):
+            self.transferred += len(self._content[i : i + 4])
+            yield self._content[i : i + 4]
+
+
+class _FakeRemoteNode:
+    def __init__(self, files, support_range=True):
+        self.files = files
+        self.support_range = support_range
+        self.responses = []
+
+    def get(self, url, headers=None, **kwargs):
+        range_header = (headers or {}).get("Range")
+        response = _FakeResponse(
+            self.files[url.rsplit("/", 1)[-1]], range_header, self.support_range
+        )
+        self.responses.append(response)
+        return response
+
+
+def _remote_metadata(file_id: str, content: bytes, bucket: str = "test-bucket"):
+    storage_path = f"distributed://127.0.0.2:8000/{bucket}/{file_id}"
+    return FileMetadata(
+        file_id=file_id,
+        bucket=bucket,
+        file_name=f"{file_id}.txt",
+        file_size=len(content),
+        storage_type="distributed",
+        storage_path=storage_path,
+        uri=storage_path,
+        custom_metadata={},
+        file_hash=hashlib.md5(content).hexdigest(),
+    )
+
+
+def test_simple_distributed_storage_cache(temp_storage_path):
+    content = b"Sample file content for distributed storage"
+    node = _FakeRemoteNode({"f1": content})
+    backend = SimpleDistributedStorage("127.0.0.1:8000", temp_storage_path)
+    backend._session.get = node.get
+    metadata = _remote_metadata("f1", content)
+
+    with backend.load(metadata) as f:
+        assert f.read() == content
+    with backend.load(metadata) as f:
+        assert f.read() == content
+    assert len(node.responses) == 1
+    assert backend.is_hash_verified(metadata)
+
+    # The cache is rebuilt from the disk
+    backend = SimpleDistributedStorage("127.0.0.1:8000", temp_storage_path)
+    backend._session.get = node.get
+    with backend.load(metadata) as f:
+        assert f.read() == content
+    assert len(node.responses) == 1
+
+
+def test_simple_distributed_storage_cache_single_flight(temp_storage_path):
+    content = b"Sample file content for distributed storage"
+    node = _FakeRemoteNode({"f1": content})
+    backend = SimpleDistributedStorage("127.0.0.1:8000", temp_storage_path)
+    backend._session.get = node.get
+    barrier = threading.Barrier(8)
+
+    def _load(_):
+        barrier.wait()
+        with backend.load(_remote_metadata("f1", content)) as f:
+            return f.read()
+
+    with ThreadPoolExecutor(8) as executor:
+        assert list(executor.map(_load, range(8))) == [content] * 8
+    assert len(node.responses) == 1
+
+
+def test_simple_distributed_storage_cache_hash_mismatch(temp_storage_path):
+    content = b"Sample file content for distributed storage"
+    node = _FakeRemoteNode({"f1": b"Corrupted content"})
+    backend = SimpleDistributedStorage("127.0.0.1:8000", temp_storage_path)
+    backend._session.get = node.get
+
+    with pytest.raises(ValueError, match="Hash mismatch"):
+        backend.load(_remote_metadata("f1", content))
+    assert not backend._cache_index
+    cache_files = [files for _, _, files in os.walk(backend._cache_path)]
+    assert not any(cache_files)
+
+
+def test_simple_distributed_storage_cache_eviction(temp_storage_path):
+    files = {f"f{i}": bytes([i]) * 10 for i in range(3)}
+    node = _FakeRemoteNode(files)
+    backend = SimpleDistributedStorage(
+        "127.0.0.1:8000", temp_storage_path, cache_max_size=20
+    )
+    backend._session.get = node.get
+
+    for file_id in ["f0", "f1", "f0", "f2"]:
+        with backend.load(_remote_metadata(file_id, files[file_id])) as f:
+            assert f.read() == files[file_id]
+    # f1 is the least recently used
+    assert len(node.responses) == 3
+    assert backend._cache_size == 20
+    assert not os.path.exists(backend._get_cache_path(_remote_metadata("f1", b"x")))
+    with backend.load(_remote_metadata("f0", files["f0"])) as f:
+        assert f.read() == files["f0"]
+    assert len(node.responses) == 3
+
+
+@pytest.mark.parametrize("support_range", [True, False])
+def test_simple_distributed_storage_load_range(temp_storage_path, support_range):
+    content = bytes(range(100))
+    node = _FakeRemoteNode({"f1": content}, support_range=support_range)
+    backend = SimpleDistributedStorage(
+        "127.0.0.1:8000", temp_storage_path, cache_max_size=0
+    )
+    backend._session.get = node.get
+    metadata = _remote_metadata("f1", content)
+
+    assert backend.load_range(metadata, 10, 5) == content[10:15]
+    assert backend.load_range(metadata, 98, 10) == content[98:]
+    if support_range:
+        assert node.responses[0].transferred == 5
+
+
+def test_file_storage_system_get_file_range(file_storage_client, sample_file_path):
+    uri = file_storage_client.upload_file(
+        bucket="test-bucket", file_path=sample_file_path
+    )
+    assert file_storage_client.get_file_range(uri, 7, 4) == b"file"
+    assert file_storage_client.get_file_range(sample_file_path, 0, 6) == b"Sample"
@@ -33,10 +33,10 @@ class AutoLLMClient(LLMClient):
         )
 
     def generate(self, *args, **kwargs):
-        return self._client_impl.generate(*args, **kwargs)
+        return self._client_impl.rate_limited_generate(*args, **kwargs)
 
     def generate_stream(self, *args, **kwargs):
-        return self._client_impl.generate_stream(*args, **kwargs)
+        return self._client_impl.rate_limited_generate_stream(*args, **kwargs)
 
     def count_token(self, *args, **kwargs):
         return self._client_impl.count_token(*args, **kwargs)
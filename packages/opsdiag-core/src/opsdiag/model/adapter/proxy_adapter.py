@@ -5,7 +5,7 @@ from typing import Optional, Type
 from opsdiag.core.interface.parameter import LLMDeployModelParameters
 from opsdiag.model.adapter.base import LLMModelAdapter
 from opsdiag.model.base import ModelType
-from opsdiag.model.proxy.base import ProxyLLMClient
+from opsdiag.model.proxy.base import ProxyLLMClient, get_proxy_executor
 from opsdiag.model.proxy.llms.proxy_model import ProxyModel
 
 logger = logging.getLogger(__name__)
@@ -69,6 +69,15 @@ class ProxyLLMModelAdapter(LLMModelAdapter):
             f"Load model from params: {params}llm client class: "
             f"{dynamic_llm_client_class}"
         )
+        # Create the executor of the provider first, with the configured size
+        get_proxy_executor(
+            dynamic_llm_client_class.provider(), params.proxy_max_workers
+        )
         proxy_llm_client = dynamic_llm_client_class.new_client(params)
+        proxy_llm_client.set_rate_limits(
+            params.max_requests_per_minute,
+            params.max_tokens_per_minute,
+            getattr(params, "api_base", None),
+        )
         model = ProxyModel(params, proxy_llm_client)
         return model, model
@@ -7,7 +7,7 @@ Adapted from https://github.com/lm-sys/FastChat/blob/main/fastchat/serve/openai_
 import asyncio
 import logging
 import os
-from typing import Any, Dict, Generator, List, Optional
+from typing import Any, AsyncIterator, Dict, Generator, List, Optional
 
 import shortuuid
 from fastapi import APIRouter, Depends, HTTPException
@@ -45,6 +45,11 @@ from opsdiag.core.schema.api import (
     UsageInfo,
 )
 from opsdiag.model.base import ModelInstance
+from opsdiag.model.cluster.coalescer import (
+    RequestCoalescer,
+    embeddings_coalescing_key,
+    llm_coalescing_key,
+)
 from opsdiag.model.cluster.manager_base import WorkerManager, WorkerManagerFactory
 from opsdiag.model.cluster.registry import ModelRegistry
 from opsdiag.model.parameter import ModelAPIServerParameters, WorkerType
@@ -52,6 +57,7 @@ from opsdiag.util.chat_util import transform_to_sse
 from opsdiag.util.fastapi import create_app
 from opsdiag.util.tracer import initialize_tracer, root_tracer
 from opsdiag.util.tracer.tracer_impl import TracerParameters
+from opsdiag.util.vector_codec import encode_vector
 from opsdiag.util.logger import LoggingParameters, setup_logging
 
 logger = logging.getLogger(__name__)
@@ -71,7 +77,7 @@ class APISettings(BaseModel):
     def embedding_bach_size(self):
         if not self.api_params:
             return 4
-        return self.api_params.embedding_batch_size
+        return self.api_params.embedding_batch_size or 4
 
     @property
     def ignore_stop_exceeds_error(self):
@@ -79,6 +85,12 @@ class APISettings(BaseModel):
             return False
         return self.api_params.ignore_stop_exceeds_error
 
+    @property
+    def coalesce_requests(self):
+        if not self.api_params:
+            return True
+        return self.api_params.coalesce_requests
+
 
 api_settings = APISettings()
 get_bearer_token = HTTPBearer(auto_error=False)
@@ -182,9 +194,46 @@ def check_requests(request) -> Optional[JSONResponse]:
 class APIServer(BaseComponent):
     name = ComponentType.MODEL_API_SERVER
 
+    def __init__(self, system_app: Optional[SystemApp] = None):
+        self._coalescer = RequestCoalescer("apiserver")
+        super().__init__(system_app)
+
     def init_app(self, system_app: SystemApp):
         self.system_app = system_app
 
+    def coalescing_stats(self) -> Dict[str, Dict[str, Any]]:
+        """The hit rate of the request coalescing of each kind of calls."""
+        return self._coalescer.stats()
+
+    async def _generate(self, params: Dict[str, Any]) -> ModelOutput:
+        """Generate, the identical deterministic requests share one call."""
+        worker_manager = self.get_worker_manager()
+        key = None
+        if api_settings.coalesce_requests:
+            key = llm_coalescing_key("generate", params)
+        return await self._coalescer.call(
+            "generate", key, lambda: worker_manager.generate(params)
+        )
+
+    def _generate_stream(self, params: Dict[str, Any]) -> AsyncIterator[ModelOutput]:
+        """Generate a stream, the identical deterministic requests share one stream."""
+        worker_manager = self.get_worker_manager()
+        key = None
+        if api_settings.coalesce_requests:
+            key = llm_coalescing_key("generate_stream", params)
+        return self._coalescer.stream(
+            "generate_stream", key, lambda: worker_manager.generate_stream(params)
+        )
+
+    async def _embeddings(self, kind: str, params: Dict[str, Any]) -> List[Any]:
+        worker_manager = self.get_worker_manager()
+        key = None
+        if api_settings.coalesce_requests:
+            key = embeddings_coalescing_key(kind, params)
+        return await self._coalescer.call(
+            kind, key, lambda: worker_manager.embeddings(params)
+        )
+
     def get_worker_manager(self) -> WorkerManager:
         """Get the worker manager component instance
 
@@ -295,7 +344,6 @@ class APIServer(BaseComponent):
             params (Dict[str, Any]): The parameters pass to model worker
             n (int): How many completions to generate for each prompt.
         """
-        worker_manager = self.get_worker_manager()
         id = f"chatcmpl-{shortuuid.random()}"
         finish_stream_events = []
         curr_usage = UsageInfo()
@@ -320,7 +368,7 @@ class APIServer(BaseComponent):
             yield transform_to_sse(chunk)
 
             previous_text = ""
-            async for model_output in worker_manager.generate_stream(params):
+            async for model_output in self._generate_stream(params):
                 model_output: ModelOutput = model_output
                 if model_output.error_code != 0:
                     yield transform_to_sse(model_output.to_dict())
@@ -380,11 +428,10 @@ class APIServer(BaseComponent):
             params (Dict[str, Any]): The parameters pass to model worker
             n (int): How many completions to generate for each prompt.
         """
-        worker_manager: WorkerManager = self.get_worker_manager()
         choices = []
         chat_completions = []
         for i in range(n):
-            model_output = asyncio.create_task(worker_manager.generate(params))
+            model_output = asyncio.create_task(self._generate(params))
             chat_completions.append(model_output)
         try:
             all_tasks = await asyncio.gather(*chat_completions)
@@ -412,7 +459,6 @@ class APIServer(BaseComponent):
     async def completion_stream_generator(
         self, request: CompletionRequest, params: Dict
     ):
-        worker_manager = self.get_worker_manager()
         id = f"cmpl-{shortuuid.random()}"
         finish_stream_events = []
         params["span_id"] = root_tracer.get_current_span_id()
@@ -426,7 +472,7 @@ class APIServer(BaseComponent):
                 last_usage.completion_tokens += curr_usage.completion_tokens
                 last_usage.total_tokens += curr_usage.total_tokens
 
-                async for model_output in worker_manager.generate_stream(params):
+                async for model_output in self._generate_stream(params):
                     model_output: ModelOutput = model_output
                     if model_output.error_code != 0:
                         yield transform_to_sse(model_output.to_dict())
@@ -484,13 +530,13 @@ class APIServer(BaseComponent):
     async def completion_generate(
         self, request: CompletionRequest, params: Dict[str, Any]
     ):
-        worker_manager: WorkerManager = self.get_worker_manager()
         choices = []
         completions = []
         for text in request.prompt:
             for i in range(request.n):
-                params["prompt"] = text
-                model_output = asyncio.create_task(worker_manager.generate(params))
+                # Each task has its own prompt
+                task_params = {**params, "prompt": text}
+                model_output = asyncio.create_task(self._generate(task_params))
                 completions.append(model_output)
         try:
             all_tasks = await asyncio.gather(*completions)
@@ -539,12 +585,11 @@ class APIServer(BaseComponent):
                 "model": model,
             },
         ):
-            worker_manager: WorkerManager = self.get_worker_manager()
             params = {
                 "input": texts,
                 "model": model,
             }
-            return await worker_manager.embeddings(params)
+            return await self._embeddings("embeddings", params)
 
     async def relevance_generate(
         self, model: str, query: str, texts: List[str]
@@ -559,13 +604,12 @@ class APIServer(BaseComponent):
         Returns:
             List[List[float]]: The embeddings of texts
         """
-        worker_manager: WorkerManager = self.get_worker_manager()
         params = {
             "input": texts,
             "model": model,
             "query": query,
         }
-        scores = await worker_manager.embeddings(params)
+        scores = await self._embeddings("relevance", params)
         return scores[0]
 
 
@@ -586,6 +630,12 @@ async def get_available_models(api_server: APIServer = Depends(get_api_server)):
     return await api_server.get_available_models()
 
 
+@router.get("/v1/coalescing/stats", dependencies=[Depends(check_api_key)])
+async def get_coalescing_stats(api_server: APIServer = Depends(get_api_server)):
+    """The hit rate of the coalescing of the identical in-flight requests."""
+    return api_server.coalescing_stats()
+
+
 @router.post("/v1/chat/completions", dependencies=[Depends(check_api_key)])
 async def create_chat_completion(
     request: APIChatCompletionRequest, api_server: APIServer = Depends(get_api_server)
@@ -601,7 +651,8 @@ async def create_chat_completion(
         ),
         "echo": False,
     }
-    if request.temperature:
+    if request.temperature is not None:
+        # Keep temperature 0, the deterministic requests can be coalesced
         params["temperature"] = request.temperature
     if request.top_p:
         params["top_p"] = request.top_p
@@ -694,6 +745,13 @@ async def create_embeddings(
     request: EmbeddingsRequest, api_server: APIServer = Depends(get_api_server)
 ):
     await api_server.get_model_instances_or_raise(request.model, worker_type="text2vec")
+    encoding_format = request.encoding_format or "float"
+    if encoding_format not in ("float", "base64"):
+        return create_error_response(
+            ErrorCode.VALIDATION_TYPE_ERROR,
+            f"Not supported encoding_format: {encoding_format}, "
+            "must be 'float' or 'base64'",
+        )
     texts = request.input
     if isinstance(texts, str):
         texts = [texts]
@@ -717,7 +775,8 @@ async def create_embeddings(
         data += [
             {
                 "object": "embedding",
-                "embedding": emb,
+                # The base64 of the little-endian float32 array, same as OpenAI
+                "embedding": encode_vector(emb) if encoding_format == "base64" else emb,
                 "index": num_batch * batch_size + i,
             }
             for i, emb in enumerate(embeddings)
@@ -825,6 +884,7 @@ def initialize_apiserver(
         tracer_parameters=trace_config,
     )
 
+    api_settings.api_params = apiserver_params
     if apiserver_params.api_keys:
         api_settings.api_keys = apiserver_params.api_keys.strip().split(",")
 
@@ -42,6 +42,8 @@ class EmbeddingsRequest(BaseModel):
     span_id: Optional[str] = None
     query: Optional[str] = None
     """For rerank model, query is required"""
+    encoding_format: Optional[str] = None
+    """"base64" to return the vectors packed in a base64 JSON envelope"""
 
 
 class CountTokenRequest(BaseModel):
@@ -1,5 +1,6 @@
 import asyncio
-from typing import AsyncIterator, List, Optional
+import copy
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from opsdiag.core.awel import DAGVar
 from opsdiag.core.awel.flow import Parameter, ResourceCategory, register_resource
@@ -11,10 +12,14 @@ from opsdiag.core.interface.llm import (
     ModelOutput,
     ModelRequest,
 )
+from opsdiag.model.cluster.coalescer import RequestCoalescer, llm_coalescing_key
 from opsdiag.model.cluster.manager_base import WorkerManager
 from opsdiag.model.parameter import WorkerType
 from opsdiag.util.i18n_utils import _
 
+# Shared by all the clients, the clients are often created per request
+_COALESCER = RequestCoalescer("llm_client")
+
 
 @register_resource(
     label=_("Default LLM Client"),
@@ -40,19 +45,41 @@ class DefaultLLMClient(LLMClient):
 
     Connect to the worker manager and send the request to the worker manager.
 
+    The identical in-flight requests with temperature 0 share one call of the
+    worker manager.
+
     Args:
         worker_manager (WorkerManager): worker manager instance.
         auto_convert_message (bool, optional): auto convert the message to ModelRequest.
          Defaults to True.
+        coalesce_requests (bool, optional): coalesce the identical deterministic
+            requests. Defaults to True.
     """
 
     def __init__(
         self,
         worker_manager: Optional[WorkerManager] = None,
         auto_convert_message: bool = True,
+        coalesce_requests: bool = True,
     ):
         self._worker_manager = worker_manager
         self._auto_covert_message = auto_convert_message
+        self._coalesce_requests = coalesce_requests
+
+    @staticmethod
+    def coalescing_stats() -> Dict[str, Dict[str, Any]]:
+        """The hit rate of the request coalescing of all the clients."""
+        return _COALESCER.stats()
+
+    def _coalescing_key(
+        self, kind: str, worker_manager: WorkerManager, params: Dict[str, Any]
+    ) -> Optional[str]:
+        if not self._coalesce_requests:
+            return None
+        # The requests to different worker managers are never coalesced
+        return llm_coalescing_key(
+            kind, {"worker_manager": id(worker_manager), **params}
+        )
 
     @property
     def worker_manager(self) -> WorkerManager:
@@ -77,7 +104,14 @@ class DefaultLLMClient(LLMClient):
         if not message_converter and self._auto_covert_message:
             message_converter = DefaultMessageConverter()
         request = await self.covert_message(request, message_converter)
-        return await self.worker_manager.generate(request.to_dict())
+        worker_manager = self.worker_manager
+        params = request.to_dict()
+        key = self._coalescing_key("generate", worker_manager, params)
+        output = await _COALESCER.call(
+            "generate", key, lambda: worker_manager.generate(params)
+        )
+        # The callers sharing the output may modify it
+        return copy.copy(output) if key else output
 
     async def generate_stream(
         self,
@@ -87,8 +121,13 @@ class DefaultLLMClient(LLMClient):
         if not message_converter and self._auto_covert_message:
             message_converter = DefaultMessageConverter()
         request = await self.covert_message(request, message_converter)
-        async for output in self.worker_manager.generate_stream(request.to_dict()):
-            yield output
+        worker_manager = self.worker_manager
+        params = request.to_dict()
+        key = self._coalescing_key("generate_stream", worker_manager, params)
+        async for output in _COALESCER.stream(
+            "generate_stream", key, lambda: worker_manager.generate_stream(params)
+        ):
+            yield copy.copy(output) if key else output
 
     async def models(self) -> List[ModelMetadata]:
         instances = await self.worker_manager.get_all_model_instances(
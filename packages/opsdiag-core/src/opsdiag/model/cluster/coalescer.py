@@ -0,0 +1,266 @@
+"""Coalesce the identical in-flight model requests.
+
+When a request arrives while an identical request is already being computed, it
+shares the running upstream call instead of sending another one (the
+"singleflight" pattern). Only the deterministic requests are coalesced: the LLM
+requests with a temperature of 0, the embedding and relevance requests.
+
+A shared stream is buffered, a subscriber joining late gets the outputs from the
+beginning, so every subscriber sees the whole stream.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TypeVar,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# The parameters which identify the caller or the trace, not the computation
+_IGNORED_PARAMS = {
+    "span_id",
+    "trace_id",
+    "rpc_id",
+    "request_id",
+    "conv_uid",
+    "user",
+    "user_name",
+    "sys_code",
+}
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: _normalize(v)
+            for k, v in value.items()
+            if k not in _IGNORED_PARAMS and v is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        # 0 and 0.0 are the same parameter
+        return int(value)
+    return value
+
+
+def _hash_params(kind: str, params: Dict[str, Any]) -> str:
+    data = json.dumps(
+        [kind, _normalize(params)], sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def llm_coalescing_key(kind: str, params: Dict[str, Any]) -> Optional[str]:
+    """The coalescing key of a LLM request, None if it is not deterministic.
+
+    Args:
+        kind (str): The kind of the call, e.g. "generate" or "generate_stream", the
+            calls of different kinds are never coalesced.
+        params (Dict[str, Any]): The parameters passed to the worker manager.
+    """
+    temperature = params.get("temperature")
+    if temperature is None:
+        return None
+    try:
+        if float(temperature) > 0:
+            return None
+    except (TypeError, ValueError):
+        return None
+    return _hash_params(kind, params)
+
+
+def embeddings_coalescing_key(kind: str, params: Dict[str, Any]) -> str:
+    """The coalescing key of an embedding or relevance request."""
+    return _hash_params(kind, params)
+
+
+class CoalescingStats:
+    """The hit rate of the coalescing of a kind of calls."""
+
+    def __init__(self):
+        self.requests = 0
+        self.coalesced = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of the requests sharing an in-flight call."""
+        return self.coalesced / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class _SharedCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _SharedStream:
+    """Run an async iterator once and replay its outputs to the subscribers."""
+
+    def __init__(self):
+        self.outputs: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def produce(self, iterator: AsyncIterator[Any]):
+        try:
+            async for output in iterator:
+                async with self._changed:
+                    self.outputs.append(output)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: index < len(self.outputs) or self.done
+                )
+                outputs = self.outputs[index:]
+                index = len(self.outputs)
+                finished = self.done
+            for output in outputs:
+                yield output
+            if finished:
+                if self.error:
+                    raise self.error
+                return
+
+
+class RequestCoalescer:
+    """Share the in-flight calls between the identical requests.
+
+    The shared call is cancelled only when all of its callers are cancelled.
+
+    Args:
+        name (str): The name in the logs.
+    """
+
+    def __init__(self, name: str = "model"):
+        self.name = name
+        self._calls: Dict[str, _SharedCall] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self._stats: Dict[str, CoalescingStats] = {}
+
+    def _record(self, kind: str, coalesced: bool):
+        stats = self._stats.setdefault(kind, CoalescingStats())
+        stats.requests += 1
+        if coalesced:
+            stats.coalesced += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """The hit rate of each kind of calls."""
+        return {kind: stats.to_dict() for kind, stats in self._stats.items()}
+
+    async def call(
+        self,
+        kind: str,
+        key: Optional[str],
+        func: Callable[[], Awaitable[T]],
+    ) -> T:
+        """Call the function, or wait for the in-flight call with the same key.
+
+        Args:
+            kind (str): The kind of the call, for the statistics.
+            key (Optional[str]): The coalescing key, the call is never shared if
+                it is None.
+            func (Callable[[], Awaitable[T]]): Start the call.
+        """
+        if key is None:
+            self._record(kind, False)
+            return await func()
+        shared = self._calls.get(key)
+        self._record(kind, shared is not None)
+        if shared is None:
+            shared = _SharedCall(asyncio.ensure_future(func()))
+            self._calls[key] = shared
+            shared.task.add_done_callback(
+                lambda _: self._remove(self._calls, key, shared)
+            )
+        else:
+            logger.debug(f"Coalesce a {kind} request of {self.name}")
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        except asyncio.CancelledError:
+            if shared.waiters == 1 and not shared.task.done():
+                shared.task.cancel()
+            raise
+        finally:
+            shared.waiters -= 1
+
+    async def stream(
+        self,
+        kind: str,
+        key: Optional[str],
+        func: Callable[[], AsyncIterator[T]],
+    ) -> AsyncIterator[T]:
+        """Stream the outputs, or subscribe the in-flight stream with the same key.
+
+        Args:
+            kind (str): The kind of the call, for the statistics.
+            key (Optional[str]): The coalescing key, the stream is never shared if
+                it is None.
+            func (Callable[[], AsyncIterator[T]]): Start the stream.
+        """
+        if key is None:
+            self._record(kind, False)
+            async for output in func():
+                yield output
+            return
+        shared = self._streams.get(key)
+        self._record(kind, shared is not None)
+        if shared is None:
+            shared = _SharedStream()
+            shared.task = asyncio.ensure_future(shared.produce(func()))
+            self._streams[key] = shared
+            shared.task.add_done_callback(
+                lambda _: self._remove(self._streams, key, shared)
+            )
+        else:
+            logger.debug(f"Coalesce a {kind} stream of {self.name}")
+        shared.subscribers += 1
+        try:
+            async for output in shared.subscribe():
+                yield output
+        finally:
+            shared.subscribers -= 1
+            if not shared.subscribers and not shared.done:
+                # All the subscribers left
+                shared.task.cancel()
+                self._remove(self._streams, key, shared)
+
+    def _remove(self, calls: Dict[str, Any], key: str, shared: Any):
+        # A newer call with the same key may have replaced it
+        if calls.get(key) is shared:
+            del calls[key]
@@ -0,0 +1,238 @@
+import asyncio
+
+import pytest
+
+from opsdiag.core import ModelOutput, ModelRequest
+from opsdiag.model.cluster.client import DefaultLLMClient
+from opsdiag.model.cluster.coalescer import (
+    RequestCoalescer,
+    embeddings_coalescing_key,
+    llm_coalescing_key,
+)
+
+
+class _Upstream:
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+
+    async def call(self, value):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return value
+
+    async def stream(self, n: int):
+        self.calls += 1
+        try:
+            for i in range(n):
+                await asyncio.sleep(self.delay / n)
+                yield i
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+
+
+def test_llm_coalescing_key():
+    params = {
+        "model": "m",
+        "messages": [{"role": "user", "content": "hi"}],
+        "context": {"user_name": "a"},
+    }
+    assert llm_coalescing_key("generate", params) is None
+    assert llm_coalescing_key("generate", {**params, "temperature": 0.7}) is None
+    key = llm_coalescing_key("generate", {**params, "temperature": 0})
+    assert key is not None
+    # The tracing and user parameters are ignored
+    assert key == llm_coalescing_key(
+        "generate",
+        {**params, "temperature": 0.0, "span_id": "b", "context": {"user_name": "b"}},
+    )
+    assert key != llm_coalescing_key("generate_stream", {**params, "temperature": 0})
+    assert key != llm_coalescing_key(
+        "generate", {**params, "temperature": 0, "max_new_tokens": 10}
+    )
+    assert embeddings_coalescing_key("embeddings", {"input": ["a"]}) != (
+        embeddings_coalescing_key("embeddings", {"input": ["b"]})
+    )
+
+
+@pytest.mark.asyncio
+async def test_call_coalesced():
+    coalescer = RequestCoalescer()
+    upstream = _Upstream()
+    results = await asyncio.gather(
+        *[coalescer.call("generate", "k", lambda: upstream.call(1)) for _ in range(10)]
+    )
+    assert results == [1] * 10
+    assert upstream.calls == 1
+    assert coalescer.stats()["generate"] == {
+        "requests": 10,
+        "coalesced": 9,
+        "hit_rate": 0.9,
+    }
+
+    # Not in-flight any more, call again
+    assert await coalescer.call("generate", "k", lambda: upstream.call(2)) == 2
+    assert upstream.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_call_not_coalesced():
+    coalescer = RequestCoalescer()
+    upstream = _Upstream()
+    results = await asyncio.gather(
+        *[coalescer.call("generate", None, lambda: upstream.call(1)) for _ in range(3)]
+    )
+    assert results == [1] * 3
+    assert upstream.calls == 3
+    assert coalescer.stats()["generate"]["hit_rate"] == 0
+
+
+@pytest.mark.asyncio
+async def test_call_error_shared():
+    coalescer = RequestCoalescer()
+    calls = 0
+
+    async def _fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    results = await asyncio.gather(
+        *[coalescer.call("generate", "k", _fail) for _ in range(3)],
+        return_exceptions=True,
+    )
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_call_cancel_one_waiter():
+    coalescer = RequestCoalescer()
+    upstream = _Upstream(delay=0.05)
+    first = asyncio.create_task(
+        coalescer.call("generate", "k", lambda: upstream.call(1))
+    )
+    second = asyncio.create_task(
+        coalescer.call("generate", "k", lambda: upstream.call(1))
+    )
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == 1
+    assert upstream.cancelled == 0
+
+    # Cancel all the waiters, the upstream call is cancelled
+    task = asyncio.create_task(
+        coalescer.call("generate", "k", lambda: upstream.call(1))
+    )
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.sleep(0.01)
+    assert upstream.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_fan_out():
+    coalescer = RequestCoalescer()
+    upstream = _Upstream(delay=0.05)
+
+    async def _collect(delay: float):
+        await asyncio.sleep(delay)
+        return [
+            i
+            async for i in coalescer.stream(
+                "generate_stream", "k", lambda: upstream.stream(5)
+            )
+        ]
+
+    # The late subscriber gets the whole stream too
+    results = await asyncio.gather(_collect(0), _collect(0), _collect(0.03))
+    assert results == [[0, 1, 2, 3, 4]] * 3
+    assert upstream.calls == 1
+    assert coalescer.stats()["generate_stream"]["coalesced"] == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_all_subscribers_leave():
+    coalescer = RequestCoalescer()
+    upstream = _Upstream(delay=0.1)
+    stream = coalescer.stream("generate_stream", "k", lambda: upstream.stream(10))
+    assert await stream.__anext__() == 0
+    await stream.aclose()
+    await asyncio.sleep(0.01)
+    assert upstream.cancelled == 1
+
+    # A new stream is started
+    outputs = [
+        i
+        async for i in coalescer.stream(
+            "generate_stream", "k", lambda: upstream.stream(2)
+        )
+    ]
+    assert outputs == [0, 1]
+    assert upstream.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_error():
+    coalescer = RequestCoalescer()
+
+    async def _fail():
+        yield 1
+        raise ValueError("failed")
+
+    outputs = []
+    with pytest.raises(ValueError):
+        async for output in coalescer.stream("generate_stream", "k", _fail):
+            outputs.append(output)
+    assert outputs == [1]
+
+
+class _FakeWorkerManager:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, params):
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        return ModelOutput.build(text="hello", usage={"total_tokens": 1})
+
+    async def generate_stream(self, params):
+        self.calls += 1
+        for text in ["he", "hello"]:
+            await asyncio.sleep(0.01)
+            yield ModelOutput.build(text=text)
+
+
+@pytest.mark.asyncio
+async def test_llm_client_coalescing():
+    worker_manager = _FakeWorkerManager()
+    client = DefaultLLMClient(worker_manager, auto_convert_message=False)
+
+    def _request(temperature):
+        return ModelRequest.build_request(
+            "m", [{"role": "human", "content": "hi"}], temperature=temperature
+        )
+
+    outputs = await asyncio.gather(*[client.generate(_request(0)) for _ in range(5)])
+    assert [o.text for o in outputs] == ["hello"] * 5
+    assert worker_manager.calls == 1
+    # Each caller has its own output
+    assert len({id(o) for o in outputs}) == 5
+
+    await asyncio.gather(*[client.generate(_request(0.5)) for _ in range(2)])
+    assert worker_manager.calls == 3
+
+    async def _stream():
+        return [o.text async for o in client.generate_stream(_request(0))]
+
+    results = await asyncio.gather(_stream(), _stream())
+    assert results == [["he", "hello"]] * 2
+    assert worker_manager.calls == 4
+    assert DefaultLLMClient.coalescing_stats()["generate_stream"]["coalesced"] >= 1
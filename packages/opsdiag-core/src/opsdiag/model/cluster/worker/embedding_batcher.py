@@ -0,0 +1,169 @@
+"""Dynamic batching of the embedding requests.
+
+The concurrent requests of a worker are queued, a background thread takes the first
+request, waits a short time for more requests and embeds them all in one call of
+the model, then gives every request its own embeddings back.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from opsdiag.util.string_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EmbeddingBatcher:
+    """Coalesce the concurrent embedding requests into batches.
+
+    A batch is closed when it has ``max_batch_size`` texts, ``max_batch_tokens``
+    tokens, or ``max_wait_ms`` milliseconds passed since its first request. A request
+    is never split, a request larger than the limits makes a batch by itself.
+
+    The batcher only waits for more requests when the last batch had more than
+    one request, so a single client doesn't pay the waiting time.
+    """
+
+    def __init__(
+        self,
+        embed_func: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int = 32,
+        max_batch_tokens: int = 8192,
+        max_wait_ms: float = 5,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        name: str = "embedding",
+    ):
+        self._embed_func = embed_func
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait_ms = max_wait_ms
+        self._token_counter = token_counter
+        self._queue: queue.Queue = queue.Queue()
+        # A request taken from the queue which doesn't fit in the last batch
+        self._pending: Optional[Tuple[List[str], int, Future]] = None
+        self._stopped = False
+
+        # statistics
+        self.batch_count = 0
+        self.request_count = 0
+        self._last_batch_requests = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"{name}-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed the texts, block until the batch of the request is done."""
+        return self.submit(texts).result()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue the texts, return a future of their embeddings."""
+        future: Future = Future()
+        if self._stopped:
+            future.set_exception(RuntimeError("The embedding batcher is stopped"))
+            return future
+        if not texts:
+            future.set_result([])
+            return future
+        tokens = sum(self._token_counter(text) for text in texts)
+        self._queue.put((texts, tokens, future))
+        return future
+
+    def stop(self):
+        """Stop the background thread, the queued requests are still embedded."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(_STOP)
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    @property
+    def average_batch_size(self) -> float:
+        """The average number of requests per batch."""
+        return self.request_count / self.batch_count if self.batch_count else 0.0
+
+    def _next_batch(self) -> Optional[List[Tuple[List[str], int, Future]]]:
+        first = self._pending or self._queue.get()
+        self._pending = None
+        if first is _STOP:
+            return None
+        batch = [first]
+        size, tokens = len(first[0]), first[1]
+        wait_ms = self.max_wait_ms if self._last_batch_requests > 1 else 0
+        deadline = time.monotonic() + wait_ms / 1000
+        while size < self.max_batch_size and tokens < self.max_batch_tokens:
+            timeout = deadline - time.monotonic()
+            try:
+                item = (
+                    self._queue.get(timeout=timeout)
+                    if timeout > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._pending = item
+                break
+            if (
+                size + len(item[0]) > self.max_batch_size
+                or tokens + item[1] > self.max_batch_tokens
+            ):
+                # Start the next batch with it
+                self._pending = item
+                break
+            batch.append(item)
+            size += len(item[0])
+            tokens += item[1]
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            self._process(batch)
+        # The requests submitted while stopping
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                item[2].set_exception(RuntimeError("The embedding batcher is stopped"))
+
+    def _process(self, batch: List[Tuple[List[str], int, Future]]):
+        self.batch_count += 1
+        self.request_count += len(batch)
+        self._last_batch_requests = len(batch)
+        texts = [text for item in batch for text in item[0]]
+        try:
+            embeddings = self._embed_func(texts)
+            if len(embeddings) != len(texts):
+                raise ValueError(
+                    f"Got {len(embeddings)} embeddings for {len(texts)} texts"
+                )
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+                return
+            # Don't fail all the requests for a bad one, embed them one by one
+            logger.warning(f"Embed a batch of {len(batch)} requests failed: {e}")
+            for item in batch:
+                try:
+                    item[2].set_result(self._embed_func(item[0]))
+                except Exception as item_error:
+                    item[2].set_exception(item_error)
+            return
+
+        start = 0
+        for texts, _, future in batch:
+            future.set_result(embeddings[start : start + len(texts)])
+            start += len(texts)
@@ -9,10 +9,12 @@ from opsdiag.core.interface.parameter import (
     RerankerDeployModelParameters,
 )
 from opsdiag.model.adapter.base import EmbeddingModelAdapter, get_embedding_adapter
+from opsdiag.model.cluster.worker.embedding_batcher import EmbeddingBatcher
 from opsdiag.model.cluster.worker_base import ModelWorker
 from opsdiag.model.parameter import (
     WorkerType,
 )
+from opsdiag.rag.embedding.rerank_service import RerankService
 from opsdiag.util.model_utils import _clear_model_cache
 
 logger = logging.getLogger(__name__)
@@ -31,6 +33,8 @@ class EmbeddingsModelWorker(ModelWorker):
             ]
         ] = None
         self._adapter: Optional[EmbeddingModelAdapter] = None
+        self._batcher: Optional[EmbeddingBatcher] = None
+        self._rerank_service: Optional[RerankService] = None
 
         self.model_name: str = ""
         self.model_path: str = ""
@@ -79,14 +83,58 @@ class EmbeddingsModelWorker(ModelWorker):
         if self._rerank_model:
             logger.info(f"Load rerank embeddings model: {self.model_name}")
             self._embeddings_impl = self._adapter.load_from_params(self._model_params)
+            self._rerank_service = self._create_rerank_service()
         else:
             logger.info(f"Load embeddings model: {self.model_name}")
             self._embeddings_impl = self._adapter.load_from_params(self._model_params)
+            self._batcher = self._create_batcher()
+
+    def _create_batcher(self) -> Optional[EmbeddingBatcher]:
+        params = self._model_params
+        max_batch_size = getattr(params, "batch_max_size", None) or 1
+        if max_batch_size <= 1:
+            return None
+        logger.info(
+            f"Enable dynamic batching for {self.model_name}, max batch size: "
+            f"{max_batch_size}"
+        )
+        return EmbeddingBatcher(
+            self._embeddings_impl.embed_documents,
+            max_batch_size=max_batch_size,
+            max_batch_tokens=getattr(params, "batch_max_tokens", None) or 8192,
+            max_wait_ms=getattr(params, "batch_wait_ms", None) or 0,
+            name=self.model_name,
+        )
+
+    def _create_rerank_service(self) -> RerankService:
+        params = self._model_params
+        max_length = getattr(params, "max_length", None) or getattr(
+            getattr(self._embeddings_impl, "client", None), "max_length", None
+        )
+        logger.info(
+            f"Enable score cache and dynamic batching for reranker {self.model_name}, "
+            f"max length: {max_length}"
+        )
+        return RerankService.from_rerank_embeddings(
+            self._embeddings_impl,
+            self.model_name,
+            max_length=max_length,
+            cache_size=getattr(params, "score_cache_size", None) or 0,
+            max_batch_size=getattr(params, "batch_max_size", None) or 1,
+            max_batch_tokens=getattr(params, "batch_max_tokens", None) or 16384,
+            max_wait_ms=getattr(params, "batch_wait_ms", None) or 0,
+        )
 
     def __del__(self):
         self.stop()
 
     def stop(self) -> None:
+        if self._batcher:
+            self._batcher.stop()
+            self._batcher = None
+        if self._rerank_service:
+            self._rerank_service.stop()
+            self._rerank_service = None
         if not self._embeddings_impl:
             return
         del self._embeddings_impl
@@ -115,8 +163,12 @@ class EmbeddingsModelWorker(ModelWorker):
         textx: List[str] = params["input"]
         if isinstance(self._embeddings_impl, RerankEmbeddings):
             query = params["query"]
+            if self._rerank_service:
+                return [self._rerank_service.predict(query, textx)]
             scores: List[float] = self._embeddings_impl.predict(query, textx)
             return [scores]
+        elif self._batcher:
+            return self._batcher.embed(textx)
         else:
             return self._embeddings_impl.embed_documents(textx)
 
@@ -0,0 +1,339 @@
+"""Hedged requests and circuit breakers of the model worker instances.
+
+A request is sent to one instance first. If its first output has not arrived within
+a percentile of the recent first output latencies of the model, a duplicate request
+is sent to a second instance, the first instance to respond wins and the other
+request is cancelled. A request failing before its first output is retried on a
+second instance at once.
+
+Every instance has a circuit breaker. After consecutive errors, the breaker opens
+and the instance is skipped by the instance selection for a while. Then the next
+request is a probe, a success closes the breaker and a failure opens it again. If
+all the instances of a model are open, they are all used, a broken breaker never
+makes a model unavailable. A lost race is not a failure, its elapsed time is
+recorded as a latency of the model instead.
+
+Without hedging and circuit breakers, the requests are sent to the selected
+instance directly.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from opsdiag.model.cluster.manager_base import WorkerRunData
+
+logger = logging.getLogger(__name__)
+
+StreamFactory = Callable[[WorkerRunData, Dict], AsyncIterator[Any]]
+
+_END = object()
+
+
+def instance_key(worker_run_data: WorkerRunData) -> str:
+    """The key of an instance, stable for the instances rebuilt for every request."""
+    return f"{worker_run_data.worker_key}@{worker_run_data.host}:{worker_run_data.port}"
+
+
+class CircuitBreaker:
+    """The circuit breaker of one instance.
+
+    Args:
+        failure_threshold (int): The consecutive failures to open the breaker.
+        reset_timeout (float): The seconds to skip the instance when opened.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._open_until: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._open_until is not None and time.monotonic() < self._open_until
+
+    @property
+    def state(self) -> str:
+        if self._open_until is None:
+            return "closed"
+        return "open" if self.is_open else "half_open"
+
+    def record_success(self):
+        self.failures = 0
+        self._open_until = None
+
+    def record_failure(self):
+        self.failures += 1
+        # A failed probe opens the breaker again at once
+        if self._open_until is not None or self.failures >= self.failure_threshold:
+            self._open_until = time.monotonic() + self.reset_timeout
+
+
+class LatencyWindow:
+    """The latencies of the recent requests and their percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._values: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, seconds: float):
+        self._values.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self._values:
+            return None
+        values = sorted(self._values)
+        index = min(len(values) - 1, int(percentile * len(values)))
+        return values[index]
+
+
+class InstanceHealth:
+    """The circuit breakers and the hedging policy of a worker manager.
+
+    Args:
+        hedge (bool): Whether to send a duplicate request to a second instance when
+            the first output is late.
+        hedge_percentile (float): The percentile of the first output latencies of a
+            model to wait before hedging.
+        hedge_min_samples (int): The latencies needed before hedging a model.
+        hedge_min_delay (float): The min seconds to wait before hedging.
+        failure_threshold (int): The consecutive failures to open the breaker of an
+            instance, 0 to disable the circuit breakers.
+        reset_timeout (float): The seconds to skip an instance when its breaker is
+            opened.
+        window_size (int): The latencies kept for each model.
+    """
+
+    def __init__(
+        self,
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.05,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        window_size: int = 200,
+    ):
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.window_size = window_size
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the requests are hedged or failed over at all."""
+        return self.hedge or bool(self.failure_threshold)
+
+    def breaker(self, worker_run_data: WorkerRunData) -> CircuitBreaker:
+        key = instance_key(worker_run_data)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._breakers[key] = breaker
+            return breaker
+
+    def available(self, instances: List[WorkerRunData]) -> List[WorkerRunData]:
+        """The instances whose breaker is not open, all of them if none."""
+        if not self.failure_threshold or not instances:
+            return instances
+        available = [ins for ins in instances if not self.breaker(ins).is_open]
+        return available or instances
+
+    def record_success(self, worker_run_data: WorkerRunData):
+        if self.failure_threshold:
+            self.breaker(worker_run_data).record_success()
+
+    def record_failure(self, worker_run_data: WorkerRunData):
+        if not self.failure_threshold:
+            return
+        breaker = self.breaker(worker_run_data)
+        breaker.record_failure()
+        if breaker.is_open:
+            logger.warning(
+                f"Circuit breaker of {instance_key(worker_run_data)} is open after "
+                f"{breaker.failures} failures"
+            )
+
+    def record_latency(self, model_key: str, seconds: float):
+        with self._lock:
+            window = self._latencies.get(model_key)
+            if window is None:
+                window = LatencyWindow(self.window_size)
+                self._latencies[model_key] = window
+            window.add(seconds)
+
+    def hedge_delay(self, model_key: str) -> Optional[float]:
+        """The seconds to wait for the first output before hedging, None for never."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            window = self._latencies.get(model_key)
+            if window is None or len(window) < self.hedge_min_samples:
+                return None
+            delay = window.percentile(self.hedge_percentile)
+        return max(self.hedge_min_delay, delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "open_instances": [
+                key for key, breaker in self._breakers.items() if breaker.is_open
+            ],
+        }
+
+
+def order_candidates(
+    health: InstanceHealth, primary: WorkerRunData, instances: List[WorkerRunData]
+) -> List[WorkerRunData]:
+    """The primary instance first, then the other available instances."""
+    primary_key = instance_key(primary)
+    others = [ins for ins in instances if instance_key(ins) != primary_key]
+    closed = health.available(others)
+    closed_keys = {instance_key(ins) for ins in closed}
+    # The open instances are the last resort of the failover
+    return (
+        [primary]
+        + closed
+        + [ins for ins in others if instance_key(ins) not in closed_keys]
+    )
+
+
+async def hedged_stream(
+    health: InstanceHealth,
+    model_key: str,
+    candidates: List[WorkerRunData],
+    params: Dict,
+    stream_factory: StreamFactory,
+    max_attempts: int = 2,
+) -> AsyncIterator[Any]:
+    """Stream from the first candidate, hedged and failed over to the others.
+
+    Every attempt gets its own copy of the params. Once an attempt has produced its
+    first output, the stream is bound to it, its later errors are raised to the
+    caller.
+
+    Args:
+        health (InstanceHealth): The circuit breakers and the hedging policy.
+        model_key (str): The key of the latencies, the model and the request kind.
+        candidates (List[WorkerRunData]): The instances, the primary one first.
+        params (Dict): The request parameters.
+        stream_factory (StreamFactory): Open the stream of a request to an instance.
+        max_attempts (int): The max instances used by the request.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    attempts: List[Tuple[WorkerRunData, asyncio.Task]] = []
+    candidates = candidates[:max_attempts]
+    failed = set()
+    winner: Optional[int] = None
+
+    async def _pump(index: int, worker_run_data: WorkerRunData):
+        start = time.monotonic()
+        first = True
+        try:
+            async for output in stream_factory(worker_run_data, dict(params)):
+                if first:
+                    first = False
+                    health.record_latency(model_key, time.monotonic() - start)
+                await queue.put((index, output))
+            await queue.put((index, _END))
+        except asyncio.CancelledError:
+            if first and winner is not None and winner != index:
+                # Lost the race, its first output would have come even later
+                health.record_latency(model_key, time.monotonic() - start)
+            raise
+        except Exception as e:
+            health.record_failure(worker_run_data)
+            await queue.put((index, e))
+        else:
+            health.record_success(worker_run_data)
+
+    def _start() -> bool:
+        if len(attempts) >= len(candidates):
+            return False
+        index = len(attempts)
+        worker_run_data = candidates[index]
+        attempts.append(
+            (worker_run_data, asyncio.create_task(_pump(index, worker_run_data)))
+        )
+        return True
+
+    _start()
+    delay = health.hedge_delay(model_key)
+    deadline = time.monotonic() + delay if delay is not None else None
+    try:
+        while True:
+            timeout = None
+            if winner is None and deadline is not None and len(attempts) == 1:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                index, item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if _start():
+                    health.hedged += 1
+                    logger.info(
+                        f"Hedge the request of {model_key} to "
+                        f"{instance_key(attempts[-1][0])} after {delay:.3f}s"
+                    )
+                deadline = None
+                continue
+
+            if winner is None:
+                if isinstance(item, Exception):
+                    failed.add(index)
+                    if len(failed) < len(attempts):
+                        continue
+                    if _start():
+                        health.failovers += 1
+                        logger.warning(
+                            f"Request to {instance_key(attempts[index][0])} failed: "
+                            f"{item}, retry on {instance_key(attempts[-1][0])}"
+                        )
+                        deadline = None
+                        continue
+                    raise item
+                winner = index
+                if index > 0:
+                    health.hedge_wins += 1
+                for i, (_, task) in enumerate(attempts):
+                    if i != winner:
+                        task.cancel()
+            elif index != winner:
+                continue
+
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for _, task in attempts:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*(task for _, task in attempts), return_exceptions=True)
@@ -11,8 +11,8 @@ from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
 
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import Response, StreamingResponse
 
 from opsdiag.component import SystemApp
 from opsdiag.configs.model_config import LOGDIR
@@ -42,6 +42,11 @@ from opsdiag.model.cluster.manager_base import (
 )
 from opsdiag.model.cluster.registry import ModelRegistry
 from opsdiag.model.cluster.storage import ModelStorage, ModelStorageItem
+from opsdiag.model.cluster.worker.hedging import (
+    InstanceHealth,
+    hedged_stream,
+    order_candidates,
+)
 from opsdiag.model.cluster.worker_base import ModelWorker
 from opsdiag.model.parameter import (
     ModelsDeployParameters,
@@ -55,6 +60,14 @@ from opsdiag.util.parameter_utils import (
     _get_dict_from_obj,
 )
 from opsdiag.util.system_utils import get_system_info
+from opsdiag.util.vector_codec import (
+    OCTET_STREAM_MEDIA_TYPE,
+    VECTOR_SHAPE_HEADER,
+    format_shape,
+    is_packable,
+    pack_vectors,
+    pack_vectors_base64,
+)
 from opsdiag.util.tracer import SpanType, SpanTypeRunName, initialize_tracer, root_tracer
 from opsdiag.util.tracer.tracer_impl import TracerParameters
 from opsdiag.util.logger import (
@@ -95,6 +108,7 @@ class LocalWorkerManager(WorkerManager):
         host: str = None,
         port: int = None,
         model_storage: Optional[ModelStorage] = None,
+        instance_health: Optional[InstanceHealth] = None,
     ) -> None:
         """Create a LocalWorkerManager instance.
 
@@ -109,6 +123,9 @@ class LocalWorkerManager(WorkerManager):
             port (int, optional): Port. Defaults to None.
             model_storage (Optional[ModelStorage], optional): Model storage. Defaults
                 to None. It is used to store model metadata.
+            instance_health (Optional[InstanceHealth], optional): The circuit
+                breakers and the hedging policy of the instances. Defaults to None,
+                circuit breakers without hedging.
         """
         self.workers: Dict[str, List[WorkerRunData]] = dict()
         self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() * 5)
@@ -120,6 +137,7 @@ class LocalWorkerManager(WorkerManager):
         self.port = port
         self.model_storage = model_storage
         self.start_listeners = []
+        self.instance_health = instance_health or InstanceHealth()
 
         self.run_data = WorkerRunData(
             host=self.host,
@@ -410,7 +428,9 @@ class LocalWorkerManager(WorkerManager):
                 f"Cound not found worker instances for model name {model_name} and "
                 f"worker type {worker_type}"
             )
-        worker_run_data = random.choice(worker_instances)
+        worker_run_data = random.choice(
+            self.instance_health.available(worker_instances)
+        )
         return worker_run_data
 
     async def select_one_instance(
@@ -435,6 +455,19 @@ class LocalWorkerManager(WorkerManager):
             raise Exception("Model name count not be empty")
         return await self.select_one_instance(worker_type, model, healthy_only=True)
 
+    async def _get_model_candidates(
+        self, params: Dict, worker_type: str = "llm"
+    ) -> List[WorkerRunData]:
+        """The selected instance first, then the instances to hedge or fail over."""
+        model = params.get("model")
+        if not model:
+            raise Exception("Model name count not be empty")
+        worker_instances = await self.get_model_instances(
+            worker_type, model, healthy_only=True
+        )
+        worker_run_data = self._simple_select(worker_type, model, worker_instances)
+        return order_candidates(self.instance_health, worker_run_data, worker_instances)
+
     def _sync_get_model(self, params: Dict, worker_type: str = "llm") -> WorkerRunData:
         model = params.get("model")
         if not model:
@@ -450,28 +483,54 @@ class LocalWorkerManager(WorkerManager):
         ) as span:
             params["span_id"] = span.span_id
             try:
-                worker_run_data = await self._get_model(params)
+                candidates = await self._get_model_candidates(params)
             except Exception as e:
                 yield ModelOutput(
                     text=f"**LLMServer Generate Error, Please CheckErrorInfo.**: {e}",
                     error_code=1,
                 )
                 return
-            async with worker_run_data.semaphore:
-                if worker_run_data.worker.support_async():
-                    async for outout in worker_run_data.worker.async_generate_stream(
-                        params
-                    ):
-                        yield outout
-                else:
-                    if not async_wrapper:
-                        from starlette.concurrency import iterate_in_threadpool
+            if not self.instance_health.enabled:
+                # Neither hedged nor failed over, stream from the instance directly
+                async for output in self._instance_generate_stream(
+                    candidates[0], params, async_wrapper
+                ):
+                    yield output
+                return
 
-                        async_wrapper = iterate_in_threadpool
-                    async for output in async_wrapper(
-                        worker_run_data.worker.generate_stream(params)
-                    ):
-                        yield output
+            async def _instance_stream(worker_run_data: WorkerRunData, req: Dict):
+                async for output in self._instance_generate_stream(
+                    worker_run_data, req, async_wrapper
+                ):
+                    yield output
+
+            async for output in hedged_stream(
+                self.instance_health,
+                f"{params['model']}:generate_stream",
+                candidates,
+                params,
+                _instance_stream,
+            ):
+                yield output
+
+    async def _instance_generate_stream(
+        self, worker_run_data: WorkerRunData, params: Dict, async_wrapper=None
+    ) -> AsyncIterator[ModelOutput]:
+        async with worker_run_data.semaphore:
+            if worker_run_data.worker.support_async():
+                async for outout in worker_run_data.worker.async_generate_stream(
+                    params
+                ):
+                    yield outout
+            else:
+                if not async_wrapper:
+                    from starlette.concurrency import iterate_in_threadpool
+
+                    async_wrapper = iterate_in_threadpool
+                async for output in async_wrapper(
+                    worker_run_data.worker.generate_stream(params)
+                ):
+                    yield output
 
     async def generate(self, params: Dict) -> ModelOutput:
         """Generate non stream result"""
@@ -480,19 +539,38 @@ class LocalWorkerManager(WorkerManager):
         ) as span:
             params["span_id"] = span.span_id
             try:
-                worker_run_data = await self._get_model(params)
+                candidates = await self._get_model_candidates(params)
             except Exception as e:
                 return ModelOutput(
                     text=f"**LLMServer Generate Error, Please CheckErrorInfo.**: {e}",
                     error_code=1,
                 )
-            async with worker_run_data.semaphore:
-                if worker_run_data.worker.support_async():
-                    return await worker_run_data.worker.async_generate(params)
-                else:
-                    return await self.run_blocking_func(
-                        worker_run_data.worker.generate, params
-                    )
+            output = None
+            if not self.instance_health.enabled:
+                async for output in self._instance_generate(candidates[0], params):
+                    pass
+                return output
+            async for output in hedged_stream(
+                self.instance_health,
+                f"{params['model']}:generate",
+                candidates,
+                params,
+                self._instance_generate,
+            ):
+                pass
+            return output
+
+    async def _instance_generate(
+        self, worker_run_data: WorkerRunData, params: Dict
+    ) -> AsyncIterator[ModelOutput]:
+        # The whole output is the first output of a non stream request
+        async with worker_run_data.semaphore:
+            if worker_run_data.worker.support_async():
+                yield await worker_run_data.worker.async_generate(params)
+            else:
+                yield await self.run_blocking_func(
+                    worker_run_data.worker.generate, params
+                )
 
     async def embeddings(self, params: Dict) -> List[List[float]]:
         """Embed input"""
@@ -897,12 +975,31 @@ async def api_generate(request: PromptRequest):
 
 
 @router.post("/worker/embeddings")
-async def api_embeddings(request: EmbeddingsRequest):
+async def api_embeddings(request: EmbeddingsRequest, raw_request: Request):
+    """Embed the texts.
+
+    The vectors are returned as a JSON list by default, as a little-endian float32
+    buffer if the client accepts ``application/octet-stream``, or in a base64 JSON
+    envelope if the ``encoding_format`` is "base64".
+    """
     params = request.dict(exclude_none=True)
+    encoding_format = params.pop("encoding_format", None)
     span_id = root_tracer.get_current_span_id()
     if "span_id" not in params and span_id:
         params["span_id"] = span_id
-    return await worker_manager.embeddings(params)
+    embeddings = await worker_manager.embeddings(params)
+    if not is_packable(embeddings):
+        return embeddings
+    if OCTET_STREAM_MEDIA_TYPE in raw_request.headers.get("accept", ""):
+        data, shape = pack_vectors(embeddings)
+        return Response(
+            content=data,
+            media_type=OCTET_STREAM_MEDIA_TYPE,
+            headers={VECTOR_SHAPE_HEADER: format_shape(shape)},
+        )
+    if encoding_format == "base64":
+        return pack_vectors_base64(embeddings)
+    return embeddings
 
 
 @router.post("/worker/count_token")
@@ -1067,7 +1164,10 @@ def _create_local_model_manager(
             f"controller_addr: {worker_params.controller_addr}"
         )
         return LocalWorkerManager(
-            host=register_host, port=port, model_storage=model_storage
+            host=register_host,
+            port=port,
+            model_storage=model_storage,
+            instance_health=_create_instance_health(worker_params),
         )
     else:
         from opsdiag.model.cluster.controller.controller import ModelRegistryClient
@@ -1102,9 +1202,18 @@ def _create_local_model_manager(
             host=register_host,
             port=port,
             model_storage=model_storage,
+            instance_health=_create_instance_health(worker_params),
         )
 
 
+def _create_instance_health(worker_params: ModelWorkerParameters) -> InstanceHealth:
+    return InstanceHealth(
+        hedge=worker_params.hedge_requests,
+        hedge_percentile=worker_params.hedge_percentile,
+        failure_threshold=worker_params.circuit_breaker_threshold,
+    )
+
+
 def _build_worker(
     worker_type: Optional[str] = None,
     worker_class: Optional[str] = None,
@@ -1276,7 +1385,11 @@ def initialize_worker_manager_in_client(
             raise ValueError("Controller can`t be None")
         logger.info(f"Worker params: {worker_params}")
         client = ModelRegistryClient(worker_params.controller_addr)
-        worker_manager.worker_manager = RemoteWorkerManager(client)
+        worker_manager.worker_manager = RemoteWorkerManager(
+            client,
+            instance_health=_create_instance_health(worker_params),
+            binary_embeddings=worker_params.binary_embeddings,
+        )
         worker_manager.after_start(start_listener)
         initialize_controller(
             app=app,
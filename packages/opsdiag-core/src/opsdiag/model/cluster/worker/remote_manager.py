@@ -1,5 +1,5 @@
 import asyncio
-from typing import Any, Callable, List
+from typing import Any, Callable, List, Optional
 
 from opsdiag.model.base import ModelInstance, WorkerApplyOutput, WorkerSupportedModel
 from opsdiag.model.cluster.base import (
@@ -9,6 +9,7 @@ from opsdiag.model.cluster.base import (
     WorkerStartupRequest,
 )
 from opsdiag.model.cluster.registry import ModelRegistry
+from opsdiag.model.cluster.worker.hedging import InstanceHealth
 from opsdiag.model.cluster.worker.manager import (
     LocalWorkerManager,
     WorkerRunData,
@@ -19,8 +20,14 @@ from opsdiag.model.parameter import WorkerType
 
 
 class RemoteWorkerManager(LocalWorkerManager):
-    def __init__(self, model_registry: ModelRegistry = None) -> None:
-        super().__init__(model_registry=model_registry)
+    def __init__(
+        self,
+        model_registry: ModelRegistry = None,
+        instance_health: Optional[InstanceHealth] = None,
+        binary_embeddings: bool = False,
+    ) -> None:
+        super().__init__(model_registry=model_registry, instance_health=instance_health)
+        self.binary_embeddings = binary_embeddings
 
     async def start(self):
         for listener in self.start_listeners:
@@ -150,7 +157,7 @@ class RemoteWorkerManager(LocalWorkerManager):
         return worker_instances
 
     def _build_single_worker_instance(self, model_name: str, instance: ModelInstance):
-        worker = RemoteModelWorker()
+        worker = RemoteModelWorker(binary_embeddings=self.binary_embeddings)
         worker.load_worker(model_name, host=instance.host, port=instance.port)
         wr = WorkerRunData(
             host=instance.host,
@@ -5,17 +5,27 @@ from typing import Dict, Iterator, List
 from opsdiag.core import ModelMetadata, ModelOutput
 from opsdiag.model.cluster.worker_base import ModelWorker
 from opsdiag.util.tracer import DERISK_TRACER_SPAN_ID, root_tracer
+from opsdiag.util.vector_codec import (
+    OCTET_STREAM_MEDIA_TYPE,
+    VECTOR_SHAPE_HEADER,
+    parse_shape,
+    unpack_vectors,
+    unpack_vectors_json,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class RemoteModelWorker(ModelWorker):
-    def __init__(self) -> None:
+    def __init__(self, binary_embeddings: bool = False) -> None:
         self.headers = {}
         # TODO Configured by ModelParameters
         self.timeout = 3600
         self.host = None
         self.port = None
+        # Receive the embeddings as float32 buffers instead of JSON lists, the
+        # vectors lose the float64 precision
+        self.binary_embeddings = binary_embeddings
 
     @property
     def worker_addr(self) -> str:
@@ -139,13 +149,13 @@ class RemoteModelWorker(ModelWorker):
         logger.debug(f"Send embeddings to url {url}, params: {params}")
         response = requests.post(
             url,
-            headers=self._get_trace_headers(),
+            headers=self._get_embeddings_headers(),
             json=params,
             timeout=self.timeout,
         )
         if response.status_code not in [200, 201]:
             raise Exception(f"Request to {url} failed, error: {response.text}")
-        return response.json()
+        return self._parse_embeddings(response)
 
     async def async_embeddings(self, params: Dict) -> List[List[float]]:
         """Asynchronous get embeddings for input"""
@@ -156,13 +166,27 @@ class RemoteModelWorker(ModelWorker):
             logger.debug(f"Send async_embeddings to url {url}")
             response = await client.post(
                 url,
-                headers=self._get_trace_headers(),
+                headers=self._get_embeddings_headers(),
                 json=params,
                 timeout=self.timeout,
             )
             if response.status_code not in [200, 201]:
                 raise Exception(f"Request to {url} failed, error: {response.text}")
-            return response.json()
+            return self._parse_embeddings(response)
+
+    def _get_embeddings_headers(self) -> Dict[str, str]:
+        headers = self._get_trace_headers()
+        if self.binary_embeddings:
+            # The old workers ignore it and return JSON
+            headers["Accept"] = f"{OCTET_STREAM_MEDIA_TYPE}, application/json"
+        return headers
+
+    def _parse_embeddings(self, response) -> List[List[float]]:
+        content_type = response.headers.get("content-type", "")
+        if content_type.startswith(OCTET_STREAM_MEDIA_TYPE):
+            shape = parse_shape(response.headers[VECTOR_SHAPE_HEADER])
+            return unpack_vectors(response.content, shape)
+        return unpack_vectors_json(response.json())
 
     def _get_trace_headers(self):
         span_id = root_tracer.get_current_span_id()
@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import List
+
+import pytest
+
+from opsdiag.model.cluster.worker.embedding_batcher import (
+    EmbeddingBatcher,
+    estimate_tokens,
+)
+
+
+class _FakeModel:
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls: List[List[str]] = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls.append(list(texts))
+        time.sleep(self.delay)
+        if "bad" in texts:
+            raise ValueError("bad input")
+        return [[float(len(text))] for text in texts]
+
+
+def _run_concurrently(batcher: EmbeddingBatcher, requests: List[List[str]]):
+    results = [None] * len(requests)
+
+    def _embed(i):
+        try:
+            results[i] = batcher.embed(requests[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=_embed, args=(i,)) for i in range(len(requests))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+@pytest.fixture
+def model():
+    return _FakeModel()
+
+
+def test_coalesce_concurrent_requests(model):
+    batcher = EmbeddingBatcher(model.embed_documents, max_wait_ms=50)
+    requests = [["a" * i] for i in range(1, 17)]
+    results = _run_concurrently(batcher, requests)
+    assert results == [[[float(i)]] for i in range(1, 17)]
+    assert len(model.calls) < 16
+    assert batcher.request_count == 16
+    batcher.stop()
+
+
+def test_max_batch_size(model):
+    batcher = EmbeddingBatcher(model.embed_documents, max_batch_size=4, max_wait_ms=50)
+    requests = [["a", "bb"] for _ in range(10)]
+    results = _run_concurrently(batcher, requests)
+    assert all(r == [[1.0], [2.0]] for r in results)
+    assert all(len(call) <= 4 for call in model.calls)
+    # A request larger than the limit is not split
+    assert batcher.embed(["x"] * 6) == [[1.0]] * 6
+    assert model.calls[-1] == ["x"] * 6
+    batcher.stop()
+
+
+def test_max_batch_tokens(model):
+    batcher = EmbeddingBatcher(
+        model.embed_documents, max_batch_tokens=10, max_wait_ms=50
+    )
+    _run_concurrently(batcher, [["a" * 20] for _ in range(4)])
+    # Every request has 6 tokens
+    assert all(len(call) == 1 for call in model.calls)
+    batcher.stop()
+
+
+def test_failed_request_does_not_fail_batch(model):
+    batcher = EmbeddingBatcher(model.embed_documents, max_wait_ms=50)
+    results = _run_concurrently(batcher, [["a"], ["bad"], ["ccc"]])
+    assert results[0] == [[1.0]]
+    assert isinstance(results[1], ValueError)
+    assert results[2] == [[3.0]]
+    batcher.stop()
+
+
+def test_stop(model):
+    batcher = EmbeddingBatcher(model.embed_documents)
+    assert batcher.embed([]) == []
+    batcher.stop()
+    with pytest.raises(RuntimeError):
+        batcher.embed(["a"])
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("hello world, hello") == 5
+    assert estimate_tokens("你好世界") == 4
@@ -0,0 +1,72 @@
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from opsdiag.model.cluster.worker import manager as manager_module
+from opsdiag.model.cluster.worker.remote_worker import RemoteModelWorker
+from opsdiag.util.vector_codec import OCTET_STREAM_MEDIA_TYPE, VECTOR_SHAPE_HEADER
+
+VECTORS = [[0.5, -1.25, 3.0], [0.0, 2.5, -0.125]]
+
+
+class _FakeWorkerManager:
+    def __init__(self):
+        self.params = None
+
+    async def embeddings(self, params):
+        self.params = params
+        return VECTORS
+
+
+@pytest.fixture
+def fake_manager(monkeypatch):
+    fake = _FakeWorkerManager()
+    monkeypatch.setattr(manager_module, "worker_manager", fake)
+    return fake
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(manager_module.router, prefix="/api")
+    return AsyncClient(transport=ASGITransport(app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_embeddings_json(fake_manager, client):
+    # Full precision JSON by default
+    response = await client.post(
+        "/api/worker/embeddings",
+        json={"model": "m", "input": ["a", "b"]},
+        headers=RemoteModelWorker()._get_embeddings_headers(),
+    )
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == VECTORS
+    assert RemoteModelWorker()._parse_embeddings(response) == VECTORS
+
+
+@pytest.mark.asyncio
+async def test_embeddings_octet_stream(fake_manager, client):
+    worker = RemoteModelWorker(binary_embeddings=True)
+    response = await client.post(
+        "/api/worker/embeddings",
+        json={"model": "m", "input": ["a", "b"]},
+        headers=worker._get_embeddings_headers(),
+    )
+    assert response.headers["content-type"] == OCTET_STREAM_MEDIA_TYPE
+    assert response.headers[VECTOR_SHAPE_HEADER] == "2,3"
+    assert len(response.content) == 2 * 3 * 4
+    assert worker._parse_embeddings(response) == VECTORS
+    assert fake_manager.params == {"model": "m", "input": ["a", "b"]}
+
+
+@pytest.mark.asyncio
+async def test_embeddings_base64(fake_manager, client):
+    response = await client.post(
+        "/api/worker/embeddings",
+        json={"model": "m", "input": ["a", "b"], "encoding_format": "base64"},
+    )
+    payload = response.json()
+    assert payload["shape"] == [2, 3]
+    assert RemoteModelWorker()._parse_embeddings(response) == VECTORS
+    assert "encoding_format" not in fake_manager.params
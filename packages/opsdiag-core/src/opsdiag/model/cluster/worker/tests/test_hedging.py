@@ -0,0 +1,210 @@
+import asyncio
+import time
+from typing import Dict, List
+
+import pytest
+
+from opsdiag.core import ModelOutput
+from opsdiag.model.base import ModelInstance
+from opsdiag.model.cluster.manager_base import WorkerRunData
+from opsdiag.model.cluster.registry import EmbeddedModelRegistry
+from opsdiag.model.cluster.worker import manager as manager_module
+from opsdiag.model.cluster.worker.hedging import CircuitBreaker, InstanceHealth
+from opsdiag.model.cluster.worker.remote_manager import RemoteWorkerManager
+from opsdiag.model.parameter import WorkerType
+
+_MODEL = "test-model"
+
+
+class _FakeWorker:
+    """An in-process worker with injected latency and errors."""
+
+    def __init__(self, name: str, delay: float = 0, fail: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    def support_async(self) -> bool:
+        return True
+
+    async def async_generate_stream(self, params: Dict):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise ConnectionError(f"{self.name} is down")
+            for text in ["Hello", "Hello world"]:
+                yield ModelOutput(text=f"{text} from {self.name}", error_code=0)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+    async def async_generate(self, params: Dict) -> ModelOutput:
+        output = None
+        async for output in self.async_generate_stream(params):
+            pass
+        return output
+
+
+class _FakeRemoteManager(RemoteWorkerManager):
+    def __init__(self, workers: Dict[int, _FakeWorker], health: InstanceHealth):
+        super().__init__(EmbeddedModelRegistry(), instance_health=health)
+        self.fake_workers = workers
+
+    def _build_single_worker_instance(self, model_name: str, instance: ModelInstance):
+        return WorkerRunData(
+            host=instance.host,
+            port=instance.port,
+            worker_type=WorkerType.LLM.value,
+            worker_key=instance.model_name,
+            worker=self.fake_workers[instance.port],
+            worker_params=None,
+            model_params=None,
+            stop_event=asyncio.Event(),
+            semaphore=asyncio.Semaphore(100),
+        )
+
+
+async def _manager(workers: List[_FakeWorker], **kwargs) -> _FakeRemoteManager:
+    kwargs.setdefault("hedge_min_samples", 5)
+    manager = _FakeRemoteManager(
+        {8001 + i: w for i, w in enumerate(workers)}, InstanceHealth(**kwargs)
+    )
+    for port in manager.fake_workers:
+        await manager.model_registry.register_instance(
+            ModelInstance(
+                model_name=WorkerType.to_worker_key(_MODEL, WorkerType.LLM.value),
+                host="127.0.0.1",
+                port=port,
+            )
+        )
+    return manager
+
+
+async def _stream_text(manager: _FakeRemoteManager) -> str:
+    text = ""
+    async for output in manager.generate_stream({"model": _MODEL}):
+        text = output.text
+    return text
+
+
+def _warm_up(manager: _FakeRemoteManager, seconds: float, kind="generate_stream"):
+    for _ in range(5):
+        manager.instance_health.record_latency(f"{_MODEL}:{kind}", seconds)
+
+
+def test_circuit_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert breaker.state == "half_open"
+    # A failed probe opens it again
+    breaker.record_failure()
+    assert breaker.state == "open"
+    monkeypatch.setattr(time, "monotonic", lambda: now + 22)
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_hedge_slow_instance():
+    slow, fast = _FakeWorker("slow", delay=5), _FakeWorker("fast", delay=0.01)
+    manager = await _manager([slow, fast], hedge=True)
+    _warm_up(manager, 0.05)
+    # Always select the slow instance first
+    manager._simple_select = lambda wt, model, instances: instances[0]
+
+    start = time.monotonic()
+    assert await _stream_text(manager) == "Hello world from fast"
+    assert time.monotonic() - start < 1
+    assert slow.cancelled == 1
+    stats = manager.instance_health.stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_lost_race_is_not_failure():
+    slow, fast = _FakeWorker("slow", delay=5), _FakeWorker("fast", delay=0.01)
+    manager = await _manager([slow, fast], hedge=True, failure_threshold=1)
+    _warm_up(manager, 0.05)
+    manager._simple_select = lambda wt, model, instances: instances[0]
+
+    assert await _stream_text(manager) == "Hello world from fast"
+    assert manager.instance_health.stats()["open_instances"] == []
+    # The latencies of the winner and the loser
+    window = manager.instance_health._latencies[f"{_MODEL}:generate_stream"]
+    assert len(window) == 7
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_before_threshold():
+    first, second = _FakeWorker("first", delay=0.1), _FakeWorker("second")
+    manager = await _manager([first, second], hedge=True)
+    manager._simple_select = lambda wt, model, instances: instances[0]
+
+    # No latencies yet
+    assert await _stream_text(manager) == "Hello world from first"
+    _warm_up(manager, 0.5)
+    assert await _stream_text(manager) == "Hello world from first"
+    assert second.calls == 0
+    assert manager.instance_health.stats()["hedged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failover_and_circuit_breaker():
+    broken, healthy = _FakeWorker("broken", fail=True), _FakeWorker("healthy")
+    manager = await _manager([broken, healthy], failure_threshold=2)
+    select = manager._simple_select
+    manager._simple_select = lambda wt, model, instances: instances[0]
+
+    # Hedging is disabled, the failed requests are retried at once
+    for _ in range(2):
+        output = await manager.generate({"model": _MODEL})
+        assert output.text == "Hello world from healthy"
+    assert broken.calls == 2
+    assert manager.instance_health.stats()["failovers"] == 2
+    assert manager.instance_health.stats()["open_instances"] == [
+        f"{_MODEL}@llm@127.0.0.1:8001"
+    ]
+
+    # The open instance is skipped by the selection
+    manager._simple_select = select
+    for _ in range(10):
+        assert await _stream_text(manager) == "Hello world from healthy"
+    assert broken.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_all_instances_failed():
+    workers = [_FakeWorker("a", fail=True), _FakeWorker("b", fail=True)]
+    manager = await _manager(workers, failure_threshold=1)
+    with pytest.raises(ConnectionError):
+        await _stream_text(manager)
+    assert [w.calls for w in workers] == [1, 1]
+
+    # All open, still available
+    with pytest.raises(ConnectionError):
+        await _stream_text(manager)
+    assert sum(w.calls for w in workers) == 4
+
+
+@pytest.mark.asyncio
+async def test_bypass_when_disabled(monkeypatch):
+    def _hedged_stream(*args, **kwargs):
+        raise AssertionError("Should not be hedged")
+
+    monkeypatch.setattr(manager_module, "hedged_stream", _hedged_stream)
+    workers = [_FakeWorker("a"), _FakeWorker("b")]
+    manager = await _manager(workers, failure_threshold=0)
+    assert not manager.instance_health.enabled
+    assert (await _stream_text(manager)).startswith("Hello world from")
+    output = await manager.generate({"model": _MODEL})
+    assert output.text.startswith("Hello world from")
+    assert sum(w.calls for w in workers) == 2
@@ -30,6 +30,9 @@ def huggingface_chat_generate_stream(
     max_new_tokens = int(params.get("max_new_tokens", 2048))
     stop_token_ids = params.get("stop_token_ids", [])
     do_sample = params.get("do_sample", True)
+    if temperature < 1e-5:
+        # Greedy search for temperature 0, the sampling rejects it
+        do_sample = False
     custom_stop_words = params.get("custom_stop_words", [])
     think_start_token = params.get("think_start_token", _DEFAULT_THINK_START_TOKEN)
     is_reasoning_model = params.get("is_reasoning_model", False)
@@ -50,10 +53,11 @@ def huggingface_chat_generate_stream(
 
     base_kwargs = {
         "max_length": context_len,
-        "temperature": temperature,
         "streamer": streamer,
-        "top_p": top_p,
     }
+    if do_sample is not False:
+        base_kwargs["temperature"] = temperature
+        base_kwargs["top_p"] = top_p
 
     if stop_token_ids:
         base_kwargs["eos_token_id"] = stop_token_ids
@@ -142,6 +142,15 @@ class ModelAPIServerParameters(BaseServerParameters):
     ignore_stop_exceeds_error: Optional[bool] = field(
         default=False, metadata={"help": _("Ignore exceeds stop words error")}
     )
+    coalesce_requests: Optional[bool] = field(
+        default=True,
+        metadata={
+            "help": _(
+                "Share one model call between the identical in-flight requests, "
+                "only for the embeddings and the LLM requests with temperature 0"
+            )
+        },
+    )
 
 
 @dataclass
@@ -187,6 +196,43 @@ class ModelWorkerParameters(BaseServerParameters):
         default=20,
         metadata={"help": _("The interval for sending heartbeats (seconds)")},
     )
+    hedge_requests: Optional[bool] = field(
+        default=False,
+        metadata={
+            "help": _(
+                "Send a duplicate request to a second instance of the model when the "
+                "first output is late, take the first one to respond"
+            )
+        },
+    )
+    hedge_percentile: Optional[float] = field(
+        default=0.95,
+        metadata={
+            "help": _(
+                "The percentile of the recent first output latencies to wait before "
+                "hedging a request"
+            )
+        },
+    )
+    circuit_breaker_threshold: Optional[int] = field(
+        default=5,
+        metadata={
+            "help": _(
+                "The consecutive failures to stop selecting a model instance for a "
+                "while, 0 to disable it"
+            )
+        },
+    )
+    binary_embeddings: Optional[bool] = field(
+        default=False,
+        metadata={
+            "help": _(
+                "Receive the embeddings of the remote workers as float32 buffers "
+                "instead of JSON lists, smaller and faster to parse but the vectors "
+                "lose the float64 precision"
+            )
+        },
+    )
 
 
 @dataclass
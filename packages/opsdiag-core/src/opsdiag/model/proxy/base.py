@@ -1,8 +1,10 @@
+import functools
 import logging
+import threading
 from abc import ABC, abstractmethod
 from concurrent.futures import Executor, ThreadPoolExecutor
 from functools import cache
-from inspect import isasyncgenfunction, iscoroutinefunction
+from inspect import isasyncgenfunction, iscoroutinefunction, isgeneratorfunction
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -29,6 +31,12 @@ from opsdiag.core.interface.parameter import LLMDeployModelParameters
 from opsdiag.util.configure.manager import _resolve_env_vars
 from opsdiag.util.executor_utils import blocking_func_to_async
 
+from .rate_limiter import (
+    ProxyRateLimiter,
+    estimate_request_tokens,
+    get_proxy_rate_limiter,
+)
+
 if TYPE_CHECKING:
     from tiktoken import Encoding
 
@@ -125,11 +133,45 @@ class TiktokenProxyTokenizer(ProxyTokenizer):
         return encoding_model
 
 
+_proxy_executors: Dict[str, Executor] = {}
+_proxy_executors_lock = threading.Lock()
+
+
+def get_proxy_executor(provider: str, max_workers: Optional[int] = None) -> Executor:
+    """Get the executor shared by the proxy clients of the provider.
+
+    The threads are created on demand and bounded per provider, instead of a thread
+    pool per client. A stream of a blocking SDK holds a thread while waiting for
+    each output, so the max threads is also the max concurrent streams of the
+    provider.
+
+    Args:
+        provider (str): The provider, like 'proxy/openai'.
+        max_workers (Optional[int]): The max threads, only used by the first call
+            of the provider. Default is min(32, CPU count + 4).
+    """
+    with _proxy_executors_lock:
+        executor = _proxy_executors.get(provider)
+        if executor is None:
+            name = provider.replace("/", "_")
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f"proxy_{name}"
+            )
+            _proxy_executors[provider] = executor
+        elif max_workers and max_workers != getattr(executor, "_max_workers", None):
+            logger.warning(
+                f"The executor of {provider} is already created, ignore the max "
+                f"workers {max_workers}"
+            )
+        return executor
+
+
 class ProxyLLMClient(LLMClient):
     """Proxy LLM client base class"""
 
     executor: Executor
     model_names: List[str]
+    rate_limiter: Optional[ProxyRateLimiter] = None
 
     def __init__(
         self,
@@ -140,19 +182,54 @@ class ProxyLLMClient(LLMClient):
     ):
         self.model_names = model_names
         self.context_length = context_length
-        self.executor = executor or ThreadPoolExecutor()
+        self.executor = executor or get_proxy_executor(self.provider())
         self._proxy_tokenizer = proxy_tokenizer
 
     def __getstate__(self):
         """Customize the serialization of the object"""
         state = self.__dict__.copy()
         state.pop("executor")
+        state.pop("rate_limiter", None)
         return state
 
     def __setstate__(self, state):
         """Customize the deserialization of the object"""
         self.__dict__.update(state)
-        self.executor = ThreadPoolExecutor()
+        self.executor = get_proxy_executor(self.provider())
+        self.rate_limiter = get_proxy_rate_limiter(self._rate_limit_key)
+
+    @classmethod
+    def provider(cls) -> str:
+        """Get the provider of the client, like 'proxy/openai'."""
+        try:
+            return cls.param_class().get_type_value()
+        except Exception:
+            return cls.__name__
+
+    @property
+    def _rate_limit_key(self) -> str:
+        api_base = getattr(self, "_rate_limit_api_base", None)
+        return f"{self.provider()}@{api_base}" if api_base else self.provider()
+
+    def set_rate_limits(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        api_base: Optional[str] = None,
+    ):
+        """Limit the requests of the client with the limiter of its provider.
+
+        Args:
+            requests_per_minute (Optional[int]): The max requests per minute.
+            tokens_per_minute (Optional[int]): The max tokens per minute.
+            api_base (Optional[str]): The API base of the client, the clients of a
+                provider share a limiter only if they have the same API base, e.g.
+                the OpenAI compatible endpoints of different services.
+        """
+        self._rate_limit_api_base = api_base
+        self.rate_limiter = get_proxy_rate_limiter(
+            self._rate_limit_key, requests_per_minute, tokens_per_minute
+        )
 
     @property
     def proxy_tokenizer(self) -> ProxyTokenizer:
@@ -249,6 +326,12 @@ class ProxyLLMClient(LLMClient):
         Returns:
             ModelOutput: model output
         """
+        if type(self).generate_stream is not ProxyLLMClient.generate_stream:
+            # The client has an async stream, no thread is needed
+            output = None
+            async for output in self.generate_stream(request, message_converter):
+                pass
+            return output
         return await blocking_func_to_async(
             self.executor, self.sync_generate, request, message_converter
         )
@@ -291,11 +374,12 @@ class ProxyLLMClient(LLMClient):
         Returns:
             AsyncIterator[ModelOutput]: model output stream
         """
-        from starlette.concurrency import iterate_in_threadpool
-
-        async for output in iterate_in_threadpool(
-            self.sync_generate_stream(request, message_converter)
-        ):
+        iterator = self.sync_generate_stream(request, message_converter)
+        end = object()
+        while True:
+            output = await blocking_func_to_async(self.executor, next, iterator, end)
+            if output is end:
+                break
             yield output
 
     def sync_generate_stream(
@@ -316,6 +400,40 @@ class ProxyLLMClient(LLMClient):
 
         raise NotImplementedError()
 
+    async def rate_limited_generate(
+        self,
+        request: ModelRequest,
+        message_converter: Optional[MessageConverter] = None,
+    ) -> ModelOutput:
+        """Generate model output after waiting for the rate limiter."""
+        if not self.rate_limiter:
+            return await self.generate(request, message_converter)
+        reserved = await self.rate_limiter.aacquire(_model_request_tokens(request))
+        output = None
+        try:
+            output = await self.generate(request, message_converter)
+            return output
+        finally:
+            self.rate_limiter.settle(reserved, _output_usage(output))
+
+    async def rate_limited_generate_stream(
+        self,
+        request: ModelRequest,
+        message_converter: Optional[MessageConverter] = None,
+    ) -> AsyncIterator[ModelOutput]:
+        """Generate model output stream after waiting for the rate limiter."""
+        if not self.rate_limiter:
+            async for output in self.generate_stream(request, message_converter):
+                yield output
+            return
+        reserved = await self.rate_limiter.aacquire(_model_request_tokens(request))
+        output = None
+        try:
+            async for output in self.generate_stream(request, message_converter):
+                yield output
+        finally:
+            self.rate_limiter.settle(reserved, _output_usage(output))
+
     async def models(self) -> List[ModelMetadata]:
         """Get model metadata list
 
@@ -384,6 +502,104 @@ class ProxyLLMClient(LLMClient):
         return counts[0]
 
 
+def _model_request_tokens(request: ModelRequest) -> int:
+    return estimate_request_tokens(
+        request.messages, max_new_tokens=request.max_new_tokens
+    )
+
+
+def _params_tokens(params: Dict[str, Any]) -> int:
+    return estimate_request_tokens(
+        params.get("messages"),
+        params.get("prompt") or params.get("string_prompt"),
+        params.get("max_new_tokens"),
+    )
+
+
+def _output_usage(output: Any) -> Optional[Dict[str, Any]]:
+    return getattr(output, "usage", None)
+
+
+def _model_rate_limiter(model: Any) -> Optional[ProxyRateLimiter]:
+    client = getattr(model, "proxy_llm_client", None)
+    return getattr(client, "rate_limiter", None)
+
+
+def _with_rate_limit(func):
+    """Wait for the rate limiter of the model before calling the generate function.
+
+    The functions are called with the ``ProxyModel`` and the request params.
+    """
+    if func is None:
+        return None
+
+    if isasyncgenfunction(func):
+
+        @functools.wraps(func)
+        async def _async_stream(model, tokenizer, params, *args, **kwargs):
+            limiter = _model_rate_limiter(model)
+            if not limiter:
+                async for output in func(model, tokenizer, params, *args, **kwargs):
+                    yield output
+                return
+            reserved = await limiter.aacquire(_params_tokens(params))
+            output = None
+            try:
+                async for output in func(model, tokenizer, params, *args, **kwargs):
+                    yield output
+            finally:
+                limiter.settle(reserved, _output_usage(output))
+
+        return _async_stream
+
+    if iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def _async_generate(model, tokenizer, params, *args, **kwargs):
+            limiter = _model_rate_limiter(model)
+            if not limiter:
+                return await func(model, tokenizer, params, *args, **kwargs)
+            reserved = await limiter.aacquire(_params_tokens(params))
+            output = None
+            try:
+                output = await func(model, tokenizer, params, *args, **kwargs)
+                return output
+            finally:
+                limiter.settle(reserved, _output_usage(output))
+
+        return _async_generate
+
+    if isgeneratorfunction(func):
+
+        @functools.wraps(func)
+        def _stream(model, tokenizer, params, *args, **kwargs):
+            limiter = _model_rate_limiter(model)
+            reserved = limiter.acquire(_params_tokens(params)) if limiter else 0
+            output = None
+            try:
+                for output in func(model, tokenizer, params, *args, **kwargs):
+                    yield output
+            finally:
+                if limiter:
+                    limiter.settle(reserved, _output_usage(output))
+
+        return _stream
+
+    @functools.wraps(func)
+    def _generate(model, tokenizer, params, *args, **kwargs):
+        limiter = _model_rate_limiter(model)
+        reserved = limiter.acquire(_params_tokens(params)) if limiter else 0
+        output = None
+        try:
+            output = func(model, tokenizer, params, *args, **kwargs)
+            return output
+        finally:
+            if limiter:
+                limiter.settle(reserved, _output_usage(output))
+
+    return _generate
+
+
 def _is_async_function(
     func: Optional[
         Union[
@@ -425,6 +641,9 @@ def register_proxy_model_adapter(
     is_async_stream = _is_async_function(generate_stream_function)
     generate_function = client_cls.generate_function()
     is_async = _is_async_function(generate_function)
+    # Limit the requests to the provider
+    generate_stream_function = _with_rate_limit(generate_stream_function)
+    generate_function = _with_rate_limit(generate_function)
     param_cls = client_cls.param_class()
     provider = param_cls.get_type_value()
 
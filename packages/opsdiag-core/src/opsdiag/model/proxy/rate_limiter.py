@@ -0,0 +1,210 @@
+"""Client side rate limiting of the proxy models.
+
+The requests and the tokens sent to a provider are limited by token buckets shared
+by all the models of the provider. A request reserves its tokens first and waits
+until the buckets are refilled, so a burst of requests is queued locally instead of
+being rejected by the provider. The reserved tokens are estimated from the prompt
+and the max new tokens, and corrected by the usage of the response.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from opsdiag.util.string_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """A thread safe token bucket refilled continuously.
+
+    A reservation can take more tokens than available, the bucket goes into debt
+    and the next reservations wait longer, so the waiting requests are served in
+    order.
+
+    Args:
+        capacity (float): The max tokens of the bucket.
+        refill_per_second (float): The tokens added per second.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._last) * self.refill_per_second
+        )
+        self._last = now
+
+    def reserve(self, tokens: float) -> float:
+        """Reserve the tokens and get the seconds to wait before using them."""
+        # A request larger than the bucket would wait forever
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.refill_per_second
+
+    def refund(self, tokens: float):
+        """Give back the tokens, negative to take more tokens."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class ProxyRateLimiter:
+    """Limit the requests and the tokens per minute of a provider.
+
+    Args:
+        provider (str): The provider name.
+        requests_per_minute (Optional[int]): The max requests per minute, None for
+            no limit.
+        tokens_per_minute (Optional[int]): The max prompt and completion tokens per
+            minute, None for no limit.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        self.provider = provider
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = (
+            TokenBucket(requests_per_minute, requests_per_minute / 60)
+            if requests_per_minute
+            else None
+        )
+        self._tokens = (
+            TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+            if tokens_per_minute
+            else None
+        )
+
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self._requests:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens:
+            wait = max(wait, self._tokens.reserve(tokens))
+        if wait > 0:
+            logger.debug(
+                f"Rate limit of {self.provider}, wait {wait:.2f}s for {tokens} tokens"
+            )
+        return wait
+
+    def _cancel(self, tokens: int):
+        if self._requests:
+            self._requests.refund(1)
+        if self._tokens:
+            self._tokens.refund(min(tokens, self._tokens.capacity))
+
+    def acquire(self, tokens: int = 0) -> int:
+        """Wait for a request of the tokens, return the reserved tokens."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return tokens
+
+    async def aacquire(self, tokens: int = 0) -> int:
+        """Wait for a request of the tokens without blocking the loop."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # The request is not sent
+                self._cancel(tokens)
+                raise
+        return tokens
+
+    def settle(self, reserved: int, usage: Optional[Dict[str, Any]]):
+        """Correct the reserved tokens with the usage of the response."""
+        if not self._tokens or not usage:
+            return
+        used = usage.get("total_tokens")
+        if used is None:
+            prompt = usage.get("prompt_tokens")
+            completion = usage.get("completion_tokens")
+            if prompt is None or completion is None:
+                return
+            used = prompt + completion
+        reserved = min(reserved, self._tokens.capacity)
+        if used != reserved:
+            self._tokens.refund(reserved - used)
+
+
+def _message_text(message: Any) -> str:
+    if isinstance(message, str):
+        return message
+    if isinstance(message, dict):
+        content = message.get("content")
+    else:
+        content = getattr(message, "content", None)
+    if content is None:
+        return ""
+    return content if isinstance(content, str) else str(content)
+
+
+def estimate_request_tokens(
+    messages: Optional[List[Any]] = None,
+    prompt: Optional[str] = None,
+    max_new_tokens: Optional[int] = None,
+) -> int:
+    """Estimate the tokens of a request, the prompt and the max new tokens."""
+    if messages:
+        text = "\n".join(_message_text(m) for m in messages)
+    else:
+        text = prompt or ""
+    return estimate_tokens(text) + (max_new_tokens or 0)
+
+
+_limiters: Dict[str, ProxyRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_proxy_rate_limiter(
+    provider: str,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+) -> Optional[ProxyRateLimiter]:
+    """Get the rate limiter shared by the models of the provider.
+
+    The limits of the first model of the provider are used, None if the provider has
+    no limit.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            if not requests_per_minute and not tokens_per_minute:
+                return None
+            limiter = ProxyRateLimiter(provider, requests_per_minute, tokens_per_minute)
+            _limiters[provider] = limiter
+        elif (requests_per_minute, tokens_per_minute) not in (
+            (None, None),
+            (limiter.requests_per_minute, limiter.tokens_per_minute),
+        ):
+            logger.warning(
+                f"The rate limits of {provider} are already set to "
+                f"{limiter.requests_per_minute} requests and "
+                f"{limiter.tokens_per_minute} tokens per minute, ignore "
+                f"{requests_per_minute} requests and {tokens_per_minute} tokens"
+            )
+        return limiter
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from typing import Iterator
+
+import pytest
+
+from opsdiag.core import ModelOutput, ModelRequest
+
+from ..base import ProxyLLMClient, _with_rate_limit, get_proxy_executor
+from ..rate_limiter import (
+    ProxyRateLimiter,
+    TokenBucket,
+    estimate_request_tokens,
+    get_proxy_rate_limiter,
+)
+
+
+class _SyncClient(ProxyLLMClient):
+    @classmethod
+    def new_client(cls, model_params, default_executor=None):
+        return cls(model_names=["m"])
+
+    def sync_generate_stream(self, request, message_converter=None) -> Iterator:
+        for i in range(3):
+            yield ModelOutput(
+                text=f"{i} {threading.current_thread().name}", error_code=0
+            )
+
+
+class _AsyncClient(_SyncClient):
+    async def generate_stream(self, request, message_converter=None):
+        for i in range(3):
+            yield ModelOutput(text=str(i), error_code=0, usage={"total_tokens": 10})
+
+
+def _request() -> ModelRequest:
+    return ModelRequest.build_request("m", [{"role": "human", "content": "hello"}])
+
+
+def test_token_bucket():
+    bucket = TokenBucket(capacity=2, refill_per_second=10)
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(0.1, abs=0.01)
+    # The next request waits for the previous one
+    assert bucket.reserve(1) == pytest.approx(0.2, abs=0.01)
+    # Not more than the capacity
+    assert bucket.reserve(100) == pytest.approx(0.4, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_queue_burst():
+    limiter = ProxyRateLimiter("test", requests_per_minute=600)
+    # 10 requests per second after a burst of 600 requests
+    for _ in range(600):
+        await limiter.aacquire()
+    start = time.monotonic()
+    await asyncio.gather(*[limiter.aacquire() for _ in range(2)])
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_tokens_settle_and_cancel():
+    limiter = ProxyRateLimiter("test", tokens_per_minute=600)
+    reserved = await limiter.aacquire(500)
+    limiter.settle(reserved, {"prompt_tokens": 100, "completion_tokens": 50})
+    assert limiter._tokens.available == pytest.approx(450, abs=1)
+
+    await limiter.aacquire(450)
+    task = asyncio.create_task(limiter.aacquire(100))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert limiter._tokens.available == pytest.approx(0, abs=2)
+
+
+def test_shared_limiter():
+    assert get_proxy_rate_limiter("proxy/test_none") is None
+    limiter = get_proxy_rate_limiter("proxy/test_shared", 60, 1000)
+    assert get_proxy_rate_limiter("proxy/test_shared") is limiter
+    assert get_proxy_rate_limiter("proxy/test_shared", 10) is limiter
+    assert limiter.requests_per_minute == 60
+
+
+def test_limiter_per_api_base():
+    client, other = _AsyncClient(["m1"]), _AsyncClient(["m2"])
+    client.set_rate_limits(60, api_base="https://a.example.com/v1")
+    other.set_rate_limits(30, api_base="https://b.example.com/v1")
+    assert client.rate_limiter is not other.rate_limiter
+    assert other.rate_limiter.requests_per_minute == 30
+    same = _AsyncClient(["m3"])
+    same.set_rate_limits(60, api_base="https://a.example.com/v1")
+    assert same.rate_limiter is client.rate_limiter
+
+
+def test_executor_max_workers():
+    executor = get_proxy_executor("proxy/test_max_workers", 64)
+    assert executor._max_workers == 64
+    # Set by the first model of the provider
+    assert get_proxy_executor("proxy/test_max_workers", 8) is executor
+    assert get_proxy_executor("proxy/test_max_workers") is executor
+
+
+def test_estimate_request_tokens():
+    tokens = estimate_request_tokens([{"content": "a" * 40}], max_new_tokens=100)
+    assert tokens == 111
+    assert estimate_request_tokens(prompt="a" * 40) == 11
+
+
+@pytest.mark.asyncio
+async def test_generate_function_rate_limit():
+    calls = []
+
+    async def _generate_stream(model, tokenizer, params, device, context_len):
+        calls.append(params)
+        yield ModelOutput(text="a", error_code=0, usage={"total_tokens": 5})
+
+    limiter = ProxyRateLimiter("test", tokens_per_minute=1000)
+    model = SimpleNamespace(proxy_llm_client=SimpleNamespace(rate_limiter=limiter))
+    func = _with_rate_limit(_generate_stream)
+    assert func.__name__ == "_generate_stream"
+    params = {"prompt": "a" * 40, "max_new_tokens": 100}
+    outputs = [o async for o in func(model, None, params, "cpu", 1024)]
+    assert [o.text for o in outputs] == ["a"]
+    # 111 reserved, 5 used
+    assert limiter._tokens.available == pytest.approx(995, abs=1)
+
+    no_limit = SimpleNamespace(proxy_llm_client=SimpleNamespace(rate_limiter=None))
+    assert len([o async for o in func(no_limit, None, params, "cpu", 1024)]) == 1
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_shared_executor():
+    client, other = _SyncClient(["m1"]), _SyncClient(["m2"])
+    assert client.executor is other.executor
+    assert client.executor is get_proxy_executor(_SyncClient.provider())
+
+    outputs = [o.text async for o in client.generate_stream(_request())]
+    assert [o.split()[0] for o in outputs] == ["0", "1", "2"]
+    # Run in the threads of the provider
+    assert all("proxy_" in o for o in outputs)
+
+
+@pytest.mark.asyncio
+async def test_async_client():
+    client = _AsyncClient(["m"])
+    client.set_rate_limits(tokens_per_minute=1000)
+    assert client.rate_limiter is get_proxy_rate_limiter(_AsyncClient.provider())
+    output = await client.rate_limited_generate(_request())
+    assert output.text == "2"
+    assert client.rate_limiter._tokens.available == pytest.approx(990, abs=1)
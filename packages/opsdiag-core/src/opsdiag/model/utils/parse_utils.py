@@ -1,3 +1,4 @@
+import functools
 import json
 import re
 from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
@@ -5,6 +6,37 @@ from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 _DEFAULT_THINK_START_TOKEN = "<think>"
 _DEFAULT_THINK_END_TOKEN = "</think>"
 
+_DEFAULT_REASONING_PATTERNS = [
+    {"start": _DEFAULT_THINK_START_TOKEN, "end": _DEFAULT_THINK_END_TOKEN},
+    {"start": "<reasoning>", "end": "</reasoning>"},
+    {"start": "<思考>", "end": "</思考>"},
+]
+
+_DEFAULT_TOOL_CALL_PATTERNS = [
+    {"start": "<｜tool▁calls▁begin｜>", "end": "<｜tool▁calls▁end｜>"},
+    {"start": "<｜tool_calls_begin｜>", "end": "<｜tool_calls_end｜>"},
+    {"start": "<｜tool calls begin｜>", "end": "<｜tool calls end｜>"},
+    {"start": "<｜tool\\_calls\\_begin｜>", "end": "<｜tool\\_calls\\_end｜>"},
+    {"start": "<tool_calls>", "end": "</tool_calls>"},
+    {"start": "<tools>", "end": "</tools>"},
+]
+
+_DEFAULT_FUNCTION_REGEX = re.compile(
+    r'function\s*(?:name)?\s*[:=]?\s*["\']?([^"\'\n]+)["\']?\s*\n```(?:json)?\s*\n'  # noqa
+)
+_DEFAULT_CLOSE_REGEX = re.compile(r"```\s*")
+
+# The formats of the function calls in the tool calls text
+_FUNCTION_REGEX_PATTERNS = [
+    re.compile(r"<｜tool▁call▁begin｜>function<｜tool▁sep｜>([^\n]+)\n```json\n"),
+    re.compile(r"function\s*:\s*([^\n]+)\n```json\n"),
+    re.compile(r'function\s*name\s*=\s*"([^"]+)"\n```json\n'),
+]
+_CLOSE_REGEX_PATTERNS = [
+    re.compile(r"```\s*<｜tool▁call▁end｜>"),
+    _DEFAULT_CLOSE_REGEX,
+]
+
 
 class StreamingEvent(NamedTuple):
     """Streaming event type, representing various events in the streaming parsing
@@ -32,7 +64,8 @@ class ParsedChatMessage:
             "reasoning_pattern": None,
             "in_tool_call": False,
             "tool_call_pattern": None,
-            # No longer using buffers, output events directly
+            # The end of the last chunk which may be the beginning of a marker
+            "pending_text": "",
         }
 
 
@@ -52,12 +85,10 @@ def parse_json_tool_calls(
 
     # Use default regex if not provided
     if function_regex is None:
-        function_regex = re.compile(
-            r'function\s*(?:name)?\s*[:=]?\s*["\']?([^"\'\n]+)["\']?\s*\n```(?:json)?\s*\n'  # noqa
-        )
+        function_regex = _DEFAULT_FUNCTION_REGEX
 
     if close_regex is None:
-        close_regex = re.compile(r"```\s*")
+        close_regex = _DEFAULT_CLOSE_REGEX
 
     current_pos = 0
     remaining_text = tool_calls_text
@@ -97,235 +128,254 @@ def parse_json_tool_calls(
     return tool_calls
 
 
+def _parse_tool_calls_text(tool_calls_text: str) -> List[Dict[str, Any]]:
+    """Parse the tool calls with the first function call format which matches"""
+    for func_regex in _FUNCTION_REGEX_PATTERNS:
+        for close_regex in _CLOSE_REGEX_PATTERNS:
+            tool_calls = parse_json_tool_calls(
+                tool_calls_text, None, func_regex, close_regex
+            )
+            if tool_calls:
+                return tool_calls
+    return []
+
+
+class _TextBuffer:
+    """Append-only text, appending doesn't copy the text accumulated so far."""
+
+    __slots__ = ("_parts",)
+
+    def __init__(self):
+        self._parts: List[str] = []
+
+    def append(self, text: str):
+        if text:
+            self._parts.append(text)
+
+    def __str__(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def __contains__(self, text: str) -> bool:
+        return text in str(self)
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+
+class _MarkerMatcher:
+    """Find the first of some markers in a text received in chunks.
+
+    A suffix of the text which may be the beginning of a marker is not consumed, so
+    a marker split across two chunks is still found.
+    """
+
+    def __init__(self, markers: Tuple[str, ...]):
+        # Try the longest marker first at the same position
+        self._regex = re.compile(
+            "|".join(re.escape(m) for m in sorted(markers, key=len, reverse=True))
+        )
+        self._prefixes = {m[:i] for m in markers for i in range(1, len(m))}
+        self._max_prefix_len = max(len(m) for m in markers) - 1
+
+    def search(self, text: str, pos: int, is_last: bool) -> Tuple[int, Optional[str]]:
+        """Search the first marker in ``text[pos:]``.
+
+        Returns:
+            (index, marker) of the first marker, or (index, None) if there is no
+            marker, the text from index may be the beginning of a marker.
+        """
+        match = self._regex.search(text, pos)
+        if match:
+            marker = match.group()
+            if is_last or match.end() < len(text) or marker not in self._prefixes:
+                return match.start(), marker
+            # The beginning of a longer marker
+            return match.start(), None
+        if not is_last:
+            for size in range(min(self._max_prefix_len, len(text) - pos), 0, -1):
+                if text[-size:] in self._prefixes:
+                    return len(text) - size, None
+        return len(text), None
+
+
+_REASONING_START = "reasoning_start"
+_REASONING_END = "reasoning_end"
+_TOOL_CALL_START = "tool_call_start"
+_MARKER_EVENTS = {_REASONING_START, _REASONING_END, _TOOL_CALL_START, "tool_call_end"}
+
+
+class _StreamingParser:
+    """The precompiled markers of the reasoning and tool call patterns."""
+
+    def __init__(
+        self,
+        reasoning_markers: Tuple[Tuple[str, str], ...],
+        tool_call_markers: Tuple[Tuple[str, str], ...],
+        extract_tool_calls: bool,
+    ):
+        # The markers expected out of reasoning and tool calls, the first kind
+        # wins if a marker is used twice
+        self.markers: Dict[str, Tuple[str, int]] = {}
+        for i, (start, _) in enumerate(reasoning_markers):
+            self.markers.setdefault(start, (_REASONING_START, i))
+        if extract_tool_calls:
+            for i, (start, _) in enumerate(tool_call_markers):
+                self.markers.setdefault(start, (_TOOL_CALL_START, i))
+        # An end marker without its start marker
+        for i, (_, end) in enumerate(reasoning_markers):
+            self.markers.setdefault(end, (_REASONING_END, i))
+        self.matcher = _MarkerMatcher(tuple(self.markers)) if self.markers else None
+        self.end_matchers = {
+            end: _MarkerMatcher((end,))
+            for _, end in reasoning_markers + tool_call_markers
+        }
+
+
+@functools.lru_cache(maxsize=64)
+def _get_streaming_parser(
+    reasoning_markers: Tuple[Tuple[str, str], ...],
+    tool_call_markers: Tuple[Tuple[str, str], ...],
+    extract_tool_calls: bool,
+) -> _StreamingParser:
+    return _StreamingParser(reasoning_markers, tool_call_markers, extract_tool_calls)
+
+
+def _patterns_key(patterns: List[Dict[str, str]]) -> Tuple[Tuple[str, str], ...]:
+    return tuple((p["start"], p["end"]) for p in patterns)
+
+
 def process_streaming_chunk(
     chunk: str,
     msg: ParsedChatMessage,
     reasoning_patterns: List[Dict[str, str]],
     tool_call_patterns: List[Dict[str, str]],
     extract_tool_calls: bool = True,
+    is_last: bool = False,
 ) -> List[StreamingEvent]:
     """
     Process a single chunk of streaming message, return a list of parsed events
 
+    The markers may be split across chunks: the end of a chunk which may be the
+    beginning of a marker is kept in the state and parsed with the next chunk, so
+    every chunk is scanned only once.
+
     Parameters:
         chunk: Current received text block
         msg: ParsedChatMessage object to update
         reasoning_patterns: List of reasoning patterns
         tool_call_patterns: List of tool call patterns
         extract_tool_calls: Whether to extract tool calls
+        is_last: Whether it is the last chunk, the text kept for a possible marker
+            is output as it is
 
     Returns:
         List of events, each representing a parsed part of content
     """
+    # An empty marker can't be matched
+    reasoning_patterns = [p for p in reasoning_patterns if p["start"] and p["end"]]
+    tool_call_patterns = [p for p in tool_call_patterns if p["start"] and p["end"]]
+    parser = _get_streaming_parser(
+        _patterns_key(reasoning_patterns),
+        _patterns_key(tool_call_patterns),
+        extract_tool_calls,
+    )
     state = msg.streaming_state
-    events = []
-    remaining_chunk = chunk
+    events: List[StreamingEvent] = []
+    text = state.get("pending_text", "") + chunk
+    pos = 0
+
+    def _emit(event_type: str, content: str = ""):
+        # Don't output empty content
+        if content or event_type in _MARKER_EVENTS:
+            events.append(StreamingEvent(type=event_type, content=content))
 
-    while remaining_chunk:
+    while pos < len(text):
         # Currently in reasoning content
         if state["in_reasoning"]:
             end_marker = state["reasoning_pattern"]["end"]
-            if end_marker in remaining_chunk:
-                end_idx = remaining_chunk.find(end_marker)
-                # Output reasoning content event
-                # if end_idx > 0:
-                reasoning_part = remaining_chunk[:end_idx]
-                events.append(
-                    StreamingEvent(type="reasoning_content", content=reasoning_part)
-                )
-                # Append reasoning content instead of replacing
-                msg.reasoning_content += reasoning_part
-
-                # Output reasoning end event
-                events.append(StreamingEvent(type="reasoning_end", content=""))
-
-                # Reset reasoning state
-                state["in_reasoning"] = False
-                state["reasoning_pattern"] = None
-
-                # Process remaining content
-                remaining_chunk = remaining_chunk[end_idx + len(end_marker) :]
-            else:
-                # The entire chunk is reasoning content
-                events.append(
-                    StreamingEvent(type="reasoning_content", content=remaining_chunk)
-                )
-                # Similarly, append instead of replace
-                msg.reasoning_content += remaining_chunk
-                remaining_chunk = ""
+            idx, marker = parser.end_matchers[end_marker].search(text, pos, is_last)
+            reasoning_part = text[pos:idx]
+            _emit("reasoning_content", reasoning_part)
+            # Append reasoning content instead of replacing
+            msg.reasoning_content += reasoning_part
+            pos = idx
+            if marker is None:
+                break
+
+            # Output reasoning end event and reset reasoning state
+            _emit("reasoning_end")
+            state["in_reasoning"] = False
+            state["reasoning_pattern"] = None
+            pos += len(marker)
             continue
 
         # Currently in tool call
         if state["in_tool_call"] and extract_tool_calls:
             end_marker = state["tool_call_pattern"]["end"]
-            if end_marker in remaining_chunk:
-                end_idx = remaining_chunk.find(end_marker)
-                # Output tool call content event
-                if end_idx > 0:
-                    tool_call_part = remaining_chunk[:end_idx]
-                    events.append(
-                        StreamingEvent(type="tool_call_content", content=tool_call_part)
-                    )
-
-                # Store content before end marker temporarily for parsing
-                tool_call_text = (
-                    state.get("tool_call_text", "") + remaining_chunk[:end_idx]
-                )
-
-                # Try to parse tool call content
-                function_regex_patterns = [
-                    re.compile(
-                        r"<｜tool▁call▁begin｜>function<｜tool▁sep｜>([^\n]+)\n```json\n"
-                    ),
-                    re.compile(r"function\s*:\s*([^\n]+)\n```json\n"),
-                    re.compile(r'function\s*name\s*=\s*"([^"]+)"\n```json\n'),
-                ]
-
-                close_regex_patterns = [
-                    re.compile(r"```\s*<｜tool▁call▁end｜>"),
-                    re.compile(r"```\s*"),
-                ]
-
-                # Try to parse tool calls
-                for func_regex in function_regex_patterns:
-                    for close_regex in close_regex_patterns:
-                        tool_calls = parse_json_tool_calls(
-                            tool_call_text, None, func_regex, close_regex
-                        )
-                        if tool_calls:
-                            msg.tool_calls.extend(tool_calls)
-                            break
-                    if msg.tool_calls:
-                        break
-
-                # Output tool call end event
-                events.append(StreamingEvent(type="tool_call_end", content=""))
-
-                # Reset tool call state
-                state["in_tool_call"] = False
-                state["tool_call_pattern"] = None
-                state.pop("tool_call_text", None)
-
-                # Process remaining content
-                remaining_chunk = remaining_chunk[end_idx + len(end_marker) :]
-            else:
-                # The entire chunk is tool call content
-                events.append(
-                    StreamingEvent(type="tool_call_content", content=remaining_chunk)
-                )
-                # Accumulate tool call text for later parsing
-                state["tool_call_text"] = (
-                    state.get("tool_call_text", "") + remaining_chunk
-                )
-                remaining_chunk = ""
-            continue
-
-        # Check for reasoning end markers without matching start markers
-        # This is the special case to handle
-        found_end_marker = False
-        for pattern in reasoning_patterns:
-            start_marker = pattern["start"]
-            end_marker = pattern["end"]
-            if end_marker in remaining_chunk and not state["in_reasoning"]:
-                end_idx = remaining_chunk.find(end_marker)
-                start_idx = 0
-                if start_marker in remaining_chunk:
-                    start_idx = remaining_chunk.find(start_marker) + len(start_marker)
-
-                # This is content that should be treated as reasoning but didn't have a
-                # start tag
-                # if end_idx > 0:
-                reasoning_part = remaining_chunk[start_idx:end_idx]
-                # Clear regular content
-                reasoning_part = msg.content + reasoning_part
-                msg.content = ""
-
-                # First, emit a reasoning_start event
-                events.append(StreamingEvent(type="reasoning_start", content=""))
-
-                # Then emit the content as reasoning content
-                events.append(
-                    StreamingEvent(type="reasoning_content", content=reasoning_part)
-                )
-
-                # Add to reasoning content
-                msg.reasoning_content += reasoning_part
-
-                # Emit the reasoning_end event
-                events.append(StreamingEvent(type="reasoning_end", content=""))
-                # Move past the end marker
-                remaining_chunk = remaining_chunk[end_idx + len(end_marker) :]
-                found_end_marker = True
-                state["reasoning_pattern"] = None
-                break
-
-        # If we found an end marker, continue to the next iteration
-        if found_end_marker:
-            continue
-
-        # Check for reasoning start markers
-        reasoning_start_found = False
-        for pattern in reasoning_patterns:
-            start_marker = pattern["start"]
-            if start_marker in remaining_chunk:
-                start_idx = remaining_chunk.find(start_marker)
-
-                # Output regular content before the marker
-                # if start_idx > 0:
-                content_part = remaining_chunk[:start_idx]
-                events.append(StreamingEvent(type="content", content=content_part))
-                msg.content += content_part
-
-                # Output reasoning start event
-                events.append(StreamingEvent(type="reasoning_start", content=""))
-
-                # Set reasoning state
-                state["in_reasoning"] = True
-                state["reasoning_pattern"] = pattern
-
-                # Process content after the marker
-                remaining_chunk = remaining_chunk[start_idx + len(start_marker) :]
-                reasoning_start_found = True
+            idx, marker = parser.end_matchers[end_marker].search(text, pos, is_last)
+            tool_call_part = text[pos:idx]
+            _emit("tool_call_content", tool_call_part)
+            # Accumulate tool call text for later parsing
+            tool_call_text = state.setdefault("tool_call_text", _TextBuffer())
+            tool_call_text.append(tool_call_part)
+            pos = idx
+            if marker is None:
                 break
 
-        if reasoning_start_found:
+            # Try to parse tool call content
+            msg.tool_calls.extend(_parse_tool_calls_text(str(tool_call_text)))
+            # Output tool call end event and reset tool call state
+            _emit("tool_call_end")
+            state["in_tool_call"] = False
+            state["tool_call_pattern"] = None
+            state.pop("tool_call_text", None)
+            pos += len(marker)
             continue
 
-        # Check for tool call start markers
-        tool_call_start_found = False
-        if extract_tool_calls:
-            for pattern in tool_call_patterns:
-                start_marker = pattern["start"]
-                if start_marker in remaining_chunk:
-                    start_idx = remaining_chunk.find(start_marker)
-
-                    # Output regular content before the marker
-                    # if start_idx > 0:
-                    content_part = remaining_chunk[:start_idx]
-                    events.append(StreamingEvent(type="content", content=content_part))
-                    msg.content += content_part
-
-                    # Output tool call start event
-                    events.append(StreamingEvent(type="tool_call_start", content=""))
-
-                    # Set tool call state
-                    state["in_tool_call"] = True
-                    state["tool_call_pattern"] = pattern
-                    state["tool_call_text"] = ""
-
-                    # Process content after the marker
-                    remaining_chunk = remaining_chunk[start_idx + len(start_marker) :]
-                    tool_call_start_found = True
-                    break
-
-        if tool_call_start_found:
+        if parser.matcher is None:
+            idx, marker = len(text), None
+        else:
+            idx, marker = parser.matcher.search(text, pos, is_last)
+        part = text[pos:idx]
+        pos = idx
+        kind, pattern_idx = parser.markers[marker] if marker else (None, -1)
+
+        if kind == _REASONING_END:
+            # Reasoning end marker without matching start marker, the content so
+            # far should be treated as reasoning
+            reasoning_part = msg.content + part
+            msg.content = ""
+            _emit("reasoning_start")
+            _emit("reasoning_content", reasoning_part)
+            msg.reasoning_content += reasoning_part
+            _emit("reasoning_end")
+            state["reasoning_pattern"] = None
+            pos += len(marker)
             continue
 
-        # If no special markers, current chunk is regular content
-        events.append(StreamingEvent(type="content", content=remaining_chunk))
-        msg.content += remaining_chunk
-        remaining_chunk = ""
+        # Output regular content before the marker
+        _emit("content", part)
+        msg.content += part
+        if marker is None:
+            break
 
+        if kind == _REASONING_START:
+            # Output reasoning start event and set reasoning state
+            _emit("reasoning_start")
+            state["in_reasoning"] = True
+            state["reasoning_pattern"] = reasoning_patterns[pattern_idx]
+        else:
+            # Output tool call start event and set tool call state
+            _emit("tool_call_start")
+            state["in_tool_call"] = True
+            state["tool_call_pattern"] = tool_call_patterns[pattern_idx]
+            state["tool_call_text"] = _TextBuffer()
+        pos += len(marker)
+
+    # It may be the beginning of a marker
+    state["pending_text"] = text[pos:]
     return events
 
 
@@ -337,6 +387,7 @@ def parse_chat_message(
     reasoning_patterns: Optional[List[Dict[str, str]]] = None,
     tool_call_patterns: Optional[List[Dict[str, str]]] = None,
     streaming_state: Optional[ParsedChatMessage] = None,
+    is_last_chunk: bool = False,
 ) -> Union[ParsedChatMessage, Tuple[ParsedChatMessage, List[StreamingEvent]]]:
     """
     Universal chat message parsing function
@@ -352,6 +403,7 @@ def parse_chat_message(
             dictionary containing start and end markers
         streaming_state: State object passed in when processing streaming messages,
             used to track progress
+        is_last_chunk: Whether it is the last chunk of a streaming message
 
     Returns:
         If is_streaming=False, returns the parsed ParsedChatMessage object
@@ -360,22 +412,11 @@ def parse_chat_message(
     """
     # Default reasoning patterns
     if reasoning_patterns is None:
-        reasoning_patterns = [
-            {"start": _DEFAULT_THINK_START_TOKEN, "end": _DEFAULT_THINK_END_TOKEN},
-            {"start": "<reasoning>", "end": "</reasoning>"},
-            {"start": "<思考>", "end": "</思考>"},
-        ]
+        reasoning_patterns = _DEFAULT_REASONING_PATTERNS
 
     # Default tool call patterns
     if tool_call_patterns is None:
-        tool_call_patterns = [
-            {"start": "<｜tool▁calls▁begin｜>", "end": "<｜tool▁calls▁end｜>"},
-            {"start": "<｜tool_calls_begin｜>", "end": "<｜tool_calls_end｜>"},
-            {"start": "<｜tool calls begin｜>", "end": "<｜tool calls end｜>"},
-            {"start": "<｜tool\\_calls\\_begin｜>", "end": "<｜tool\\_calls\\_end｜>"},
-            {"start": "<tool_calls>", "end": "</tool_calls>"},
-            {"start": "<tools>", "end": "</tools>"},
-        ]
+        tool_call_patterns = _DEFAULT_TOOL_CALL_PATTERNS
 
     # Streaming processing mode
     if is_streaming:
@@ -384,7 +425,12 @@ def parse_chat_message(
 
         # Process current text block and get events
         events = process_streaming_chunk(
-            input_text, msg, reasoning_patterns, tool_call_patterns, extract_tool_calls
+            input_text,
+            msg,
+            reasoning_patterns,
+            tool_call_patterns,
+            extract_tool_calls,
+            is_last=is_last_chunk,
         )
 
         return msg, events
@@ -472,30 +518,8 @@ def parse_chat_message(
                     break
 
         # Process function calls
-        function_regex_patterns = [
-            re.compile(
-                r"<｜tool▁call▁begin｜>function<｜tool▁sep｜>([^\n]+)\n```json\n"
-            ),
-            re.compile(r"function\s*:\s*([^\n]+)\n```json\n"),
-            re.compile(r'function\s*name\s*=\s*"([^"]+)"\n```json\n'),
-        ]
-
-        close_regex_patterns = [
-            re.compile(r"```\s*<｜tool▁call▁end｜>"),
-            re.compile(r"```\s*"),
-        ]
-
         if tool_calls_text:
-            for func_regex in function_regex_patterns:
-                for close_regex in close_regex_patterns:
-                    tool_calls = parse_json_tool_calls(
-                        tool_calls_text, None, func_regex, close_regex
-                    )
-                    if tool_calls:
-                        msg.tool_calls = tool_calls
-                        break
-                if msg.tool_calls:
-                    break
+            msg.tool_calls = _parse_tool_calls_text(tool_calls_text)
 
     # Set final content
     msg.content = string_strip(content)
@@ -1,3 +1,5 @@
+import pytest
+
 from ..parse_utils import parse_chat_message
 
 
@@ -729,3 +731,97 @@ def test_chinese_pattern_missing_start():
 #
 #     # In streaming mode, reasoning_engine content should match the expected format
 #     assert "Reasoning content 1Reasoning content 2" == msg.reasoning_content
+
+
+# Cross-chunk tests: the result must not depend on where the stream is split
+_SPLIT_FIXTURES = [
+    (
+        "Start<think>I need to analyze</think>Middle<｜tool▁calls▁begin｜>"
+        "<｜tool▁call▁begin｜>function<｜tool▁sep｜>search\n```json\n"
+        '{"query": "天气"}\n```<｜tool▁call▁end｜><｜tool▁calls▁end｜>End<',
+        "StartMiddleEnd<",
+        "I need to analyze",
+        [{"name": "search", "arguments": {"query": "天气"}}],
+    ),
+    (
+        "Reasoning without start.</think>Answer <thin and <思考>思考</思考>done",
+        "Answer <thin and done",
+        "Reasoning without start.思考",
+        [],
+    ),
+    (
+        "<tools>function: a\n```json\n{}\n```\nfunction: b\n```json\n[1]\n```"
+        '</tools><tools>function: c\n```json\n{"x": 1}\n```</tools></tools',
+        "</tools",
+        "",
+        [
+            {"name": "a", "arguments": {}},
+            {"name": "b", "arguments": [1]},
+            {"name": "c", "arguments": {"x": 1}},
+        ],
+    ),
+]
+
+
+def _stream(chunks):
+    msg, all_events = None, []
+    for i, chunk in enumerate(chunks):
+        msg, events = parse_chat_message(
+            chunk,
+            is_streaming=True,
+            streaming_state=msg,
+            extract_tool_calls=True,
+            is_last_chunk=i == len(chunks) - 1,
+        )
+        all_events.extend(events)
+    # Merge the adjacent content events of the same type
+    merged = []
+    for event in all_events:
+        if merged and event.content and merged[-1].type == event.type:
+            merged[-1] = merged[-1]._replace(content=merged[-1].content + event.content)
+        else:
+            merged.append(event)
+    return msg, merged
+
+
+@pytest.mark.parametrize("text, content, reasoning, tool_calls", _SPLIT_FIXTURES)
+def test_streaming_split_at_every_offset(text, content, reasoning, tool_calls):
+    """Split the stream at every offset, the markers are split across chunks"""
+    expected_msg, expected_events = _stream([text])
+    assert content == expected_msg.content
+    assert reasoning == expected_msg.reasoning_content
+    assert tool_calls == expected_msg.tool_calls
+
+    splits = [[text[:i], text[i:]] for i in range(len(text) + 1)]
+    splits.append(list(text))
+    splits.append([text[i : i + 3] for i in range(0, len(text), 3)] + [""])
+    for chunks in splits:
+        msg, events = _stream(chunks)
+        assert content == msg.content, chunks
+        assert reasoning == msg.reasoning_content, chunks
+        assert tool_calls == msg.tool_calls, chunks
+        if "</think>Answer" not in text:
+            assert expected_events == events, chunks
+
+
+def test_streaming_end_marker_split_across_chunks():
+    chunks = ["<think>abc</th", "ink>def"]
+    msg, events = _stream(chunks)
+    assert "def" == msg.content
+    assert "abc" == msg.reasoning_content
+    assert [e.type for e in events] == [
+        "reasoning_start",
+        "reasoning_content",
+        "reasoning_end",
+        "content",
+    ]
+
+
+def test_streaming_long_tool_call():
+    """The tool call text is accumulated without copying it on every chunk"""
+    chunks = ["<tools>function: f\n```json\n["]
+    chunks += ["1, " for _ in range(20000)]
+    chunks += ["1]\n```</tools>"]
+    msg, events = _stream(chunks)
+    assert 20001 == len(msg.tool_calls[0]["arguments"])
+    assert "tool_call_end" == events[-1].type
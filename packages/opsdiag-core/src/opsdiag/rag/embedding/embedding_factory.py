@@ -34,6 +34,12 @@ class EmbeddingFactory(BaseComponent, ABC):
             Embeddings: The embedding instance.
         """
 
+    async def async_before_stop(self):
+        """Close the pooled HTTP sessions of the remote embeddings."""
+        from .embeddings import close_async_sessions
+
+        await close_async_sessions()
+
 
 class RerankEmbeddingFactory(BaseComponent, ABC):
     """Class for RerankEmbeddingFactory."""
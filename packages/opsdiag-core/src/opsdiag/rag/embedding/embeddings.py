@@ -1,7 +1,14 @@
 """Embedding implementations."""
 
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Dict, List, Optional, Tuple, Type
+from urllib.parse import urlparse
 
 import aiohttp
 import requests
@@ -16,8 +23,11 @@ from opsdiag.model.adapter.embed_metadata import (
     EMBED_COMMON_HF_JINA_MODELS,
 )
 from opsdiag.util.i18n_utils import _
+from opsdiag.util.string_utils import estimate_tokens
 from opsdiag.util.tracer import DERISK_TRACER_SPAN_ID, root_tracer
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
 DEFAULT_INSTRUCT_MODEL = "hkunlp/instructor-large"
 DEFAULT_BGE_MODEL = "BAAI/bge-large-en"
@@ -637,7 +647,10 @@ def _handle_request_result(res: requests.Response) -> List[List[float]]:
         RuntimeError: If the response is not successful.
     """
     res.raise_for_status()
-    resp = res.json()
+    return _parse_embeddings_result(res.json())
+
+
+def _parse_embeddings_result(resp: Dict[str, Any]) -> List[List[float]]:
     if "data" not in resp:
         raise RuntimeError(resp["detail"])
     embeddings = resp["data"]
@@ -647,6 +660,73 @@ def _handle_request_result(res: requests.Response) -> List[List[float]]:
     return [result["embedding"] for result in sorted_embeddings]
 
 
+# The connections kept for each endpoint, shared by all the OpenAPIEmbeddings
+_POOL_MAXSIZE = 32
+_RETRY_BACKOFF_SECONDS = 0.5
+_pool_lock = threading.Lock()
+_sync_sessions: Dict[str, requests.Session] = {}
+# The aiohttp sessions are bound to their event loop: loop -> endpoint -> session
+_async_sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _endpoint(api_url: str) -> str:
+    parsed = urlparse(api_url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _shared_session(api_url: str) -> requests.Session:
+    """The pooled session of the endpoint of the url."""
+    key = _endpoint(api_url)
+    with _pool_lock:
+        session = _sync_sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=_POOL_MAXSIZE
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sync_sessions[key] = session
+        return session
+
+
+def _shared_async_session(api_url: str) -> aiohttp.ClientSession:
+    """The pooled aiohttp session of the endpoint in the running event loop."""
+    loop = asyncio.get_running_loop()
+    key = _endpoint(api_url)
+    with _pool_lock:
+        sessions = _async_sessions.setdefault(loop, {})
+        session = sessions.get(key)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=_POOL_MAXSIZE)
+            )
+            sessions[key] = session
+        return session
+
+
+async def close_async_sessions():
+    """Close the pooled aiohttp sessions of the running event loop."""
+    with _pool_lock:
+        sessions = _async_sessions.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+
+def _is_retryable(e: Exception) -> bool:
+    """Retry the connection errors, the timeouts and the 429 and 5xx responses."""
+    status = None
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        status = e.response.status_code
+    elif isinstance(e, aiohttp.ClientResponseError):
+        status = e.status
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(
+        e, (requests.ConnectionError, requests.Timeout, aiohttp.ClientError)
+    ) or isinstance(e, asyncio.TimeoutError)
+
+
 @dataclass
 class OpenAPIEmbeddingDeployModelParameters(EmbeddingDeployModelParameters):
     """OpenAPI embedding deploy model parameters."""
@@ -688,6 +768,30 @@ class OpenAPIEmbeddingDeployModelParameters(EmbeddingDeployModelParameters):
             "help": _("embedding text limit."),
         },
     )
+    batch_size: int = field(
+        default=64,
+        metadata={
+            "help": _("The max number of texts in a request."),
+        },
+    )
+    max_batch_tokens: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": _("The max number of (estimated) tokens in a request."),
+        },
+    )
+    concurrency: int = field(
+        default=4,
+        metadata={
+            "help": _("The max number of requests sent in parallel."),
+        },
+    )
+    max_retries: int = field(
+        default=2,
+        metadata={
+            "help": _("The max number of retries of a failed request."),
+        },
+    )
 
     @property
     def real_provider_model_name(self) -> str:
@@ -820,26 +924,40 @@ class OpenAPIEmbeddings(BaseModel, Embeddings):
         default=None,
         description="The maximum length of the text to be embedding.",
     )
+    batch_size: int = Field(
+        default=64, description="The max number of texts in a request."
+    )
+    max_batch_tokens: Optional[int] = Field(
+        default=None,
+        description="The max number of (estimated) tokens in a request.",
+    )
+    concurrency: int = Field(
+        default=4, description="The max number of requests sent in parallel."
+    )
+    max_retries: int = Field(
+        default=2, description="The max number of retries of a failed request."
+    )
 
     def __init__(self, **kwargs):
-        """Initialize the OpenAPIEmbeddings."""
-        try:
-            import requests
-        except ImportError:
-            raise ValueError(
-                "The requests python package is not installed. "
-                "Please install it with `pip install requests`"
-            )
+        """Initialize the OpenAPIEmbeddings.
+
+        The requests share a pooled session of the endpoint unless a session is
+        passed.
+        """
         if "session" not in kwargs:  # noqa: SIM401
-            session = requests.Session()
+            session = _shared_session(kwargs.get("api_url", self._default_api_url()))
         else:
             session = kwargs["session"]
-        api_key = kwargs.get("api_key")
-        if api_key:
-            session.headers.update({"Authorization": f"Bearer {api_key}"})
+            api_key = kwargs.get("api_key")
+            if api_key:
+                session.headers.update({"Authorization": f"Bearer {api_key}"})
         kwargs["session"] = session
         super().__init__(**kwargs)
 
+    @classmethod
+    def _default_api_url(cls) -> str:
+        return cls.model_fields["api_url"].default
+
     @classmethod
     def param_class(cls) -> Type[OpenAPIEmbeddingDeployModelParameters]:
         return OpenAPIEmbeddingDeployModelParameters
@@ -855,12 +973,103 @@ class OpenAPIEmbeddings(BaseModel, Embeddings):
             model_name=parameters.real_provider_model_name,
             timeout=parameters.timeout,
             text_limit=parameters.text_limit,
-
+            batch_size=parameters.batch_size,
+            max_batch_tokens=parameters.max_batch_tokens,
+            concurrency=parameters.concurrency,
+            max_retries=parameters.max_retries,
         )
 
+    def _headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        current_span_id = root_tracer.get_current_span_id()
+        if self.pass_trace_id and current_span_id:
+            # Set the trace ID if available
+            headers[DERISK_TRACER_SPAN_ID] = current_span_id
+        return headers
+
+    def _split_batches(self, texts: List[str]) -> List[Tuple[int, List[str]]]:
+        """Split the texts by the batch size and the token budget.
+
+        Returns:
+            List[Tuple[int, List[str]]]: The index of the first text and the texts
+                of each batch, a text larger than the budget is a batch by itself.
+        """
+        batches: List[Tuple[int, List[str]]] = []
+        start, tokens = 0, 0
+        for i, text in enumerate(texts):
+            text_tokens = estimate_tokens(text) if self.max_batch_tokens else 0
+            if i > start and (
+                i - start >= self.batch_size
+                or (
+                    self.max_batch_tokens
+                    and tokens + text_tokens > self.max_batch_tokens
+                )
+            ):
+                batches.append((start, texts[start:i]))
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            batches.append((start, texts[start:]))
+        return batches
+
+    def _check_batch(self, batch: List[str], embeddings: List[List[float]]):
+        if len(embeddings) != len(batch):
+            raise RuntimeError(
+                f"Got {len(embeddings)} embeddings for {len(batch)} texts"
+            )
+
+    def _embed_batch(self, batch: List[str], headers: Dict[str, str]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                res = self.session.post(  # type: ignore
+                    self.api_url,
+                    json={"input": batch, "model": self.model_name},
+                    timeout=self.timeout,
+                    headers=headers,
+                )
+                embeddings = _handle_request_result(res)
+                self._check_batch(batch, embeddings)
+                return embeddings
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                logger.warning(
+                    f"Embed a batch of {len(batch)} texts failed, retry "
+                    f"{attempt + 1}/{self.max_retries}: {e}"
+                )
+                time.sleep(_RETRY_BACKOFF_SECONDS * 2**attempt)
+
+    async def _aembed_batch(self, batch: List[str], headers: Dict[str, str]):
+        session = _shared_async_session(self.api_url)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with session.post(
+                    self.api_url,
+                    json={"input": batch, "model": self.model_name},
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                ) as resp:
+                    resp.raise_for_status()
+                    embeddings = _parse_embeddings_result(await resp.json())
+                self._check_batch(batch, embeddings)
+                return embeddings
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                logger.warning(
+                    f"Embed a batch of {len(batch)} texts failed, retry "
+                    f"{attempt + 1}/{self.max_retries}: {e}"
+                )
+                await asyncio.sleep(_RETRY_BACKOFF_SECONDS * 2**attempt)
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Get the embeddings for a list of texts.
 
+        The texts are split into batches, at most ``concurrency`` batches are sent
+        at the same time and a failed batch is retried by itself.
+
         Args:
             texts (Documents): A list of texts to get embeddings for.
 
@@ -869,18 +1078,20 @@ class OpenAPIEmbeddings(BaseModel, Embeddings):
                 corresponds to a single input text.
         """
         # Call OpenAI Embedding API
-        headers = {}
-        current_span_id = root_tracer.get_current_span_id()
-        if self.pass_trace_id and current_span_id:
-            # Set the trace ID if available
-            headers[DERISK_TRACER_SPAN_ID] = current_span_id
-        res = self.session.post(  # type: ignore
-            self.api_url,
-            json={"input": texts, "model": self.model_name},
-            timeout=self.timeout,
-            headers=headers,
-        )
-        return _handle_request_result(res)
+        headers = self._headers()
+        batches = self._split_batches(texts)
+        if len(batches) <= 1 or self.concurrency <= 1:
+            results = [self._embed_batch(batch, headers) for _, batch in batches]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.concurrency, len(batches))
+            ) as executor:
+                results = list(
+                    executor.map(
+                        lambda item: self._embed_batch(item[1], headers), batches
+                    )
+                )
+        return [embedding for result in results for embedding in result]
 
     def embed_query(self, text: str) -> List[float]:
         """Compute query embeddings using a OpenAPI embedding model.
@@ -903,24 +1114,24 @@ class OpenAPIEmbeddings(BaseModel, Embeddings):
             List[List[float]]: Embedded texts as List[List[float]], where each inner
                 List[float] corresponds to a single input text.
         """
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        current_span_id = root_tracer.get_current_span_id()
-        if self.pass_trace_id and current_span_id:
-            # Set the trace ID if available
-            headers[DERISK_TRACER_SPAN_ID] = current_span_id
-        async with aiohttp.ClientSession(
-            headers=headers, timeout=aiohttp.ClientTimeout(total=self.timeout)
-        ) as session:
-            async with session.post(
-                self.api_url, json={"input": texts, "model": self.model_name}
-            ) as resp:
-                resp.raise_for_status()
-                data = await resp.json()
-                if "data" not in data:
-                    raise RuntimeError(data["detail"])
-                embeddings = data["data"]
-                sorted_embeddings = sorted(embeddings, key=lambda e: e["index"])
-                return [result["embedding"] for result in sorted_embeddings]
+        headers = self._headers()
+        semaphore = asyncio.Semaphore(max(self.concurrency, 1))
+
+        async def _embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._aembed_batch(batch, headers)
+
+        tasks = [
+            asyncio.create_task(_embed(batch))
+            for _, batch in self._split_batches(texts)
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return [embedding for result in results for embedding in result]
 
     async def aembed_query(self, text: str) -> List[float]:
         """Asynchronous Embed query text."""
@@ -2,7 +2,7 @@
 
 import os
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Type, cast
+from typing import Any, Dict, List, Optional, Tuple, Type, cast
 
 import aiohttp
 import numpy as np
@@ -151,11 +151,23 @@ class CrossEncoderRerankEmbeddings(BaseModel, RerankEmbeddings):
         Returns:
             List[float]: The rank scores of the candidates.
         """
+        return self.predict_pairs([(query, candidate) for candidate in candidates])
+
+    def predict_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Predict the rank scores of the (query, candidate) pairs in one batch.
+
+        Args:
+            pairs: The pairs, they may have different queries.
+
+        Returns:
+            List[float]: The rank scores of the pairs.
+        """
         from sentence_transformers import CrossEncoder
 
-        query_content_pairs = [[query, candidate] for candidate in candidates]
+        if not pairs:
+            return []
         _model = cast(CrossEncoder, self.client)
-        rank_scores = _model.predict(sentences=query_content_pairs)
+        rank_scores = _model.predict(sentences=[list(pair) for pair in pairs])
         if isinstance(rank_scores, np.ndarray):
             rank_scores = rank_scores.tolist()
         return rank_scores  # type: ignore
@@ -0,0 +1,222 @@
+"""Cached and batched rerank scoring.
+
+The scores of the (query, candidate) pairs are cached by the model, the query and
+the hash of the candidate, so a repeated rerank only scores the new candidates. The
+pairs of the concurrent requests are merged into batches by an
+:class:`EmbeddingBatcher`, after the candidates are truncated to the max length of
+the model, so a long candidate doesn't make the whole batch slow.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+from opsdiag.core import RerankEmbeddings
+from opsdiag.model.cluster.worker.embedding_batcher import EmbeddingBatcher
+from opsdiag.util.executor_utils import blocking_func_to_async_no_executor
+from opsdiag.util.string_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Score the (query, candidate) pairs, the pairs may have different queries
+PairScorer = Callable[[List[Tuple[str, str]]], List[float]]
+ScoreKey = Tuple[str, str, str]
+
+
+def pair_scorer(model: RerankEmbeddings) -> PairScorer:
+    """Get the pair scorer of a rerank model.
+
+    The models without ``predict_pairs`` are called once per query of the pairs.
+    """
+    predict_pairs = getattr(model, "predict_pairs", None)
+    if predict_pairs is not None:
+        return predict_pairs
+
+    def _score(pairs: List[Tuple[str, str]]) -> List[float]:
+        groups: Dict[str, List[int]] = {}
+        for i, (query, _) in enumerate(pairs):
+            groups.setdefault(query, []).append(i)
+        scores: List[float] = [0.0] * len(pairs)
+        for query, indices in groups.items():
+            group_scores = model.predict(query, [pairs[i][1] for i in indices])
+            for i, score in zip(indices, group_scores):
+                scores[i] = float(score)
+        return scores
+
+    return _score
+
+
+class RerankService:
+    """Score the candidates of the queries with a cache and dynamic batching.
+
+    Args:
+        score_pairs (PairScorer): Score a batch of (query, candidate) pairs.
+        model_name (str): The model name, a part of the cache key.
+        max_length (Optional[int]): The max tokens of a pair, the longer candidates
+            are truncated. None for no truncation.
+        cache_size (int): The max number of cached scores, 0 to disable the cache.
+        max_batch_size (int): The max number of pairs in a batch, 1 to disable the
+            dynamic batching.
+        max_batch_tokens (int): The max number of estimated tokens in a batch.
+        max_wait_ms (float): The max time to wait for more requests after the first
+            request of a batch.
+        token_counter (Callable[[str], int]): Count the tokens of a text.
+    """
+
+    def __init__(
+        self,
+        score_pairs: PairScorer,
+        model_name: str,
+        max_length: Optional[int] = None,
+        cache_size: int = 10000,
+        max_batch_size: int = 32,
+        max_batch_tokens: int = 16384,
+        max_wait_ms: float = 5,
+        token_counter: Callable[[str], int] = estimate_tokens,
+    ):
+        self._score_pairs = score_pairs
+        self.model_name = model_name
+        self.max_length = max_length
+        self._token_counter = token_counter
+        self._cache: Optional[LRUCache] = (
+            LRUCache(maxsize=cache_size) if cache_size > 0 else None
+        )
+        self._lock = threading.Lock()
+        self._batcher: Optional[EmbeddingBatcher] = None
+        if max_batch_size > 1:
+            # The batcher only concatenates the items and counts their tokens, the
+            # items are the pairs here
+            self._batcher = EmbeddingBatcher(
+                self._score_pairs,
+                max_batch_size=max_batch_size,
+                max_batch_tokens=max_batch_tokens,
+                max_wait_ms=max_wait_ms,
+                token_counter=self._pair_tokens,
+                name=f"{model_name}-rerank",
+            )
+
+        # statistics
+        self.hit_count = 0
+        self.miss_count = 0
+
+    @classmethod
+    def from_rerank_embeddings(
+        cls, model: RerankEmbeddings, model_name: str, **kwargs
+    ) -> "RerankService":
+        """Create a service of a rerank model."""
+        return cls(pair_scorer(model), model_name, **kwargs)
+
+    def _pair_tokens(self, pair: Tuple[str, str]) -> int:
+        return self._token_counter(pair[0]) + self._token_counter(pair[1])
+
+    def truncate(self, query: str, candidate: str) -> str:
+        """Truncate the candidate to fit the pair in the max length."""
+        if not self.max_length:
+            return candidate
+        budget = max(self.max_length - self._token_counter(query), 1)
+        tokens = self._token_counter(candidate)
+        if tokens <= budget:
+            return candidate
+        # Cut by the ratio of the tokens first, then shrink until it fits
+        end = max(int(len(candidate) * budget / tokens), 1)
+        while end > 1 and self._token_counter(candidate[:end]) > budget:
+            end = int(end * 0.9)
+        return candidate[:end]
+
+    def _key(self, query: str, candidate: str) -> ScoreKey:
+        digest = hashlib.blake2b(candidate.encode("utf-8"), digest_size=16)
+        return self.model_name, query, digest.hexdigest()
+
+    def _lookup(
+        self, query: str, candidates: List[str]
+    ) -> Tuple[List[Optional[float]], List[ScoreKey], Dict[ScoreKey, str]]:
+        """Get the cached scores and the candidates to score, without duplicates."""
+        keys = [self._key(query, candidate) for candidate in candidates]
+        scores: List[Optional[float]] = [None] * len(candidates)
+        missing: Dict[ScoreKey, str] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                score = self._cache.get(key) if self._cache is not None else None
+                if score is not None:
+                    scores[i] = score
+                    self.hit_count += 1
+                elif key not in missing:
+                    missing[key] = candidates[i]
+                    self.miss_count += 1
+        return scores, keys, missing
+
+    def _merge(
+        self,
+        scores: List[Optional[float]],
+        keys: List[ScoreKey],
+        missing: Dict[ScoreKey, str],
+        new_scores: List[float],
+    ) -> List[float]:
+        if len(new_scores) != len(missing):
+            raise ValueError(
+                f"Got {len(new_scores)} scores for {len(missing)} candidates"
+            )
+        scored = {key: float(score) for key, score in zip(missing, new_scores)}
+        if self._cache is not None:
+            with self._lock:
+                self._cache.update(scored)
+        return [
+            score if score is not None else scored[key]
+            for score, key in zip(scores, keys)
+        ]
+
+    def _pairs(self, query: str, missing: Dict[ScoreKey, str]):
+        return [(query, self.truncate(query, c)) for c in missing.values()]
+
+    def predict(self, query: str, candidates: List[str]) -> List[float]:
+        """Predict the rank scores of the candidates."""
+        scores, keys, missing = self._lookup(query, candidates)
+        if not missing:
+            return scores  # type: ignore
+        pairs = self._pairs(query, missing)
+        if self._batcher:
+            new_scores = self._batcher.submit(pairs).result()
+        else:
+            new_scores = self._score_pairs(pairs)
+        return self._merge(scores, keys, missing, new_scores)
+
+    async def apredict(self, query: str, candidates: List[str]) -> List[float]:
+        """Predict the rank scores of the candidates without blocking the loop."""
+        scores, keys, missing = self._lookup(query, candidates)
+        if not missing:
+            return scores  # type: ignore
+        pairs = self._pairs(query, missing)
+        if self._batcher:
+            new_scores = await asyncio.wrap_future(self._batcher.submit(pairs))
+        else:
+            new_scores = await blocking_func_to_async_no_executor(
+                self._score_pairs, pairs
+            )
+        return self._merge(scores, keys, missing, new_scores)
+
+    def stats(self) -> Dict[str, float]:
+        """The cache hit rate and the average batch size."""
+        total = self.hit_count + self.miss_count
+        return {
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "hit_rate": self.hit_count / total if total else 0.0,
+            "average_batch_size": (
+                self._batcher.average_batch_size if self._batcher else 1.0
+            ),
+        }
+
+    def clear_cache(self):
+        if self._cache is not None:
+            with self._lock:
+                self._cache.clear()
+
+    def stop(self):
+        """Stop the batcher, the queued requests are still scored."""
+        if self._batcher:
+            self._batcher.stop()
+            self._batcher = None
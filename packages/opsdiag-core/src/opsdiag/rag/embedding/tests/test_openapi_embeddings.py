@@ -0,0 +1,171 @@
+import threading
+from typing import List
+
+import pytest
+import requests
+from aiohttp import web
+
+from opsdiag.rag.embedding import embeddings as embeddings_module
+from opsdiag.rag.embedding.embedding_factory import WrappedEmbeddingFactory
+from opsdiag.rag.embedding.embeddings import (
+    OpenAPIEmbeddings,
+    close_async_sessions,
+)
+
+
+def _embedding(text: str) -> List[float]:
+    return [float(len(text)), float(ord(text[0]))]
+
+
+def _response_data(texts: List[str]):
+    # Shuffled, the embeddings are sorted by index
+    return {
+        "data": [
+            {"index": i, "embedding": _embedding(text)}
+            for i, text in reversed(list(enumerate(texts)))
+        ]
+    }
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def json(self):
+        return self._data
+
+
+class _FakeSession(requests.Session):
+    """Fail the first request of the texts in ``fail_once`` with ``fail_status``."""
+
+    def __init__(self, fail_once=(), fail_status: int = 503):
+        super().__init__()
+        self.batches: List[List[str]] = []
+        self.fail_once = set(fail_once)
+        self.fail_status = fail_status
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, json=None, timeout=None, headers=None):
+        texts = json["input"]
+        with self._lock:
+            self.batches.append(texts)
+            failed = self.fail_once & set(texts)
+            self.fail_once -= failed
+        if failed:
+            return _FakeResponse(self.fail_status)
+        return _FakeResponse(200, _response_data(texts))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(embeddings_module, "_RETRY_BACKOFF_SECONDS", 0)
+
+
+def test_split_batches():
+    embeddings = OpenAPIEmbeddings(session=_FakeSession(), batch_size=2)
+    texts = ["a", "b", "c", "d", "e"]
+    assert embeddings._split_batches(texts) == [
+        (0, ["a", "b"]),
+        (2, ["c", "d"]),
+        (4, ["e"]),
+    ]
+    assert embeddings._split_batches([]) == []
+
+    embeddings = OpenAPIEmbeddings(
+        session=_FakeSession(), batch_size=10, max_batch_tokens=10
+    )
+    long_text = "word " * 40
+    batches = embeddings._split_batches(["short", long_text, "short"])
+    # The text over the budget is a batch by itself
+    assert [batch for _, batch in batches] == [["short"], [long_text], ["short"]]
+
+
+def test_embed_documents_batches_in_order():
+    session = _FakeSession()
+    embeddings = OpenAPIEmbeddings(session=session, batch_size=3, concurrency=4)
+    texts = [f"text{i}" * (i + 1) for i in range(10)]
+    assert embeddings.embed_documents(texts) == [_embedding(t) for t in texts]
+    assert sorted(len(batch) for batch in session.batches) == [1, 3, 3, 3]
+
+
+def test_embed_documents_retry_failed_batch():
+    session = _FakeSession(fail_once={"c"})
+    embeddings = OpenAPIEmbeddings(session=session, batch_size=2, concurrency=2)
+    texts = ["a", "b", "c", "d", "e"]
+    assert embeddings.embed_documents(texts) == [_embedding(t) for t in texts]
+    # Only the failed batch is sent again
+    assert sorted(session.batches) == [["a", "b"], ["c", "d"], ["c", "d"], ["e"]]
+
+
+def test_embed_documents_no_retry_client_error():
+    session = _FakeSession(fail_once={"a"}, fail_status=400)
+    embeddings = OpenAPIEmbeddings(session=session, batch_size=2, concurrency=1)
+    with pytest.raises(requests.HTTPError):
+        embeddings.embed_documents(["a", "b"])
+    assert session.batches == [["a", "b"]]
+
+
+def test_shared_session():
+    first = OpenAPIEmbeddings(api_url="http://host:1/v1/embeddings", api_key="a")
+    second = OpenAPIEmbeddings(api_url="http://host:1/api/embeddings", api_key="b")
+    other = OpenAPIEmbeddings(api_url="http://host:2/v1/embeddings")
+    assert first.session is second.session
+    assert first.session is not other.session
+    # The api key is sent with each request, not stored in the shared session
+    assert "Authorization" not in first.session.headers
+    assert first._headers()["Authorization"] == "Bearer a"
+    assert "Authorization" not in other._headers()
+
+
+@pytest.mark.asyncio
+async def test_aembed_documents():
+    received: List[List[str]] = []
+    fail_once = {"c"}
+
+    async def _handle(request: web.Request):
+        texts = (await request.json())["input"]
+        received.append(texts)
+        if fail_once & set(texts):
+            fail_once.clear()
+            return web.json_response({"detail": "busy"}, status=429)
+        return web.json_response(_response_data(texts))
+
+    app = web.Application()
+    app.router.add_post("/v1/embeddings", _handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        embeddings = OpenAPIEmbeddings(
+            api_url=f"http://127.0.0.1:{port}/v1/embeddings",
+            batch_size=2,
+            concurrency=2,
+        )
+        texts = ["a", "b", "c", "d", "e"]
+        assert await embeddings.aembed_documents(texts) == [
+            _embedding(t) for t in texts
+        ]
+        assert sorted(received) == [["a", "b"], ["c", "d"], ["c", "d"], ["e"]]
+    finally:
+        await close_async_sessions()
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_close_sessions_on_stop():
+    embeddings = OpenAPIEmbeddings(api_url="http://127.0.0.1:1/v1/embeddings")
+    factory = WrappedEmbeddingFactory(embeddings=embeddings)
+    session = embeddings_module._shared_async_session(embeddings.api_url)
+    assert not session.closed
+
+    await factory.async_before_stop()
+    assert session.closed
+    assert embeddings_module._shared_async_session(embeddings.api_url) is not session
+    await close_async_sessions()
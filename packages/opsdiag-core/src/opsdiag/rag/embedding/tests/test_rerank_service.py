@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from typing import List, Tuple
+
+import pytest
+
+from opsdiag.core import RerankEmbeddings
+from opsdiag.rag.embedding.rerank_service import RerankService, pair_scorer
+
+
+class _FakeCrossEncoder:
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls: List[List[Tuple[str, str]]] = []
+        self._lock = threading.Lock()
+
+    def predict_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        with self._lock:
+            self.calls.append(list(pairs))
+        time.sleep(self.delay)
+        return [float(len(q) + len(c)) for q, c in pairs]
+
+
+class _FakeReranker(RerankEmbeddings):
+    def __init__(self):
+        self.queries = []
+
+    def predict(self, query: str, candidates: List[str]) -> List[float]:
+        self.queries.append(query)
+        return [float(len(c)) for c in candidates]
+
+
+def test_cache():
+    model = _FakeCrossEncoder()
+    service = RerankService(model.predict_pairs, "m", max_batch_size=1)
+    assert service.predict("q", ["a", "bb", "a"]) == [2.0, 3.0, 2.0]
+    # The duplicated candidate is scored once
+    assert model.calls == [[("q", "a"), ("q", "bb")]]
+
+    assert service.predict("q", ["bb", "ccc"]) == [3.0, 4.0]
+    assert model.calls[-1] == [("q", "ccc")]
+    assert service.predict("q2", ["a"]) == [3.0]
+    assert service.stats()["hit_count"] == 1
+
+
+def test_cache_disabled():
+    model = _FakeCrossEncoder()
+    service = RerankService(model.predict_pairs, "m", cache_size=0, max_batch_size=1)
+    service.predict("q", ["a"])
+    service.predict("q", ["a"])
+    assert len(model.calls) == 2
+
+
+def test_truncate():
+    model = _FakeCrossEncoder()
+    service = RerankService(
+        model.predict_pairs, "m", max_length=10, max_batch_size=1, token_counter=len
+    )
+    assert service.truncate("q" * 4, "short") == "short"
+    assert service.truncate("q" * 4, "x" * 20) == "x" * 6
+    service.predict("q" * 4, ["x" * 20])
+    assert model.calls == [[("q" * 4, "x" * 6)]]
+
+
+@pytest.mark.asyncio
+async def test_batch_concurrent_queries():
+    model = _FakeCrossEncoder(delay=0.02)
+    service = RerankService(model.predict_pairs, "m", max_wait_ms=50)
+    queries = [f"q{i}" for i in range(8)]
+    results = await asyncio.gather(*[service.apredict(q, ["a", "bb"]) for q in queries])
+    assert results == [[float(len(q) + 1), float(len(q) + 2)] for q in queries]
+    assert len(model.calls) < len(queries)
+    assert sum(len(call) for call in model.calls) == 2 * len(queries)
+    service.stop()
+
+
+def test_pair_scorer_groups_by_query():
+    model = _FakeReranker()
+    score = pair_scorer(model)
+    assert score([("q1", "a"), ("q2", "bb"), ("q1", "ccc")]) == [1.0, 2.0, 3.0]
+    assert model.queries == ["q1", "q2"]
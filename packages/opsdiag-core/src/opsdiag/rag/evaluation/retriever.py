@@ -1,5 +1,6 @@
 """Evaluation for retriever."""
 
+import asyncio
 from abc import ABC
 from typing import Any, Dict, List, Optional, Sequence, Type
 
@@ -12,9 +13,10 @@ from opsdiag.core.interface.evaluation import (
     Evaluator,
 )
 from opsdiag.core.interface.operators.retriever import RetrieverOperator
-from opsdiag.util.similarity_util import calculate_cosine_similarity
-
-from ..operators.evaluation import RetrieverEvaluatorOperator
+from opsdiag.util.similarity_util import (
+    calculate_cosine_similarity,
+    cosine_similarity_vectors,
+)
 
 
 class RetrieverEvaluationMetric(EvaluationMetric[List[str], str], ABC):
@@ -24,12 +26,133 @@ class RetrieverEvaluationMetric(EvaluationMetric[List[str], str], ABC):
     """
 
 
+class _EmbeddingBatcher:
+    """Coalesce the concurrent embedding requests of the dataset rows.
+
+    The texts requested in ``max_wait_ms`` milliseconds are embedded together in
+    batches of ``batch_size``. The embeddings are cached by the text, a chunk
+    retrieved for many queries is embedded only once.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int, max_wait_ms: float):
+        self._embeddings = embeddings
+        self._batch_size = batch_size
+        self._max_wait_ms = max_wait_ms
+        self._vectors: Dict[str, List[float]] = {}
+        self._query_vectors: Dict[str, List[float]] = {}
+        # The texts waiting for a batch and their futures
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def embed_query(self, text: str) -> List[float]:
+        vector = self._query_vectors.get(text)
+        if vector is None:
+            vector = await self._embeddings.aembed_query(text)
+            self._query_vectors[text] = vector
+        return vector
+
+    async def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        futures: Dict[str, asyncio.Future] = {}
+        for text in texts:
+            if text in self._vectors or text in futures:
+                continue
+            future = self._pending.get(text) or self._inflight.get(text)
+            if future is None:
+                future = self._pending[text] = loop.create_future()
+            futures[text] = future
+        if self._pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush())
+        for text, future in futures.items():
+            # Shield the shared future from the cancellation of this request
+            self._vectors[text] = await asyncio.shield(future)
+        return [self._vectors[text] for text in texts]
+
+    async def _flush(self):
+        await asyncio.sleep(self._max_wait_ms / 1000)
+        while self._pending:
+            texts = list(self._pending)[: self._batch_size]
+            futures = [self._pending.pop(text) for text in texts]
+            self._inflight.update(zip(texts, futures))
+            try:
+                vectors = await self._embeddings.aembed_documents(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(
+                        f"Got {len(vectors)} embeddings for {len(texts)} texts"
+                    )
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                for text in texts:
+                    self._inflight.pop(text, None)
+            for text, vector, future in zip(texts, vectors, futures):
+                self._vectors[text] = vector
+                if not future.done():
+                    future.set_result(vector)
+
+
 class RetrieverSimilarityMetric(RetrieverEvaluationMetric):
-    """Similarity metric for retriever."""
+    """Similarity metric for retriever.
+
+    The asynchronous computations of the concurrent rows share the embedding
+    batches, see `_EmbeddingBatcher`.
+    """
 
-    def __init__(self, embeddings: Embeddings):
-        """Create a SimilarityMetric with embeddings."""
+    def __init__(
+        self, embeddings: Embeddings, batch_size: int = 32, max_wait_ms: float = 5
+    ):
+        """Create a SimilarityMetric with embeddings.
+
+        Args:
+            embeddings(Embeddings): The embeddings.
+            batch_size(int): The max number of texts embedded in a call.
+            max_wait_ms(float): The time to wait for the other rows to join a batch.
+        """
         self._embeddings = embeddings
+        self._batch_size = batch_size
+        self._max_wait_ms = max_wait_ms
+        self._batchers: Dict[asyncio.AbstractEventLoop, _EmbeddingBatcher] = {}
+
+    def _get_batcher(self) -> _EmbeddingBatcher:
+        loop = asyncio.get_running_loop()
+        batcher = self._batchers.get(loop)
+        if batcher is None:
+            # The futures of a batcher belong to an event loop
+            self._batchers = {
+                loop: _EmbeddingBatcher(
+                    self._embeddings, self._batch_size, self._max_wait_ms
+                )
+            }
+            batcher = self._batchers[loop]
+        return batcher
+
+    async def compute(
+        self,
+        prediction: List[str],
+        contexts: Optional[Sequence[str]] = None,
+        query: Optional[str] = None,
+    ) -> BaseEvaluationResult:
+        """Compute the evaluation metric, the embeddings are batched across rows."""
+        if not prediction or not contexts:
+            return BaseEvaluationResult(
+                prediction=prediction,
+                contexts=contexts,
+                score=0.0,
+            )
+        batcher = self._get_batcher()
+        context_vec, prediction_vecs = await asyncio.gather(
+            batcher.embed_query(contexts[0]), batcher.embed_documents(prediction)
+        )
+        similarity = cosine_similarity_vectors(context_vec, prediction_vecs)
+        return BaseEvaluationResult(
+            prediction=prediction,
+            contexts=contexts,
+            score=float(similarity.mean()),
+        )
 
     def sync_compute(
         self,
@@ -229,6 +352,8 @@ class RetrieverEvaluator(Evaluator):
         """Evaluate the dataset."""
         from opsdiag.core.awel import DAG, IteratorTrigger, MapOperator
 
+        from ..operators.evaluation import RetrieverEvaluatorOperator
+
         if not metrics:
             if not self.embeddings:
                 raise ValueError("embeddings are required for SimilarityMetric")
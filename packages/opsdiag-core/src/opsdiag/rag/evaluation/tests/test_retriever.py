@@ -0,0 +1,78 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from opsdiag.core import Embeddings
+
+from ..retriever import RetrieverSimilarityMetric
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self):
+        self.document_calls: List[List[str]] = []
+        self.query_calls: List[str] = []
+
+    @staticmethod
+    def _vector(text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.document_calls.append(list(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.query_calls.append(text)
+        return self._vector(text)
+
+
+def _rows(n: int):
+    # The rows share the retrieved chunks like the queries of a knowledge space
+    return [
+        ([f"chunk {i % 7}", f"chunk {(i + 1) % 7}", f"chunk {i}"], [f"context {i}"])
+        for i in range(n)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_similarity_metric_batches_rows():
+    embeddings = FakeEmbeddings()
+    metric = RetrieverSimilarityMetric(embeddings, batch_size=16)
+    rows = _rows(40)
+
+    results = await asyncio.gather(
+        *[metric.compute(prediction, contexts) for prediction, contexts in rows]
+    )
+
+    expected = [
+        RetrieverSimilarityMetric(FakeEmbeddings()).sync_compute(prediction, contexts)
+        for prediction, contexts in rows
+    ]
+    assert [r.score for r in results] == pytest.approx([r.score for r in expected])
+    embedded = [text for call in embeddings.document_calls for text in call]
+    # Every chunk is embedded once, in batches
+    assert sorted(embedded) == sorted({t for p, _ in rows for t in p})
+    assert len(embeddings.document_calls) == 3
+    assert all(len(call) <= 16 for call in embeddings.document_calls)
+
+
+@pytest.mark.asyncio
+async def test_similarity_metric_batch_failure():
+    embeddings = FakeEmbeddings()
+    metric = RetrieverSimilarityMetric(embeddings)
+    embed_documents = embeddings.embed_documents
+    embeddings.embed_documents = lambda texts: 1 / 0
+
+    with pytest.raises(ZeroDivisionError):
+        await metric.compute(["chunk"], ["context"])
+
+    # The failed texts are embedded again
+    embeddings.embed_documents = embed_documents
+    result = await metric.compute(["chunk"], ["context"])
+    assert result.score is not None
+
+
+@pytest.mark.asyncio
+async def test_similarity_metric_empty():
+    metric = RetrieverSimilarityMetric(FakeEmbeddings())
+    assert (await metric.compute([], ["context"])).score == 0.0
@@ -1,15 +1,24 @@
 """Rerank module for RAG retriever."""
 
+import threading
 from abc import ABC, abstractmethod
-from typing import Callable, List, Optional
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 
 from opsdiag.core import Chunk, RerankEmbeddings
 from opsdiag.core.awel.flow import Parameter, ResourceCategory, register_resource
 from opsdiag.util.executor_utils import blocking_func_to_async_no_executor
 from opsdiag.util.i18n_utils import _
 
+if TYPE_CHECKING:
+    from opsdiag.rag.embedding.rerank_service import RerankService
+
 RANK_FUNC = Callable[[List[Chunk]], List[Chunk]]
 
+# The rerank services of the cross encoder models, by model and device, the
+# concurrent rankers of a model share its cache and batches
+_cross_encoder_services: Dict[Tuple[str, str], "RerankService"] = {}
+_cross_encoder_lock = threading.Lock()
+
 
 class Ranker(ABC):
     """Base Ranker."""
@@ -219,15 +228,42 @@ class CrossEncoderRanker(Ranker):
             rank_fn: Optional[callable] - The rank function.
         Refer: https://www.sbert.net/examples/applications/cross-encoder/README.html
         """
-        try:
-            from sentence_transformers import CrossEncoder
-        except ImportError:
-            raise ImportError(
-                "please `pip install sentence-transformers`",
-            )
-        self._model = CrossEncoder(model, max_length=512, device=device)
+        self._service = self._get_service(model, device)
         super().__init__(topk, rank_fn)
 
+    @staticmethod
+    def _get_service(model: str, device: str) -> "RerankService":
+        from opsdiag.rag.embedding.rerank_service import RerankService
+
+        with _cross_encoder_lock:
+            service = _cross_encoder_services.get((model, device))
+            if service is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError:
+                    raise ImportError(
+                        "please `pip install sentence-transformers`",
+                    )
+                cross_encoder = CrossEncoder(model, max_length=512, device=device)
+
+                def _predict_pairs(pairs: List[Tuple[str, str]]) -> List[float]:
+                    scores = cross_encoder.predict(
+                        sentences=[list(pair) for pair in pairs]
+                    )
+                    return [float(score) for score in scores]
+
+                service = RerankService(_predict_pairs, model, max_length=512)
+                _cross_encoder_services[(model, device)] = service
+            return service
+
+    def _query_contents(
+        self, candidates_with_scores: List[Chunk], query: Optional[str]
+    ) -> Tuple[str, List[str]]:
+        return query if query is not None else "", [
+            candidate.content if candidate.content is not None else ""
+            for candidate in candidates_with_scores
+        ]
+
     def rank(
         self, candidates_with_scores: List[Chunk], query: Optional[str] = None
     ) -> List[Chunk]:
@@ -241,21 +277,34 @@ class CrossEncoderRanker(Ranker):
         """
         if len(candidates_with_scores) <= 1:
             return candidates_with_scores
-        contents = [candidate.content for candidate in candidates_with_scores]
-        query_content_pairs = [
-            [
-                query if query is not None else "",
-                content if content is not None else "",
-            ]
-            for content in contents
-        ]
-        rank_scores = self._model.predict(sentences=query_content_pairs)
+        rank_scores = self._service.predict(
+            *self._query_contents(candidates_with_scores, query)
+        )
+        new_candidates_with_scores = self._rerank_with_scores(
+            candidates_with_scores, rank_scores
+        )
+        return new_candidates_with_scores[: self.topk]
 
-        for candidate, score in zip(candidates_with_scores, rank_scores):
-            candidate.score = float(score)
+    async def arank(
+        self, candidates_with_scores: List[Chunk], query: Optional[str] = None
+    ) -> List[Chunk]:
+        """Cross Encoder rank algorithm implementation, without blocking the loop.
 
-        new_candidates_with_scores = sorted(
-            candidates_with_scores, key=lambda x: x.score, reverse=True
+        The pairs of the concurrent queries are scored in the same batches.
+
+        Args:
+            candidates_with_scores: List[Chunk], candidates with scores
+            query: Optional[str], query text
+        Returns:
+            List[Chunk], reranked candidates
+        """
+        if len(candidates_with_scores) <= 1:
+            return candidates_with_scores
+        rank_scores = await self._service.apredict(
+            *self._query_contents(candidates_with_scores, query)
+        )
+        new_candidates_with_scores = self._rerank_with_scores(
+            candidates_with_scores, rank_scores
         )
         return new_candidates_with_scores[: self.topk]
 
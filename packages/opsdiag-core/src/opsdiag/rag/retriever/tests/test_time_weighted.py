@@ -0,0 +1,176 @@
+import datetime
+import os
+from typing import List
+
+import pytest
+
+from opsdiag.core import Chunk
+from opsdiag.rag.retriever.time_weighted import (
+    FileDocumentStorage,
+    TimeWeightedEmbeddingRetriever,
+)
+
+NOW = datetime.datetime(2025, 1, 1, 12)
+
+
+class _IndexStore:
+    def __init__(self):
+        self.chunks: List[Chunk] = []
+        self.relevance = {}
+
+    def load_document(self, chunks):
+        self.chunks.extend(chunks)
+        return [c.chunk_id for c in chunks]
+
+    def similar_search_with_scores(self, query, topk, score_threshold, filters=None):
+        result = []
+        for chunk in self.chunks:
+            if chunk.content in self.relevance:
+                result.append(
+                    Chunk(
+                        chunk_id=chunk.chunk_id,
+                        content=chunk.content,
+                        metadata=dict(chunk.metadata),
+                        score=self.relevance[chunk.content],
+                    )
+                )
+        return result
+
+
+class _CountingStorage(FileDocumentStorage):
+    def __init__(self, path):
+        super().__init__(path)
+        self.saved = 0
+
+    def save_documents(self, documents):
+        self.saved += 1
+        return super().save_documents(documents)
+
+
+def _retriever(storage, **kwargs):
+    return TimeWeightedEmbeddingRetriever(
+        index_store=_IndexStore(), external_storage=storage, **kwargs
+    )
+
+
+def _load(retriever, hours_ago: List[int]):
+    retriever.load_document(
+        [
+            Chunk(
+                content=f"m{i}",
+                metadata={
+                    "created_at": str(NOW),
+                    "last_accessed_at": str(NOW - datetime.timedelta(hours=hours)),
+                },
+            )
+            for i, hours in enumerate(hours_ago)
+        ],
+        current_time=NOW,
+    )
+
+
+def test_combined_scores():
+    retriever = _retriever(None, decay_rate=0.5)
+    retriever.other_score_keys = ["importance"]
+    chunks = [
+        Chunk(metadata={"last_accessed_at": NOW - datetime.timedelta(hours=1)}),
+        Chunk(metadata={"last_accessed_at": str(NOW - datetime.timedelta(hours=2))}),
+        Chunk(metadata={"created_at": NOW.timestamp(), "importance": 0.3}),
+    ]
+    scores = retriever._get_combined_scores(chunks, [0.1, None, 0.2], NOW)
+    assert scores == pytest.approx([0.6, 0.25, 1.5])
+    assert retriever._get_combined_score(chunks[0], 0.1, NOW) == pytest.approx(0.6)
+
+
+def test_append_access_times(tmp_path):
+    path = str(tmp_path / "memory.jsonl")
+    storage = _CountingStorage(path)
+    retriever = _retriever(storage)
+    retriever._use_vector_store_only = False
+    _load(retriever, [10, 0, 5])
+    retriever._index_store.relevance = {"m0": 0.9}
+    retriever._k = 2
+
+    result = retriever._retrieve("q")
+    assert [c.content for c in result] == ["m0", "m1"]
+    # Only appended to the log, no snapshot written
+    assert storage.saved == 0
+    assert retriever._last_accessed[0] > NOW.timestamp()
+    assert retriever._last_accessed[2] == NOW.timestamp() - 5 * 3600
+
+    reloaded = _retriever(_CountingStorage(path))
+    assert [c.content for c in reloaded.memory_stream] == ["m0", "m1", "m2"]
+    assert reloaded._last_accessed.tolist() == retriever._last_accessed.tolist()
+
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / "memory.jsonl")
+    storage = _CountingStorage(path)
+    retriever = _retriever(storage, compaction_threshold=2)
+    retriever._use_vector_store_only = False
+    _load(retriever, [1, 2])
+    for _ in range(3):
+        retriever._retrieve("q")
+    assert storage.saved == 1
+
+    reloaded = _retriever(FileDocumentStorage(path))
+    assert reloaded._last_accessed.tolist() == retriever._last_accessed.tolist()
+
+
+def test_crash_after_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "memory.jsonl")
+    storage = FileDocumentStorage(path)
+    storage.append_documents([Chunk(content="m0"), Chunk(content="m1")])
+    storage.append_access_times({1: 10.0})
+    documents = storage.get_all_documents()
+
+    def _crash(path):
+        raise RuntimeError("crashed")
+
+    # Crash after the snapshot is written, before the log is removed
+    monkeypatch.setattr(os, "remove", _crash)
+    with pytest.raises(RuntimeError):
+        storage.save_documents(documents)
+    monkeypatch.undo()
+    assert os.path.exists(f"{path}.log")
+
+    restarted = FileDocumentStorage(path)
+    reloaded = restarted.get_all_documents()
+    assert [d.content for d in reloaded] == ["m0", "m1"]
+    assert reloaded[1].metadata["last_accessed_at"] == 10.0
+
+    # The new records are not skipped with the stale log
+    restarted.append_documents([Chunk(content="m2")])
+    restarted.append_access_times({0: 20.0})
+    reloaded = FileDocumentStorage(path).get_all_documents()
+    assert [d.content for d in reloaded] == ["m0", "m1", "m2"]
+    assert reloaded[0].metadata["last_accessed_at"] == 20.0
+
+
+def test_plain_storage_saves_all():
+    class _Storage:
+        def __init__(self):
+            self.saved = []
+
+        def get_all_documents(self):
+            return []
+
+        def save_documents(self, documents):
+            self.saved.append(len(documents))
+            return True
+
+    storage = _Storage()
+    retriever = _retriever(storage)
+    retriever._use_vector_store_only = False
+    _load(retriever, [1, 2])
+    retriever._retrieve("q")
+    assert storage.saved == [2, 2]
+
+
+def test_load_document_does_not_mutate_input():
+    retriever = _retriever(None)
+    chunk = Chunk(content="m", metadata={"a": 1})
+    retriever.load_document([chunk], current_time=NOW)
+    assert chunk.metadata == {"a": 1}
+    assert retriever.memory_stream[0].metadata["buffer_idx"] == 0
+    assert retriever._last_accessed.tolist() == [NOW.timestamp()]
@@ -1,9 +1,22 @@
 """Time weighted retriever with external storage support."""
 
 import datetime
+import json
 import logging
-from copy import deepcopy
-from typing import Any, Dict, List, Optional, Protocol, Tuple
+import os
+import threading
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    runtime_checkable,
+)
+
+import numpy as np
 
 from opsdiag.core import Chunk
 from opsdiag.rag.retriever.rerank import Ranker
@@ -39,6 +52,196 @@ class DocumentStorage(Protocol):
         ...
 
 
+@runtime_checkable
+class IncrementalDocumentStorage(DocumentStorage, Protocol):
+    """Protocol for external document storage with append-only updates.
+
+    The appended documents and access times are replayed by
+    ``get_all_documents``, ``save_documents`` replaces all of them with a new
+    snapshot (the compaction).
+    """
+
+    def append_documents(self, documents: List[Chunk]) -> bool:
+        """Append new documents to storage.
+
+        Args:
+            documents: List of document chunks to append
+
+        Returns:
+            Boolean indicating success
+        """
+        ...
+
+    def append_access_times(self, access_times: Dict[int, float]) -> bool:
+        """Append the new last accessed times of documents to storage.
+
+        Args:
+            access_times: Mapping of buffer indices to timestamps
+
+        Returns:
+            Boolean indicating success
+        """
+        ...
+
+
+class FileDocumentStorage:
+    """Document storage in a snapshot file and an append-only log file.
+
+    Both files are JSON lines, the log records the documents added and the
+    access times updated since the last snapshot.
+
+    Both files start with a generation record. A snapshot covers the logs of the
+    older generations, a log left by a crash after its snapshot was written is
+    not replayed again.
+    """
+
+    def __init__(self, path: str):
+        """Create a FileDocumentStorage.
+
+        Args:
+            path (str): The snapshot file path, the log is ``{path}.log``
+        """
+        self._path = path
+        self._log_path = f"{path}.log"
+        self._lock = threading.Lock()
+        # The generation of the snapshot and of the log, None if not read yet
+        self._generation: Optional[int] = None
+        self._log_generation: Optional[int] = None
+
+    def get_all_documents(self) -> List[Chunk]:
+        """Load the snapshot and replay the log."""
+        with self._lock:
+            documents = []
+            generation = 0
+            for line in self._read(self._path):
+                record = json.loads(line)
+                if "generation" in record:
+                    generation = record["generation"]
+                else:
+                    documents.append(Chunk.from_dict(record))
+            self._generation = generation
+            for line in self._read(self._log_path):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write at the end of the log
+                    logger.warning(f"Skip a broken record in {self._log_path}")
+                    continue
+                if "generation" in record:
+                    if record["generation"] < generation:
+                        # Already in the snapshot, the log was not removed
+                        logger.info(f"Skip the compacted log {self._log_path}")
+                        break
+                    continue
+                if "document" in record:
+                    documents.append(Chunk.from_dict(record["document"]))
+                for idx, timestamp in record.get("access_times", {}).items():
+                    idx = int(idx)
+                    if 0 <= idx < len(documents):
+                        documents[idx].metadata["last_accessed_at"] = timestamp
+            return documents
+
+    def save_documents(self, documents: List[Chunk]) -> bool:
+        """Write a new snapshot atomically and truncate the log."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            generation = self._snapshot_generation() + 1
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"generation": generation}) + "\n")
+                for document in documents:
+                    f.write(_dump_chunk(document) + "\n")
+            os.replace(tmp_path, self._path)
+            self._generation = generation
+            # A crash here leaves a log of the older generation, skipped by replay
+            if os.path.exists(self._log_path):
+                os.remove(self._log_path)
+            self._log_generation = None
+            return True
+
+    def append_documents(self, documents: List[Chunk]) -> bool:
+        """Append the documents to the log."""
+        return self._append(
+            json.dumps({"document": json.loads(_dump_chunk(d))}) for d in documents
+        )
+
+    def append_access_times(self, access_times: Dict[int, float]) -> bool:
+        """Append the access times to the log, in one record."""
+        return self._append([json.dumps({"access_times": access_times})])
+
+    def _snapshot_generation(self) -> int:
+        if self._generation is None:
+            self._generation = self._read_generation(self._path)
+        return self._generation
+
+    def _append(self, lines: Iterable[str]) -> bool:
+        with self._lock:
+            os.makedirs(os.path.dirname(self._log_path) or ".", exist_ok=True)
+            generation = self._snapshot_generation()
+            if self._log_generation is None and os.path.exists(self._log_path):
+                self._log_generation = self._read_generation(self._log_path)
+                if self._log_generation < generation:
+                    # Left by a crash, its records are in the snapshot
+                    os.remove(self._log_path)
+            with open(self._log_path, "a", encoding="utf-8") as f:
+                if f.tell() == 0:
+                    f.write(json.dumps({"generation": generation}) + "\n")
+                self._log_generation = generation
+                for line in lines:
+                    f.write(line + "\n")
+            return True
+
+    @staticmethod
+    def _read_generation(path: str) -> int:
+        """Read the generation record of a file, 0 for the files without it."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            line = f.readline()
+        try:
+            return int(json.loads(line).get("generation", 0))
+        except (ValueError, AttributeError):
+            return 0
+
+    @staticmethod
+    def _read(path: str) -> List[str]:
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return [line for line in f if line.strip()]
+
+
+def _dump_chunk(chunk: Chunk) -> str:
+    # The access times may be datetime objects
+    return json.dumps(chunk.to_dict(), default=str)
+
+
+def _copy_chunk(chunk: Chunk) -> Chunk:
+    """Copy a chunk with its own metadata, the other fields are shared."""
+    update = {"metadata": dict(chunk.metadata)}
+    if hasattr(chunk, "model_copy"):
+        return chunk.model_copy(update=update)
+    return chunk.copy(update=update)
+
+
+def _to_timestamp(value: Any, default: float) -> float:
+    """Convert a datetime, a timestamp or their string to a timestamp."""
+    if value is None:
+        return default
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return default
+
+
 def _get_hours_passed(time: datetime.datetime, ref_time: datetime.datetime) -> float:
     """Get the hours passed between two datetime objects."""
     return (time - ref_time).total_seconds() / 3600
@@ -55,6 +258,7 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
         rerank: Optional[Ranker] = None,
         decay_rate: float = 0.01,
         external_storage: Optional[DocumentStorage] = None,
+        compaction_threshold: int = 1000,
     ):
         """Initialize TimeWeightedEmbeddingRetriever.
 
@@ -66,6 +270,9 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
             decay_rate (float): rate at which relevance decays over time
             external_storage (Optional[DocumentStorage]): external storage for
                 persistence
+            compaction_threshold (int): the number of records appended to an
+                incremental storage before the memory stream is saved as a new
+                snapshot
         """
         super().__init__(
             index_store=index_store,
@@ -81,6 +288,10 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
         self._k = 4
         self._external_storage = external_storage
         self._use_vector_store_only = False
+        self._compaction_threshold = compaction_threshold
+        self._appended_records = 0
+        # The last accessed timestamps of the memory stream, by buffer index
+        self._last_accessed = np.empty(0, dtype=np.float64)
 
         # Initialize memory stream
         self._initialize_memory_stream()
@@ -90,6 +301,7 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
         if self._external_storage:
             try:
                 self.memory_stream = self._external_storage.get_all_documents()
+                self._rebuild_access_index()
                 logger.info(
                     "Loaded memory stream from external storage with "
                     f"{len(self.memory_stream)} documents"
@@ -116,6 +328,69 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
                     logger.warning("Failed to save documents to external storage")
             except Exception as e:
                 logger.error(f"Error saving documents to external storage: {e}")
+        self._appended_records = 0
+
+    def _append_to_storage(self, method: str, *args) -> None:
+        """Append a delta to an incremental storage, compact it when needed.
+
+        The storage without append-only updates saves the whole memory stream.
+        """
+        if not self._external_storage:
+            return
+        if not isinstance(self._external_storage, IncrementalDocumentStorage):
+            self._save_memory_stream()
+            return
+        if self._appended_records >= self._compaction_threshold:
+            self._save_memory_stream()
+            return
+        try:
+            if getattr(self._external_storage, method)(*args):
+                self._appended_records += 1
+                return
+            logger.warning("Failed to append to external storage, save all documents")
+        except Exception as e:
+            logger.error(f"Error appending to external storage: {e}")
+        self._save_memory_stream()
+
+    def _rebuild_access_index(self) -> None:
+        """Rebuild the last accessed timestamps of the memory stream."""
+        self._last_accessed = self._chunk_timestamps(
+            self.memory_stream, datetime.datetime.now().timestamp()
+        )
+
+    def _access_index(self) -> np.ndarray:
+        # The memory stream may be replaced by the subclasses
+        if len(self._last_accessed) != len(self.memory_stream):
+            self._rebuild_access_index()
+        return self._last_accessed
+
+    @staticmethod
+    def _chunk_timestamps(chunks: List[Chunk], default: float) -> np.ndarray:
+        return np.fromiter(
+            (
+                _to_timestamp(
+                    c.metadata.get("last_accessed_at", c.metadata.get("created_at")),
+                    default,
+                )
+                for c in chunks
+            ),
+            dtype=np.float64,
+            count=len(chunks),
+        )
+
+    def _record_access(
+        self, buffer_indices: List[int], current_time: datetime.datetime
+    ) -> None:
+        """Update the last accessed time of the documents and persist the delta."""
+        if not buffer_indices:
+            return
+        timestamp = current_time.timestamp()
+        for buffer_idx in buffer_indices:
+            self.memory_stream[buffer_idx].metadata["last_accessed_at"] = current_time
+        self._access_index()[buffer_indices] = timestamp
+        self._append_to_storage(
+            "append_access_times", {idx: timestamp for idx in buffer_indices}
+        )
 
     def load_document(self, chunks: List[Chunk], **kwargs: Dict[str, Any]) -> List[str]:
         """Load document chunks into vector database.
@@ -131,8 +406,8 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
         if current_time is None:
             current_time = datetime.datetime.now()
 
-        # Avoid mutating input documents
-        dup_docs = [deepcopy(d) for d in chunks]
+        # Avoid mutating input documents, only the metadata is changed
+        dup_docs = [_copy_chunk(d) for d in chunks]
 
         # Generate buffer indices for new documents
         for i, doc in enumerate(dup_docs):
@@ -145,11 +420,17 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
                 )
             doc.metadata["buffer_idx"] = len(self.memory_stream) + i
 
-        # Add to memory stream
+        # Add to memory stream and its access index
+        self._last_accessed = np.concatenate(
+            [
+                self._access_index(),
+                self._chunk_timestamps(dup_docs, current_time.timestamp()),
+            ]
+        )
         self.memory_stream.extend(dup_docs)
 
-        # Save memory stream after adding new documents
-        self._save_memory_stream()
+        # Append the new documents to external storage
+        self._append_to_storage("append_documents", dup_docs)
 
         # Add to vector store
         return self._index_store.load_document(dup_docs)
@@ -210,31 +491,27 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
         if not docs_and_scores:
             return self._retrieve_vector_store_only(query, filters, current_time)
 
-        rescored_docs = [
-            (doc, self._get_combined_score(doc, relevance, current_time))
-            for doc, relevance in docs_and_scores.values()
-        ]
-
-        rescored_docs.sort(key=lambda x: x[1], reverse=True)
+        docs = [doc for doc, _ in docs_and_scores.values()]
+        scores = self._get_combined_scores(
+            docs, [relevance for _, relevance in docs_and_scores.values()], current_time
+        )
         result = []
+        accessed = []
 
         # Ensure frequently accessed memories aren't forgotten
-        for doc, _ in rescored_docs[: self._k]:
-            if "buffer_idx" in doc.metadata:
-                buffer_idx = doc.metadata["buffer_idx"]
-                if 0 <= buffer_idx < len(self.memory_stream):
-                    buffered_doc = self.memory_stream[buffer_idx]
-                    buffered_doc.metadata["last_accessed_at"] = current_time
-                    result.append(buffered_doc)
-                else:
-                    # If buffer_idx is invalid, still return the document from vector
-                    # store
-                    result.append(doc)
+        for i in np.argsort(-scores, kind="stable")[: self._k]:
+            doc = docs[i]
+            buffer_idx = doc.metadata.get("buffer_idx")
+            if buffer_idx is not None and 0 <= buffer_idx < len(self.memory_stream):
+                accessed.append(buffer_idx)
+                result.append(self.memory_stream[buffer_idx])
             else:
+                # If buffer_idx is invalid, still return the document from vector
+                # store
                 result.append(doc)
 
-        # Save memory stream after updating access times
-        self._save_memory_stream()
+        # Persist the updated access times only
+        self._record_access(accessed, current_time)
 
         return result
 
@@ -296,22 +573,57 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
         Returns:
             Combined score value
         """
-        # Default last_accessed_at to creation time if not present
-        last_accessed_at = chunk.metadata.get("last_accessed_at")
-        if last_accessed_at is None:
-            last_accessed_at = chunk.metadata.get("created_at", current_time)
+        return float(
+            self._get_combined_scores([chunk], [vector_relevance], current_time)[0]
+        )
 
-        hours_passed = _get_hours_passed(current_time, last_accessed_at)
-        score = (1.0 - self.decay_rate) ** hours_passed
+    def _get_combined_scores(
+        self,
+        chunks: List[Chunk],
+        vector_relevances: List[Optional[float]],
+        current_time: datetime.datetime,
+    ) -> np.ndarray:
+        """Calculate the combined scores of documents at once.
 
-        for key in self.other_score_keys:
-            if key in chunk.metadata:
-                score += chunk.metadata[key]
+        The last accessed times of the documents in the memory stream are read from
+        its index, the others from their metadata (or their creation time).
+
+        Args:
+            chunks: The document chunks
+            vector_relevances: Vector similarity scores, None for no relevance
+            current_time: Current time for calculating decay
 
-        if vector_relevance is not None:
-            score += vector_relevance
+        Returns:
+            The combined scores
+        """
+        now = current_time.timestamp()
+        last_accessed = self._access_index()
+        timestamps = np.empty(len(chunks), dtype=np.float64)
+        for i, chunk in enumerate(chunks):
+            buffer_idx = chunk.metadata.get("buffer_idx")
+            if (
+                isinstance(buffer_idx, int)
+                and 0 <= buffer_idx < len(last_accessed)
+                and self.memory_stream[buffer_idx] is chunk
+            ):
+                timestamps[i] = last_accessed[buffer_idx]
+            else:
+                timestamps[i] = self._chunk_timestamps([chunk], now)[0]
 
-        return score
+        hours_passed = (now - timestamps) / 3600
+        scores = np.power(1.0 - self.decay_rate, hours_passed)
+        for key in self.other_score_keys:
+            scores += np.fromiter(
+                (c.metadata.get(key, 0.0) for c in chunks),
+                dtype=np.float64,
+                count=len(chunks),
+            )
+        scores += np.fromiter(
+            (r if r is not None else 0.0 for r in vector_relevances),
+            dtype=np.float64,
+            count=len(chunks),
+        )
+        return scores
 
     def get_salient_docs(
         self, query: str, filters: Optional[MetadataFilters] = None
@@ -360,6 +672,8 @@ class TimeWeightedEmbeddingRetriever(EmbeddingRetriever):
         if self._external_storage:
             try:
                 self.memory_stream = self._external_storage.get_all_documents()
+                self._rebuild_access_index()
+                self._appended_records = 0
                 self._use_vector_store_only = False
                 logger.info(
                     "Synced memory stream from external storage with "
@@ -0,0 +1,843 @@
+"""Compact graph in CSR (compressed sparse row) layout.
+
+Vertices get integer ids, the edges are kept in numpy arrays sorted by the source
+vertex, with offset arrays for the out and in edges of each vertex. Vertex and
+edge properties are stored by columns, every column is a blob of JSON values with
+an offset array. The arrays can be saved to a directory and loaded back with
+memory mapping, so a large graph is opened without parsing it.
+
+Writes are kept in a small delta (new vertices and edges, deleted ids) on top of
+the compacted arrays, and they are merged into the arrays by `compact`, which is
+called before searching and saving. The writes, the compaction and the searches
+hold the lock of the graph, so a graph can be searched from several threads.
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from opsdiag.storage.graph_store.graph import (
+    Direction,
+    Edge,
+    Graph,
+    IdVertex,
+    MemoryGraph,
+    Vertex,
+)
+
+logger = logging.getLogger(__name__)
+
+_META_FILE = "graph.json"
+_FORMAT_VERSION = 1
+
+# The key of a delta edge: (source vertex, target vertex, label)
+_EdgeKey = Tuple[int, int, int]
+
+
+def _synchronized(method):
+    """Run the method holding the lock of the graph."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _encode_value(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenate the ranges [start, start + count) without a Python loop."""
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return shift + np.arange(total, dtype=np.int64)
+
+
+class _Blob:
+    """A column of variable-length bytes, empty bytes means a missing value."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def empty(cls, size: int = 0) -> "_Blob":
+        return cls(np.zeros(size + 1, dtype=np.int64), np.zeros(0, dtype=np.uint8))
+
+    @classmethod
+    def from_list(cls, values: List[bytes]) -> "_Blob":
+        lengths = np.fromiter((len(v) for v in values), np.int64, len(values))
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        data = np.frombuffer(b"".join(values), dtype=np.uint8)
+        return cls(offsets, data)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, i: int) -> bytes:
+        return self.data[self.offsets[i] : self.offsets[i + 1]].tobytes()
+
+    def concat(self, other: "_Blob") -> "_Blob":
+        offsets = np.concatenate(
+            [self.offsets[:-1], other.offsets + self.offsets[-1]]
+        ).astype(np.int64)
+        return _Blob(offsets, np.concatenate([self.data, other.data]))
+
+    def gather(self, indices: np.ndarray) -> "_Blob":
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return _Blob(offsets, np.asarray(self.data)[_ranges(starts, lengths)])
+
+    def save(self, path: str, name: str):
+        _save_array(path, f"{name}.offsets", self.offsets)
+        _save_array(path, f"{name}.data", self.data)
+
+    @classmethod
+    def load(cls, path: str, name: str, mmap_mode: Optional[str]) -> "_Blob":
+        return cls(
+            _load_array(path, f"{name}.offsets", mmap_mode),
+            _load_array(path, f"{name}.data", mmap_mode),
+        )
+
+
+def _save_array(path: str, name: str, array: np.ndarray):
+    # Write a new file and replace the old one, the old file may be memory mapped
+    tmp_file = os.path.join(path, f".{name}.tmp.npy")
+    np.save(tmp_file, np.ascontiguousarray(array))
+    os.replace(tmp_file, os.path.join(path, f"{name}.npy"))
+
+
+def _load_array(path: str, name: str, mmap_mode: Optional[str]) -> np.ndarray:
+    array = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+    # numpy can't memory map empty arrays
+    return array if len(array) or mmap_mode is None else np.asarray(array)
+
+
+class CSRGraph(Graph):
+    """Compact graph with integer vertex ids and columnar properties.
+
+    It implements the same interface as `MemoryGraph`, `search` returns a
+    `MemoryGraph` of the k-hop subgraph. The vertices and edges returned are
+    decoded copies, update them with `upsert_vertex` and `append_edge`.
+    """
+
+    def __init__(self):
+        """Create an empty graph."""
+        # Reentrant, the search compacts the graph and the writes call each other
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        # metadata
+        self._vertex_prop_keys: List[str] = []
+        self._edge_prop_keys: List[str] = []
+        self._labels: List[str] = []
+        self._label_ids: Dict[str, int] = {}
+
+        # compacted vertices, sorted by nothing but their id
+        self._vids = _Blob.empty()
+        # vertex ids sorted by the id bytes, for binary search
+        self._vid_order = np.zeros(0, dtype=np.int64)
+        # 0 for the vertices only known by their id (`IdVertex`)
+        self._vertex_flags = np.zeros(0, dtype=np.uint8)
+        self._vertex_names = _Blob.empty()
+        self._vertex_props: Dict[str, _Blob] = {}
+
+        # compacted edges, sorted by the source vertex
+        self._edge_src = np.zeros(0, dtype=np.int64)
+        self._edge_dst = np.zeros(0, dtype=np.int64)
+        self._edge_label = np.zeros(0, dtype=np.int64)
+        self._edge_props: Dict[str, _Blob] = {}
+        self._out_offsets = np.zeros(1, dtype=np.int64)
+        self._in_offsets = np.zeros(1, dtype=np.int64)
+        # edge ids sorted by the target vertex
+        self._in_edges = np.zeros(0, dtype=np.int64)
+
+        # delta
+        self._new_vids: List[str] = []
+        self._new_vid_index: Dict[str, int] = {}
+        self._vertex_updates: Dict[int, Vertex] = {}
+        self._deleted_vertices: Set[int] = set()
+        self._new_edges: Dict[_EdgeKey, Edge] = {}
+        self._delta_out: Dict[int, Dict[_EdgeKey, None]] = {}
+        self._delta_in: Dict[int, Dict[_EdgeKey, None]] = {}
+        self._deleted_edges: Set[int] = set()
+
+        self._edge_count = 0
+        # Whether the graph differs from the last saved or loaded one
+        self._unsaved = True
+
+    @property
+    def _base_vertex_count(self) -> int:
+        return len(self._vids)
+
+    @property
+    def _base_edge_count(self) -> int:
+        return len(self._edge_src)
+
+    @property
+    def vertex_count(self) -> int:
+        """Return the number of vertices in the graph."""
+        return (
+            self._base_vertex_count + len(self._new_vids) - len(self._deleted_vertices)
+        )
+
+    @property
+    def edge_count(self) -> int:
+        """Return the count of edges in the graph."""
+        return self._edge_count
+
+    @property
+    def has_unsaved_changes(self) -> bool:
+        """Whether the graph is changed since it was saved or loaded."""
+        return self._unsaved
+
+    @property
+    def is_compacted(self) -> bool:
+        """Whether all the writes are merged into the compacted arrays."""
+        return not (
+            self._new_vids
+            or self._vertex_updates
+            or self._deleted_vertices
+            or self._new_edges
+            or self._deleted_edges
+        )
+
+    # ----- vertex ids -----
+
+    def _vid(self, idx: int) -> str:
+        if idx < self._base_vertex_count:
+            return self._vids.get(idx).decode("utf-8")
+        return self._new_vids[idx - self._base_vertex_count]
+
+    def _lookup(self, vid: str) -> Optional[int]:
+        """Find the integer id of a vertex, including the deleted ones."""
+        idx = self._new_vid_index.get(vid)
+        if idx is not None:
+            return idx
+        key = vid.encode("utf-8")
+        lo, hi = 0, len(self._vid_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._vids.get(int(self._vid_order[mid])) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._vid_order):
+            idx = int(self._vid_order[lo])
+            if self._vids.get(idx) == key:
+                return idx
+        return None
+
+    def vertex_index(self, vid: str) -> Optional[int]:
+        """Return the integer id of a vertex, None if it doesn't exist."""
+        idx = self._lookup(vid)
+        return None if idx is None or idx in self._deleted_vertices else idx
+
+    def _ensure_vertex(self, vid: str) -> int:
+        idx = self._lookup(vid)
+        if idx is None:
+            idx = self._base_vertex_count + len(self._new_vids)
+            self._new_vids.append(vid)
+            self._new_vid_index[vid] = idx
+            self._vertex_updates[idx] = IdVertex(vid)
+        elif idx in self._deleted_vertices:
+            self._deleted_vertices.discard(idx)
+            self._vertex_updates[idx] = IdVertex(vid)
+        return idx
+
+    def _label_id(self, label: str) -> int:
+        label_id = self._label_ids.get(label)
+        if label_id is None:
+            label_id = len(self._labels)
+            self._labels.append(label)
+            self._label_ids[label] = label_id
+        return label_id
+
+    # ----- decoding -----
+
+    def _decode_vertex(self, idx: int) -> Vertex:
+        vertex = self._vertex_updates.get(idx)
+        if vertex is not None:
+            return vertex
+        vid = self._vid(idx)
+        if not self._vertex_flags[idx]:
+            return IdVertex(vid)
+        name = self._vertex_names.get(idx)
+        props = {}
+        for key, column in self._vertex_props.items():
+            value = column.get(idx)
+            if value:
+                props[key] = json.loads(value)
+        return Vertex(vid, json.loads(name) if name else None, **props)
+
+    def _decode_edge(self, e: int) -> Edge:
+        props = {}
+        for key, column in self._edge_props.items():
+            value = column.get(e)
+            if value:
+                props[key] = json.loads(value)
+        return Edge(
+            self._vid(int(self._edge_src[e])),
+            self._vid(int(self._edge_dst[e])),
+            self._labels[int(self._edge_label[e])],
+            **props,
+        )
+
+    def _base_out_edges(self, idx: int) -> range:
+        if idx >= self._base_vertex_count:
+            return range(0)
+        return range(int(self._out_offsets[idx]), int(self._out_offsets[idx + 1]))
+
+    def _base_in_edges(self, idx: int) -> List[int]:
+        if idx >= self._base_vertex_count:
+            return []
+        start, end = int(self._in_offsets[idx]), int(self._in_offsets[idx + 1])
+        return self._in_edges[start:end].tolist()
+
+    def _find_base_edges(
+        self, sidx: int, tidx: int, label_id: Optional[int] = None
+    ) -> List[int]:
+        edges = self._base_out_edges(sidx)
+        if not edges:
+            return []
+        mask = self._edge_dst[edges.start : edges.stop] == tidx
+        if label_id is not None:
+            mask &= self._edge_label[edges.start : edges.stop] == label_id
+        return [
+            edges.start + int(i)
+            for i in np.flatnonzero(mask)
+            if edges.start + int(i) not in self._deleted_edges
+        ]
+
+    # ----- writes -----
+
+    @_synchronized
+    def upsert_vertex(self, vertex: Vertex):
+        """Insert or update a vertex based on its ID."""
+        self._unsaved = True
+        idx = self._lookup(vertex.vid)
+        if idx is None or idx in self._deleted_vertices:
+            idx = self._ensure_vertex(vertex.vid)
+            self._vertex_updates[idx] = vertex
+        else:
+            current = self._decode_vertex(idx)
+            if isinstance(current, IdVertex):
+                self._vertex_updates[idx] = vertex
+            else:
+                current.props.update(vertex.props)
+                self._vertex_updates[idx] = current
+
+        for key in vertex.props.keys():
+            if key not in self._vertex_prop_keys:
+                self._vertex_prop_keys.append(key)
+
+    @_synchronized
+    def append_edge(self, edge: Edge) -> bool:
+        """Append an edge if it doesn't exist; requires edge label."""
+        sidx = self._ensure_vertex(edge.sid)
+        tidx = self._ensure_vertex(edge.tid)
+        key = (sidx, tidx, self._label_id(edge.name))
+        if key in self._new_edges or self._find_base_edges(*key):
+            return False
+
+        self._unsaved = True
+        self._new_edges[key] = edge
+        self._delta_out.setdefault(sidx, {})[key] = None
+        self._delta_in.setdefault(tidx, {})[key] = None
+
+        for prop_key in edge.props.keys():
+            if prop_key not in self._edge_prop_keys:
+                self._edge_prop_keys.append(prop_key)
+        self._edge_count += 1
+        return True
+
+    @_synchronized
+    def upsert_graph(self, graph: Graph):
+        """Upsert a graph."""
+        for vertex in graph.vertices():
+            self.upsert_vertex(vertex)
+
+        for edge in graph.edges():
+            self.append_edge(edge)
+
+    def _del_new_edge(self, key: _EdgeKey):
+        self._unsaved = True
+        del self._new_edges[key]
+        self._delta_out[key[0]].pop(key, None)
+        self._delta_in[key[1]].pop(key, None)
+        self._edge_count -= 1
+
+    def _del_base_edge(self, e: int):
+        if e not in self._deleted_edges:
+            self._unsaved = True
+            self._deleted_edges.add(e)
+            self._edge_count -= 1
+
+    @_synchronized
+    def del_vertices(self, *vids: str):
+        """Delete specified vertices."""
+        for vid in vids:
+            idx = self.vertex_index(vid)
+            if idx is None:
+                continue
+            self.del_neighbor_edges(vid, Direction.BOTH)
+            self._unsaved = True
+            self._deleted_vertices.add(idx)
+            self._vertex_updates.pop(idx, None)
+
+    @_synchronized
+    def del_edges(self, sid: str, tid: str, name: str, **props):
+        """Delete edges."""
+        sidx, tidx = self.vertex_index(sid), self.vertex_index(tid)
+        if sidx is None or tidx is None:
+            return
+        label_id = self._label_ids.get(name) if name else None
+        if name and label_id is None:
+            return
+
+        for e in self._find_base_edges(sidx, tidx, label_id):
+            if not props or self._decode_edge(e).has_props(**props):
+                self._del_base_edge(e)
+        for key in list(self._delta_out.get(sidx, {})):
+            if key[1] != tidx or (label_id is not None and key[2] != label_id):
+                continue
+            if self._new_edges[key].has_props(**props):
+                self._del_new_edge(key)
+
+    @_synchronized
+    def del_neighbor_edges(self, vid: str, direction: Direction = Direction.OUT):
+        """Delete all neighbor edges."""
+        idx = self.vertex_index(vid)
+        if idx is None:
+            return
+        if direction in [Direction.OUT, Direction.BOTH]:
+            for e in self._base_out_edges(idx):
+                self._del_base_edge(e)
+            for key in list(self._delta_out.get(idx, {})):
+                self._del_new_edge(key)
+        if direction in [Direction.IN, Direction.BOTH]:
+            for e in self._base_in_edges(idx):
+                self._del_base_edge(e)
+            for key in list(self._delta_in.get(idx, {})):
+                self._del_new_edge(key)
+
+    @_synchronized
+    def truncate(self):
+        """Truncate graph."""
+        self._reset()
+
+    # ----- reads -----
+
+    @_synchronized
+    def has_vertex(self, vid: str) -> bool:
+        """Check vertex exists."""
+        return self.vertex_index(vid) is not None
+
+    @_synchronized
+    def get_vertex(self, vid: str) -> Vertex:
+        """Retrieve a vertex by ID."""
+        idx = self.vertex_index(vid)
+        if idx is None:
+            raise KeyError(vid)
+        return self._decode_vertex(idx)
+
+    def _neighbor_edges(self, idx: int, direction: Direction) -> Iterator[Edge]:
+        if direction in [Direction.OUT, Direction.BOTH]:
+            for e in self._base_out_edges(idx):
+                if e not in self._deleted_edges:
+                    yield self._decode_edge(e)
+            for key in self._delta_out.get(idx, {}):
+                yield self._new_edges[key]
+        if direction in [Direction.IN, Direction.BOTH]:
+            for e in self._base_in_edges(idx):
+                # The self loops are already returned as out edges
+                is_loop = direction == Direction.BOTH and self._edge_src[e] == idx
+                if e not in self._deleted_edges and not is_loop:
+                    yield self._decode_edge(e)
+            for key in self._delta_in.get(idx, {}):
+                if direction != Direction.BOTH or key[0] != idx:
+                    yield self._new_edges[key]
+
+    def get_neighbor_edges(
+        self,
+        vid: str,
+        direction: Direction = Direction.OUT,
+        limit: Optional[int] = None,
+    ) -> Iterator[Edge]:
+        """Get edges connected to a vertex by direction."""
+        if direction not in [Direction.OUT, Direction.IN, Direction.BOTH]:
+            raise ValueError(f"Invalid direction: {direction}")
+        idx = self.vertex_index(vid)
+        if idx is None:
+            return iter([])
+        es = self._neighbor_edges(idx, direction)
+        if limit:
+            return (e for _, e in zip(range(limit), es))
+        return es
+
+    def vertices(
+        self, filter_fn: Optional[Callable[[Vertex], bool]] = None
+    ) -> Iterator[Vertex]:
+        """Return vertices."""
+        total = self._base_vertex_count + len(self._new_vids)
+        all_vertices = (
+            self._decode_vertex(idx)
+            for idx in range(total)
+            if idx not in self._deleted_vertices
+        )
+        return all_vertices if filter_fn is None else filter(filter_fn, all_vertices)
+
+    def edges(
+        self, filter_fn: Optional[Callable[[Edge], bool]] = None
+    ) -> Iterator[Edge]:
+        """Return edges."""
+        base_edges = (
+            self._decode_edge(e)
+            for e in range(self._base_edge_count)
+            if e not in self._deleted_edges
+        )
+        all_edges = (e for es in [base_edges, self._new_edges.values()] for e in es)
+        return all_edges if filter_fn is None else filter(filter_fn, all_edges)
+
+    # ----- compaction and persistence -----
+
+    @_synchronized
+    def compact(self):
+        """Merge the delta into the compacted arrays."""
+        if self.is_compacted:
+            return
+        n_base = self._base_vertex_count
+        total = n_base + len(self._new_vids)
+
+        alive = np.ones(total, dtype=bool)
+        if self._deleted_vertices:
+            alive[np.fromiter(self._deleted_vertices, np.int64)] = False
+        kept = np.flatnonzero(alive)
+        new_index = np.cumsum(alive) - 1
+
+        # Vertices: the updated ones are appended after the compacted ones, then
+        # every column is gathered in the order of the kept vertices.
+        updated = sorted(self._vertex_updates)
+        source = np.arange(total, dtype=np.int64)
+        source[updated] = n_base + np.arange(len(updated), dtype=np.int64)
+        source = source[kept]
+        updates = [self._vertex_updates[idx] for idx in updated]
+
+        vids = [self._vid(idx) for idx in kept.tolist()]
+        self._vids = _Blob.from_list([vid.encode("utf-8") for vid in vids])
+        self._vid_order = np.array(
+            sorted(range(len(vids)), key=lambda i: vids[i].encode("utf-8")),
+            dtype=np.int64,
+        )
+        flags = np.fromiter(
+            (not isinstance(v, IdVertex) for v in updates), np.uint8, len(updates)
+        )
+        self._vertex_flags = np.concatenate([np.asarray(self._vertex_flags), flags])[
+            source
+        ]
+        self._vertex_names = self._vertex_names.concat(
+            _Blob.from_list(
+                [_encode_value(v._name) if v._name else b"" for v in updates]
+            )
+        ).gather(source)
+        self._vertex_props = {
+            key: self._vertex_props.get(key, _Blob.empty(n_base))
+            .concat(
+                _Blob.from_list(
+                    [
+                        _encode_value(v.props[key]) if key in v.props else b""
+                        for v in updates
+                    ]
+                )
+            )
+            .gather(source)
+            for key in self._vertex_prop_keys
+        }
+
+        # Edges: append the new edges, drop the deleted ones and sort by source
+        e_base = self._base_edge_count
+        new_edges = list(self._new_edges.items())
+        src = np.concatenate(
+            [self._edge_src, np.array([k[0] for k, _ in new_edges], dtype=np.int64)]
+        )
+        dst = np.concatenate(
+            [self._edge_dst, np.array([k[1] for k, _ in new_edges], dtype=np.int64)]
+        )
+        label = np.concatenate(
+            [self._edge_label, np.array([k[2] for k, _ in new_edges], dtype=np.int64)]
+        )
+        edge_alive = alive[src] & alive[dst]
+        if self._deleted_edges:
+            edge_alive[np.fromiter(self._deleted_edges, np.int64)] = False
+        src, dst = new_index[src], new_index[dst]
+        order = np.flatnonzero(edge_alive)
+        order = order[np.argsort(src[order], kind="stable")]
+
+        self._edge_src = src[order]
+        self._edge_dst = dst[order]
+        self._edge_label = label[order]
+        self._edge_props = {
+            key: self._edge_props.get(key, _Blob.empty(e_base))
+            .concat(
+                _Blob.from_list(
+                    [
+                        _encode_value(e.props[key]) if key in e.props else b""
+                        for _, e in new_edges
+                    ]
+                )
+            )
+            .gather(order)
+            for key in self._edge_prop_keys
+        }
+        n = len(kept)
+        self._out_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._edge_src, minlength=n), out=self._out_offsets[1:])
+        self._in_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._edge_dst, minlength=n), out=self._in_offsets[1:])
+        self._in_edges = np.argsort(self._edge_dst, kind="stable").astype(np.int64)
+
+        self._new_vids = []
+        self._new_vid_index = {}
+        self._vertex_updates = {}
+        self._deleted_vertices = set()
+        self._new_edges = {}
+        self._delta_out = {}
+        self._delta_in = {}
+        self._deleted_edges = set()
+        self._edge_count = len(self._edge_src)
+
+    @_synchronized
+    def save(self, path: str):
+        """Compact the graph and save it to a directory."""
+        self.compact()
+        os.makedirs(path, exist_ok=True)
+        self._vids.save(path, "vertex_ids")
+        _save_array(path, "vertex_order", self._vid_order)
+        _save_array(path, "vertex_flags", self._vertex_flags)
+        self._vertex_names.save(path, "vertex_names")
+        for i, key in enumerate(self._vertex_prop_keys):
+            self._vertex_props[key].save(path, f"vertex_props_{i}")
+        _save_array(path, "edge_src", self._edge_src)
+        _save_array(path, "edge_dst", self._edge_dst)
+        _save_array(path, "edge_label", self._edge_label)
+        for i, key in enumerate(self._edge_prop_keys):
+            self._edge_props[key].save(path, f"edge_props_{i}")
+        _save_array(path, "out_offsets", self._out_offsets)
+        _save_array(path, "in_offsets", self._in_offsets)
+        _save_array(path, "in_edges", self._in_edges)
+
+        # Write the metadata at last, it makes the new arrays visible
+        meta = {
+            "version": _FORMAT_VERSION,
+            "labels": self._labels,
+            "vertex_prop_keys": self._vertex_prop_keys,
+            "edge_prop_keys": self._edge_prop_keys,
+        }
+        tmp_file = os.path.join(path, f".{_META_FILE}.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_file, os.path.join(path, _META_FILE))
+        self._unsaved = False
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        """Whether a graph is saved in the directory."""
+        return os.path.exists(os.path.join(path, _META_FILE))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CSRGraph":
+        """Load a graph saved by `save`.
+
+        Args:
+            path (str): The directory of the graph.
+            mmap (bool): Memory map the arrays instead of reading them, the pages
+                are loaded by the OS when they are accessed.
+        """
+        with open(os.path.join(path, _META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != _FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported graph format version {meta.get('version')} in {path}"
+            )
+        mmap_mode = "r" if mmap else None
+
+        graph = cls()
+        graph._labels = meta["labels"]
+        graph._label_ids = {label: i for i, label in enumerate(graph._labels)}
+        graph._vertex_prop_keys = meta["vertex_prop_keys"]
+        graph._edge_prop_keys = meta["edge_prop_keys"]
+        graph._vids = _Blob.load(path, "vertex_ids", mmap_mode)
+        graph._vid_order = _load_array(path, "vertex_order", mmap_mode)
+        graph._vertex_flags = _load_array(path, "vertex_flags", mmap_mode)
+        graph._vertex_names = _Blob.load(path, "vertex_names", mmap_mode)
+        graph._vertex_props = {
+            key: _Blob.load(path, f"vertex_props_{i}", mmap_mode)
+            for i, key in enumerate(graph._vertex_prop_keys)
+        }
+        graph._edge_src = _load_array(path, "edge_src", mmap_mode)
+        graph._edge_dst = _load_array(path, "edge_dst", mmap_mode)
+        graph._edge_label = _load_array(path, "edge_label", mmap_mode)
+        graph._edge_props = {
+            key: _Blob.load(path, f"edge_props_{i}", mmap_mode)
+            for i, key in enumerate(graph._edge_prop_keys)
+        }
+        graph._out_offsets = _load_array(path, "out_offsets", mmap_mode)
+        graph._in_offsets = _load_array(path, "in_offsets", mmap_mode)
+        graph._in_edges = _load_array(path, "in_edges", mmap_mode)
+        graph._edge_count = len(graph._edge_src)
+        graph._unsaved = False
+        return graph
+
+    # ----- search -----
+
+    def _expand(
+        self, frontier: np.ndarray, direct: Direction, fan: Optional[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the edges of the frontier vertices and the neighbor of each."""
+        owners, edges, neighbors = [], [], []
+        if direct in [Direction.OUT, Direction.BOTH]:
+            starts = self._out_offsets[frontier]
+            counts = self._out_offsets[frontier + 1] - starts
+            out_edges = _ranges(starts, counts)
+            owners.append(np.repeat(frontier, counts))
+            edges.append(out_edges)
+            neighbors.append(self._edge_dst[out_edges])
+        if direct in [Direction.IN, Direction.BOTH]:
+            starts = self._in_offsets[frontier]
+            counts = self._in_offsets[frontier + 1] - starts
+            in_edges = self._in_edges[_ranges(starts, counts)]
+            owners.append(np.repeat(frontier, counts))
+            edges.append(in_edges)
+            neighbors.append(self._edge_src[in_edges])
+        owner = np.concatenate(owners)
+        edge = np.concatenate(edges)
+        neighbor = np.concatenate(neighbors)
+
+        if fan and len(owner):
+            # Keep the first `fan` edges of each vertex
+            order = np.argsort(owner, kind="stable")
+            owner, edge, neighbor = owner[order], edge[order], neighbor[order]
+            group_start = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+            group_size = np.diff(np.r_[group_start, len(owner)])
+            rank = np.arange(len(owner)) - np.repeat(group_start, group_size)
+            keep = rank < fan
+            edge, neighbor = edge[keep], neighbor[keep]
+        return edge, neighbor
+
+    @_synchronized
+    def k_hop(
+        self,
+        vids: List[str],
+        direct: Direction = Direction.OUT,
+        depth: Optional[int] = None,
+        fan: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the k-hop subgraph by a level-synchronous BFS.
+
+        Args:
+            vids (List[str]): The start vertices.
+            direct (Direction): The direction of the edges to follow.
+            depth (Optional[int]): The max number of hops, unlimited if not set.
+            fan (Optional[int]): The max number of edges to follow from a vertex.
+            limit (Optional[int]): The max number of edges in the subgraph.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The integer ids of the vertices and the
+                edges of the subgraph, only valid until the graph is changed.
+        """
+        self.compact()
+        visited = np.zeros(self._base_vertex_count, dtype=bool)
+        taken = np.zeros(self._base_edge_count, dtype=bool)
+        seeds = [idx for idx in map(self.vertex_index, vids) if idx is not None]
+        frontier = np.unique(np.array(seeds, dtype=np.int64))
+        visited[frontier] = True
+
+        hop, edge_count = 0, 0
+        while len(frontier) and not (depth and hop >= depth):
+            edges, neighbors = self._expand(frontier, direct, fan)
+            # Drop the edges already taken, e.g. the edges between two vertices
+            # of the frontier
+            _, first = np.unique(edges, return_index=True)
+            first.sort()
+            first = first[~taken[edges[first]]]
+            edges, neighbors = edges[first], neighbors[first]
+            if limit:
+                edges, neighbors = (
+                    edges[: limit - edge_count],
+                    neighbors[: limit - edge_count],
+                )
+            taken[edges] = True
+            edge_count += len(edges)
+
+            frontier = np.unique(neighbors[~visited[neighbors]])
+            visited[frontier] = True
+            hop += 1
+            if limit and edge_count >= limit:
+                break
+        return np.flatnonzero(visited), np.flatnonzero(taken)
+
+    @_synchronized
+    def search(
+        self,
+        vids: List[str],
+        direct: Direction = Direction.OUT,
+        depth: Optional[int] = None,
+        fan: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> MemoryGraph:
+        """Search the k-hop subgraph of the vertices, see `k_hop`."""
+        vertex_ids, edge_ids = self.k_hop(vids, direct, depth, fan, limit)
+        subgraph = MemoryGraph()
+        for idx in vertex_ids.tolist():
+            subgraph.upsert_vertex(self._decode_vertex(idx))
+        for e in edge_ids.tolist():
+            subgraph.append_edge(self._decode_edge(e))
+        return subgraph
+
+    def schema(self) -> Dict[str, Any]:
+        """Return schema."""
+        return {
+            "schema": [
+                {
+                    "type": "VERTEX",
+                    "properties": [{"name": k} for k in self._vertex_prop_keys],
+                },
+                {
+                    "type": "EDGE",
+                    "properties": [{"name": k} for k in self._edge_prop_keys],
+                },
+            ]
+        }
+
+    def format(self, entities_only: Optional[bool] = False) -> str:
+        """Format graph to string."""
+        vs_str = "\n".join(v.format() for v in self.vertices())
+        es_str = "\n".join(
+            f"{self.get_vertex(e.sid).format(concise=True)}"
+            f"{e.format()}"
+            f"{self.get_vertex(e.tid).format(concise=True)}"
+            for e in self.edges()
+        )
+        if entities_only:
+            return f"Entities:\n{vs_str}" if vs_str else ""
+        else:
+            return (
+                f"Entities:\n{vs_str}\n\nRelationships:\n{es_str}"
+                if (vs_str or es_str)
+                else ""
+            )
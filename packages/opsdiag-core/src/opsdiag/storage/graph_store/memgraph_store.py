@@ -1,19 +1,46 @@
 """Memory graph store."""
 
+import atexit
 import logging
+import os
+import shutil
+import threading
+import weakref
+from typing import Optional
 
-from opsdiag._private.pydantic import ConfigDict
+from opsdiag._private.pydantic import ConfigDict, Field
 from opsdiag.storage.graph_store.base import GraphStoreBase, GraphStoreConfig
-from opsdiag.storage.graph_store.graph import MemoryGraph
+from opsdiag.storage.graph_store.graph import Graph, MemoryGraph
 
 logger = logging.getLogger(__name__)
 
+# The persisted stores, saved again when the process exits
+_persisted_stores: "weakref.WeakSet[MemoryGraphStore]" = weakref.WeakSet()
+_persist_lock = threading.Lock()
+_exit_handler_registered = False
+
+
+def _persist_all():
+    for store in list(_persisted_stores):
+        try:
+            store.persist()
+        except Exception as e:
+            logger.warning(f"Persist graph {store.get_config().name} failed: {e}")
+
 
 class MemoryGraphStoreConfig(GraphStoreConfig):
     """Memory graph store config."""
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
+    graph_path: Optional[str] = Field(
+        default=None,
+        description="The directory to persist the graphs in the compact CSR format, "
+        "each graph is saved in a sub directory of its name. Use the environment "
+        "variable MEMORY_GRAPH_PATH if not set, keep the graph in memory only if "
+        "neither is set.",
+    )
+
 
 class MemoryGraphStore(GraphStoreBase):
     """Memory graph store."""
@@ -21,8 +48,52 @@ class MemoryGraphStore(GraphStoreBase):
     def __init__(self, graph_store_config: MemoryGraphStoreConfig):
         """Initialize MemoryGraphStore with a memory graph."""
         self._graph_store_config = graph_store_config
-        self._graph = MemoryGraph()
+        graph_path = graph_store_config.graph_path or os.getenv("MEMORY_GRAPH_PATH")
+        self._graph_path: Optional[str] = (
+            os.path.join(graph_path, graph_store_config.name) if graph_path else None
+        )
+        self._graph: Graph = self._load_graph()
+        if self._graph_path:
+            self._register_persist_on_exit()
+
+    def _load_graph(self) -> Graph:
+        if not self._graph_path:
+            return MemoryGraph()
+
+        from opsdiag.storage.graph_store.csr_graph import CSRGraph
+
+        if CSRGraph.exists(self._graph_path):
+            logger.info(f"Load the compact graph from {self._graph_path}")
+            return CSRGraph.load(self._graph_path)
+        return CSRGraph()
+
+    def _register_persist_on_exit(self):
+        global _exit_handler_registered
+
+        _persisted_stores.add(self)
+        if not _exit_handler_registered:
+            atexit.register(_persist_all)
+            _exit_handler_registered = True
 
     def get_config(self):
         """Get the graph store config."""
         return self._graph_store_config
+
+    def persist(self):
+        """Save the graph to the graph path, if it is configured and changed."""
+        from opsdiag.storage.graph_store.csr_graph import CSRGraph
+
+        graph = self._graph
+        if not self._graph_path or not isinstance(graph, CSRGraph):
+            return
+        with _persist_lock:
+            if graph.has_unsaved_changes:
+                graph.save(self._graph_path)
+                logger.info(f"Persist the compact graph to {self._graph_path}")
+
+    def remove_persisted(self):
+        """Remove the saved graph, the graph is dropped."""
+        _persisted_stores.discard(self)
+        if self._graph_path and os.path.exists(self._graph_path):
+            with _persist_lock:
+                shutil.rmtree(self._graph_path, ignore_errors=True)
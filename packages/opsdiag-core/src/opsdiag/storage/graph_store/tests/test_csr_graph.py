@@ -0,0 +1,203 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from opsdiag.storage.graph_store.csr_graph import CSRGraph
+from opsdiag.storage.graph_store.graph import Direction, Edge, MemoryGraph, Vertex
+from opsdiag.storage.graph_store.memgraph_store import (
+    MemoryGraphStore,
+    MemoryGraphStoreConfig,
+)
+
+
+def _build(graph):
+    graph.upsert_vertex(Vertex("A", "A", description="vertex A", weight=1))
+    graph.upsert_vertex(Vertex("B", description="vertex B"))
+    graph.append_edge(Edge("A", "B", "0", weight=1.0))
+    graph.append_edge(Edge("B", "C", "1"))
+    graph.append_edge(Edge("C", "D", "2"))
+    graph.append_edge(Edge("D", "A", "3"))
+    graph.append_edge(Edge("A", "E", "4"))
+    graph.append_edge(Edge("E", "E", "5"))
+    return graph
+
+
+@pytest.fixture(params=[False, True], ids=["delta", "compacted"])
+def g(request):
+    graph = _build(CSRGraph())
+    if request.param:
+        graph.compact()
+    return graph
+
+
+def _triplets(graph):
+    return sorted(e.triplet() for e in graph.edges())
+
+
+def test_same_as_memory_graph(g):
+    mg = _build(MemoryGraph())
+    assert g.vertex_count == mg.vertex_count == 5
+    assert g.edge_count == mg.edge_count == 6
+    assert _triplets(g) == _triplets(mg)
+    assert g.get_vertex("A").props == {"description": "vertex A", "weight": 1}
+    assert g.get_vertex("A").name == "A"
+    assert g.get_vertex("C").props == {}
+    for csr_schema, mg_schema in zip(g.schema()["schema"], mg.schema()["schema"]):
+        assert sorted(p["name"] for p in csr_schema["properties"]) == sorted(
+            p["name"] for p in mg_schema["properties"]
+        )
+    assert not g.append_edge(Edge("A", "B", "0"))
+    assert g.append_edge(Edge("A", "B", "00"))
+
+
+def test_upsert_vertex(g):
+    g.upsert_vertex(Vertex("A", weight=2))
+    g.upsert_vertex(Vertex("C", "C", description="vertex C"))
+    assert g.get_vertex("A").props == {"description": "vertex A", "weight": 2}
+    assert g.get_vertex("C").props == {"description": "vertex C"}
+    g.compact()
+    assert g.get_vertex("A").props == {"description": "vertex A", "weight": 2}
+    assert g.get_vertex("C").name == "C"
+
+
+def test_neighbor_edges(g):
+    assert {e.tid for e in g.get_neighbor_edges("A")} == {"B", "E"}
+    assert {e.sid for e in g.get_neighbor_edges("A", Direction.IN)} == {"D"}
+    assert len(list(g.get_neighbor_edges("A", Direction.BOTH))) == 3
+    assert len(list(g.get_neighbor_edges("E", Direction.BOTH))) == 2
+    assert len(list(g.get_neighbor_edges("A", limit=1))) == 1
+    assert list(g.get_neighbor_edges("X")) == []
+
+
+def test_delete(g):
+    g.del_edges("A", "B", "0", weight=2.0)
+    assert g.edge_count == 6
+    g.del_edges("A", "B", "0", weight=1.0)
+    assert g.edge_count == 5
+    g.del_neighbor_edges("E", Direction.IN)
+    assert g.edge_count == 3
+    g.del_vertices("C")
+    assert not g.has_vertex("C")
+    assert g.vertex_count == 4
+    assert _triplets(g) == [("D", "3", "A")]
+
+    g.compact()
+    assert g.vertex_count == 4
+    assert _triplets(g) == [("D", "3", "A")]
+    assert g.append_edge(Edge("C", "A", "6"))
+    assert g.get_vertex("C").props == {}
+
+
+def test_search(g):
+    subgraph = g.search(["A"], depth=1)
+    assert _triplets(subgraph) == [("A", "0", "B"), ("A", "4", "E")]
+    assert subgraph.get_vertex("B").props == {"description": "vertex B"}
+
+    subgraph = g.search(["A"], depth=2)
+    assert len(_triplets(subgraph)) == 4
+
+    subgraph = g.search(["A"], Direction.BOTH)
+    assert subgraph.edge_count == 6
+    assert g.search(["A"], Direction.BOTH, limit=2).edge_count == 2
+    assert g.search(["A"], Direction.BOTH, depth=1, fan=1).edge_count == 1
+    assert g.search(["C"], Direction.IN, depth=1).edge_count == 1
+    assert g.search(["X"]).vertex_count == 0
+
+
+def test_concurrent_k_hop():
+    graph = CSRGraph()
+    for i in range(3000):
+        graph.append_edge(Edge(str(i), str(i + 1), "next"))
+    graph.compact()
+    # A pending delta, compacted by the first search
+    for i in range(3000, 6000):
+        graph.append_edge(Edge(str(i), str(i + 1), "next"))
+
+    def _k_hop(_):
+        vertex_ids, edge_ids = graph.k_hop(["0"], depth=10)
+        return len(vertex_ids), len(edge_ids)
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(_k_hop, range(32)))
+    assert results == [(11, 10)] * 32
+    assert graph.is_compacted
+    assert graph.vertex_count == 6001
+    assert graph.edge_count == 6000
+    assert graph.search(["5990"]).edge_count == 10
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_and_load(g, tmp_path, mmap):
+    path = str(tmp_path / "graph")
+    g.save(path)
+    assert CSRGraph.exists(path)
+    loaded = CSRGraph.load(path, mmap=mmap)
+    assert loaded.vertex_count == 5
+    assert _triplets(loaded) == _triplets(g)
+    assert loaded.get_vertex("A").props == g.get_vertex("A").props
+    assert loaded.search(["A"], depth=1).edge_count == 2
+
+    # Update the loaded graph and save it back
+    loaded.append_edge(Edge("E", "F", "6", weight=0.5))
+    loaded.del_vertices("B")
+    loaded.save(path)
+    reloaded = CSRGraph.load(path, mmap=mmap)
+    assert reloaded.vertex_count == 5
+    assert ("E", "6", "F") in _triplets(reloaded)
+    assert next(reloaded.get_neighbor_edges("E")).props in ({}, {"weight": 0.5})
+    assert not reloaded.has_vertex("B")
+
+
+def test_save_empty_graph(tmp_path):
+    path = str(tmp_path / "graph")
+    CSRGraph().save(path)
+    graph = CSRGraph.load(path)
+    assert graph.vertex_count == 0
+    assert graph.search(["A"]).edge_count == 0
+
+
+def test_large_graph_k_hop():
+    graph = CSRGraph()
+    n = 2000
+    for i in range(n):
+        graph.append_edge(Edge(f"v{i}", f"v{(i + 1) % n}", "next"))
+        graph.append_edge(Edge(f"v{i}", f"v{(i * 7) % n}", "jump"))
+    vertex_ids, edge_ids = graph.k_hop(["v0"], depth=3)
+    # v0 -> v1, v0 (self loop); v1 -> v2, v7; ...
+    assert len(vertex_ids) == len({0, 1, 2, 7, 3, 14, 8, 49})
+    assert graph.edge_count == 2 * n
+
+
+def test_memory_graph_store_persist(tmp_path):
+    path = str(tmp_path / "graph")
+    store = MemoryGraphStore(MemoryGraphStoreConfig(graph_path=path))
+    _build(store._graph)
+    store.persist()
+
+    store = MemoryGraphStore(MemoryGraphStoreConfig(graph_path=path))
+    assert store._graph.edge_count == 6
+    assert isinstance(MemoryGraphStore(MemoryGraphStoreConfig())._graph, MemoryGraph)
+
+
+def test_memory_graph_store_persist_changes_only(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_GRAPH_PATH", str(tmp_path))
+    store = MemoryGraphStore(MemoryGraphStoreConfig(name="kg"))
+    _build(store._graph)
+    store.persist()
+    meta = tmp_path / "kg" / "graph.json"
+    mtime = os.path.getmtime(meta)
+    assert not store._graph.has_unsaved_changes
+
+    # Not saved again without changes
+    store.persist()
+    assert os.path.getmtime(meta) == mtime
+
+    store._graph.del_vertices("A")
+    assert store._graph.has_unsaved_changes
+    store.persist()
+    reloaded = MemoryGraphStore(MemoryGraphStoreConfig(name="kg"))
+    assert not reloaded._graph.has_vertex("A")
+
+    reloaded.remove_persisted()
+    assert not (tmp_path / "kg").exists()
@@ -0,0 +1,170 @@
+"""Benchmark of the agent chat streams.
+
+Compare the old stream, which polled the queue with timeouts and slept 5 ms after
+every message, with the :class:`ChatChunkStream` ended by a sentinel, which merges
+the chunks produced within a short window into one frame.
+
+A burst session produces ``--chunks`` chunks, one every ``--interval_ms``, like the
+tokens of a model. The idle sessions wait for a slow model and produce nothing.
+
+Run it with:
+
+.. code-block:: shell
+
+    python -m opsdiag.util.benchmarks.agent.chat_stream_benchmarks \\
+        --chunks 500 --idle_sessions 1000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import AsyncIterator, Dict
+
+from opsdiag_serve.agent.agents.chat.chunk_stream import ChatChunkStream
+
+
+async def _produce(chunks: int, interval_ms: float) -> AsyncIterator[str]:
+    for i in range(chunks):
+        if interval_ms:
+            await asyncio.sleep(interval_ms / 1000)
+        yield f"data: {i}\n\n"
+
+
+async def polling_stream(
+    chunks: int, interval_ms: float, message_sleep: bool = True
+) -> AsyncIterator[str]:
+    """The old stream, the end of the producer is noticed by the timeouts."""
+    queue: asyncio.Queue = asyncio.Queue()
+    complete = asyncio.Event()
+
+    async def _producer():
+        async for chunk in _produce(chunks, interval_ms):
+            await queue.put(chunk)
+            if message_sleep:
+                # The sleep of the old message loop
+                await asyncio.sleep(0.005)
+        complete.set()
+
+    task = asyncio.create_task(_producer())
+    while not (complete.is_set() and queue.empty()):
+        try:
+            timeout = 1.0 if not complete.is_set() else 0.1
+            yield await asyncio.wait_for(queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            continue
+    await task
+
+
+async def event_stream(
+    chunks: int, interval_ms: float, window_ms: float
+) -> AsyncIterator[str]:
+    """The new stream, ended by a sentinel and coalesced in frames."""
+    stream: ChatChunkStream = ChatChunkStream(window_ms=window_ms)
+
+    async def _producer():
+        try:
+            async for chunk in _produce(chunks, interval_ms):
+                await stream.put(chunk)
+        finally:
+            stream.end()
+
+    task = asyncio.create_task(_producer())
+    async for frame in stream.frames():
+        yield "".join(frame)
+    await task
+
+
+async def run_burst(stream: AsyncIterator[str]) -> Dict[str, float]:
+    start = time.perf_counter()
+    ttfb = None
+    writes = 0
+    async for _ in stream:
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+        writes += 1
+    return {
+        "ttfb_ms": (ttfb or 0) * 1000,
+        "total_ms": (time.perf_counter() - start) * 1000,
+        "writes": writes,
+    }
+
+
+async def run_idle(new: bool, sessions: int, idle_s: float) -> float:
+    """The CPU microseconds per idle session per second."""
+
+    async def _idle_producer():
+        await asyncio.sleep(idle_s)
+        yield "data: done\n\n"
+
+    async def _old_session():
+        queue: asyncio.Queue = asyncio.Queue()
+        complete = asyncio.Event()
+
+        async def _producer():
+            async for chunk in _idle_producer():
+                await queue.put(chunk)
+            complete.set()
+
+        task = asyncio.create_task(_producer())
+        while not (complete.is_set() and queue.empty()):
+            try:
+                timeout = 1.0 if not complete.is_set() else 0.1
+                await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                continue
+        await task
+
+    async def _new_session():
+        stream: ChatChunkStream = ChatChunkStream()
+
+        async def _producer():
+            try:
+                async for chunk in _idle_producer():
+                    await stream.put(chunk)
+            finally:
+                stream.end()
+
+        task = asyncio.create_task(_producer())
+        async for _ in stream.frames():
+            pass
+        await task
+
+    session = _new_session if new else _old_session
+    start = time.process_time()
+    await asyncio.gather(*[session() for _ in range(sessions)])
+    return (time.process_time() - start) / sessions / idle_s * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent chat stream benchmark")
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--interval_ms", type=float, default=0.5)
+    parser.add_argument("--window_ms", type=float, default=10)
+    parser.add_argument("--idle_sessions", type=int, default=1000)
+    parser.add_argument("--idle_seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ("polling", polling_stream(args.chunks, args.interval_ms)),
+        (
+            "polling, no sleep",
+            polling_stream(args.chunks, args.interval_ms, message_sleep=False),
+        ),
+        ("event", event_stream(args.chunks, args.interval_ms, args.window_ms)),
+    ]
+    print(f"{'case':<20}{'ttfb ms':>10}{'total ms':>12}{'writes':>10}")
+    for name, stream in cases:
+        result = asyncio.run(run_burst(stream))
+        print(
+            f"{name:<20}{result['ttfb_ms']:>10.2f}{result['total_ms']:>12.1f}"
+            f"{result['writes']:>10}"
+        )
+
+    print(f"\n{'case':<20}{'cpu us / idle session / s':>28}")
+    for name, new in [("polling", False), ("event", True)]:
+        cpu = asyncio.run(run_idle(new, args.idle_sessions, args.idle_seconds))
+        print(f"{name:<20}{cpu:>28.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark of the dynamic batching of the embedding worker.
+
+A CPU stand-in model is used: every call costs a fixed overhead (like a forward
+pass launch) plus a matrix multiplication per text. Many clients send
+single-text requests concurrently, like the queries of the retrievers.
+
+Run it with:
+
+.. code-block:: shell
+
+    python -m opsdiag.util.benchmarks.embedding.batching_benchmarks --clients 32
+"""
+
+import argparse
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from opsdiag.model.cluster.worker.embedding_batcher import EmbeddingBatcher
+
+
+class CPUStandInEmbeddings:
+    """Hash the bytes of the texts into features and project them."""
+
+    def __init__(self, dim: int = 384, features: int = 2048, overhead_ms: float = 5):
+        rng = np.random.default_rng(0)
+        self._projection = rng.standard_normal((features, dim)).astype(np.float32)
+        self._features = features
+        self._overhead_ms = overhead_ms
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # The model runs one batch at a time
+        with self._lock:
+            time.sleep(self._overhead_ms / 1000)
+            x = np.zeros((len(texts), self._features), dtype=np.float32)
+            for i, text in enumerate(texts):
+                data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+                np.add.at(x[i], (data.astype(np.int64) * 31) % self._features, 1.0)
+            emb = x @ self._projection
+            emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-9
+            return emb.tolist()
+
+
+def run(
+    clients: int, requests_per_client: int, batch_options: Optional[dict] = None
+) -> dict:
+    """Run the clients, use the dynamic batching if ``batch_options`` is set."""
+    model = CPUStandInEmbeddings()
+    batcher = None
+    if batch_options is not None:
+        batcher = EmbeddingBatcher(model.embed_documents, **batch_options)
+    embed = batcher.embed if batcher else model.embed_documents
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def _client(i: int):
+        for j in range(requests_per_client):
+            start = time.perf_counter()
+            embed([f"query {i}-{j} about the service latency"])
+            cost = time.perf_counter() - start
+            with lock:
+                latencies.append(cost)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=_client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if batcher:
+        batcher.stop()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "batch_size": batcher.average_batch_size if batcher else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding batching benchmark")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--max_batch_size", type=int, default=32)
+    parser.add_argument("--max_wait_ms", type=float, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ("no batching", None),
+        (
+            f"dynamic batching (wait {args.max_wait_ms}ms)",
+            {"max_batch_size": args.max_batch_size, "max_wait_ms": args.max_wait_ms},
+        ),
+        (
+            "dynamic batching (no wait)",
+            {"max_batch_size": args.max_batch_size, "max_wait_ms": 0},
+        ),
+    ]
+    print(f"{'case':<36}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'batch':>8}")
+    for name, batch_options in cases:
+        result = run(args.clients, args.requests, batch_options)
+        print(
+            f"{name:<36}{result['throughput']:>10.1f}{result['p50_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['batch_size']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark of the serialization of the embedding vectors.
+
+Compare the JSON lists of floats with the float32 transports of
+:mod:`opsdiag.util.vector_codec`: the encoding time on the worker, the decoding
+time on the client and the payload size.
+
+Run it with:
+
+.. code-block:: shell
+
+    python -m opsdiag.util.benchmarks.embedding.transport_benchmarks --dim 1024
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Callable, List
+
+from opsdiag.util.vector_codec import (
+    decode_vector,
+    encode_vector,
+    pack_vectors,
+    pack_vectors_base64,
+    unpack_vectors,
+    unpack_vectors_json,
+)
+
+
+def _best_of(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(rows: int, dim: int, repeat: int = 3) -> List[dict]:
+    rng = random.Random(0)
+    vectors = [[rng.uniform(-1, 1) for _ in range(dim)] for _ in range(rows)]
+    results = []
+
+    def _case(name, encode, decode):
+        payload = encode()
+        results.append(
+            {
+                "case": name,
+                "encode_ms": _best_of(encode, repeat) * 1000,
+                "decode_ms": _best_of(lambda: decode(payload), repeat) * 1000,
+                "size_kb": len(payload) / 1024,
+            }
+        )
+
+    _case("json", lambda: json.dumps(vectors).encode("utf-8"), json.loads)
+    # The OpenAI encoding_format="base64" of the API server
+    _case(
+        "base64 per vector (OpenAI)",
+        lambda: json.dumps([{"embedding": encode_vector(v)} for v in vectors]).encode(
+            "utf-8"
+        ),
+        lambda payload: [decode_vector(d["embedding"]) for d in json.loads(payload)],
+    )
+    _case(
+        "base64 packed envelope",
+        lambda: json.dumps(pack_vectors_base64(vectors)).encode("utf-8"),
+        lambda payload: unpack_vectors_json(json.loads(payload)),
+    )
+    _case(
+        "octet-stream",
+        lambda: pack_vectors(vectors)[0],
+        lambda payload: unpack_vectors(payload, [rows, dim]),
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding transport benchmark")
+    parser.add_argument("--rows", type=int, default=2048)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.rows} vectors of {args.dim} dimensions")
+    print(f"{'case':<30}{'encode ms':>12}{'decode ms':>12}{'size KB':>12}")
+    for result in run(args.rows, args.dim, args.repeat):
+        print(
+            f"{result['case']:<30}{result['encode_ms']:>12.1f}"
+            f"{result['decode_ms']:>12.1f}{result['size_kb']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
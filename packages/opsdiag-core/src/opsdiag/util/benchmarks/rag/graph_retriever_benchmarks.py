@@ -0,0 +1,194 @@
+"""Benchmark of the latency of the knowledge graph retriever.
+
+The LLM, the embedding model and the graph store are stubs with fixed latencies,
+so the benchmark measures the pipeline only. The concurrent pipeline of
+``GraphRetriever.retrieve`` is compared with the stages run one after another.
+
+Run it with:
+
+.. code-block:: shell
+
+    python -m opsdiag.util.benchmarks.rag.graph_retriever_benchmarks --llm_ms 200
+"""
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from opsdiag.storage.graph_store.graph import MemoryGraph, Vertex
+
+
+def _graph(name: str, hit: bool) -> MemoryGraph:
+    graph = MemoryGraph()
+    if hit:
+        graph.upsert_vertex(Vertex(name, name=name))
+    return graph
+
+
+class StubGraphStoreAdapter:
+    """The graph store, each query blocks for ``db_ms``."""
+
+    def __init__(self, db_ms: float, text2gql_hit: bool, triplet_hit: bool):
+        self.graph_store = SimpleNamespace(enable_similarity_search=True)
+        self._db_s = db_ms / 1000
+        self._text2gql_hit = text2gql_hit
+        self._triplet_hit = triplet_hit
+
+    def get_schema(self) -> str:
+        time.sleep(self._db_s)
+        return "{}"
+
+    def query(self, query: str) -> MemoryGraph:
+        time.sleep(self._db_s)
+        return _graph("text2gql", self._text2gql_hit)
+
+    def explore_trigraph(self, subs, **kwargs) -> MemoryGraph:
+        time.sleep(self._db_s)
+        return _graph("triplet", self._triplet_hit)
+
+    def explore_docgraph_with_entities(self, subs, **kwargs) -> MemoryGraph:
+        time.sleep(self._db_s)
+        return _graph("doc", True)
+
+    def explore_docgraph_without_entities(self, subs, **kwargs) -> MemoryGraph:
+        time.sleep(self._db_s)
+        return _graph("doc", True)
+
+
+class StubLLM:
+    """The LLM transformers, each call waits for ``llm_ms``."""
+
+    def __init__(self, llm_ms: float):
+        self._llm_s = llm_ms / 1000
+
+    async def translate(self, text: str) -> Dict[str, str]:
+        await asyncio.sleep(self._llm_s)
+        return {"query": "MATCH (n) RETURN n"}
+
+    async def extract(self, text: str) -> List[str]:
+        await asyncio.sleep(self._llm_s)
+        return ["service", "latency", "database"]
+
+
+class StubEmbeddings:
+    def __init__(self, embed_ms: float):
+        self._embed_s = embed_ms / 1000
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._embed_s)
+        return [0.1, 0.2, 0.3]
+
+
+def build_retriever(
+    llm_ms: float,
+    embed_ms: float,
+    db_ms: float,
+    text2gql_hit: bool,
+    triplet_hit: bool,
+):
+    """Build a graph retriever with the stub models and graph store."""
+    from opsdiag_ext.rag.retriever.graph_retriever.graph_retriever import (
+        GraphRetriever,
+    )
+
+    llm = StubLLM(llm_ms)
+    config = SimpleNamespace(
+        triplet_graph_enabled=True,
+        document_graph_enabled=True,
+        extract_topk=5,
+        knowledge_graph_chunk_search_top_size=5,
+        llm_client=None,
+        model_name="stub",
+        knowledge_graph_embedding_batch_size=20,
+        similarity_search_topk=5,
+        extract_score_threshold=0.3,
+        enable_text_search=True,
+        text2gql_model_enabled=False,
+        text2gql_model_name=None,
+        embedding_fn=StubEmbeddings(embed_ms),
+    )
+    retriever = GraphRetriever(
+        config, StubGraphStoreAdapter(db_ms, text2gql_hit, triplet_hit)
+    )
+    retriever._keyword_extractor = llm
+    retriever._text_based_graph_retriever._intent_interpreter = llm
+    retriever._text_based_graph_retriever._text2gql = llm
+    return retriever
+
+
+async def sequential_retrieve(retriever, text: str):
+    """Run the stages one after another, like the retriever did before."""
+    graph_store_adapter = retriever._text_based_graph_retriever._graph_store_adapter
+    text_retriever = retriever._text_based_graph_retriever
+    await text_retriever._intent_interpreter.translate(text)
+    graph_store_adapter.get_schema()
+    await text_retriever._text2gql.translate(text)
+    subgraph = graph_store_adapter.query("")
+    keywords = await retriever._keyword_extractor.extract(text)
+    if subgraph.vertex_count:
+        return subgraph
+    vector = await retriever._text_embedder.embed(text)
+    vectors = await retriever._text_embedder.batch_embed(
+        keywords, batch_size=retriever._embedding_batch_size
+    )
+    vectors.append(vector)
+    subgraph = graph_store_adapter.explore_trigraph(vectors)
+    if subgraph.vertex_count:
+        return graph_store_adapter.explore_docgraph_with_entities(subgraph)
+    return graph_store_adapter.explore_docgraph_without_entities(vectors)
+
+
+async def _measure(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def run(llm_ms: float, embed_ms: float, db_ms: float, repeat: int = 3):
+    cases = [
+        ("text2gql hit", True, False),
+        ("triplet hit", False, True),
+        ("document only", False, False),
+    ]
+    results = []
+    text = "Why is the latency of the service high?"
+    for name, text2gql_hit, triplet_hit in cases:
+        retriever = build_retriever(llm_ms, embed_ms, db_ms, text2gql_hit, triplet_hit)
+        sequential_ms = await _measure(
+            lambda: sequential_retrieve(retriever, text), repeat
+        )
+        concurrent_ms = await _measure(lambda: retriever.retrieve(text), repeat)
+        results.append(
+            {
+                "case": name,
+                "sequential_ms": sequential_ms,
+                "concurrent_ms": concurrent_ms,
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph retriever latency benchmark")
+    parser.add_argument("--llm_ms", type=float, default=200)
+    parser.add_argument("--embed_ms", type=float, default=30)
+    parser.add_argument("--db_ms", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.llm_ms, args.embed_ms, args.db_ms, args.repeat))
+    print(f"{'case':<20}{'sequential ms':>16}{'concurrent ms':>16}")
+    for result in results:
+        print(
+            f"{result['case']:<20}{result['sequential_ms']:>16.1f}"
+            f"{result['concurrent_ms']:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Benchmark of the cached and batched rerank service.
+
+Many clients rerank the candidates of their queries concurrently, some queries are
+asked again by the other clients, like the questions about an ongoing incident.
+A small cross encoder runs on the CPU, ``--model stub`` uses a stand-in model with
+a fixed cost per call and per pair when sentence-transformers is not installed.
+
+Run it with:
+
+.. code-block:: shell
+
+    python -m opsdiag.util.benchmarks.rag.rerank_benchmarks \\
+        --model cross-encoder/ms-marco-TinyBERT-L-2-v2 --clients 16
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from opsdiag.rag.embedding.rerank_service import PairScorer, RerankService
+
+
+class StubCrossEncoder:
+    """Cost ``overhead_ms`` per call plus ``pair_ms`` per pair, one call at a time."""
+
+    def __init__(self, overhead_ms: float = 8, pair_ms: float = 0.5):
+        self._overhead_s = overhead_ms / 1000
+        self._pair_s = pair_ms / 1000
+        self._lock = threading.Lock()
+
+    def predict_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        with self._lock:
+            time.sleep(self._overhead_s + self._pair_s * len(pairs))
+            return [float(len(q) % 7 + len(c) % 5) for q, c in pairs]
+
+
+def load_scorer(model: str) -> PairScorer:
+    if model == "stub":
+        return StubCrossEncoder().predict_pairs
+    from sentence_transformers import CrossEncoder
+
+    cross_encoder = CrossEncoder(model, max_length=512, device="cpu")
+    lock = threading.Lock()
+
+    def _predict_pairs(pairs: List[Tuple[str, str]]) -> List[float]:
+        with lock:
+            scores = cross_encoder.predict(sentences=[list(p) for p in pairs])
+        return [float(s) for s in scores]
+
+    return _predict_pairs
+
+
+def build_workload(
+    clients: int, requests: int, candidates: int, queries: int, corpus_size: int
+) -> List[List[Tuple[str, List[str]]]]:
+    """The requests of the clients, a query always retrieves the same candidates."""
+    rng = random.Random(0)
+    corpus = [
+        f"Chunk {i}: the service {i % 13} reports a latency spike after deploy "
+        + "details " * rng.randint(10, 60)
+        for i in range(corpus_size)
+    ]
+    retrieved = [
+        (f"why is service {i} slow after the deploy", rng.sample(corpus, candidates))
+        for i in range(queries)
+    ]
+    return [
+        [retrieved[rng.randrange(queries)] for _ in range(requests)]
+        for _ in range(clients)
+    ]
+
+
+async def run(
+    scorer: PairScorer, workload, service: Optional[RerankService] = None
+) -> dict:
+    latencies: List[float] = []
+
+    async def _predict(query: str, contents: List[str]):
+        if service:
+            return await service.apredict(query, contents)
+        # Like the ranker did before, one model call per rerank in a thread
+        pairs = [(query, content) for content in contents]
+        return await asyncio.get_running_loop().run_in_executor(None, scorer, pairs)
+
+    async def _client(requests):
+        for query, contents in requests:
+            start = time.perf_counter()
+            await _predict(query, contents)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(requests) for requests in workload])
+    elapsed = time.perf_counter() - start
+    result = {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "hit_rate": 0.0,
+        "batch_size": 1.0,
+    }
+    if service:
+        stats = service.stats()
+        result["hit_rate"] = stats["hit_rate"]
+        result["batch_size"] = stats["average_batch_size"]
+        service.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerank service benchmark")
+    parser.add_argument("--model", type=str, default="stub")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--corpus_size", type=int, default=200)
+    parser.add_argument("--max_batch_size", type=int, default=64)
+    parser.add_argument("--max_wait_ms", type=float, default=5)
+    parser.add_argument("--max_length", type=int, default=256)
+    args = parser.parse_args()
+
+    scorer = load_scorer(args.model)
+    workload = build_workload(
+        args.clients, args.requests, args.candidates, args.queries, args.corpus_size
+    )
+    service_options = {
+        "max_length": args.max_length,
+        "max_batch_size": args.max_batch_size,
+        "max_wait_ms": args.max_wait_ms,
+    }
+    cases = [
+        ("direct", None),
+        ("batching", dict(service_options, cache_size=0)),
+        ("batching + cache", service_options),
+    ]
+    print(
+        f"{'case':<20}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'hit rate':>10}{'batch':>8}"
+    )
+    for name, options in cases:
+        service = RerankService(scorer, args.model, **options) if options else None
+        result = asyncio.run(run(scorer, workload, service))
+        print(
+            f"{name:<20}{result['throughput']:>10.1f}{result['p50_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['hit_rate']:>10.2f}"
+            f"{result['batch_size']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Microbenchmark of the tracing overhead per span.
+
+Run it with:
+
+.. code-block:: shell
+
+    python -m opsdiag.util.benchmarks.tracer.span_benchmarks --spans 100000
+"""
+
+import argparse
+import gc
+import time
+from typing import Callable, List, Optional, Tuple
+
+from opsdiag.component import SystemApp
+from opsdiag.util.tracer import (
+    DefaultTracer,
+    MemorySpanStorage,
+    RingBufferSpanStorage,
+    SpanSampler,
+    SpanStorage,
+    SpanStorageType,
+    TailSampler,
+    TraceIdRatioSampler,
+)
+
+
+def _run_case(
+    storage_factory: Callable[[SystemApp], SpanStorage],
+    span_storage_type: SpanStorageType,
+    sampler: Optional[SpanSampler],
+    num_spans: int,
+) -> Tuple[float, int]:
+    system_app = SystemApp()
+    storage = storage_factory(system_app)
+    system_app.register_instance(storage)
+    tracer = DefaultTracer(
+        system_app, span_storage_type=span_storage_type, sampler=sampler
+    )
+    gc.collect()
+    start = time.perf_counter_ns()
+    for i in range(num_spans):
+        span = tracer.start_span("benchmark", metadata={"index": i})
+        span.end(metadata={"output": i})
+    cost = time.perf_counter_ns() - start
+    return cost / num_spans, len(storage.spans)
+
+
+def run_benchmarks(num_spans: int, capacity: int) -> List[Tuple[str, float, int]]:
+    """Return the case name, the overhead per span (ns) and the retained spans."""
+    cases = [
+        (
+            "memory, on_create_end",
+            MemorySpanStorage,
+            SpanStorageType.ON_CREATE_END,
+            None,
+        ),
+        ("memory, on_end", MemorySpanStorage, SpanStorageType.ON_END, None),
+        (
+            "ring buffer, on_end",
+            lambda app: RingBufferSpanStorage(app, capacity=capacity),
+            SpanStorageType.ON_END,
+            None,
+        ),
+        (
+            "ring buffer, on_end, head 10%",
+            lambda app: RingBufferSpanStorage(app, capacity=capacity),
+            SpanStorageType.ON_END,
+            TraceIdRatioSampler(0.1),
+        ),
+        (
+            "ring buffer, on_end, tail 10% + slow",
+            lambda app: RingBufferSpanStorage(app, capacity=capacity),
+            SpanStorageType.ON_END,
+            TailSampler(0.1, slow_threshold_ms=1000),
+        ),
+    ]
+    results = []
+    for name, storage_factory, span_storage_type, sampler in cases:
+        cost, retained = _run_case(
+            storage_factory, span_storage_type, sampler, num_spans
+        )
+        results.append((name, cost, retained))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracer span overhead benchmark")
+    parser.add_argument("--spans", type=int, default=100000)
+    parser.add_argument("--capacity", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'case':<40}{'ns/span':>12}{'retained':>12}")
+    for name, cost, retained in run_benchmarks(args.spans, args.capacity):
+        print(f"{name:<40}{cost:>12.0f}{retained:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -59,6 +59,23 @@ def calculate_cosine_similarity(
         prediction(str): The prediction.
         contexts(Sequence[str]): The contexts.
 
+    Returns:
+        numpy.ndarray: The cosine similarity.
+    """
+    prediction_vec = embeddings.embed_query(prediction)
+    context_list_vec = embeddings.embed_documents(list(contexts))
+    return cosine_similarity_vectors(prediction_vec, context_list_vec)
+
+
+def cosine_similarity_vectors(
+    prediction_vec: Sequence[float], context_list_vec: Sequence[Sequence[float]]
+) -> Any:
+    """Calculate the cosine similarity between a vector and a list of vectors.
+
+    Args:
+        prediction_vec(Sequence[float]): The embedding of the prediction.
+        context_list_vec(Sequence[Sequence[float]]): The embeddings of the contexts.
+
     Returns:
         numpy.ndarray: The cosine similarity.
     """
@@ -66,11 +83,8 @@ def calculate_cosine_similarity(
         import numpy as np
     except ImportError:
         raise ImportError("numpy is required for SimilarityMetric")
-    prediction_vec = np.asarray(embeddings.embed_query(prediction)).reshape(1, -1)
-    context_list = list(contexts)
-    context_list_vec = np.asarray(embeddings.embed_documents(context_list)).reshape(
-        len(contexts), -1
-    )
+    prediction_vec = np.asarray(prediction_vec).reshape(1, -1)
+    context_list_vec = np.asarray(context_list_vec).reshape(len(context_list_vec), -1)
     # cos(a,b) = dot(a,b) / (norm(a) * norm(b))
     dot = np.dot(context_list_vec, prediction_vec.T).reshape(
         -1,
@@ -0,0 +1,54 @@
+import base64
+import struct
+
+import pytest
+
+from opsdiag.util.vector_codec import (
+    decode_vector,
+    encode_vector,
+    is_packable,
+    pack_vectors,
+    pack_vectors_base64,
+    unpack_vectors,
+    unpack_vectors_json,
+)
+
+VECTORS = [[0.5, -1.25, 3.0], [0.0, 2.5, -0.125]]
+
+
+def test_encode_vector_openai_compatible():
+    encoded = encode_vector(VECTORS[0])
+    # Same as the OpenAI base64 embeddings: little-endian float32
+    assert base64.b64decode(encoded) == struct.pack("<3f", *VECTORS[0])
+    assert decode_vector(encoded) == VECTORS[0]
+
+
+def test_pack_vectors():
+    data, shape = pack_vectors(VECTORS)
+    assert shape == [2, 3]
+    assert len(data) == 2 * 3 * 4
+    assert unpack_vectors(data, shape) == VECTORS
+    with pytest.raises(ValueError):
+        unpack_vectors(data, [3, 3])
+
+
+def test_float32_precision():
+    vector = [0.1, 1 / 3]
+    decoded = decode_vector(encode_vector(vector))
+    assert decoded == pytest.approx(vector, rel=1e-6)
+
+
+def test_unpack_vectors_json():
+    assert unpack_vectors_json(pack_vectors_base64(VECTORS)) == VECTORS
+    # The JSON lists are returned as they are
+    assert unpack_vectors_json(VECTORS) == VECTORS
+
+
+def test_is_packable():
+    assert is_packable(VECTORS)
+    assert is_packable([[1, 2]])
+    assert not is_packable([])
+    assert not is_packable([[]])
+    assert not is_packable([[1.0], [1.0, 2.0]])
+    assert not is_packable([["a"]])
+    assert not is_packable([[True]])
@@ -8,11 +8,19 @@ from opsdiag.util.tracer.base import (
     Tracer,
     TracerContext,
 )
+from opsdiag.util.tracer.sampler import (
+    AlwaysOnSampler,
+    SpanSampler,
+    TailSampler,
+    TraceIdRatioSampler,
+)
 from opsdiag.util.tracer.span_storage import (
     FileSpanStorage,
     MemorySpanStorage,
+    RingBufferSpanStorage,
     SpanStorageContainer,
 )
+from opsdiag.util.tracer.trace_store import SqliteSpanStorage, SqliteTraceStore
 from opsdiag.util.tracer.tracer_impl import (
     DefaultTracer,
     TracerManager,
@@ -32,8 +40,15 @@ __all__ = [
     "TracerContext",
     "DERISK_TRACER_SPAN_ID",
     "MemorySpanStorage",
+    "RingBufferSpanStorage",
     "FileSpanStorage",
     "SpanStorageContainer",
+    "SqliteSpanStorage",
+    "SqliteTraceStore",
+    "SpanSampler",
+    "AlwaysOnSampler",
+    "TraceIdRatioSampler",
+    "TailSampler",
     "root_tracer",
     "trace",
     "initialize_tracer",
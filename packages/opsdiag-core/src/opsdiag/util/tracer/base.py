@@ -72,6 +72,9 @@ class Span:
         self.end_time = None
         # Additional metadata associated with the span
         self.metadata = metadata or {}
+        # Whether to merge the metadata passed to `end` into the start metadata,
+        # used by single-emission spans which only have one record
+        self.merge_end_metadata = False
         self._end_callers = []
         if end_caller:
             self._end_callers.append(end_caller)
@@ -80,7 +83,11 @@ class Span:
         """Mark the end of this span by recording the current time."""
         self.end_time = datetime.now()
         if "metadata" in kwargs:
-            self.metadata = kwargs.get("metadata")
+            metadata = kwargs.get("metadata")
+            if self.merge_end_metadata and self.metadata and metadata:
+                self.metadata = {**self.metadata, **metadata}
+            else:
+                self.metadata = metadata
         for caller in self._end_callers:
             caller(self)
 
@@ -92,6 +99,9 @@ class Span:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_val is not None and self.metadata.get("error") is None:
+            # Mark the span as failed, so samplers can always keep it
+            self.metadata["error"] = f"{exc_type.__name__}: {exc_val}"
         self.end()
         return False
 
@@ -97,6 +97,9 @@ class OpenTelemetrySpanStorage(SpanStorage):
 
             if not span.end_time:
                 self.spans[span_id] = otel_span
+            else:
+                # Single-emission span, it is stored only once when it ends
+                otel_span.end(end_time=int(span.end_time.timestamp() * 1e9))
 
     def append_span_batch(self, spans: List[Span]):
         for span in spans:
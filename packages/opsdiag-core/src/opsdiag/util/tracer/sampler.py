@@ -0,0 +1,93 @@
+"""Span sampling policies.
+
+A sampler decides whether a span is stored. Head-based samplers decide by the
+trace id only, so all spans of a trace are kept or dropped together. Tail-based
+samplers decide when the span ends, so they can always keep errors and slow spans.
+"""
+
+import zlib
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from opsdiag.util.tracer.base import Span
+
+
+def _trace_id_ratio(trace_id: Optional[str]) -> float:
+    """Map a trace id to a stable number in [0, 1).
+
+    The hash is stable across processes, so every service makes the same decision
+    for the same trace.
+    """
+    if not trace_id:
+        return 0.0
+    return zlib.crc32(trace_id.encode("utf-8")) / 2**32
+
+
+def _is_error_span(span: Span) -> bool:
+    return bool(span.metadata) and span.metadata.get("error") is not None
+
+
+def _span_duration_ms(span: Span) -> Optional[float]:
+    if not span.start_time or not span.end_time:
+        return None
+    return (span.end_time - span.start_time).total_seconds() * 1000
+
+
+class SpanSampler(ABC):
+    """The base class of span samplers."""
+
+    @abstractmethod
+    def should_sample(self, span: Span) -> bool:
+        """Whether to store the span."""
+
+
+class AlwaysOnSampler(SpanSampler):
+    """Store all spans."""
+
+    def should_sample(self, span: Span) -> bool:
+        return True
+
+
+class TraceIdRatioSampler(SpanSampler):
+    """Head-based sampler, keep a fixed ratio of the traces."""
+
+    def __init__(self, ratio: float = 1.0):
+        if not 0.0 <= ratio <= 1.0:
+            raise ValueError(f"The sample ratio must be in [0, 1], got {ratio}")
+        self.ratio = ratio
+
+    def should_sample(self, span: Span) -> bool:
+        if self.ratio >= 1.0:
+            return True
+        return _trace_id_ratio(span.trace_id) < self.ratio
+
+
+class TailSampler(SpanSampler):
+    """Tail-based sampler.
+
+    Ended spans with an error or taking longer than ``slow_threshold_ms`` are
+    always kept, other spans are kept by the trace id ratio. Spans which have not
+    ended yet are dropped, so use it with single-emission spans
+    (`SpanStorageType.ON_END`).
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.0,
+        slow_threshold_ms: Optional[float] = None,
+        keep_errors: bool = True,
+    ):
+        self._head_sampler = TraceIdRatioSampler(ratio)
+        self.slow_threshold_ms = slow_threshold_ms
+        self.keep_errors = keep_errors
+
+    def should_sample(self, span: Span) -> bool:
+        if not span.end_time:
+            return False
+        if self.keep_errors and _is_error_span(span):
+            return True
+        if self.slow_threshold_ms is not None:
+            duration = _span_duration_ms(span)
+            if duration is not None and duration >= self.slow_threshold_ms:
+                return True
+        return self._head_sampler.should_sample(span)
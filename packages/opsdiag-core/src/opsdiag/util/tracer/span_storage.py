@@ -5,8 +5,9 @@ import os
 import queue
 import threading
 import time
+from collections import deque
 from concurrent.futures import Executor, ThreadPoolExecutor
-from typing import List
+from typing import List, Optional
 
 from opsdiag.component import SystemApp
 from opsdiag.util.tracer.base import Span, SpanStorage
@@ -25,6 +26,51 @@ class MemorySpanStorage(SpanStorage):
             self.spans.append(span)
 
 
+class RingBufferSpanStorage(SpanStorage):
+    """Span storage with a fixed capacity.
+
+    When the buffer is full, the oldest spans are evicted, so the memory of a
+    long-running server is bounded.
+    """
+
+    def __init__(self, system_app: SystemApp | None = None, capacity: int = 10000):
+        super().__init__(system_app)
+        if capacity <= 0:
+            raise ValueError("The capacity of the span storage must be positive")
+        self.capacity = capacity
+        self._buffer: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._total_count = 0
+
+    @property
+    def spans(self) -> List[Span]:
+        """Return the retained spans, from the oldest to the newest."""
+        with self._lock:
+            return list(self._buffer)
+
+    @property
+    def dropped_count(self) -> int:
+        """Return the number of spans evicted from the buffer."""
+        return max(0, self._total_count - self.capacity)
+
+    def append_span(self, span: Span):
+        with self._lock:
+            self._buffer.append(span)
+            self._total_count += 1
+
+    def append_span_batch(self, spans: List[Span]):
+        with self._lock:
+            self._buffer.extend(spans)
+            self._total_count += len(spans)
+
+    def get_spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        """Return the retained spans, optionally filtered by trace id."""
+        spans = self.spans
+        if trace_id is None:
+            return spans
+        return [span for span in spans if span.trace_id == trace_id]
+
+
 class SpanStorageContainer(SpanStorage):
     def __init__(
         self,
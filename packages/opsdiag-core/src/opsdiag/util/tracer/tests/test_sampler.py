@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+import pytest
+
+from opsdiag.util.tracer import (
+    AlwaysOnSampler,
+    Span,
+    SpanType,
+    TailSampler,
+    TraceIdRatioSampler,
+)
+from opsdiag.util.tracer.base import _new_random_trace_id
+
+
+def _new_span(trace_id: str, duration_ms: float = None, metadata=None) -> Span:
+    span = Span(trace_id, f"{trace_id}:a", SpanType.BASE, None, "op", metadata)
+    if duration_ms is not None:
+        span.end_time = span.start_time + timedelta(milliseconds=duration_ms)
+    return span
+
+
+def test_always_on_sampler():
+    assert AlwaysOnSampler().should_sample(_new_span("1"))
+
+
+def test_trace_id_ratio_sampler():
+    trace_ids = [_new_random_trace_id() for _ in range(2000)]
+    sampler = TraceIdRatioSampler(0.25)
+    kept = [t for t in trace_ids if sampler.should_sample(_new_span(t))]
+    assert 0.2 < len(kept) / len(trace_ids) < 0.3
+    # The decision of a trace is stable
+    assert all(sampler.should_sample(_new_span(t)) for t in kept)
+
+    assert TraceIdRatioSampler(1).should_sample(_new_span(trace_ids[0]))
+    assert not TraceIdRatioSampler(0).should_sample(_new_span(trace_ids[0]))
+    with pytest.raises(ValueError):
+        TraceIdRatioSampler(1.5)
+
+
+def test_tail_sampler():
+    sampler = TailSampler(0, slow_threshold_ms=100)
+    # Not ended
+    assert not sampler.should_sample(_new_span("1", metadata={"error": "e"}))
+    assert sampler.should_sample(_new_span("1", 1, metadata={"error": "e"}))
+    assert sampler.should_sample(_new_span("1", 150))
+    assert not sampler.should_sample(_new_span("1", 10))
+    assert TailSampler(1).should_sample(_new_span("1", 10))
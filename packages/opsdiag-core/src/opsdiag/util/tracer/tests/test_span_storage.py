@@ -10,6 +10,7 @@ import pytest
 
 from opsdiag.util.tracer import (
     FileSpanStorage,
+    RingBufferSpanStorage,
     Span,
     SpanStorage,
     SpanStorageContainer,
@@ -173,3 +174,23 @@ async def test_container_flush_policy(
 
     spans_in_file = read_spans_from_file(filename)
     assert len(spans_in_file) == storage_container.batch_size
+
+
+def test_ring_buffer_storage_evicts_oldest():
+    storage = RingBufferSpanStorage(capacity=3)
+    for i in range(5):
+        storage.append_span(Span(str(i), f"{i}:a", SpanType.BASE, None, "op"))
+    assert [s.trace_id for s in storage.spans] == ["2", "3", "4"]
+    assert storage.dropped_count == 2
+
+    storage.append_span_batch(
+        [Span("5", "5:a", SpanType.BASE, None, "op"), Span("6", "6:a")]
+    )
+    assert [s.trace_id for s in storage.spans] == ["4", "5", "6"]
+    assert storage.dropped_count == 4
+    assert [s.span_id for s in storage.get_spans("5")] == ["5:a"]
+
+
+def test_ring_buffer_storage_invalid_capacity():
+    with pytest.raises(ValueError):
+        RingBufferSpanStorage(capacity=0)
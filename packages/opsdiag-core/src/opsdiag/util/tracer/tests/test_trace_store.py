@@ -0,0 +1,149 @@
+import json
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from opsdiag.util.tracer import Span, SpanType, tracer_cli
+from opsdiag.util.tracer.trace_store import SqliteSpanStorage, SqliteTraceStore
+
+
+def _record(
+    trace_id: str,
+    span_id: str,
+    parent_span_id=None,
+    start_time="2023-10-18 10:00:00.000",
+    end_time=None,
+    span_type="base",
+    operation_name="op",
+    metadata=None,
+):
+    return {
+        "span_type": span_type,
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_span_id": parent_span_id,
+        "operation_name": operation_name,
+        "start_time": start_time,
+        "end_time": end_time,
+        "metadata": metadata,
+    }
+
+
+def _write(filename, records, mode="a"):
+    with open(filename, mode, encoding="utf8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def store():
+    store = SqliteTraceStore()
+    yield store
+    store.close()
+
+
+def test_sync_file_incrementally(store: SqliteTraceStore, tmp_path):
+    filename = str(tmp_path / "derisk.jsonl")
+    _write(filename, [_record("t1", "t1:a"), _record("t1", "t1:b", "t1:a")])
+    file_id = store.sync_file(filename)
+    assert len(store.query_spans(file_ids=[file_id])) == 2
+
+    # Sync again without changes
+    assert store.sync_file(filename) == file_id
+    assert len(store.query_spans()) == 2
+
+    _write(filename, [_record("t2", "t2:a", start_time="2023-10-18 11:00:00.000")])
+    # An incomplete line is indexed when it is finished
+    with open(filename, "a") as f:
+        f.write('{"trace_id": "t3"')
+    store.sync_file(filename)
+    assert [s["trace_id"] for s in store.query_spans(desc=True)] == ["t2", "t1", "t1"]
+
+    with open(filename, "a") as f:
+        f.write(', "span_id": "t3:a", "start_time": "2023-10-18 12:00:00.000"}\n')
+    store.sync_file(filename)
+    assert len(store.query_spans(trace_id="t3")) == 1
+
+
+def test_sync_rolled_over_file(store: SqliteTraceStore, tmp_path):
+    filename = str(tmp_path / "derisk.jsonl")
+    _write(filename, [_record("t1", "t1:a"), _record("t1", "t1:b")])
+    store.sync_file(filename)
+
+    os.rename(filename, str(tmp_path / "derisk_2023-10-18.jsonl"))
+    _write(filename, [_record("t2", "t2:a")])
+    file_id = store.sync_file(filename)
+    assert [s["trace_id"] for s in store.query_spans(file_ids=[file_id])] == ["t2"]
+
+
+def test_query_spans(store: SqliteTraceStore):
+    store.append_spans(
+        [
+            _record("t1", "t1:a", span_type="chat", metadata={"conv_uid": "c1"}),
+            _record(
+                "t1",
+                "t1:a",
+                span_type="chat",
+                end_time="2023-10-18 10:00:01.000",
+                metadata={"conv_uid": "c1", "output": "hello"},
+            ),
+            _record("t2", "t2:a", start_time="2023-10-19 10:00:00.000"),
+        ]
+    )
+    assert len(store.query_spans(trace_id="t1")) == 2
+    assert len(store.query_spans(conv_uid="c1")) == 2
+    assert len(store.query_spans(span_type="chat")) == 2
+    assert len(store.query_spans(search="hello")) == 1
+    assert [s["trace_id"] for s in store.query_spans(desc=True, limit=1)] == ["t2"]
+    assert (
+        len(store.query_spans(start_time="2023-10-18 10:00:00.001", end_time=None)) == 1
+    )
+    assert store.query_spans(file_ids=[]) == []
+
+
+def test_sqlite_span_storage(tmp_path):
+    storage = SqliteSpanStorage(str(tmp_path / "index.db"))
+    span = Span("t1", "t1:a", SpanType.BASE, None, "op", metadata={"conv_uid": "c"})
+    span.end()
+    storage.append_span_batch([span])
+    assert storage.store.query_spans(conv_uid="c")[0]["span_id"] == "t1:a"
+
+
+def test_cli_list_and_tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracer_cli, "_DEFAULT_INDEX_FILE", str(tmp_path / "index.db"))
+    filename = str(tmp_path / "derisk.jsonl")
+    _write(
+        filename,
+        [
+            _record("t1", "t1:a", operation_name="root"),
+            _record("t1", "t1:b", "t1:a", operation_name="child"),
+            # Single-emission span
+            _record(
+                "t1",
+                "t1:c",
+                "t1:a",
+                operation_name="single",
+                end_time="2023-10-18 10:00:00.500",
+            ),
+            _record(
+                "t1",
+                "t1:b",
+                "t1:a",
+                end_time="2023-10-18 10:00:01.000",
+                operation_name="child",
+            ),
+            _record("t2", "t2:a", operation_name="other"),
+        ],
+    )
+    runner = CliRunner()
+    result = runner.invoke(tracer_cli.list, ["--trace_id", "t1", filename])
+    assert result.exit_code == 0, result.output
+    assert "root" in result.output and "other" not in result.output
+
+    result = runner.invoke(tracer_cli.tree, ["--trace_id", "t1", filename])
+    assert result.exit_code == 0, result.output
+    lines = result.output.strip().splitlines()
+    assert lines[0].startswith("Operation: root")
+    assert sum("Operation: single" in line for line in lines) == 2
+    assert sum("Operation: child" in line for line in lines) == 2
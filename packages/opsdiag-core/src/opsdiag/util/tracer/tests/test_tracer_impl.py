@@ -7,6 +7,8 @@ from opsdiag.util.tracer import (
     Span,
     SpanStorage,
     SpanStorageType,
+    TailSampler,
+    TraceIdRatioSampler,
     Tracer,
     TracerManager,
 )
@@ -32,7 +34,11 @@ def tracer(request, system_app: SystemApp):
         span_storage_type = request.param.get(
             "span_storage_type", SpanStorageType.ON_CREATE_END
         )
-        return DefaultTracer(system_app, span_storage_type=span_storage_type)
+        return DefaultTracer(
+            system_app,
+            span_storage_type=span_storage_type,
+            sampler=request.param.get("sampler"),
+        )
 
 
 @pytest.fixture
@@ -106,3 +112,46 @@ def test_tracer_span_storage_type_and_with(
     with tracer.start_span("with_span") as _ws:
         assert len(storage.spans) == expected_count + after_create_inc_count
     assert len(storage.spans) == expected_count + expected_count
+
+
+@pytest.mark.parametrize(
+    "tracer", [{"span_storage_type": SpanStorageType.ON_END}], indirect=["tracer"]
+)
+def test_single_emission_span_keeps_start_metadata(
+    tracer: Tracer, storage: SpanStorage
+):
+    span = tracer.start_span("operation", metadata={"input": "hello"})
+    span.end(metadata={"output": "world"})
+    assert len(storage.spans) == 1
+    assert storage.spans[0].metadata == {"input": "hello", "output": "world"}
+
+
+@pytest.mark.parametrize(
+    "tracer",
+    [{"span_storage_type": SpanStorageType.ON_END, "sampler": TraceIdRatioSampler(0)}],
+    indirect=["tracer"],
+)
+def test_head_sampler_drops_traces(tracer: Tracer, storage: SpanStorage):
+    with tracer.start_span("operation"):
+        pass
+    assert len(storage.spans) == 0
+
+
+@pytest.mark.parametrize(
+    "tracer",
+    [
+        {
+            "span_storage_type": SpanStorageType.ON_END,
+            "sampler": TailSampler(0, slow_threshold_ms=60_000),
+        }
+    ],
+    indirect=["tracer"],
+)
+def test_tail_sampler_keeps_error_spans(tracer: Tracer, storage: SpanStorage):
+    with tracer.start_span("fast_operation"):
+        pass
+    with pytest.raises(ValueError):
+        with tracer.start_span("failed_operation"):
+            raise ValueError("bad input")
+    assert [s.operation_name for s in storage.spans] == ["failed_operation"]
+    assert storage.spans[0].metadata["error"] == "ValueError: bad input"
@@ -0,0 +1,245 @@
+"""Indexed local trace store.
+
+The spans are kept in a SQLite database with indexes on the trace id, span type,
+start time and conversation id, so looking up a trace does not need to parse all
+the span files again.
+
+The store can be written directly by `SqliteSpanStorage`, or built incrementally
+from the JSONL files written by `FileSpanStorage`: only the lines appended since
+the last sync are parsed.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from opsdiag.component import SystemApp
+from opsdiag.util.tracer.base import Span, SpanStorage
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trace_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    inode INTEGER NOT NULL DEFAULT 0,
+    offset INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS spans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id INTEGER NOT NULL DEFAULT 0,
+    trace_id TEXT,
+    span_id TEXT,
+    parent_span_id TEXT,
+    span_type TEXT,
+    operation_name TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    conv_uid TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_spans_trace_id ON spans (trace_id);
+CREATE INDEX IF NOT EXISTS idx_spans_span_id ON spans (span_id);
+CREATE INDEX IF NOT EXISTS idx_spans_span_type_start_time
+    ON spans (span_type, start_time);
+CREATE INDEX IF NOT EXISTS idx_spans_start_time ON spans (start_time);
+CREATE INDEX IF NOT EXISTS idx_spans_conv_uid ON spans (conv_uid);
+CREATE INDEX IF NOT EXISTS idx_spans_file_id ON spans (file_id);
+"""
+
+_INSERT_SQL = (
+    "INSERT INTO spans (file_id, trace_id, span_id, parent_span_id, span_type, "
+    "operation_name, start_time, end_time, conv_uid, data) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# The number of lines inserted in one transaction when syncing a file
+_SYNC_BATCH_SIZE = 5000
+
+
+def _span_row(file_id: int, record: Dict[str, Any]) -> tuple:
+    metadata = record.get("metadata")
+    conv_uid = metadata.get("conv_uid") if isinstance(metadata, dict) else None
+    return (
+        file_id,
+        record.get("trace_id"),
+        record.get("span_id"),
+        record.get("parent_span_id"),
+        record.get("span_type"),
+        record.get("operation_name"),
+        record.get("start_time"),
+        record.get("end_time"),
+        None if conv_uid is None else str(conv_uid),
+        json.dumps(record, ensure_ascii=False),
+    )
+
+
+class SqliteTraceStore:
+    """A SQLite trace store with indexed span lookups."""
+
+    def __init__(self, db_path: str = ":memory:"):
+        self.db_path = db_path
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def append_spans(self, records: Iterable[Dict[str, Any]], file_id: int = 0):
+        """Append span records, the dicts returned by `Span.to_dict`."""
+        rows = [_span_row(file_id, record) for record in records]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(_INSERT_SQL, rows)
+
+    def sync_file(self, path: str) -> int:
+        """Index the lines appended to a span file since the last sync.
+
+        If the file was truncated or replaced (e.g. rolled over by
+        `FileSpanStorage`), its spans are indexed again from the beginning.
+
+        Returns:
+            int: The id of the file in the store.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, inode, offset FROM trace_files WHERE path = ?", (path,)
+            ).fetchone()
+            if row is None:
+                cursor = self._conn.execute(
+                    "INSERT INTO trace_files (path, inode, offset) VALUES (?, ?, 0)",
+                    (path, stat.st_ino),
+                )
+                file_id, offset = cursor.lastrowid, 0
+            else:
+                file_id, inode, offset = row
+                if inode != stat.st_ino or stat.st_size < offset:
+                    self._conn.execute(
+                        "DELETE FROM spans WHERE file_id = ?", (file_id,)
+                    )
+                    self._conn.execute(
+                        "UPDATE trace_files SET inode = ?, offset = 0 WHERE id = ?",
+                        (stat.st_ino, file_id),
+                    )
+                    offset = 0
+        if stat.st_size > offset:
+            self._index_file(file_id, path, offset)
+        return file_id
+
+    def _index_file(self, file_id: int, path: str, offset: int):
+        rows = []
+        with open(path, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # The last line is still being written
+                    break
+                offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(_span_row(file_id, json.loads(line)))
+                except ValueError:
+                    logger.warning(f"Skip invalid span line in {path}: {line[:100]}")
+                if len(rows) >= _SYNC_BATCH_SIZE:
+                    self._commit_rows(file_id, rows, offset)
+                    rows = []
+        self._commit_rows(file_id, rows, offset)
+
+    def _commit_rows(self, file_id: int, rows: List[tuple], offset: int):
+        with self._lock, self._conn:
+            if rows:
+                self._conn.executemany(_INSERT_SQL, rows)
+            self._conn.execute(
+                "UPDATE trace_files SET offset = ? WHERE id = ?", (offset, file_id)
+            )
+
+    def sync_files(self, paths: Iterable[str]) -> List[int]:
+        """Sync the span files and return their ids in the store."""
+        return [self.sync_file(path) for path in paths]
+
+    def query_spans(
+        self,
+        trace_id: Optional[str] = None,
+        span_id: Optional[str] = None,
+        span_type: Optional[str] = None,
+        parent_span_id: Optional[str] = None,
+        conv_uid: Optional[str] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        search: Optional[str] = None,
+        file_ids: Optional[List[int]] = None,
+        desc: bool = False,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Query the span records, ordered by start time.
+
+        Args:
+            start_time (Optional[str]): Only the spans started at or after this time,
+                in the format "YYYY-MM-DD HH:MM:SS.mmm".
+            end_time (Optional[str]): Only the spans started at or before this time.
+            search (Optional[str]): Only the spans whose record contains this text.
+            file_ids (Optional[List[int]]): Only the spans of these files.
+        """
+        conditions, params = [], []
+        for column, value in [
+            ("trace_id", trace_id),
+            ("span_id", span_id),
+            ("span_type", span_type),
+            ("parent_span_id", parent_span_id),
+            ("conv_uid", conv_uid),
+        ]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if start_time:
+            conditions.append("start_time >= ?")
+            params.append(start_time)
+        if end_time:
+            conditions.append("start_time <= ?")
+            params.append(end_time)
+        if search:
+            conditions.append("instr(data, ?) > 0")
+            params.append(search)
+        if file_ids is not None:
+            conditions.append(
+                f"file_id IN ({','.join(str(int(i)) for i in file_ids) or 'NULL'})"
+            )
+        sql = "SELECT data FROM spans"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        order = "DESC" if desc else "ASC"
+        sql += f" ORDER BY start_time {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class SqliteSpanStorage(SpanStorage):
+    """Span storage which writes the spans into a `SqliteTraceStore`."""
+
+    def __init__(self, db_path: str, system_app: SystemApp | None = None):
+        super().__init__(system_app)
+        self.store = SqliteTraceStore(db_path)
+
+    def append_span(self, span: Span):
+        self.store.append_spans([span.to_dict()])
+
+    def append_span_batch(self, spans: List[Span]):
+        self.store.append_spans([span.to_dict() for span in spans])
@@ -2,18 +2,23 @@ import glob
 import json
 import logging
 import os
+import sqlite3
 from datetime import datetime
-from typing import Dict, Iterable
+from typing import Dict, Iterable, List, Tuple
 
 import click
 
 from opsdiag.configs.model_config import LOGDIR
 from opsdiag.util.tracer import SpanType, SpanTypeRunName
+from opsdiag.util.tracer.trace_store import SqliteTraceStore
 
 logger = logging.getLogger("derisk_cli")
 
 
 _DEFAULT_FILE_PATTERN = os.path.join(LOGDIR, "derisk*.jsonl")
+_DEFAULT_INDEX_FILE = os.getenv(
+    "DERISK_TRACER_INDEX_FILE", os.path.join(LOGDIR, "derisk_tracer_index.db")
+)
 
 
 @click.group("trace")
@@ -55,6 +60,14 @@ def trace_cli_group():
     show_default=True,
     help="Specify the Parent Span ID to list.",
 )
+@click.option(
+    "--conv_uid",
+    required=False,
+    type=str,
+    default=None,
+    show_default=True,
+    help="Specify the Conversation UID to list.",
+)
 @click.option(
     "--search",
     required=False,
@@ -100,6 +113,7 @@ def list(
     span_id: str,
     span_type: str,
     parent_span_id: str,
+    conv_uid: str,
     search: str,
     limit: int,
     start_time: str,
@@ -112,36 +126,25 @@ def list(
     from prettytable import PrettyTable
 
     # If no files are explicitly specified, use the default pattern to get them
-    spans = read_spans_from_files(files)
-
-    if trace_id:
-        spans = filter(lambda s: s["trace_id"] == trace_id, spans)
-    if span_id:
-        spans = filter(lambda s: s["span_id"] == span_id, spans)
-    if span_type:
-        spans = filter(lambda s: s["span_type"] == span_type, spans)
-    if parent_span_id:
-        spans = filter(lambda s: s["parent_span_id"] == parent_span_id, spans)
-    # Filter spans based on the start and end times
+    store, file_ids = _open_trace_store(files)
+    # Normalize the times to the format of the span records
     if start_time:
-        start_dt = _parse_datetime(start_time)
-        spans = filter(
-            lambda span: _parse_datetime(span["start_time"]) >= start_dt, spans
-        )
-
+        start_time = _format_datetime(_parse_datetime(start_time))
     if end_time:
-        end_dt = _parse_datetime(end_time)
-        spans = filter(
-            lambda span: _parse_datetime(span["start_time"]) <= end_dt, spans
-        )
-
-    if search:
-        spans = filter(_new_search_span_func(search), spans)
-
-    # Sort spans based on the start time
-    spans = sorted(
-        spans, key=lambda span: _parse_datetime(span["start_time"]), reverse=desc
-    )[:limit]
+        end_time = _format_datetime(_parse_datetime(end_time))
+    spans = store.query_spans(
+        trace_id=trace_id or None,
+        span_id=span_id or None,
+        span_type=span_type or None,
+        parent_span_id=parent_span_id or None,
+        conv_uid=conv_uid or None,
+        start_time=start_time or None,
+        end_time=end_time or None,
+        search=search or None,
+        file_ids=file_ids,
+        desc=desc,
+        limit=limit,
+    )
 
     table = PrettyTable(
         ["Trace ID", "Span ID", "Operation Name", "Conversation UID"],
@@ -234,32 +237,29 @@ def chat(
     """Show conversation details"""
     from prettytable import PrettyTable
 
-    spans = read_spans_from_files(files)
-
-    # Sort by start time
-    spans = sorted(
-        spans, key=lambda span: _parse_datetime(span["start_time"]), reverse=True
-    )
-    spans = [sp for sp in spans]
-    if not spans:
+    store, file_ids = _open_trace_store(files)
+    if not store.query_spans(file_ids=file_ids, limit=1):
         _print_empty_message(files)
         return
     service_spans = {}
-    service_names = set(SpanTypeRunName.values())
-    found_trace_id = None
-    for sp in spans:
-        span_type = sp["span_type"]
+    # The latest run span of each service
+    for sp in store.query_spans(
+        span_type=SpanType.RUN.value, file_ids=file_ids, desc=True
+    ):
         metadata = sp.get("metadata")
-        if span_type == SpanType.RUN and metadata and "run_service" in metadata:
-            service_name = metadata["run_service"]
-            service_spans[service_name] = sp.copy()
-            if set(service_spans.keys()) == service_names and found_trace_id:
-                break
-        elif span_type == SpanType.CHAT and not found_trace_id:
-            if not trace_id:
-                found_trace_id = sp["trace_id"]
-            if trace_id and trace_id == sp["trace_id"]:
-                found_trace_id = trace_id
+        if metadata and "run_service" in metadata:
+            service_spans.setdefault(metadata["run_service"], sp)
+
+    found_trace_id = None
+    chat_spans = store.query_spans(
+        trace_id=trace_id or None,
+        span_type=SpanType.CHAT.value,
+        file_ids=file_ids,
+        desc=True,
+        limit=1,
+    )
+    if chat_spans:
+        found_trace_id = chat_spans[0]["trace_id"]
 
     service_tables = {}
     system_infos_table = {}
@@ -312,8 +312,7 @@ def chat(
         return
     trace_id = found_trace_id
 
-    trace_spans = [span for span in spans if span["trace_id"] == trace_id]
-    trace_spans = [s for s in reversed(trace_spans)]
+    trace_spans = store.query_spans(trace_id=trace_id, file_ids=file_ids)
     hierarchy = _build_trace_hierarchy(trace_spans)
     if tree:
         print(f"\nInvoke Trace Tree(trace_id: {trace_id}):\n")
@@ -426,6 +425,29 @@ def read_spans_from_files(files=None) -> Iterable[Dict]:
                     yield json.loads(line)
 
 
+def _open_trace_store(files=None) -> Tuple[SqliteTraceStore, List[int]]:
+    """Open the indexed trace store and sync the span files into it.
+
+    Only the lines appended since the last command are parsed, so the lookups do
+    not need to read all the span files again.
+
+    Returns:
+        Tuple[SqliteTraceStore, List[int]]: The store and the ids of the files.
+    """
+    if not files:
+        files = [_DEFAULT_FILE_PATTERN]
+    filenames = sorted({name for pattern in files for name in glob.glob(pattern)})
+    try:
+        store = SqliteTraceStore(_DEFAULT_INDEX_FILE)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(
+            f"Can't open the trace index {_DEFAULT_INDEX_FILE}: {e}, use a "
+            "temporary index instead"
+        )
+        store = SqliteTraceStore()
+    return store, store.sync_files(filenames)
+
+
 def _print_empty_message(files=None):
     if not files:
         files = [_DEFAULT_FILE_PATTERN]
@@ -433,57 +455,44 @@ def _print_empty_message(files=None):
     print(f"No trace span records found in your tracer files: {file_names}")
 
 
-def _new_search_span_func(search: str):
-    def func(span: Dict) -> bool:
-        items = [span["trace_id"], span["span_id"], span["parent_span_id"]]
-        if "operation_name" in span:
-            items.append(span["operation_name"])
-        if "metadata" in span:
-            metadata = span["metadata"]
-            if isinstance(metadata, dict):
-                for k, v in metadata.items():
-                    items.append(k)
-                    items.append(v)
-        return any(search in str(item) for item in items if item)
-
-    return func
-
-
 def _parse_datetime(dt_str):
     """Parse a datetime string to a datetime object."""
     return datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S.%f")
 
 
-def _build_trace_hierarchy(spans, parent_span_id=None, indent=0):
-    # Current spans
-    current_level_spans = [
-        span
-        for span in spans
-        if span["parent_span_id"] == parent_span_id and span["end_time"] is None
-    ]
+def _format_datetime(dt: datetime) -> str:
+    """Format a datetime object like the time of the span records."""
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
 
+
+def _build_trace_hierarchy(spans, parent_span_id=None, indent=0):
+    started_span_ids = {span["span_id"] for span in spans if span["end_time"] is None}
+    # Note: `list` is the command of this module, don't use `defaultdict(list)`
+    children = {}
+    end_spans = {}
+    for span in spans:
+        # Single-emission spans only have the end record
+        if span["end_time"] is None or span["span_id"] not in started_span_ids:
+            children.setdefault(span["parent_span_id"], []).append(span)
+        if span["end_time"] is not None:
+            end_spans.setdefault(span["span_id"], span)
+    return _build_hierarchy_level(children, end_spans, parent_span_id)
+
+
+def _build_hierarchy_level(children, end_spans, parent_span_id=None):
     hierarchy = []
 
-    for start_span in current_level_spans:
-        # Find end span
-        end_span = next(
-            (
-                span
-                for span in spans
-                if span["span_id"] == start_span["span_id"]
-                and span["end_time"] is not None
-            ),
-            None,
-        )
+    for start_span in children.get(parent_span_id, []):
+        end_span = end_spans.get(start_span["span_id"])
         entry = {
             "operation_name": start_span["operation_name"],
             "parent_span_id": start_span["parent_span_id"],
             "span_id": start_span["span_id"],
             "start_time": start_span["start_time"],
-            "end_time": start_span["end_time"],
+            "end_time": None,
             "metadata": start_span["metadata"],
-            "children": _build_trace_hierarchy(
-                spans, start_span["span_id"], indent + 1
+            "children": _build_hierarchy_level(
+                children, end_spans, start_span["span_id"]
             ),
         }
         hierarchy.append(entry)
@@ -506,8 +515,8 @@ def _build_trace_hierarchy(spans, parent_span_id=None, indent=0):
 
 def _view_trace_hierarchy(trace_id, files=None):
     """Find and display the calls of the entire link based on the given trace_id"""
-    spans = read_spans_from_files(files)
-    trace_spans = [span for span in spans if span["trace_id"] == trace_id]
+    store, file_ids = _open_trace_store(files)
+    trace_spans = store.query_spans(trace_id=trace_id, file_ids=file_ids)
     if not trace_spans:
         return None
     hierarchy = _build_trace_hierarchy(trace_spans)
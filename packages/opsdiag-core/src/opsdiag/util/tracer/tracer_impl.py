@@ -20,7 +20,12 @@ from opsdiag.util.tracer.base import (
     Tracer,
     TracerContext,
 )
-from opsdiag.util.tracer.span_storage import MemorySpanStorage
+from opsdiag.util.tracer.sampler import (
+    SpanSampler,
+    TailSampler,
+    TraceIdRatioSampler,
+)
+from opsdiag.util.tracer.span_storage import RingBufferSpanStorage
 from opsdiag_serve.rag.tracer.rag_flow_span import RagFlowSpanStorage
 
 logger = logging.getLogger(__name__)
@@ -31,17 +36,21 @@ class DefaultTracer(Tracer):
         self,
         system_app: SystemApp | None = None,
         default_storage: SpanStorage = None,
-        span_storage_type: SpanStorageType = SpanStorageType.ON_CREATE_END,
+        span_storage_type: SpanStorageType = SpanStorageType.ON_END,
+        sampler: Optional[SpanSampler] = None,
     ):
         super().__init__(system_app)
         self._span_stack_var = ContextVar("span_stack", default=[])
 
         if not default_storage:
-            default_storage = MemorySpanStorage(system_app)
+            default_storage = RingBufferSpanStorage(system_app)
         self._default_storage = default_storage
         self._span_storage_type = span_storage_type
+        self._sampler = sampler
 
     def append_span(self, span: Span):
+        if self._sampler and not self._sampler.should_sample(span):
+            return
         self._get_current_storage().append_span(span.copy())
 
     def start_span(
@@ -66,6 +75,8 @@ class DefaultTracer(Tracer):
             operation_name,
             metadata=metadata,
         )
+        # Single-emission spans keep the start metadata in their only record
+        span.merge_end_metadata = self._span_storage_type == SpanStorageType.ON_END
 
         if self._span_storage_type in [
             SpanStorageType.ON_END,
@@ -365,12 +376,49 @@ class TracerParameters(BaseParameters):
             "help": _("The class of the tracer storage"),
         },
     )
+    span_storage_type: Optional[str] = field(
+        default=SpanStorageType.ON_END.value,
+        metadata={
+            "help": _(
+                "When to store the spans, 'on_end' stores each span once when it "
+                "ends, 'on_create_end' stores it both when it starts and ends"
+            ),
+            "valid_values": [t.value for t in SpanStorageType],
+        },
+    )
+    sample_ratio: Optional[float] = field(
+        default=None,
+        metadata={
+            "help": _(
+                "The ratio of traces to store, between 0 and 1, all traces are "
+                "stored by default"
+            ),
+        },
+    )
+    slow_span_threshold_ms: Optional[float] = field(
+        default=None,
+        metadata={
+            "help": _(
+                "Enable tail-based sampling, spans with errors or slower than this "
+                "threshold (in milliseconds) are always stored"
+            ),
+        },
+    )
 
     def __post_init__(self):
         use_telemetry = os.getenv("TRACER_TO_OPEN_TELEMETRY", "false").lower() == "true"
         if self.exporter is None and use_telemetry:
             self.exporter = "telemetry"
 
+    def create_sampler(self) -> Optional[SpanSampler]:
+        """Create the span sampler from the parameters."""
+        if self.slow_span_threshold_ms is not None:
+            ratio = self.sample_ratio if self.sample_ratio is not None else 0.0
+            return TailSampler(ratio, slow_threshold_ms=self.slow_span_threshold_ms)
+        if self.sample_ratio is not None:
+            return TraceIdRatioSampler(self.sample_ratio)
+        return None
+
     @property
     def absolute_file(self) -> Optional[str]:
         """Get the absolute path of the file"""
@@ -399,7 +447,16 @@ def initialize_tracer(
         "trace_context",
         default=TracerContext(),
     )
-    tracer = DefaultTracer(system_app)
+    if tracer_parameters:
+        tracer = DefaultTracer(
+            system_app,
+            span_storage_type=SpanStorageType(
+                tracer_parameters.span_storage_type or SpanStorageType.ON_END
+            ),
+            sampler=tracer_parameters.create_sampler(),
+        )
+    else:
+        tracer = DefaultTracer(system_app)
 
     storage_container = SpanStorageContainer(system_app)
     # tracer_filename = resolve_root_path(tracer_filename)
@@ -0,0 +1,109 @@
+"""Binary transport of the embedding vectors.
+
+The vectors are sent as little-endian float32 arrays instead of JSON lists of
+floats, which are several times larger and slow to encode and decode.
+
+- ``base64``: the OpenAI ``encoding_format``, each vector is a base64 string.
+- The packed matrix: all the vectors in one buffer with their shape, sent as raw
+  bytes (``application/octet-stream``) or as base64 in a JSON envelope.
+"""
+
+import base64
+import sys
+from array import array
+from itertools import chain
+from typing import Any, Dict, List, Sequence, Tuple
+
+OCTET_STREAM_MEDIA_TYPE = "application/octet-stream"
+# The shape of the packed matrix in the response headers, e.g. "2,1024"
+VECTOR_SHAPE_HEADER = "X-Vector-Shape"
+VECTOR_DTYPE = "<f4"
+
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+def _to_bytes(values) -> bytes:
+    data = array("f", values)
+    if _BIG_ENDIAN:
+        data.byteswap()
+    return data.tobytes()
+
+
+def _from_bytes(data: bytes) -> array:
+    values = array("f")
+    values.frombytes(data)
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def encode_vector(vector: Sequence[float]) -> str:
+    """Encode a vector to base64, like the OpenAI ``encoding_format="base64"``."""
+    return base64.b64encode(_to_bytes(vector)).decode("ascii")
+
+
+def decode_vector(data: str) -> List[float]:
+    """Decode a base64 vector."""
+    return _from_bytes(base64.b64decode(data)).tolist()
+
+
+def is_packable(vectors: Any) -> bool:
+    """Whether the vectors are a non-empty matrix (same dimension) of numbers."""
+    if not isinstance(vectors, list) or not vectors:
+        return False
+    first = vectors[0]
+    if not isinstance(first, (list, tuple)) or not first:
+        return False
+    if not isinstance(first[0], (int, float)) or isinstance(first[0], bool):
+        return False
+    dim = len(first)
+    return all(isinstance(v, (list, tuple)) and len(v) == dim for v in vectors)
+
+
+def pack_vectors(vectors: List[Sequence[float]]) -> Tuple[bytes, List[int]]:
+    """Pack the vectors into one little-endian float32 buffer.
+
+    Returns:
+        Tuple[bytes, List[int]]: The buffer and the shape ``[rows, dim]``.
+    """
+    dim = len(vectors[0]) if vectors else 0
+    return _to_bytes(chain.from_iterable(vectors)), [len(vectors), dim]
+
+
+def unpack_vectors(data: bytes, shape: Sequence[int]) -> List[List[float]]:
+    """Unpack the buffer of :func:`pack_vectors`."""
+    rows, dim = int(shape[0]), int(shape[1])
+    values = _from_bytes(data)
+    if len(values) != rows * dim:
+        raise ValueError(
+            f"The vector buffer has {len(values)} values, expected shape {shape}"
+        )
+    return [values[i * dim : (i + 1) * dim].tolist() for i in range(rows)]
+
+
+def format_shape(shape: Sequence[int]) -> str:
+    return ",".join(str(s) for s in shape)
+
+
+def parse_shape(value: str) -> List[int]:
+    return [int(s) for s in value.split(",")]
+
+
+def pack_vectors_base64(vectors: List[Sequence[float]]) -> Dict[str, Any]:
+    """Pack the vectors into a JSON envelope."""
+    data, shape = pack_vectors(vectors)
+    return {
+        "encoding_format": "base64",
+        "dtype": VECTOR_DTYPE,
+        "shape": shape,
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def unpack_vectors_json(payload: Any) -> List[List[float]]:
+    """Unpack the JSON response of the embeddings, a list or a packed envelope."""
+    if isinstance(payload, dict) and payload.get("encoding_format") == "base64":
+        if payload.get("dtype", VECTOR_DTYPE) != VECTOR_DTYPE:
+            raise ValueError(f"Not supported vector dtype: {payload['dtype']}")
+        return unpack_vectors(base64.b64decode(payload["data"]), payload["shape"])
+    return payload
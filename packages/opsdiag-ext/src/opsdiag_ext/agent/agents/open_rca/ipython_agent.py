@@ -10,7 +10,8 @@ from IPython.terminal.embed import InteractiveShellEmbed
 
 from opsdiag_ext.agent.agents.open_rca.actions.ipython_action import IpythonAction
 
-_IPYTHON_SYSTEM_TEMPLATE = """You are a {{ role }}, {% if name %}named {{ name }}. {% endif %}\
+_IPYTHON_SYSTEM_TEMPLATE = (
+    """You are a {{ role }}, {% if name %}named {{ name }}. {% endif %}\
 {{ goal }} 
 
 ## RULES OF PYTHON CODE WRITING:
@@ -26,7 +27,13 @@ _IPYTHON_SYSTEM_TEMPLATE = """You are a {{ role }}, {% if name %}named {{ name }
 9. Do not generate anything else except the Python code block except the instruction tell you to 'Use plain English'. If you find the input instruction is a summarization task (which is typically happening in the last step), you should comprehensively summarize the conclusion as a string in your code and display it directly.
 10. Do not calculate threshold AFTER filtering data within the given time duration. Always calculate global thresholds using the entire KPI series of a specific component within a metric file BEFORE filtering data within the given time duration.
 11. All issues use **UTC+8** time. However, the local machine's default timezone is unknown. Please use `pytz.timezone('Asia/Shanghai')` to explicityly set the timezone to UTC+8.
-
+"""
+    "12. To find anomalous KPIs, prefer the preloaded vectorized toolkit over "
+    "per-component loops: `metrics = load_metrics(metric_dir)`, "
+    "`anomalies = detect_kpi_anomalies(metrics, start_time, end_time)` (epoch "
+    "seconds) and `rank_fault_candidates(anomalies)` return the anomalous KPIs and "
+    "the ranked candidate components of all components in one step.\n"
+    """
 {{background}}
 
 Your response should follow the Python block format below:
@@ -34,8 +41,10 @@ Your response should follow the Python block format below:
 (YOUR CODE HERE)
 ```
 """
+)
 
-_IPYTHON_SYSTEM_TEMPLATE_ZH = """您是{{ role }}，{% if name %} 名为 {{ name }}。{% endif %}\
+_IPYTHON_SYSTEM_TEMPLATE_ZH = (
+    """您是{{ role }}，{% if name %} 名为 {{ name }}。{% endif %}\
 {{ goal }}。请根据下面的规范编写python代码完成你的目标。
 ## Python 代码编写规则：
 1. 尽可能复用变量以提高执行效率，因为 IPython 内核是有状态的，也就是说，前面步骤中定义的变量可以在后面步骤中使用。
@@ -49,7 +58,13 @@ _IPYTHON_SYSTEM_TEMPLATE_ZH = """您是{{ role }}，{% if name %} 名为 {{ name
 9. 除了指令外，不要生成 Python 代码块以外的任何其他内容。如果您发现输入指令是摘要任务（通常发生在最后一步），则应在代码中将结论全面总结为字符串并直接显示。
 10. 不要在给定时间段内过滤数据后计算阈值。始终在给定时间段内过滤数据之前，使用指标文件中特定组件的整个 KPI 系列计算全局阈值。
 11. 所有问题均使用 **UTC+8** 时间。但是，本地计算机的默认时区未知。请使用 `pytz.timezone('Asia/Shanghai')` 将时区明确设置为 UTC+8。
-
+"""
+    "12. 查找异常 KPI 时，优先使用已预加载的向量化工具，而不是逐个组件循环："
+    "`metrics = load_metrics(metric_dir)`、"
+    "`anomalies = detect_kpi_anomalies(metrics, start_time, end_time)`"
+    "（秒级时间戳）和 `rank_fault_candidates(anomalies)` "
+    "可一步得到所有组件的异常 KPI 及排序后的候选根因组件。\n"
+    """
 {{background}}
 
 您的回复应遵循以下 Python 块格式：
@@ -57,8 +72,10 @@ _IPYTHON_SYSTEM_TEMPLATE_ZH = """您是{{ role }}，{% if name %} 名为 {{ name
 （此处输入您的代码)
 ```
 """
+)
 
-_IPYTHON_SYSTEM_TEMPLATE_ZH_v2 = """您是{{ role }}，{% if name %} 名为 {{ name }}。{% endif %}\
+_IPYTHON_SYSTEM_TEMPLATE_ZH_v2 = (
+    """您是{{ role }}，{% if name %} 名为 {{ name }}。{% endif %}\
 {{ goal }}。请根据下面的规范编写python代码完成你的目标。
 ## Python 代码编写规则：
 1. 尽可能复用变量以提高执行效率，因为 IPython 内核是有状态的，也就是说，前面步骤中定义的变量可以在后面步骤中使用。
@@ -131,7 +148,13 @@ _IPYTHON_SYSTEM_TEMPLATE_ZH_v2 = """您是{{ role }}，{% if name %} 名为 {{ n
 10. 除了指令外，不要生成 Python 代码块以外的任何其他内容。如果您发现输入指令是摘要任务（通常发生在最后一步），则应在代码中将结论全面总结为字符串并直接显示。
 11. 不要在给定时间段内过滤数据后计算阈值。始终在给定时间段内过滤数据之前，使用指标文件中特定组件的整个 KPI 系列计算全局阈值。
 12. 所有问题均使用 **UTC+8** 时间。但是，本地计算机的默认时区未知。请使用 `pytz.timezone('Asia/Shanghai')` 将时区明确设置为 UTC+8。
-
+"""
+    "13. 查找异常 KPI 时，优先使用已预加载的向量化工具，而不是逐个组件循环："
+    "`metrics = load_metrics(metric_dir)`、"
+    "`anomalies = detect_kpi_anomalies(metrics, start_time, end_time)`"
+    "（秒级时间戳）和 `rank_fault_candidates(anomalies)` "
+    "可一步得到所有组件的异常 KPI 及排序后的候选根因组件。\n"
+    """
 {{background}}
 
 您的回复应遵循以下 Python 块格式：
@@ -139,6 +162,7 @@ _IPYTHON_SYSTEM_TEMPLATE_ZH_v2 = """您是{{ role }}，{% if name %} 名为 {{ n
 （此处输入您的代码)
 ```
 """
+)
 
 
 # Not needed additional user prompt template
@@ -197,7 +221,10 @@ class IpythonAssistantAgent(ConversableAgent):
         kernel = InteractiveShellEmbed()
         init_code = "import pandas as pd\n" + \
                     "pd.set_option('display.width', 427)\n" + \
-                    "pd.set_option('display.max_columns', 10)\n"
+                    "pd.set_option('display.max_columns', 10)\n" + \
+                    "from opsdiag_ext.agent.agents.open_rca.resource.kpi_anomaly " \
+                    "import load_metrics, detect_kpi_anomalies, " \
+                    "rank_fault_candidates\n"
         kernel.run_cell(init_code)
         for idx, action in enumerate(actions):
             if issubclass(action, Action):
@@ -0,0 +1,428 @@
+"""Vectorized KPI anomaly detection for OpenRCA telemetry.
+
+The functions in this module work on every component and KPI of a metric table in
+one pass, so an agent can get a ranked list of suspicious components and resources
+with a single call instead of writing a pandas loop per component.
+
+All metric files are first normalized to a long table with the columns
+``timestamp`` (seconds), ``cmdb_id``, ``kpi_name`` and ``value``.
+"""
+
+import functools
+import glob
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from typing_extensions import Annotated, Doc
+
+from opsdiag.agent.resource.tool.base import tool
+
+logger = logging.getLogger(__name__)
+
+METRIC_COLUMNS = ["timestamp", "cmdb_id", "kpi_name", "value"]
+SERIES_KEYS = ["cmdb_id", "kpi_name"]
+_ANOMALY_COLUMNS = SERIES_KEYS + [
+    "resource",
+    "points",
+    "breaches",
+    "breach_ratio",
+    "max_abs_zscore",
+    "direction",
+    "change_score",
+    "change_time",
+    "lower",
+    "upper",
+    "score",
+]
+_CANDIDATE_COLUMNS = [
+    "cmdb_id",
+    "resource",
+    "score",
+    "anomalous_kpis",
+    "first_change_time",
+    "top_kpis",
+]
+
+# Column names used by the wide metric tables, e.g. `metric_app.csv`
+_WIDE_ID_COLUMNS = ("cmdb_id", "tc", "serviceName", "service")
+_WIDE_TIME_COLUMNS = ("timestamp", "startTime")
+# Timestamps larger than this are treated as milliseconds
+_MILLISECOND_THRESHOLD = 10**11
+
+_SERVICE_KPIS = {
+    "rr",
+    "sr",
+    "mrt",
+    "cnt",
+    "count",
+    "avg_time",
+    "num",
+    "succee_num",
+    "succee_rate",
+}
+# Order matters, the first matched resource wins
+_RESOURCE_KEYWORDS: Sequence[Tuple[str, Sequence[str]]] = (
+    ("jvm", ("jvm", "heap", "gc")),
+    ("cpu", ("cpu",)),
+    ("memory", ("mem", "oom")),
+    ("network", ("net", "tcp", "packet", "receive", "transmit", "sent", "latency")),
+    ("disk", ("disk", "fs_", "iowait", "_io", "io_", "read", "write", "space")),
+)
+
+
+def normalize_metric_frame(
+    df: pd.DataFrame, source: Optional[str] = None
+) -> pd.DataFrame:
+    """Normalize a metric table to the long ``METRIC_COLUMNS`` layout.
+
+    Long tables (with ``kpi_name`` or ``name`` columns) are renamed, wide tables
+    like ``metric_app.csv`` are melted, one KPI per numeric column. Millisecond
+    timestamps are converted to seconds.
+
+    Args:
+        df (pd.DataFrame): The raw metric table.
+        source (Optional[str]): The name of the source file, kept as a column.
+
+    Returns:
+        pd.DataFrame: The normalized metric table.
+    """
+    columns = set(df.columns)
+    if {"kpi_name", "cmdb_id", "value"} <= columns:
+        long_df = df[METRIC_COLUMNS]
+    elif {"name", "cmdb_id", "value"} <= columns:
+        long_df = df.rename(columns={"name": "kpi_name"})[METRIC_COLUMNS]
+    else:
+        id_col = next((c for c in _WIDE_ID_COLUMNS if c in columns), None)
+        time_col = next((c for c in _WIDE_TIME_COLUMNS if c in columns), None)
+        if id_col is None or time_col is None:
+            raise ValueError(
+                f"Unsupported metric table with columns {list(df.columns)}, "
+                "a component column and a timestamp column are required."
+            )
+        value_cols = [
+            c
+            for c in df.columns
+            if c not in (id_col, time_col) and pd.api.types.is_numeric_dtype(df[c])
+        ]
+        long_df = df.melt(
+            id_vars=[time_col, id_col],
+            value_vars=value_cols,
+            var_name="kpi_name",
+            value_name="value",
+        ).rename(columns={time_col: "timestamp", id_col: "cmdb_id"})[METRIC_COLUMNS]
+
+    long_df = long_df.assign(
+        timestamp=pd.to_numeric(long_df["timestamp"], errors="coerce"),
+        value=pd.to_numeric(long_df["value"], errors="coerce"),
+    ).dropna(subset=["timestamp", "value"])
+    timestamp = long_df["timestamp"].to_numpy(dtype=np.int64)
+    if len(timestamp) and timestamp.max() > _MILLISECOND_THRESHOLD:
+        timestamp = timestamp // 1000
+    long_df = long_df.assign(
+        timestamp=timestamp,
+        cmdb_id=long_df["cmdb_id"].astype(str),
+        kpi_name=long_df["kpi_name"].astype(str),
+    )
+    if source:
+        long_df = long_df.assign(source=source)
+    return long_df.reset_index(drop=True)
+
+
+def _resolve_metric_files(path: Union[str, Sequence[str]]) -> List[str]:
+    if not isinstance(path, str):
+        files: List[str] = []
+        for p in path:
+            files.extend(_resolve_metric_files(p))
+        return files
+    if os.path.isdir(path):
+        return sorted(
+            glob.glob(os.path.join(path, "**", "metric_*.csv"), recursive=True)
+        )
+    return sorted(glob.glob(path))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_metric_files(files: Tuple[Tuple[str, float, int], ...]) -> pd.DataFrame:
+    frames = [
+        normalize_metric_frame(pd.read_csv(file), source=os.path.basename(file))
+        for file, _, _ in files
+    ]
+    if not frames:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_metrics(path: Union[str, Sequence[str]]) -> pd.DataFrame:
+    """Load and normalize metric files.
+
+    The loaded tables are cached by file path, modification time and size, so
+    repeated diagnosis steps on the same telemetry do not parse the CSVs again.
+
+    Args:
+        path (Union[str, Sequence[str]]): A metric file, a glob pattern, a directory
+            (all ``metric_*.csv`` files below it are loaded) or a list of them.
+
+    Returns:
+        pd.DataFrame: The normalized metric table, do not modify it in place.
+    """
+    files = _resolve_metric_files(path)
+    if not files:
+        raise ValueError(f"No metric files found in {path}")
+    keys = tuple(
+        (file, os.path.getmtime(file), os.path.getsize(file)) for file in files
+    )
+    return _load_metric_files(keys)
+
+
+def classify_resource(kpi_name: str) -> str:
+    """Map a KPI name to a coarse resource, e.g. cpu, memory, disk or network."""
+    name = kpi_name.lower()
+    if name in _SERVICE_KPIS:
+        return "service"
+    for resource, keywords in _RESOURCE_KEYWORDS:
+        if any(keyword in name for keyword in keywords):
+            return resource
+    return "other"
+
+
+def _group_window_sums(
+    values: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> np.ndarray:
+    """Sum ``values[starts:ends]`` for every row with one cumulative sum."""
+    cumsum = np.concatenate(([0.0], np.cumsum(values)))
+    return cumsum[ends] - cumsum[starts]
+
+
+def score_kpi_series(metrics: pd.DataFrame, window: int = 10) -> pd.DataFrame:
+    """Compute the per-point statistics of all KPI series in one pass.
+
+    For every point it adds the global thresholds of its series, the rolling
+    z-score against the previous ``window`` points and a change score, which is
+    the shift between the means of the ``window`` points before and after the
+    point, in units of the global standard deviation of the series.
+
+    Thresholds are always computed on the whole series, before any time window
+    filtering.
+
+    Args:
+        metrics (pd.DataFrame): The normalized metric table.
+        window (int): The number of points of the rolling baseline.
+
+    Returns:
+        pd.DataFrame: The metric table sorted by series and time with the columns
+            ``mean``, ``std``, ``lower``, ``upper``, ``zscore`` and ``change_score``
+            added.
+    """
+    if window < 2:
+        raise ValueError("The window must be at least 2 points")
+    df = metrics.sort_values(SERIES_KEYS + ["timestamp"], kind="mergesort").reset_index(
+        drop=True
+    )
+    grouped = df.groupby(SERIES_KEYS, sort=False)["value"]
+    mean = grouped.transform("mean").to_numpy(dtype=float)
+    std = grouped.transform("std").fillna(0.0).to_numpy(dtype=float)
+    position = grouped.cumcount().to_numpy()
+    size = grouped.transform("size").to_numpy()
+
+    # Center each series on its global mean to keep the cumulative sums stable
+    centered = df["value"].to_numpy(dtype=float) - mean
+    index = np.arange(len(df))
+
+    # Rolling baseline over the previous `window` points of the same series
+    prev_count = np.minimum(position, window)
+    prev_sum = _group_window_sums(centered, index - prev_count, index)
+    prev_sq_sum = _group_window_sums(centered**2, index - prev_count, index)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prev_mean = prev_sum / prev_count
+        prev_var = (prev_sq_sum - prev_sum * prev_mean) / (prev_count - 1)
+    prev_std = np.sqrt(np.clip(np.nan_to_num(prev_var), 0.0, None))
+    # Short baselines underestimate the deviation, so it is floored by a fraction
+    # of the global deviation of the series
+    scale = np.maximum(prev_std, 0.25 * std)
+    min_count = max(2, window // 2)
+    valid = (prev_count >= min_count) & (scale > 1e-9)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zscore = np.where(valid, (centered - prev_mean) / scale, 0.0)
+
+    # Mean shift between the windows before and after (including) the point
+    next_count = np.minimum(size - position, window)
+    next_sum = _group_window_sums(centered, index, index + next_count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        next_mean = next_sum / next_count
+        change_score = np.where(
+            (prev_count >= min_count) & (next_count >= min_count) & (std > 1e-9),
+            np.abs(next_mean - prev_mean) / std,
+            0.0,
+        )
+
+    lower = grouped.transform("quantile", 0.05)
+    upper = grouped.transform("quantile", 0.95)
+    return df.assign(
+        mean=mean,
+        std=std,
+        lower=lower,
+        upper=upper,
+        zscore=zscore,
+        change_score=change_score,
+    )
+
+
+def detect_kpi_anomalies(
+    metrics: pd.DataFrame,
+    start_time: Optional[int] = None,
+    end_time: Optional[int] = None,
+    window: int = 10,
+    z_threshold: float = 3.0,
+    change_threshold: float = 2.0,
+    only_anomalous: bool = True,
+) -> pd.DataFrame:
+    """Detect anomalous KPIs of all components within a time range.
+
+    Args:
+        metrics (pd.DataFrame): The normalized metric table, see `load_metrics`.
+        start_time (Optional[int]): The start of the fault window, in seconds.
+        end_time (Optional[int]): The end of the fault window, in seconds.
+        window (int): The number of points of the rolling baseline.
+        z_threshold (float): The rolling z-score regarded as anomalous.
+        change_threshold (float): The change score regarded as anomalous.
+        only_anomalous (bool): Whether to drop the series without any anomaly.
+
+    Returns:
+        pd.DataFrame: One row per KPI series, sorted by ``score`` descending.
+    """
+    scored = score_kpi_series(metrics, window=window)
+    mask = np.ones(len(scored), dtype=bool)
+    if start_time is not None:
+        mask &= scored["timestamp"].to_numpy() >= start_time
+    if end_time is not None:
+        mask &= scored["timestamp"].to_numpy() <= end_time
+    scored = scored[mask]
+    if scored.empty:
+        return pd.DataFrame(columns=_ANOMALY_COLUMNS)
+    scored = scored.assign(
+        abs_zscore=scored["zscore"].abs(),
+        breach=(scored["value"] > scored["upper"])
+        | (scored["value"] < scored["lower"]),
+    )
+    grouped = scored.groupby(SERIES_KEYS, sort=False)
+    result = grouped.agg(
+        points=("value", "size"),
+        breaches=("breach", "sum"),
+        max_abs_zscore=("abs_zscore", "max"),
+        change_score=("change_score", "max"),
+        lower=("lower", "first"),
+        upper=("upper", "first"),
+    )
+    peak_rows = scored.loc[grouped["abs_zscore"].idxmax().to_numpy()]
+    change_rows = scored.loc[grouped["change_score"].idxmax().to_numpy()]
+    result["direction"] = np.where(peak_rows["zscore"].to_numpy() >= 0, "up", "down")
+    result["change_time"] = change_rows["timestamp"].to_numpy()
+    result["breach_ratio"] = result["breaches"] / result["points"]
+    result["score"] = (
+        result["breach_ratio"]
+        + np.clip(result["max_abs_zscore"] / z_threshold, 0, 3)
+        + np.clip(result["change_score"] / change_threshold, 0, 3)
+    )
+    result = result.reset_index()
+    resources = {name: classify_resource(name) for name in result["kpi_name"].unique()}
+    result["resource"] = result["kpi_name"].map(resources)
+    if only_anomalous:
+        # A rolling z-score peak alone is common in noisy series, so it must also
+        # break the global thresholds of the series
+        result = result[
+            ((result["max_abs_zscore"] >= z_threshold) & (result["breaches"] > 0))
+            | (result["change_score"] >= change_threshold)
+        ]
+    return (
+        result[_ANOMALY_COLUMNS]
+        .sort_values("score", ascending=False, kind="mergesort")
+        .reset_index(drop=True)
+    )
+
+
+def rank_fault_candidates(anomalies: pd.DataFrame, top_k: int = 10) -> pd.DataFrame:
+    """Rank the faulty components from the KPI anomalies.
+
+    A component scores its most anomalous KPI, plus a small bonus for each other
+    anomalous KPI, and reports the resource of its most anomalous KPI.
+
+    Args:
+        anomalies (pd.DataFrame): The result of `detect_kpi_anomalies`.
+        top_k (int): The number of candidates to return.
+
+    Returns:
+        pd.DataFrame: The ranked candidate components.
+    """
+    if anomalies.empty:
+        return pd.DataFrame(columns=_CANDIDATE_COLUMNS)
+    ordered = anomalies.sort_values("score", ascending=False, kind="mergesort")
+    grouped = ordered.groupby("cmdb_id", sort=False)
+    result = grouped.agg(
+        resource=("resource", "first"),
+        max_score=("score", "max"),
+        anomalous_kpis=("kpi_name", "size"),
+        first_change_time=("change_time", "min"),
+        top_kpis=("kpi_name", lambda names: ", ".join(names[:3])),
+    ).reset_index()
+    result["score"] = result["max_score"] + 0.1 * (result["anomalous_kpis"] - 1)
+    return (
+        result[_CANDIDATE_COLUMNS]
+        .sort_values("score", ascending=False, kind="mergesort")
+        .head(top_k)
+        .reset_index(drop=True)
+    )
+
+
+def _to_epoch_seconds(value: Union[str, int, float, None]) -> Optional[int]:
+    """Parse a time to epoch seconds, naive datetimes are treated as UTC+8."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) or str(value).strip().isdigit():
+        seconds = int(value)
+        return seconds // 1000 if seconds > _MILLISECOND_THRESHOLD else seconds
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("Asia/Shanghai")
+    return int(ts.timestamp())
+
+
+@tool(
+    description="Detect anomalous KPIs of all components in OpenRCA metric files "
+    "within a fault time range, and return the ranked candidate root cause "
+    "components and resources.",
+)
+def open_rca_kpi_anomaly_detection(
+    metric_path: Annotated[
+        str,
+        Doc(
+            "The metric directory, e.g. `<data_path>/telemetry/2021_03_05/metric`, "
+            "or a metric csv file."
+        ),
+    ],
+    start_time: Annotated[
+        str, Doc("The start of the fault, e.g. `2021-03-05 10:00:00` in UTC+8.")
+    ] = "",
+    end_time: Annotated[
+        str, Doc("The end of the fault, e.g. `2021-03-05 10:30:00` in UTC+8.")
+    ] = "",
+    top_k: Annotated[int, Doc("The number of candidates to return.")] = 10,
+) -> str:
+    """Detect anomalous KPIs and rank the candidate root cause components."""
+    metrics = load_metrics(metric_path)
+    anomalies = detect_kpi_anomalies(
+        metrics,
+        start_time=_to_epoch_seconds(start_time),
+        end_time=_to_epoch_seconds(end_time),
+    )
+    if anomalies.empty:
+        return "No anomalous KPI found in the given time range."
+    candidates = rank_fault_candidates(anomalies, top_k=top_k)
+    return (
+        "## Candidate root cause components\n\n"
+        f"{candidates.to_string(index=False)}\n\n"
+        "## Top anomalous KPIs\n\n"
+        f"{anomalies.head(top_k * 3).to_string(index=False)}"
+    )
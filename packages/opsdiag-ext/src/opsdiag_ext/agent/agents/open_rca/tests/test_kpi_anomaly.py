@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from opsdiag_ext.agent.agents.open_rca.resource.kpi_anomaly import (
+    _to_epoch_seconds,
+    classify_resource,
+    detect_kpi_anomalies,
+    load_metrics,
+    normalize_metric_frame,
+    open_rca_kpi_anomaly_detection,
+    rank_fault_candidates,
+    score_kpi_series,
+)
+
+START = 1614787200
+FAULT_START = START + 60 * 120
+FAULT_END = START + 60 * 130
+
+
+@pytest.fixture
+def container_metrics():
+    rng = np.random.default_rng(0)
+    timestamps = START + 60 * np.arange(200)
+    rows = []
+    for cmdb_id in ["Tomcat01", "Tomcat02", "Mysql01"]:
+        for kpi_name in ["OSLinux-CPU_CPU_CPUCpuUtil", "OSLinux-MEM_MEM_MemUsedPct"]:
+            values = 30 + rng.normal(0, 1, len(timestamps))
+            if cmdb_id == "Tomcat02" and "CPU" in kpi_name:
+                fault = (timestamps >= FAULT_START) & (timestamps <= FAULT_END)
+                values[fault] += 40
+            rows.append(
+                pd.DataFrame(
+                    {
+                        "timestamp": timestamps,
+                        "cmdb_id": cmdb_id,
+                        "kpi_name": kpi_name,
+                        "value": values,
+                    }
+                )
+            )
+    # Shuffle the rows, the detector must not rely on the input order
+    return pd.concat(rows).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def test_normalize_wide_app_metrics():
+    df = pd.DataFrame(
+        {
+            "timestamp": [1614787440, 1614787500],
+            "rr": [100.0, 99.0],
+            "sr": [100.0, 98.0],
+            "cnt": [22, 23],
+            "mrt": [53.27, 60.1],
+            "tc": ["ServiceTest1", "ServiceTest1"],
+        }
+    )
+    normalized = normalize_metric_frame(df)
+    assert list(normalized.columns) == ["timestamp", "cmdb_id", "kpi_name", "value"]
+    assert len(normalized) == 8
+    assert set(normalized["kpi_name"]) == {"rr", "sr", "cnt", "mrt"}
+    assert set(normalized["cmdb_id"]) == {"ServiceTest1"}
+
+
+def test_normalize_millisecond_named_metrics():
+    df = pd.DataFrame(
+        {
+            "itemid": [1],
+            "name": ["container_mem_used"],
+            "bomc_id": ["ZJ-004-060"],
+            "timestamp": [1586534423000],
+            "value": [59.0],
+            "cmdb_id": ["docker_008"],
+        }
+    )
+    normalized = normalize_metric_frame(df)
+    assert normalized.loc[0, "timestamp"] == 1586534423
+    assert normalized.loc[0, "kpi_name"] == "container_mem_used"
+
+
+def test_normalize_unsupported_table():
+    with pytest.raises(ValueError):
+        normalize_metric_frame(pd.DataFrame({"a": [1], "b": [2]}))
+
+
+def test_score_kpi_series_rolling_zscore():
+    df = pd.DataFrame(
+        {
+            "timestamp": np.arange(20),
+            "cmdb_id": "c1",
+            "kpi_name": "cpu",
+            "value": [1.0, 2.0] * 9 + [1.0, 50.0],
+        }
+    )
+    scored = score_kpi_series(df, window=4)
+    baseline = [2.0, 1.0, 2.0, 1.0]
+    scale = max(np.std(baseline, ddof=1), 0.25 * df["value"].std())
+    expected = (50.0 - np.mean(baseline)) / scale
+    assert scored["zscore"].iloc[-1] == pytest.approx(expected)
+    # Not enough points for the baseline
+    assert scored["zscore"].iloc[0] == 0.0
+    assert scored["zscore"].iloc[1] == 0.0
+
+
+def test_detect_and_rank(container_metrics):
+    anomalies = detect_kpi_anomalies(
+        container_metrics, start_time=FAULT_START, end_time=FAULT_END
+    )
+    top = anomalies.iloc[0]
+    assert top["cmdb_id"] == "Tomcat02"
+    assert top["kpi_name"] == "OSLinux-CPU_CPU_CPUCpuUtil"
+    assert top["resource"] == "cpu"
+    assert top["direction"] == "up"
+    assert FAULT_START <= top["change_time"] <= FAULT_END
+
+    candidates = rank_fault_candidates(anomalies, top_k=2)
+    assert candidates.iloc[0]["cmdb_id"] == "Tomcat02"
+    assert len(candidates) <= 2
+
+
+def test_detect_outside_fault_window(container_metrics):
+    anomalies = detect_kpi_anomalies(
+        container_metrics, start_time=START, end_time=START + 60 * 100
+    )
+    assert "Tomcat02" not in set(
+        anomalies[anomalies["kpi_name"].str.contains("CPU")]["cmdb_id"]
+    )
+    assert rank_fault_candidates(anomalies.iloc[0:0]).empty
+
+
+def test_classify_resource():
+    assert classify_resource("OSLinux-CPU_CPU_CPUCpuUtil") == "cpu"
+    assert classify_resource("container_mem_used") == "memory"
+    assert classify_resource("JVM-Memory_7778_JVM_Memory_HeapMemoryUsed") == "jvm"
+    assert classify_resource("container_fs_writes_MB./dev/vda") == "disk"
+    assert classify_resource("istio_tcp_sent_bytes.-") == "network"
+    assert classify_resource("mrt") == "service"
+
+
+def test_to_epoch_seconds():
+    assert _to_epoch_seconds("") is None
+    assert _to_epoch_seconds("1614787200") == 1614787200
+    assert _to_epoch_seconds(1614787200000) == 1614787200
+    # Naive datetimes are in UTC+8
+    assert _to_epoch_seconds("2021-03-04 00:00:00") == 1614787200
+
+
+def test_tool(tmp_path, container_metrics):
+    metric_dir = tmp_path / "metric"
+    metric_dir.mkdir()
+    container_metrics.to_csv(metric_dir / "metric_container.csv", index=False)
+    assert len(load_metrics(str(metric_dir))) == len(container_metrics)
+    result = open_rca_kpi_anomaly_detection(
+        metric_path=str(metric_dir),
+        start_time=str(FAULT_START),
+        end_time=str(FAULT_END),
+        top_k=3,
+    )
+    assert "Candidate root cause components" in result
+    assert "Tomcat02" in result
@@ -5,7 +5,7 @@ import socket
 import traceback
 import uuid
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 
 import uvicorn
 from fastapi import FastAPI, WebSocket
@@ -29,6 +29,9 @@ from .types import ServerSettings, StdioToWsArgs
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait after the server is initialized before listing its tools
+_INITIALIZED_WAIT_SECONDS = 5
+
 
 class BearerAuthBackend(AuthenticationBackend):
     def __init__(self, valid_tokens):
@@ -57,6 +60,16 @@ class BearerAuthBackend(AuthenticationBackend):
         return None
 
 
+class _ServerConnection:
+    """State of a server's WebSocket connection, shared by its receiver and the
+    requests sent to it"""
+
+    def __init__(self):
+        # Ids of the requests in flight on this connection
+        self.inflight: Set[int] = set()
+        self.closed = False
+
+
 class MCPGateway:
     def __init__(
             self,
@@ -108,16 +121,19 @@ class MCPGateway:
         await websocket.accept()
         logger.debug("WebSocket connection accepted")
 
-        # Create message queue for handling received messages
+        # Queue of the received messages which are not responses
         message_queue = asyncio.Queue()
+        connection = _ServerConnection()
 
         # Start message receiving task
         receiver_task = asyncio.create_task(
-            self.websocket_receiver(websocket, message_queue)
+            self.websocket_receiver(websocket, message_queue, connection)
         )
 
         try:
-            await self.server_registration_handler(websocket, message_queue)
+            await self.server_registration_handler(
+                websocket, message_queue, connection
+            )
         except Exception as e:
             logger.error(f"Error handling WebSocket connection: {str(e)}")
             logger.error(traceback.format_exc())
@@ -130,40 +146,92 @@ class MCPGateway:
                 pass
 
     async def websocket_receiver(
-            self, websocket: WebSocket, message_queue: asyncio.Queue
+            self,
+            websocket: WebSocket,
+            message_queue: asyncio.Queue,
+            connection: _ServerConnection,
     ):
-        """Continuously receive WebSocket messages and put them in queue"""
+        """Continuously receive WebSocket messages of a connection.
+
+        This is the only reader of the connection, every message is parsed once.
+        A response resolves the future of its request directly, other messages
+        (registration, notifications) are put in the queue.
+        """
         try:
             while True:
                 message = await websocket.receive()
                 logger.debug(f"Received raw WebSocket message: {message}")
-                if "text" in message:
-                    await message_queue.put(message["text"])
-                elif "bytes" in message:
-                    await message_queue.put(message["bytes"])
-                else:
+                if message.get("type") == "websocket.disconnect":
+                    break
+                message_raw = message.get("text")
+                if message_raw is None:
+                    message_raw = message.get("bytes")
+                if message_raw is None:
+                    # Ignore other types of messages
                     logger.warning(f"Unknown message type: {message}")
                     continue
-                # Ignore other types of messages
+                try:
+                    data = json.loads(message_raw)
+                except json.JSONDecodeError:
+                    logger.error(f"Cannot parse JSON: {message_raw}")
+                    continue
+                if not self._resolve_response(data):
+                    await message_queue.put(data)
         except Exception as e:
             logger.error(f"WebSocket receiver error: {str(e)}")
-            # Put an error marker to let the consumer know that reception has stopped
-            await message_queue.put(None)
+        finally:
+            # Fail the requests waiting for this connection
+            connection.closed = True
+            for request_id in connection.inflight:
+                future = self.pending_requests.pop(request_id, None)
+                if future and not future.done():
+                    future.set_exception(Exception("WebSocket connection closed"))
+            connection.inflight.clear()
+            # Put an end marker to let the consumer know that reception has stopped
+            message_queue.put_nowait(None)
+
+    def _resolve_response(self, data: Any) -> bool:
+        """Resolve the pending request of a response, return False if not a
+        response."""
+        if (
+                not isinstance(data, dict)
+                or "id" not in data
+                or ("result" not in data and "error" not in data)
+        ):
+            return False
+        req_id = data["id"]
+        future = (
+            self.pending_requests.pop(req_id, None)
+            if isinstance(req_id, (int, str))
+            else None
+        )
+        if future is None:
+            logger.warning(f"Received response for unknown request ID: {req_id}")
+        elif not future.done():
+            if "error" in data:
+                logger.debug(f"Received error response for request {req_id}")
+                future.set_exception(Exception(f"Server error: {data['error']}"))
+            else:
+                logger.debug(f"Received response for request {req_id}")
+                future.set_result(data["result"])
+        return True
 
     async def server_registration_handler(
-            self, websocket: WebSocket, message_queue: asyncio.Queue
+            self,
+            websocket: WebSocket,
+            message_queue: asyncio.Queue,
+            connection: _ServerConnection,
     ):
         """Handle registration requests from MCP servers"""
         server_id = None
 
         # Receive first message (registration info)
-        registration_info_raw = await message_queue.get()
-        if registration_info_raw is None:
+        info = await message_queue.get()
+        if info is None:
             logger.error("Failed to receive registration info")
             return
 
         try:
-            info = json.loads(registration_info_raw)
 
             # Use client-provided ID or generate new ID
             server_id = info.get("id") or str(uuid.uuid4())
@@ -186,6 +254,11 @@ class MCPGateway:
             self.registered_servers[server_id] = {
                 "websocket": websocket,
                 "message_queue": message_queue,
+                "connection": connection,
+                # Limit the concurrent requests sent to the server
+                "semaphore": asyncio.Semaphore(
+                    self.settings.max_concurrent_requests
+                ),
                 "name": server_name,
                 "info": info,
                 "tools": [],
@@ -241,7 +314,7 @@ class MCPGateway:
                     }
                 )
             )
-            await asyncio.sleep(5)
+            await asyncio.sleep(_INITIALIZED_WAIT_SECONDS)
 
             # Get server tools list
             logger.info(f"Requesting tools list from server {server_id}")
@@ -308,115 +381,21 @@ class MCPGateway:
             except:
                 pass
 
-    async def wait_for_response(
-            self,
-            server_id: str,
-            message_queue: asyncio.Queue,
-            request_id: int,
-            future: asyncio.Future,
-    ):
-        """Wait for response with specific request ID"""
-        try:
-            while True:
-                message_raw = await message_queue.get()
-                logger.debug(f"Received message: {message_raw}")
-                if message_raw is None:
-                    # Receiver has stopped
-                    if not future.done():
-                        future.set_exception(Exception("WebSocket connection closed"))
-                    return
-
-                try:
-                    message = json.loads(message_raw)
-                    logger.debug(f"Processing message: {message}")
-
-                    # Check if it's a response
-                    if "id" in message and message["id"] == request_id:
-                        if "result" in message:
-                            logger.debug(f"Found response for request {request_id}")
-                            if not future.done():
-                                future.set_result(message["result"])
-                            return
-                        elif "error" in message:
-                            logger.debug(
-                                f"Found error response for request {request_id}"
-                            )
-                            if not future.done():
-                                future.set_exception(
-                                    Exception(f"Server error: {message['error']}")
-                                )
-                            return
-                    else:
-                        # Not the response we're looking for, put it back in the queue for other handlers
-                        logger.debug(
-                            f"Message is not a response for request {request_id}, putting it back in queue"
-                        )
-                        await message_queue.put(message_raw)
-                        await asyncio.sleep(
-                            0.1
-                        )  # Brief sleep to avoid immediately processing the same message
-
-                except json.JSONDecodeError:
-                    logger.error(f"Cannot parse JSON: {message_raw}")
-                    continue
-                except Exception as e:
-                    logger.error(f"Error processing message: {str(e)}")
-                    continue
-        except asyncio.CancelledError:
-            logger.debug("Task waiting for response was cancelled")
-            raise
-        except Exception as e:
-            logger.error(f"Error waiting for response: {str(e)}")
-            logger.error(traceback.format_exc())
-            if not future.done():
-                future.set_exception(Exception(f"Error waiting for response: {str(e)}"))
-
     async def handle_server_messages(
             self, server_id: str, message_queue: asyncio.Queue
     ):
-        """Process messages from the server"""
-        # Start heartbeat task
-        heartbeat_task = asyncio.create_task(self.send_heartbeat(server_id))
+        """Process messages from the server, the responses are resolved by the
+        receiver"""
         while True:
-            try:
-                message_raw = await message_queue.get()
-                if message_raw is None:
-                    logger.info(f"Server {server_id} connection closed")
-                    break
-
-                logger.debug(f"Received message from server {server_id}: {message_raw}")
-                data = json.loads(message_raw)
-
-                # Handle responses
-                if "id" in data and "result" in data:
-                    req_id = data["id"]
-                    logger.debug(f"Received response for request {req_id}")
-                    if req_id in self.pending_requests:
-                        future = self.pending_requests.pop(req_id)
-                        if not future.done():
-                            future.set_result(data["result"])
-                    else:
-                        logger.warning(
-                            f"Received response for unknown request ID: {req_id}"
-                        )
-
-                # Handle error responses
-                elif "id" in data and "error" in data:
-                    req_id = data["id"]
-                    logger.debug(f"Received error response for request {req_id}")
-                    if req_id in self.pending_requests:
-                        future = self.pending_requests.pop(req_id)
-                        if not future.done():
-                            future.set_exception(
-                                Exception(f"Server error: {data['error']}")
-                            )
-                    else:
-                        logger.warning(
-                            f"Received error for unknown request ID: {req_id}"
-                        )
+            data = await message_queue.get()
+            if data is None:
+                logger.info(f"Server {server_id} connection closed")
+                break
 
+            logger.debug(f"Received message from server {server_id}: {data}")
+            try:
                 # Handle notifications (if needed)
-                elif "method" in data and "id" not in data:
+                if "method" in data and "id" not in data:
                     # Handle notifications, e.g., tools/list_changed
                     if data["method"] == "notifications/tools/list_changed":
                         await self.refresh_server_tools(server_id)
@@ -424,21 +403,11 @@ class MCPGateway:
                 else:
                     logger.warning(f"Received unrecognized message: {data}")
 
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON parsing error: {str(e)}")
-                continue
             except Exception as e:
                 logger.error(
                     f"Error processing message from server {server_id}: {str(e)}"
                 )
                 logger.error(traceback.format_exc())
-            finally:
-                # Cancel heartbeat task
-                heartbeat_task.cancel()
-                try:
-                    await heartbeat_task
-                except asyncio.CancelledError:
-                    pass
 
     async def send_heartbeat(self, server_id: str):
         """Periodically send heartbeat messages to keep connection active, currently not manually handled"""
@@ -453,13 +422,16 @@ class MCPGateway:
             params: Dict[str, Any],
             timeout: Optional[int] = None,
     ) -> Any:
-        """Send request to specified server and wait for response"""
+        """Send request to specified server and wait for response
+
+        The timeout includes the time waiting for a free slot of the server's
+        concurrency limit.
+        """
         if server_id not in self.registered_servers:
             logger.error(f"Server {server_id} not registered")
             return None
 
-        websocket = self.registered_servers[server_id]["websocket"]
-        message_queue = self.registered_servers[server_id]["message_queue"]
+        server = self.registered_servers[server_id]
         request_id = self.next_request_id
         self.next_request_id += 1
 
@@ -470,52 +442,43 @@ class MCPGateway:
             "params": params,
         }
 
-        # Create Future to wait for response
+        # Create Future to wait for response, resolved by the receiver
         future = asyncio.get_running_loop().create_future()
-        self.pending_requests[request_id] = future
-
-        # Start task to receive response
-        response_task = asyncio.create_task(
-            self.wait_for_response(server_id, message_queue, request_id, future)
-        )
-
+        timeout = timeout or self.settings.timeout_rpc
         try:
-            # Send request
-            request_str = json.dumps(request)
-            logger.debug(
-                f"Sending request {request_id} to server {server_id}: {request_str}"
-            )
-            await websocket.send_text(request_str)
-
-            timeout = timeout or self.settings.timeout_rpc
             # Wait for response with timeout
-            return await asyncio.wait_for(future, timeout=timeout)
+            return await asyncio.wait_for(
+                self._send_and_wait(server, request, future), timeout=timeout
+            )
         except asyncio.TimeoutError:
             logger.error(f"Request {method} timed out")
-            response_task.cancel()
-            try:
-                await response_task
-            except asyncio.CancelledError:
-                pass
-            self.pending_requests.pop(request_id, None)
             return None
         except Exception as e:
             logger.error(f"Error sending request {method}: {str(e)}")
-            response_task.cancel()
-            try:
-                await response_task
-            except asyncio.CancelledError:
-                pass
-            self.pending_requests.pop(request_id, None)
             return None
         finally:
-            # Cancel response task (if not yet completed)
-            if not response_task.done():
-                response_task.cancel()
-                try:
-                    await response_task
-                except asyncio.CancelledError:
-                    pass
+            self.pending_requests.pop(request_id, None)
+            server["connection"].inflight.discard(request_id)
+
+    async def _send_and_wait(
+            self,
+            server: Dict[str, Any],
+            request: Dict[str, Any],
+            future: asyncio.Future,
+    ) -> Any:
+        async with server["semaphore"]:
+            connection = server["connection"]
+            if connection.closed:
+                raise Exception("WebSocket connection closed")
+            request_id = request["id"]
+            # Register before sending, the response may come back immediately
+            self.pending_requests[request_id] = future
+            connection.inflight.add(request_id)
+
+            request_str = json.dumps(request)
+            logger.debug(f"Sending request {request_id}: {request_str}")
+            await server["websocket"].send_text(request_str)
+            return await future
 
     async def refresh_server_tools(self, server_id: str):
         """Refresh the server's tool list"""
@@ -828,6 +791,8 @@ class McpserverParam(BaseModel):
     ipv6: bool = Field(default=True, description="Enable dual-stack IPv6/IPv4 support (default: True)", )
     timeout_rpc: int = Field(default=10, description="Timeout for RPC calls in seconds (default: 10)", )
     timeout_run_tool: int = Field(default=300, description="Timeout for tool execution in seconds (default: 120)", )
+    max_concurrent_requests: int = Field(default=16,
+                                         description="Max concurrent requests sent to each MCP server (default: 16)", )
     sse_path: str = Field(default="/mcp/sse", description="SSE endpoint path (default: /mcp/sse)", )
     message_path: str = Field(default="/mcp/messages", description="Message endpoint path (default:/mcp/messages)", )
     auth_tokens: Optional[str] = Field(default=None,
@@ -852,6 +817,7 @@ def run_mcp_port(app: FastAPI, args: McpserverParam):
         ipv6=args.ipv6,
         timeout_rpc=args.timeout_rpc,
         timeout_run_tool=args.timeout_run_tool,
+        max_concurrent_requests=args.max_concurrent_requests,
         ssl_enabled=args.ssl_enabled,
         ssl_keyfile=args.ssl_keyfile,
         ssl_certfile=args.ssl_certfile,
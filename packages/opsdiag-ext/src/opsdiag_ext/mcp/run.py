@@ -61,6 +61,12 @@ def setup_server_parser(parser):
         default=120,
         help="Timeout for tool execution in seconds (default: 120)",
     )
+    parser.add_argument(
+        "--max-concurrent-requests",
+        type=int,
+        default=16,
+        help="Max concurrent requests sent to each MCP server (default: 16)",
+    )
 
     # Path configuration
     parser.add_argument(
@@ -169,6 +175,7 @@ def run_server(args):
         ipv6=args.ipv6,
         timeout_rpc=args.timeout_rpc,
         timeout_run_tool=args.timeout_run_tool,
+        max_concurrent_requests=args.max_concurrent_requests,
         ssl_enabled=args.ssl_enabled,
         ssl_keyfile=args.ssl_keyfile,
         ssl_certfile=args.ssl_certfile,
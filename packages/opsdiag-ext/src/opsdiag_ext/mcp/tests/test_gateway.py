@@ -0,0 +1,197 @@
+import asyncio
+import json
+import random
+import time
+
+import pytest
+
+from opsdiag_ext.mcp import gateway as gateway_module
+from opsdiag_ext.mcp.gateway import MCPGateway
+from opsdiag_ext.mcp.types import ServerSettings
+
+
+class _User:
+    is_authenticated = True
+
+
+class FakeMCPServer:
+    """A local MCP server speaking to the gateway through a fake WebSocket.
+
+    The tool calls are answered after a random delay, so the responses come back
+    out of order and interleaved with notifications.
+    """
+
+    def __init__(self, server_id: str = "fake", max_delay: float = 0.01):
+        self.user = _User()
+        self.server_id = server_id
+        self.max_delay = max_delay
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.running = 0
+        self.max_running = 0
+        self.calls = 0
+        self.hang = False
+        self.inbox.put_nowait(
+            {
+                "type": "websocket.receive",
+                "text": json.dumps(
+                    {
+                        "id": server_id,
+                        "method": "register",
+                        "params": {"name": "fake"},
+                    }
+                ),
+            }
+        )
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        await self.inbox.put({"type": "websocket.disconnect", "code": code})
+
+    async def receive(self):
+        return await self.inbox.get()
+
+    async def _reply(self, message):
+        await self.inbox.put({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def send_text(self, text: str):
+        message = json.loads(text)
+        method = message.get("method")
+        if method == "initialize":
+            result = {"protocolVersion": "0.1.0", "serverInfo": {"name": "fake"}}
+            await self._reply({"jsonrpc": "2.0", "id": message["id"], "result": result})
+        elif method == "tools/list":
+            tool = {"name": "echo", "inputSchema": {"properties": {}}}
+            await self._reply(
+                {"jsonrpc": "2.0", "id": message["id"], "result": {"tools": [tool]}}
+            )
+        elif method == "tools/call":
+            asyncio.create_task(self._call(message))
+
+    async def _call(self, message):
+        self.calls += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            if self.hang:
+                await asyncio.Event().wait()
+            await asyncio.sleep(random.random() * self.max_delay)
+            # A notification between the responses
+            await self._reply({"jsonrpc": "2.0", "method": "notifications/progress"})
+            arguments = message["params"]["arguments"]
+            if arguments.get("fail"):
+                response = {"id": message["id"], "error": {"message": "failed"}}
+            else:
+                text = json.dumps({"echo": arguments["value"]})
+                content = [{"type": "text", "text": text}]
+                response = {"id": message["id"], "result": {"content": content}}
+        finally:
+            self.running -= 1
+        await self._reply({"jsonrpc": "2.0", **response})
+
+
+def _settings(max_concurrent_requests: int = 4) -> ServerSettings:
+    return ServerSettings(
+        host="localhost",
+        port=0,
+        debug=False,
+        log_level="INFO",
+        sse_path="/sse",
+        message_path="/messages",
+        timeout_rpc=5,
+        max_concurrent_requests=max_concurrent_requests,
+    )
+
+
+async def _connect(gateway: MCPGateway, server: FakeMCPServer) -> asyncio.Task:
+    task = asyncio.create_task(gateway.handle_websocket(server))
+    for _ in range(500):
+        if gateway.registered_servers.get(server.server_id, {}).get("tools"):
+            return task
+        await asyncio.sleep(0.01)
+    raise AssertionError("The fake MCP server is not registered")
+
+
+@pytest.fixture(autouse=True)
+def _no_initialized_wait(monkeypatch):
+    monkeypatch.setattr(gateway_module, "_INITIALIZED_WAIT_SECONDS", 0)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_under_load():
+    gateway = MCPGateway(settings=_settings(max_concurrent_requests=8))
+    server = FakeMCPServer()
+    task = await _connect(gateway, server)
+
+    n = 500
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[
+            gateway.send_request_to_server(
+                "fake", "tools/call", {"name": "echo", "arguments": {"value": i}}
+            )
+            for i in range(n)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+
+    for i, result in enumerate(results):
+        assert json.loads(result["content"][0]["text"]) == {"echo": i}
+    assert server.calls == n
+    # The per-server limit is reached but never exceeded
+    assert server.max_running == 8
+    assert not gateway.pending_requests
+    # Each request waits at most its own delay, not the other requests' messages
+    assert elapsed < n * server.max_delay / 8 * 2 + 1
+
+    await server.close()
+    await asyncio.wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_error_response():
+    gateway = MCPGateway(settings=_settings())
+    server = FakeMCPServer()
+    task = await _connect(gateway, server)
+
+    results = await asyncio.gather(
+        gateway.send_request_to_server(
+            "fake", "tools/call", {"name": "echo", "arguments": {"fail": True}}
+        ),
+        gateway.send_request_to_server(
+            "fake", "tools/call", {"name": "echo", "arguments": {"value": 1}}
+        ),
+    )
+    assert results[0] is None
+    assert json.loads(results[1]["content"][0]["text"]) == {"echo": 1}
+    assert not gateway.pending_requests
+
+    await server.close()
+    await asyncio.wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_connection_closed_fails_inflight_requests():
+    gateway = MCPGateway(settings=_settings())
+    server = FakeMCPServer()
+    task = await _connect(gateway, server)
+    server.hang = True
+
+    requests = asyncio.gather(
+        *[
+            gateway.send_request_to_server(
+                "fake", "tools/call", {"name": "echo", "arguments": {"value": i}}
+            )
+            for i in range(10)
+        ]
+    )
+    await asyncio.sleep(0.05)
+    assert len(gateway.pending_requests) == 4
+    await server.close()
+
+    # Failed at once, not after the timeout
+    results = await asyncio.wait_for(requests, 1)
+    assert all(result is None for result in results)
+    assert not gateway.pending_requests
+    await asyncio.wait_for(task, 1)
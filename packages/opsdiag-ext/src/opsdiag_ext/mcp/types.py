@@ -43,6 +43,7 @@ class ServerSettings:
     ipv6: bool = False  # Added IPv6 support flag
     timeout_rpc: int = 10
     timeout_run_tool: int = 120
+    max_concurrent_requests: int = 16  # Max concurrent requests to each server
     ssl_enabled: bool = False  # Whether to enable SSL
     ssl_keyfile: Optional[str] = None  # SSL private key file path
     ssl_certfile: Optional[str] = None  # SSL certificate file path
@@ -1,12 +1,18 @@
 """PDF Knowledge."""
 
+import hashlib
 import json
+import math
+import multiprocessing
 import os
 import re
+import uuid
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from opsdiag.component import logger
+from opsdiag.configs.model_config import DATA_DIR
 from opsdiag.core import Document
 from opsdiag.rag.knowledge.base import (
     ChunkStrategy,
@@ -15,6 +21,25 @@ from opsdiag.rag.knowledge.base import (
     KnowledgeType,
 )
 
+_DEFAULT_CACHE_DIR = os.path.join(DATA_DIR, "pdf_cache")
+# Change it when the extracted rows change, the old cached results are ignored
+_CACHE_VERSION = 1
+# The max total size of the cached results, the least recently used are evicted
+_DEFAULT_CACHE_MAX_SIZE = 512 * 1024 * 1024
+# The min number of pages extracted by a worker process, the small files are
+# extracted in the current process
+_MIN_PAGES_PER_WORKER = 16
+
+
+def _table_to_markdown(table: List[List[str]]) -> str:
+    """Convert the table rows to a markdown table, the first row is the header."""
+    header = table[0]
+    markdown_output = "| " + " | ".join(header) + " |\n"
+    markdown_output += "| " + " | ".join(["---"] * len(header)) + " |\n"
+    for row in table[1:]:
+        markdown_output += "| " + " | ".join(row) + " |\n"
+    return markdown_output
+
 
 class PDFKnowledge(Knowledge):
     """PDF Knowledge."""
@@ -174,29 +199,16 @@ class PDFKnowledge(Knowledge):
                     # merge excel table
                     if temp_table:
                         table_meta = {
-                            "title": temp_title or temp_table[0],
+                            "title": temp_title or str(temp_table[0]),
                             "type": "excel",
                         }
                         self.all_title.append(table_meta)
 
                         # markdown format
-                        markdown_tables = []
-                        if temp_table:
-                            header = eval(temp_table[0])
-                            markdown_tables.append(header)
-                            for entry in temp_table[1:]:
-                                row = eval(entry)
-                                markdown_tables.append(row)
-                            markdown_output = "| " + " | ".join(header) + " |\n"
-                            markdown_output += (
-                                "| " + " | ".join(["---"] * len(header)) + " |\n"
-                            )
-                            for row in markdown_tables[1:]:
-                                markdown_output += "| " + " | ".join(row) + " |\n"
-
-                            #  merged content
-                            merged_data[page]["excel_content"] = temp_table
-                            merged_data[page]["markdown_output"] = markdown_output
+                        merged_data[page]["excel_content"] = temp_table
+                        merged_data[page]["markdown_output"] = _table_to_markdown(
+                            temp_table
+                        )
 
                         temp_title = None
                         temp_table = []
@@ -204,26 +216,14 @@ class PDFKnowledge(Knowledge):
             # deal last excel
             if temp_table:
                 table_meta = {
-                    "title": temp_title or temp_table[0],
+                    "title": temp_title or str(temp_table[0]),
                     "table": temp_table,
                     "type": "excel",
                 }
                 self.all_title.append(table_meta)
                 # markdown format
-                markdown_tables = []
-                if temp_table:
-                    header = eval(temp_table[0])
-                    markdown_tables.append(header)
-                    for entry in temp_table[1:]:
-                        row = eval(entry)
-                        markdown_tables.append(row)
-                    markdown_output = "| " + " | ".join(header) + " |\n"
-                    markdown_output += "| " + " | ".join(["---"] * len(header)) + " |\n"
-                    for row in markdown_tables[1:]:
-                        markdown_output += "| " + " | ".join(row) + " |\n"
-                    #  merged content
-                    merged_data[page]["excel_content"] = temp_table
-                    merged_data[page]["markdown_output"] = markdown_output
+                merged_data[page]["excel_content"] = temp_table
+                merged_data[page]["markdown_output"] = _table_to_markdown(temp_table)
 
             for page, content in merged_data.items():
                 inside_content = content["inside_content"]
@@ -287,11 +287,46 @@ class PDFKnowledge(Knowledge):
         return DocumentType.PDF
 
 
+def _extract_pages(filepath: str, start: int, end: int) -> List[List[dict]]:
+    """Extract the rows of the pages in [start, end), run in the worker processes."""
+    processor = PDFProcessor(filepath, max_workers=1, cache_dir=None)
+    try:
+        return [
+            processor.extract_page_rows(processor.pdf.pages[i], first_page=i == 0)
+            for i in range(start, end)
+        ]
+    finally:
+        processor.pdf.close()
+
+
 class PDFProcessor:
-    """PDFProcessor class."""
+    """PDFProcessor class.
+
+    The pages are extracted in parallel worker processes, each of them extracts a
+    range of the pages. The worker processes are spawned, forking a multi-threaded
+    server process may deadlock them. The extracted rows are cached by the hash of
+    the file, so an unchanged file is not extracted again until it is evicted.
+    """
+
+    def __init__(
+        self,
+        filepath,
+        max_workers: Optional[int] = None,
+        cache_dir: Optional[str] = _DEFAULT_CACHE_DIR,
+        cache_max_size: int = _DEFAULT_CACHE_MAX_SIZE,
+    ):
+        """Initialize PDFProcessor class.
 
-    def __init__(self, filepath):
-        """Initialize PDFProcessor class."""
+        Args:
+            filepath: The path of the pdf file
+            max_workers (Optional[int]): The max number of worker processes,
+                defaults to the number of CPUs (at most 8), 1 to extract the pages
+                in the current process.
+            cache_dir (Optional[str]): The directory of the extracted results,
+                None to disable the cache.
+            cache_max_size (int): The max total size in bytes of the extracted
+                results, the least recently used are evicted.
+        """
         self.filepath = filepath
         try:
             import pdfplumber  # type: ignore
@@ -301,6 +336,9 @@ class PDFProcessor:
         self.all_text = defaultdict(dict)
         self.allrow = 0
         self.last_num = 0
+        self.max_workers = max_workers or min(os.cpu_count() or 1, 8)
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
 
     def check_lines(self, page, top, buttom):
         """Check lines."""
@@ -357,8 +395,89 @@ class PDFProcessor:
         result = list(map(list, zip(*filtered_data)))
         return result
 
-    def extract_text_and_tables(self, page):
-        """Extract text and tables."""
+    def _table_rows(self, table) -> List[List[str]]:
+        """Extract the rows of a table, merge the broken rows and fill the cells."""
+        new_table = table.extract()
+        r_count = 0
+        for r in range(len(new_table)):
+            row = new_table[r]
+            if row[0] is None:
+                r_count += 1
+                for c in range(len(row)):
+                    if row[c] is not None and row[c] not in ["", " "]:
+                        if new_table[r - r_count][c] is None:
+                            new_table[r - r_count][c] = row[c]
+                        else:
+                            new_table[r - r_count][c] += row[c]
+                        new_table[r][c] = None
+            else:
+                r_count = 0
+
+        end_table = []
+        for row in new_table:
+            if row[0] is not None:
+                cell_list = []
+                cell_check = False
+                for cell in row:
+                    if cell is not None:
+                        cell = cell.replace("\n", "")
+                    else:
+                        cell = ""
+                    if cell != "":
+                        cell_check = True
+                    cell_list.append(cell)
+                if cell_check:
+                    end_table.append(cell_list)
+
+        end_table = self.drop_empty_cols(end_table)
+
+        # process when column name is empty
+        if len(end_table) > 0:
+            for i in range(len(end_table[0])):
+                if end_table[0][i] == "":
+                    if 0 < i < len(end_table[0]) - 1:
+                        # left column name
+                        left_column = end_table[0][i - 1]
+                        # right column name
+                        right_column = end_table[0][i + 1]
+                        # current name = left name + right name
+                        end_table[0][i] = left_column + right_column
+                    else:
+                        # if current column is empty and is the first
+                        # column, assign the right column name.
+                        # if current column is empty and is the
+                        # last column, assign the left column name.
+                        end_table[0][i] = (
+                            end_table[0][i - 1]
+                            if i == len(end_table[0]) - 1
+                            else end_table[0][i + 1]
+                        )
+
+        # if the first row is empty, assign the value of the previous row
+        for i in range(1, len(end_table)):
+            for j in range(len(end_table[i])):
+                if end_table[i][j] == "":
+                    end_table[i][j] = end_table[i][j - 1]
+        return end_table
+
+    def extract_page_rows(self, page, first_page: bool = False) -> List[dict]:
+        """Extract the text lines and the table rows of a page.
+
+        The "inside" of a table row is the list of its cells.
+
+        Args:
+            page: The pdfplumber page
+            first_page (bool): Whether it is the first page of the file
+
+        Returns:
+            List[dict]: The rows of the page, in order
+        """
+        rows: List[dict] = []
+
+        def _add_text(text: str):
+            for line in text.split("\n"):
+                rows.append({"page": page.page_number, "type": "text", "inside": line})
+
         buttom = 0
         tables = page.find_tables()
         if len(tables) >= 1:
@@ -371,144 +490,182 @@ class PDFProcessor:
                     count -= 1
                     # process text before table
                     top = table.bbox[1]
-                    text = self.check_lines(page, top, buttom)
-                    text_list = text.split("\n")
-                    for _t in range(len(text_list)):
-                        self.all_text[self.allrow] = {
-                            "page": page.page_number,
-                            "allrow": self.allrow,
-                            "type": "text",
-                            "inside": text_list[_t],
-                        }
-                        self.allrow += 1
+                    _add_text(self.check_lines(page, top, buttom))
 
                     # process table
                     buttom = table.bbox[3]
-                    new_table = table.extract()
-                    r_count = 0
-                    for r in range(len(new_table)):
-                        row = new_table[r]
-                        if row[0] is None:
-                            r_count += 1
-                            for c in range(len(row)):
-                                if row[c] is not None and row[c] not in ["", " "]:
-                                    if new_table[r - r_count][c] is None:
-                                        new_table[r - r_count][c] = row[c]
-                                    else:
-                                        new_table[r - r_count][c] += row[c]
-                                    new_table[r][c] = None
-                        else:
-                            r_count = 0
-
-                    end_table = []
-                    for row in new_table:
-                        if row[0] is not None:
-                            cell_list = []
-                            cell_check = False
-                            for cell in row:
-                                if cell is not None:
-                                    cell = cell.replace("\n", "")
-                                else:
-                                    cell = ""
-                                if cell != "":
-                                    cell_check = True
-                                cell_list.append(cell)
-                            if cell_check:
-                                end_table.append(cell_list)
-
-                    end_table = self.drop_empty_cols(end_table)
-
-                    # process when column name is empty
-                    if len(end_table) > 0:
-                        for i in range(len(end_table[0])):
-                            if end_table[0][i] == "":
-                                if 0 < i < len(end_table[0]) - 1:
-                                    # left column name
-                                    left_column = end_table[0][i - 1]
-                                    # right column name
-                                    right_column = end_table[0][i + 1]
-                                    # current name = left name + right name
-                                    end_table[0][i] = left_column + right_column
-                                else:
-                                    # if current column is empty and is the first
-                                    # column, assign the right column name.
-                                    # if current column is empty and is the
-                                    # last column, assign the left column name.
-                                    end_table[0][i] = (
-                                        end_table[0][i - 1]
-                                        if i == len(end_table[0]) - 1
-                                        else end_table[0][i + 1]
-                                    )
-
-                    # if the first row is empty, assign the value of the previous row
-                    for i in range(1, len(end_table)):
-                        for j in range(len(end_table[i])):
-                            if end_table[i][j] == "":
-                                end_table[i][j] = end_table[i][j - 1]
-
-                    for row in end_table:
-                        self.all_text[self.allrow] = {
-                            "page": page.page_number,
-                            "allrow": self.allrow,
-                            "type": "excel",
-                            "inside": str(row),
-                        }
-                        self.allrow += 1
+                    for row in self._table_rows(table):
+                        rows.append(
+                            {"page": page.page_number, "type": "excel", "inside": row}
+                        )
 
                     if count == 0:
-                        text = self.check_lines(page, "", buttom)
-                        text_list = text.split("\n")
-                        for _t in range(len(text_list)):
-                            self.all_text[self.allrow] = {
-                                "page": page.page_number,
-                                "allrow": self.allrow,
-                                "type": "text",
-                                "inside": text_list[_t],
-                            }
-                            self.allrow += 1
-
+                        _add_text(self.check_lines(page, "", buttom))
         else:
-            text = self.check_lines(page, "", "")
-            text_list = text.split("\n")
-            for _t in range(len(text_list)):
-                self.all_text[self.allrow] = {
-                    "page": page.page_number,
-                    "allrow": self.allrow,
-                    "type": "text",
-                    "inside": text_list[_t],
-                }
-                self.allrow += 1
+            _add_text(self.check_lines(page, "", ""))
+
+        self._mark_header_footer(rows, first_page)
+        return rows
 
+    def _mark_header_footer(self, rows: List[dict], first_page: bool):
+        """Mark the header (the second row) and the footer (the last row)."""
+        if len(rows) < 2:
+            return
         first_re = "[^计](?:报告(?:全文)?(?:（修订版）|（修订稿）|（更正后）)?)$"
         end_re = "^(?:\d|\\|\/|第|共|页|-|_| ){1,}"
-        if self.last_num == 0:
+        first_text = str(rows[1]["inside"])
+        end_text = str(rows[-1]["inside"])
+        if re.search(first_re, first_text) and "[" not in end_text:
+            rows[1]["type"] = "页眉"
+            if first_page and re.search(end_re, end_text) and "[" not in end_text:
+                rows[-1]["type"] = "页脚"
+        if not first_page and re.search(end_re, end_text) and "[" not in end_text:
+            rows[-1]["type"] = "页脚"
+
+    def extract_text_and_tables(self, page, first_page: Optional[bool] = None):
+        """Extract text and tables of a page, append them to all_text."""
+        if first_page is None:
+            first_page = self.allrow == 0
+        self._append_rows(self.extract_page_rows(page, first_page))
+
+    def _append_rows(self, rows: List[dict]):
+        for row in rows:
+            self.all_text[self.allrow] = {
+                "page": row["page"],
+                "allrow": self.allrow,
+                "type": row["type"],
+                "inside": row["inside"],
+            }
+            self.allrow += 1
+        self.last_num = len(self.all_text) - 1
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        """Split the pages to the ranges extracted by the worker processes."""
+        if self.max_workers <= 1 or page_count < 2 * _MIN_PAGES_PER_WORKER:
+            return [(0, page_count)]
+        # More ranges than workers, a slow range doesn't keep the others waiting
+        size = max(
+            _MIN_PAGES_PER_WORKER, math.ceil(page_count / (self.max_workers * 4))
+        )
+        return [(i, min(i + size, page_count)) for i in range(0, page_count, size)]
+
+    def _extract_all_pages(self) -> List[List[dict]]:
+        page_count = len(self.pdf.pages)
+        ranges = self._page_ranges(page_count)
+        if len(ranges) == 1:
+            pages = []
+            for i in range(page_count):
+                pages.append(
+                    self.extract_page_rows(self.pdf.pages[i], first_page=i == 0)
+                )
+                logger.info(f"{self.filepath} page {i} extract text success")
+            return pages
+
+        pages = []
+        workers = min(self.max_workers, len(ranges))
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            # The results are returned in the order of the ranges
+            for (start, end), range_pages in zip(
+                ranges,
+                executor.map(
+                    _extract_pages,
+                    [self.filepath] * len(ranges),
+                    [start for start, _ in ranges],
+                    [end for _, end in ranges],
+                ),
+            ):
+                pages.extend(range_pages)
+                logger.info(
+                    f"{self.filepath} page {start}-{end - 1} extract text success"
+                )
+        return pages
+
+    def _file_hash(self) -> Optional[str]:
+        if not self.cache_dir or not os.path.isfile(self.filepath):
+            return None
+        sha256 = hashlib.sha256()
+        with open(self.filepath, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _cache_path(self, file_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{file_hash}.json")
+
+    def _load_cache(self, file_hash: str) -> Optional[List[List[dict]]]:
+        cache_path = self._cache_path(file_hash)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("version") == _CACHE_VERSION:
+                # Mark it as recently used
+                os.utime(cache_path)
+                return cached["pages"]
+        except Exception as e:
+            logger.warning(f"Load the extracted pages from {cache_path} failed: {e}")
+        return None
+
+    def _save_cache(self, file_hash: str, pages: List[List[dict]]):
+        cache_path = self._cache_path(file_hash)
+        tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": _CACHE_VERSION, "pages": pages}, f, ensure_ascii=False
+                )
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning(f"Save the extracted pages to {cache_path} failed: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict_cache(keep=cache_path)
+
+    def _evict_cache(self, keep: str):
+        """Remove the least recently used results until the cache fits its size."""
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
             try:
-                first_text = str(self.all_text[1]["inside"])
-                end_text = str(self.all_text[len(self.all_text) - 1]["inside"])
-                if re.search(first_re, first_text) and "[" not in end_text:
-                    self.all_text[1]["type"] = "页眉"
-                    if re.search(end_re, end_text) and "[" not in end_text:
-                        self.all_text[len(self.all_text) - 1]["type"] = "页脚"
-            except Exception:
-                print(page.page_number)
-        else:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # Evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+        for _, size, path in sorted(entries):
+            if total_size <= self.cache_max_size:
+                break
+            if path == keep:
+                continue
             try:
-                first_text = str(self.all_text[self.last_num + 2]["inside"])
-                end_text = str(self.all_text[len(self.all_text) - 1]["inside"])
-                if re.search(first_re, first_text) and "[" not in end_text:
-                    self.all_text[self.last_num + 2]["type"] = "页眉"
-                if re.search(end_re, end_text) and "[" not in end_text:
-                    self.all_text[len(self.all_text) - 1]["type"] = "页脚"
-            except Exception:
-                print(page.page_number)
-
-        self.last_num = len(self.all_text) - 1
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
 
     def pdf_to_json(self):
-        """Process pdf."""
-        for i in range(len(self.pdf.pages)):
-            self.extract_text_and_tables(self.pdf.pages[i])
-            logger.info(f"{self.filepath} page {i} extract text success")
+        """Process pdf.
+
+        The pages are read from the cache if the file was extracted before.
+        """
+        file_hash = self._file_hash()
+        pages = self._load_cache(file_hash) if file_hash else None
+        if pages is not None:
+            logger.info(f"{self.filepath} load {len(pages)} pages from cache")
+        else:
+            pages = self._extract_all_pages()
+            if file_hash:
+                self._save_cache(file_hash, pages)
+        for rows in pages:
+            self._append_rows(rows)
 
     def save_all_text(self, path):
         """Save all text."""
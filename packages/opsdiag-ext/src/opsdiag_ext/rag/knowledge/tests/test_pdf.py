@@ -1,8 +1,9 @@
+import os
 from unittest.mock import MagicMock, mock_open, patch
 
 import pytest
 
-from ..pdf import PDFKnowledge
+from ..pdf import PDFKnowledge, PDFProcessor
 
 MOCK_PDF_PAGES = [
     ("", 0),
@@ -35,3 +36,106 @@ def test_load_from_pdf(mock_pdf_open_and_reader):
         assert document.metadata["type"] == "text"
 
     #
+
+
+def _mock_page(page_number, lines, table=None):
+    page = MagicMock(page_number=page_number, width=100, height=100)
+    page.extract_words.return_value = [
+        {"text": line, "top": 10 * (i + 1), "x1": 10} for i, line in enumerate(lines)
+    ]
+    if table:
+        mock_table = MagicMock(bbox=(0, 5, 100, 8))
+        mock_table.extract.return_value = table
+        page.find_tables.return_value = [mock_table]
+    else:
+        page.find_tables.return_value = []
+    return page
+
+
+def test_pdf_table_rows(tmp_path):
+    pages = [
+        _mock_page(
+            1, ["Service status"], table=[["name", "state"], ["api", "it's [ok]"]]
+        )
+    ]
+    with patch("pdfplumber.open", return_value=MagicMock(pages=pages)):
+        knowledge = PDFKnowledge(file_path=str(tmp_path / "runbook.pdf"))
+        documents = knowledge._load()
+
+    rows = [row for row in knowledge.all_text if row["type"] == "excel"]
+    assert [row["inside"] for row in rows] == [["name", "state"], ["api", "it's [ok]"]]
+    assert documents[0].metadata["type"] == "excel"
+    assert "| api | it's [ok] |" in documents[0].content
+
+
+def test_pdf_to_json_cache(tmp_path):
+    file_path = tmp_path / "runbook.pdf"
+    file_path.write_bytes(b"%PDF-1.4 runbook")
+    cache_dir = str(tmp_path / "cache")
+    pages = [_mock_page(1, ["first page"]), _mock_page(2, ["second page"])]
+
+    with patch("pdfplumber.open", return_value=MagicMock(pages=pages)):
+        processor = PDFProcessor(str(file_path), cache_dir=cache_dir)
+        processor.pdf_to_json()
+    expected = list(processor.all_text.values())
+    assert [row["inside"] for row in expected if row["inside"]] == [
+        "first page",
+        "second page",
+    ]
+
+    # The unchanged file is not extracted again
+    pages = [MagicMock(find_tables=MagicMock(side_effect=AssertionError))]
+    with patch("pdfplumber.open", return_value=MagicMock(pages=pages)):
+        processor = PDFProcessor(str(file_path), cache_dir=cache_dir)
+        processor.pdf_to_json()
+    assert list(processor.all_text.values()) == expected
+
+    # A changed file is extracted again
+    file_path.write_bytes(b"%PDF-1.4 runbook v2")
+    pages = [_mock_page(1, ["new page"])]
+    with patch("pdfplumber.open", return_value=MagicMock(pages=pages)):
+        processor = PDFProcessor(str(file_path), cache_dir=cache_dir)
+        processor.pdf_to_json()
+    rows = processor.all_text.values()
+    assert [row["inside"] for row in rows if row["inside"]] == ["new page"]
+
+
+def test_pdf_cache_eviction(tmp_path):
+    cache_dir = tmp_path / "cache"
+
+    def _extract(i):
+        file_path = tmp_path / f"runbook{i}.pdf"
+        file_path.write_bytes(f"%PDF-1.4 runbook {i}".encode())
+        pages = [_mock_page(1, ["page " + "x" * 100])]
+        with patch("pdfplumber.open", return_value=MagicMock(pages=pages)):
+            processor = PDFProcessor(
+                str(file_path), cache_dir=str(cache_dir), cache_max_size=500
+            )
+            processor.pdf_to_json()
+        return processor._cache_path(processor._file_hash())
+
+    # Only two results fit the cache
+    cache_paths = [_extract(0), _extract(1)]
+    assert 500 / 3 < os.path.getsize(cache_paths[0]) <= 500 / 2
+    for i, cache_path in enumerate(cache_paths):
+        os.utime(cache_path, (i, i))
+    # The first result is used again, the second one is the least recently used
+    assert _extract(0) == cache_paths[0]
+    cache_paths.append(_extract(2))
+
+    assert sorted(os.listdir(cache_dir)) == sorted(
+        os.path.basename(p) for p in (cache_paths[0], cache_paths[2])
+    )
+
+
+def test_page_ranges():
+    with patch("pdfplumber.open", return_value=MagicMock(pages=[])):
+        processor = PDFProcessor("test_document", max_workers=4)
+    assert processor._page_ranges(20) == [(0, 20)]
+    ranges = processor._page_ranges(500)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 500
+    assert all(r1[1] == r2[0] for r1, r2 in zip(ranges, ranges[1:]))
+    assert len(ranges) > 4
+
+    processor.max_workers = 1
+    assert processor._page_ranges(500) == [(0, 500)]
@@ -1,8 +1,15 @@
 """Tree-based document retriever."""
 
+import bisect
+import difflib
+import json
 import logging
+import os
+import re
+import threading
+import unicodedata
 from concurrent.futures import Executor, ThreadPoolExecutor
-from typing import Optional, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from opsdiag.core import Chunk, Document
 from opsdiag.rag.retriever import BaseRetriever, QueryRewrite, Ranker, DefaultRanker
@@ -19,6 +26,7 @@ HEADER3 = "Header3"
 HEADER4 = "Header4"
 HEADER5 = "Header5"
 HEADER6 = "Header6"
+HEADERS = [HEADER1, HEADER2, HEADER3, HEADER4, HEADER5, HEADER6]
 
 
 class TreeNode:
@@ -287,3 +295,167 @@ class DocTreeRetriever(BaseRetriever):
                 )
             tree_indexes.append(tree_index)
         return tree_indexes
+
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_title(text: str) -> str:
+    """Normalize a title or a keyword for the lookup.
+
+    The width, the case and the spaces are ignored, e.g. "Ｄｅｐｌｏｙ  Guide" and
+    "deploy guide" are the same title.
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return _SPACES.sub(" ", text).strip()
+
+
+class HeaderTreeIndex:
+    """The header trees of the documents of a knowledge space, as a hash map.
+
+    It gives the same results as searching the :class:`DocTreeIndex` of each
+    document, without building and walking the trees:
+
+    - A document title matches all the chunks with headers of the document (or
+      its first chunk if no chunk has headers).
+    - A header matches the first chunk of the document under the header.
+
+    The index is built when the documents are synced and updated per document, a
+    lookup is a dictionary access for each keyword.
+    """
+
+    VERSION = 1
+
+    def __init__(self, documents: Optional[Dict[str, Dict[str, List[str]]]] = None):
+        # doc_id -> normalized title or header -> chunk ids
+        self._documents: Dict[str, Dict[str, List[str]]] = dict(documents or {})
+        self._lock = threading.Lock()
+        # normalized title or header -> chunk ids of each document
+        self._titles: Optional[Dict[str, List[List[str]]]] = None
+        self._sorted_titles: List[str] = []
+
+    @staticmethod
+    def build_document_entries(chunks: Iterable[Chunk]) -> Dict[str, List[str]]:
+        """Build the entries of a document from its chunks, in order."""
+        title = None
+        title_chunk_ids: List[str] = []
+        header_chunk_ids: List[str] = []
+        headers: Dict[str, List[str]] = {}
+        for chunk in chunks:
+            metadata = chunk.metadata or {}
+            if not metadata.get(TITLE):
+                continue
+            if title is None:
+                # Like DocTreeIndex, the first title is the title of the document
+                title = metadata[TITLE]
+                title_chunk_ids.append(chunk.chunk_id)
+            chunk_headers = [metadata.get(h) for h in HEADERS if metadata.get(h)]
+            if chunk_headers:
+                header_chunk_ids.append(chunk.chunk_id)
+            for header in chunk_headers:
+                headers.setdefault(normalize_title(header), [chunk.chunk_id])
+        if title is None:
+            return {}
+        entries = {normalize_title(title): header_chunk_ids or title_chunk_ids}
+        for header, chunk_ids in headers.items():
+            # The title node is searched before its headers
+            entries.setdefault(header, chunk_ids)
+        return entries
+
+    def upsert_document(self, doc_id: str, chunks: Iterable[Chunk]):
+        """Add or replace the entries of a document."""
+        entries = self.build_document_entries(chunks)
+        with self._lock:
+            self._documents.pop(doc_id, None)
+            if entries:
+                self._documents[doc_id] = entries
+            self._titles = None
+
+    def remove_document(self, doc_id: str) -> bool:
+        """Remove the entries of a document, return False if it is not indexed."""
+        with self._lock:
+            removed = self._documents.pop(doc_id, None) is not None
+            if removed:
+                self._titles = None
+            return removed
+
+    @property
+    def document_count(self) -> int:
+        return len(self._documents)
+
+    def _title_map(self) -> Tuple[Dict[str, List[List[str]]], List[str]]:
+        with self._lock:
+            if self._titles is None:
+                titles: Dict[str, List[List[str]]] = {}
+                for entries in self._documents.values():
+                    for title, chunk_ids in entries.items():
+                        titles.setdefault(title, []).append(chunk_ids)
+                self._titles = titles
+                self._sorted_titles = sorted(titles)
+            return self._titles, self._sorted_titles
+
+    def search(
+        self,
+        keywords: List[str],
+        match: str = "exact",
+        fuzzy_cutoff: float = 0.85,
+    ) -> List[str]:
+        """Search the chunk ids matching the keywords.
+
+        Args:
+            keywords (List[str]): The keywords.
+            match (str): "exact" matches the whole title, "prefix" matches the
+                titles starting with the keyword and "fuzzy" matches the most
+                similar titles.
+            fuzzy_cutoff (float): The min similarity of the fuzzy matching.
+
+        Returns:
+            List[str]: The matched chunk ids, without duplicates.
+        """
+        titles, sorted_titles = self._title_map()
+        chunk_ids: Dict[str, None] = {}
+        for keyword in keywords:
+            key = normalize_title(keyword)
+            if not key:
+                continue
+            if match == "prefix":
+                start = bisect.bisect_left(sorted_titles, key)
+                matched = []
+                for title in sorted_titles[start:]:
+                    if not title.startswith(key):
+                        break
+                    matched.append(title)
+            elif match == "fuzzy":
+                matched = difflib.get_close_matches(
+                    key, sorted_titles, n=3, cutoff=fuzzy_cutoff
+                )
+            else:
+                matched = [key] if key in titles else []
+            for title in matched:
+                logger.info(f"HeaderTreeIndex Match found for {keyword}: {title}")
+                for ids in titles[title]:
+                    chunk_ids.update(dict.fromkeys(ids))
+        return list(chunk_ids)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {"version": self.VERSION, "documents": dict(self._documents)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HeaderTreeIndex":
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Not supported header tree index: {data.get('version')}")
+        return cls(data.get("documents"))
+
+    def save(self, path: str):
+        """Save the index to a file, atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HeaderTreeIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -2,9 +2,10 @@
 
 import logging
 from abc import ABC, abstractmethod
-from typing import Any, Tuple
+from typing import Any, Callable, Tuple
 
 from opsdiag.storage.graph_store.graph import Graph
+from opsdiag.util.executor_utils import blocking_func_to_async_no_executor
 
 logger = logging.getLogger(__name__)
 
@@ -15,3 +16,9 @@ class GraphRetrieverBase(ABC):
     @abstractmethod
     async def retrieve(self, input: Any) -> Tuple[Graph, Any]:
         """Retrieve from graph database."""
+
+    async def _call_store(self, func: Callable, *args, **kwargs) -> Any:
+        """Call the graph store in a thread, if the store supports it."""
+        if self._graph_store_adapter.thread_safe:
+            return await blocking_func_to_async_no_executor(func, *args, **kwargs)
+        return func(*args, **kwargs)
@@ -37,7 +37,8 @@ class DocumentGraphRetriever(GraphRetrieverBase):
                 keywords_for_document_graph.append(vertex.name)
             # Using the vids to search chunks and doc
             # entities -> chunks -> doc
-            subgraph_for_doc = self._graph_store_adapter.explore_docgraph_with_entities(
+            subgraph_for_doc = await self._call_store(
+                self._graph_store_adapter.explore_docgraph_with_entities,
                 subs=keywords_for_document_graph,
                 topk=self._similarity_search_topk,
                 score_threshold=self._similarity_search_score_threshold,
@@ -46,13 +47,12 @@ class DocumentGraphRetriever(GraphRetrieverBase):
         else:
             # Using subs to search chunks
             # subs -> chunks -> doc
-            subgraph_for_doc = (
-                self._graph_store_adapter.explore_docgraph_without_entities(
-                    subs=input,
-                    topk=self._similarity_search_topk,
-                    score_threshold=self._similarity_search_score_threshold,
-                    limit=self._document_topk,
-                )
+            subgraph_for_doc = await self._call_store(
+                self._graph_store_adapter.explore_docgraph_without_entities,
+                subs=input,
+                topk=self._similarity_search_topk,
+                score_threshold=self._similarity_search_score_threshold,
+                limit=self._document_topk,
             )
 
         return subgraph_for_doc
@@ -1,5 +1,6 @@
 """Graph Retriever."""
 
+import asyncio
 import logging
 import os
 from typing import List, Tuple, Union
@@ -136,74 +137,116 @@ class GraphRetriever(GraphRetrieverBase):
         )
 
     async def retrieve(self, text: str) -> Tuple[Graph, Tuple[Graph, str]]:
-        """Retrieve subgraph from triplet graph and document graph."""
+        """Retrieve subgraph from triplet graph and document graph.
+
+        The text2gql translation and the preparation of the fallback search (the
+        keyword extraction and the embeddings) run concurrently, the fallback is
+        cancelled when the text2gql query retrieves a subgraph.
+        """
         subgraph = MemoryGraph()
         subgraph_for_doc = MemoryGraph()
         text2gql_query = ""
 
-        # Retrieve from triplet graph and document graph
-        if self._enable_text_search:
-            # Retrieve from knowledge graph with text.
-            subgraph, text2gql_query = await self._text_based_graph_retriever.retrieve(
-                text
-            )
+        # Start the fallback search speculatively
+        subs_task = asyncio.ensure_future(self._prepare_subs(text))
+        try:
+            # Retrieve from triplet graph and document graph
+            if self._enable_text_search:
+                # Retrieve from knowledge graph with text.
+                (
+                    subgraph,
+                    text2gql_query,
+                ) = await self._text_based_graph_retriever.retrieve(text)
 
-        # Extract keywords from original question
-        keywords: List[str] = await self._keyword_extractor.extract(text)
+            if not _is_empty(subgraph):
+                return subgraph, (subgraph_for_doc, text2gql_query)
 
-        if subgraph.vertex_count == 0 and subgraph.edge_count == 0:
             # if not enable text search or text search failed to retrieve subgraph
+            subs = await subs_task
+        finally:
+            if not subs_task.done():
+                subs_task.cancel()
 
-            # Using subs to transfer keywords or embeddings
-            subs: Union[List[str], List[List[float]]]
+        subgraph, subgraph_for_doc = await self._retrieve_by_subs(subs)
+        return subgraph, (subgraph_for_doc, text2gql_query)
 
-            if self._enable_similarity_search:
-                # Embedding the question
-                vector = await self._text_embedder.embed(text)
-                # Embedding the keywords
-                vectors = await self._text_embedder.batch_embed(
-                    keywords, batch_size=self._embedding_batch_size
-                )
-                # Using the embeddings of keywords and question
-                vectors.append(vector)
-                # Using vectors as subs
-                subs = vectors
-                logger.info(
-                    "Search subgraph with the following keywords and question's "
-                    f"embedding vector:\n[KEYWORDS]:{keywords}\n[QUESTION]:{text}"
-                )
+    async def _prepare_subs(self, text: str) -> Union[List[str], List[List[float]]]:
+        """Get the keywords, or their embeddings, to search the subgraph."""
+        if not self._enable_similarity_search:
+            # Extract keywords from original question
+            keywords: List[str] = await self._keyword_extractor.extract(text)
+            # Using keywords as subs
+            logger.info(
+                f"Search subgraph with the following keywords:\n[KEYWORDS]:{keywords}"
+            )
+            return keywords
+
+        # Embedding the question while extracting the keywords
+        vector_task = asyncio.ensure_future(self._text_embedder.embed(text))
+        try:
+            keywords = await self._keyword_extractor.extract(text)
+            # Embedding the keywords
+            vectors = await self._text_embedder.batch_embed(
+                keywords, batch_size=self._embedding_batch_size
+            )
+            vector = await vector_task
+        finally:
+            if not vector_task.done():
+                vector_task.cancel()
+        # Using the embeddings of keywords and question
+        vectors.append(vector)
+        logger.info(
+            "Search subgraph with the following keywords and question's "
+            f"embedding vector:\n[KEYWORDS]:{keywords}\n[QUESTION]:{text}"
+        )
+        return vectors
+
+    async def _retrieve_by_subs(
+        self, subs: Union[List[str], List[List[float]]]
+    ) -> Tuple[Graph, Graph]:
+        """Retrieve from triplet graph and document graph with the subs.
+
+        The document graph is searched with the entities of the triplet subgraph,
+        or with the subs if the triplet subgraph is empty. Both graphs are searched
+        concurrently, the search by subs is ignored if the triplet subgraph is not
+        empty.
+        """
+        subgraph: Graph = MemoryGraph()
+        subgraph_for_doc: Graph = MemoryGraph()
+        if not self._triplet_graph_enabled:
+            if self._document_graph_enabled:
+                subgraph_for_doc = await self._document_graph_retriever.retrieve(subs)
+            return subgraph, subgraph_for_doc
+
+        # Retrieve from triplet graph
+        if self._enable_similarity_search:
+            # Retrieve from triplet graph with vectors
+            triplet_task = self._vector_based_graph_retriever.retrieve(subs)
+        else:
+            # Retrieve from triplet graph with keywords
+            triplet_task = self._keyword_based_graph_retriever.retrieve(subs)
+        if not self._document_graph_enabled:
+            return await triplet_task, subgraph_for_doc
+
+        doc_task = asyncio.ensure_future(self._document_graph_retriever.retrieve(subs))
+        try:
+            subgraph = await triplet_task
+            if _is_empty(subgraph):
+                # Failed to retrieve subgraph, using subs to retrieve from document
+                # graph
+                subgraph_for_doc = await doc_task
             else:
-                # Using keywords as subs
-                subs = keywords
-                logger.info(
-                    "Search subgraph with the following keywords:\n"
-                    f"[KEYWORDS]:{keywords}"
+                # If retrieve subgraph from triplet graph successfully
+                # Using entities in subgraph to search chunks and doc
+                doc_task.cancel()
+                subgraph_for_doc = await self._document_graph_retriever.retrieve(
+                    subgraph
                 )
+        finally:
+            if not doc_task.done():
+                doc_task.cancel()
+        return subgraph, subgraph_for_doc
 
-            # If enable triplet graph
-            if self._triplet_graph_enabled:
-                # Retrieve from triplet graph
-                if self._enable_similarity_search:
-                    # Retrieve from triplet graph with vectors
-                    subgraph = await self._vector_based_graph_retriever.retrieve(subs)
-                else:
-                    # Retrieve from triplet graph with keywords
-                    subgraph = await self._keyword_based_graph_retriever.retrieve(subs)
-
-            # If enable document graph
-            if self._document_graph_enabled:
-                # Retrieve from document graph
-                # If not enable triplet graph or failed to retrieve subgraph
-                if subgraph.vertex_count == 0 and subgraph.edge_count == 0:
-                    # Using subs to retrieve from document graph
-                    subgraph_for_doc = await self._document_graph_retriever.retrieve(
-                        subs
-                    )
-                else:
-                    # If retrieve subgraph from triplet graph successfully
-                    # Using entities in subgraph to search chunks and doc
-                    subgraph_for_doc = await self._document_graph_retriever.retrieve(
-                        subgraph
-                    )
 
-        return subgraph, (subgraph_for_doc, text2gql_query)
+def _is_empty(graph: Graph) -> bool:
+    return graph.vertex_count == 0 and graph.edge_count == 0
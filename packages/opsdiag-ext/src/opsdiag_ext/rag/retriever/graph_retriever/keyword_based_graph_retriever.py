@@ -19,7 +19,8 @@ class KeywordBasedGraphRetriever(GraphRetrieverBase):
 
     async def retrieve(self, keywords: List[str]) -> Tuple[Graph, str]:
         """Retrieve from triplets graph with keywords."""
-        subgraph = self._graph_store_adapter.explore_trigraph(
+        subgraph = await self._call_store(
+            self._graph_store_adapter.explore_trigraph,
             subs=keywords,
             limit=self._triplet_topk,
         )
@@ -1,5 +1,6 @@
 """Text Based Graph Retriever."""
 
+import asyncio
 import json
 import logging
 from typing import Dict, List, Tuple, Union
@@ -28,12 +29,18 @@ class TextBasedGraphRetriever(GraphRetrieverBase):
 
     async def retrieve(self, text: str) -> Tuple[Graph, str]:
         """Retrieve from triplets graph with text2gql."""
-        intention: Dict[
-            str, Union[str, List[str]]
-        ] = await self._intent_interpreter.translate(text)
-        schema = json.dumps(
-            json.loads(self._graph_store_adapter.get_schema()), indent=4
+        # Fetch the schema while translating the intention
+        schema_task = asyncio.ensure_future(
+            self._call_store(self._graph_store_adapter.get_schema)
         )
+        try:
+            intention: Dict[
+                str, Union[str, List[str]]
+            ] = await self._intent_interpreter.translate(text)
+        except BaseException:
+            schema_task.cancel()
+            raise
+        schema = json.dumps(json.loads(await schema_task), indent=4)
         intention["schema"] = schema
         translation: Dict[str, str] = await self._text2gql.translate(
             json.dumps(intention)
@@ -42,7 +49,9 @@ class TextBasedGraphRetriever(GraphRetrieverBase):
         if "LIMIT" not in text2gql_query:
             text2gql_query += f" LIMIT {self._triplet_topk}"
         try:
-            subgraph = self._graph_store_adapter.query(query=text2gql_query)
+            subgraph = await self._call_store(
+                self._graph_store_adapter.query, query=text2gql_query
+            )
             logger.info(f"Query executed successfully: {text2gql_query}")
         except Exception as e:
             text2gql_query = ""
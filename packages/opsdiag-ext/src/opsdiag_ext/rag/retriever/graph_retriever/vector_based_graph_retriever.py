@@ -27,7 +27,8 @@ class VectorBasedGraphRetriever(GraphRetrieverBase):
 
     async def retrieve(self, vectors: List[List[float]]) -> Tuple[Graph, None]:
         """Retrieve from triplet graph with vectors."""
-        subgraph = self._graph_store_adapter.explore_trigraph(
+        subgraph = await self._call_store(
+            self._graph_store_adapter.explore_trigraph,
             subs=vectors,
             topk=self._similarity_search_topk,
             limit=self._triplet_topk,
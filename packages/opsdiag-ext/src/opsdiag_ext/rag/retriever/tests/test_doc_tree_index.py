@@ -0,0 +1,105 @@
+import pytest
+
+from opsdiag.core import Chunk
+from opsdiag_ext.rag.retriever.doc_tree import (
+    HEADERS,
+    DocTreeIndex,
+    HeaderTreeIndex,
+    normalize_title,
+)
+
+
+def _chunk(chunk_id: str, title: str = "Guide", *headers: str) -> Chunk:
+    metadata = {"title": title} if title else {}
+    metadata.update(dict(zip(HEADERS, headers)))
+    return Chunk(chunk_id=chunk_id, content=chunk_id, metadata=metadata)
+
+
+DOC = [
+    _chunk("c0", None),
+    _chunk("c1", "Guide", "Install"),
+    _chunk("c2", "Guide", "Install", "Linux"),
+    _chunk("c3", "Guide", "Deploy", "Linux"),
+    _chunk("c4", "Other"),
+]
+
+
+def _tree_search(chunks, keyword):
+    """The chunk ids found by the DocTreeIndex, like the old tree retrieval."""
+    tree = DocTreeIndex()
+    for chunk in chunks:
+        if chunk.metadata.get("title"):
+            tree.add_nodes(
+                chunk.chunk_id,
+                chunk.metadata["title"],
+                *[chunk.metadata.get(h) for h in HEADERS],
+            )
+    node = tree.search_keywords(tree.root, keyword)
+    if node is None:
+        return []
+
+    def _leaves(n):
+        if not n.children:
+            return [n.node_id]
+        return [i for child in n.children for i in _leaves(child)]
+
+    return _leaves(node)
+
+
+@pytest.mark.parametrize(
+    "keyword", ["Guide", "Install", "Linux", "Deploy", "Other", "Missing"]
+)
+def test_same_as_doc_tree(keyword):
+    index = HeaderTreeIndex()
+    index.upsert_document("d1", DOC)
+    assert index.search([keyword]) == _tree_search(DOC, keyword)
+
+
+def test_title_without_headers():
+    index = HeaderTreeIndex()
+    index.upsert_document("d1", [_chunk("c1", "Notes"), _chunk("c2", "Notes")])
+    assert index.search(["notes"]) == ["c1"]
+
+
+def test_normalize():
+    assert normalize_title("Ｄｅｐｌｏｙ  Guide ") == "deploy guide"
+    index = HeaderTreeIndex()
+    index.upsert_document("d1", [_chunk("c1", "Guide", "Deploy  Guide")])
+    assert index.search(["ＤＥＰＬＯＹ guide"]) == ["c1"]
+
+
+def test_prefix_and_fuzzy():
+    index = HeaderTreeIndex()
+    index.upsert_document("d1", DOC)
+    assert index.search(["inst"]) == []
+    assert index.search(["inst"], match="prefix") == ["c1"]
+    assert index.search(["instal"], match="fuzzy") == ["c1"]
+
+
+def test_upsert_and_remove():
+    index = HeaderTreeIndex()
+    index.upsert_document("d1", DOC)
+    index.upsert_document("d2", [_chunk("c5", "Runbook", "Install")])
+    assert index.search(["Install", "Runbook"]) == ["c1", "c5"]
+
+    index.upsert_document("d2", [_chunk("c6", "Runbook", "Rollback")])
+    assert index.search(["Install"]) == ["c1"]
+    assert index.search(["Rollback"]) == ["c6"]
+
+    assert index.remove_document("d1")
+    assert not index.remove_document("d1")
+    assert index.search(["Install"]) == []
+    assert index.document_count == 1
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "space" / "index.json")
+    index = HeaderTreeIndex()
+    index.upsert_document("d1", DOC)
+    index.save(path)
+    loaded = HeaderTreeIndex.load(path)
+    assert loaded.to_dict() == index.to_dict()
+    assert loaded.search(["Linux"]) == ["c2"]
+
+    with pytest.raises(ValueError):
+        HeaderTreeIndex.from_dict({"version": 0})
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from opsdiag.storage.graph_store.graph import MemoryGraph, Vertex
+from opsdiag_ext.rag.retriever.graph_retriever.graph_retriever import GraphRetriever
+
+
+def _graph(name: str = None) -> MemoryGraph:
+    graph = MemoryGraph()
+    if name:
+        graph.upsert_vertex(Vertex(name, name=name))
+    return graph
+
+
+class _Adapter:
+    def __init__(self, text2gql_hit=False, triplet_hit=False, thread_safe=True):
+        self.graph_store = SimpleNamespace(enable_similarity_search=True)
+        self.text2gql_hit = text2gql_hit
+        self.triplet_hit = triplet_hit
+        self.thread_safe = thread_safe
+        self.threads = set()
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _search(self):
+        self.threads.add(threading.current_thread())
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)
+        with self._lock:
+            self.active -= 1
+
+    def get_schema(self):
+        return "{}"
+
+    def query(self, query):
+        self.calls.append("query")
+        return _graph("text2gql" if self.text2gql_hit else None)
+
+    def explore_trigraph(self, subs, **kwargs):
+        self.calls.append("trigraph")
+        self._search()
+        return _graph("triplet" if self.triplet_hit else None)
+
+    def explore_docgraph_with_entities(self, subs, **kwargs):
+        self.calls.append(("doc_with_entities", tuple(subs)))
+        return _graph("doc_by_entities")
+
+    def explore_docgraph_without_entities(self, subs, **kwargs):
+        self.calls.append("doc_without_entities")
+        self._search()
+        return _graph("doc_by_subs")
+
+
+class _LLM:
+    def __init__(self, translate_delay=0.01, extract_delay=0.1):
+        self.translate_delay = translate_delay
+        self.extract_delay = extract_delay
+        self.events = []
+
+    async def translate(self, text):
+        self.events.append("translate")
+        await asyncio.sleep(self.translate_delay)
+        return {"query": "MATCH (n) RETURN n"}
+
+    async def extract(self, text):
+        self.events.append("extract start")
+        try:
+            await asyncio.sleep(self.extract_delay)
+        except asyncio.CancelledError:
+            self.events.append("extract cancelled")
+            raise
+        self.events.append("extract end")
+        return ["a", "b"]
+
+
+class _Embeddings:
+    async def aembed_query(self, text):
+        await asyncio.sleep(0.01)
+        return [float(len(text))]
+
+
+def _retriever(adapter, llm, enable_text_search=True):
+    config = SimpleNamespace(
+        triplet_graph_enabled=True,
+        document_graph_enabled=True,
+        extract_topk=5,
+        knowledge_graph_chunk_search_top_size=5,
+        llm_client=None,
+        model_name="m",
+        knowledge_graph_embedding_batch_size=10,
+        similarity_search_topk=5,
+        extract_score_threshold=0.3,
+        enable_text_search=enable_text_search,
+        text2gql_model_enabled=False,
+        text2gql_model_name=None,
+        embedding_fn=_Embeddings(),
+    )
+    retriever = GraphRetriever(config, adapter)
+    retriever._keyword_extractor = llm
+    retriever._text_based_graph_retriever._intent_interpreter = llm
+    retriever._text_based_graph_retriever._text2gql = llm
+    return retriever
+
+
+@pytest.mark.asyncio
+async def test_text2gql_hit_cancels_fallback():
+    adapter, llm = _Adapter(text2gql_hit=True), _LLM()
+    subgraph, (subgraph_for_doc, query) = await _retriever(adapter, llm).retrieve("q")
+    assert [v.vid for v in subgraph.vertices()] == ["text2gql"]
+    assert subgraph_for_doc.vertex_count == 0
+    assert query.startswith("MATCH (n) RETURN n")
+    # The keyword extraction started with text2gql and was cancelled
+    await asyncio.sleep(0.01)
+    assert set(llm.events[:2]) == {"extract start", "translate"}
+    assert "extract cancelled" in llm.events
+    assert "trigraph" not in adapter.calls
+
+
+@pytest.mark.asyncio
+async def test_triplet_hit_searches_doc_by_entities():
+    adapter, llm = _Adapter(triplet_hit=True), _LLM()
+    subgraph, (subgraph_for_doc, query) = await _retriever(adapter, llm).retrieve("q")
+    assert [v.vid for v in subgraph.vertices()] == ["triplet"]
+    assert [v.vid for v in subgraph_for_doc.vertices()] == ["doc_by_entities"]
+    assert ("doc_with_entities", ("triplet",)) in adapter.calls
+
+
+@pytest.mark.asyncio
+async def test_triplet_miss_searches_doc_by_subs():
+    adapter, llm = _Adapter(), _LLM()
+    retriever = _retriever(adapter, llm, enable_text_search=False)
+    subgraph, (subgraph_for_doc, _) = await retriever.retrieve("q")
+    assert subgraph.vertex_count == 0
+    assert [v.vid for v in subgraph_for_doc.vertices()] == ["doc_by_subs"]
+    assert "query" not in adapter.calls
+    # The triplet and the document graphs are searched concurrently
+    assert adapter.max_active == 2
+
+
+@pytest.mark.asyncio
+async def test_search_in_loop_if_not_thread_safe():
+    adapter, llm = _Adapter(thread_safe=False), _LLM()
+    retriever = _retriever(adapter, llm, enable_text_search=False)
+    subgraph, (subgraph_for_doc, _) = await retriever.retrieve("q")
+    assert [v.vid for v in subgraph_for_doc.vertices()] == ["doc_by_subs"]
+    assert adapter.threads == {threading.current_thread()}
+    assert adapter.max_active == 1
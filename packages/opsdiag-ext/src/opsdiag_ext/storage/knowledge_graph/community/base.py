@@ -26,6 +26,7 @@ class Community:
     id: str
     data: Optional[Graph] = None
     summary: Optional[str] = None
+    content_hash: Optional[str] = None
 
 
 @dataclass
@@ -45,6 +46,11 @@ class GraphStoreAdapter(ABC):
         """Get graph store."""
         return self._graph_store
 
+    @property
+    def thread_safe(self) -> bool:
+        """Whether the reads can run in a thread while the graph is written."""
+        return True
+
     @abstractmethod
     async def discover_communities(self, **kwargs) -> List[str]:
         """Run community discovery."""
@@ -151,6 +157,9 @@ class GraphStoreAdapter(ABC):
     def drop(self) -> None:
         """Drop graph."""
 
+    def persist(self) -> None:
+        """Save the graph changes, for the stores which keep the graph in memory."""
+
     @abstractmethod
     def create_graph(self, graph_name: str) -> None:
         """Create graph."""
@@ -287,6 +296,10 @@ class CommunityMetastore(ABC):
     async def save(self, communities: List[Community]):
         """Save communities."""
 
+    @abstractmethod
+    async def delete(self, community_ids: List[str]):
+        """Delete communities by id."""
+
     @abstractmethod
     async def truncate(self):
         """Truncate all communities."""
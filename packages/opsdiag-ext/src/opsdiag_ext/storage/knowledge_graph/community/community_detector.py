@@ -0,0 +1,230 @@
+"""In-process community detection for the local graph stores.
+
+The graph stores without a community plugin (e.g. the memory graph store) use the
+Louvain method [1] to find the communities: the vertices are moved greedily to the
+neighbor community with the largest modularity gain, then every community is
+merged into a single vertex and the process repeats until nothing moves. Like the
+refinement of Leiden [2], the communities are finally split into their connected
+components, so a community is never disconnected.
+
+[1] Blondel et al. "Fast unfolding of communities in large networks", 2008.
+[2] Traag et al. "From Louvain to Leiden: guaranteeing well-connected
+    communities", 2019.
+"""
+
+import hashlib
+import logging
+import random
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from opsdiag.storage.graph_store.graph import Graph
+
+logger = logging.getLogger(__name__)
+
+# adjacency list with weights: {vertex: {neighbor: weight}}
+_Adjacency = Dict[int, Dict[int, float]]
+
+# The min modularity gain (scaled by the total weight) to move a vertex, it
+# prevents the vertices from moving back and forth by rounding errors
+_MIN_GAIN = 1e-9
+
+
+def _one_level(
+    adj: _Adjacency,
+    degrees: List[float],
+    total_weight: float,
+    resolution: float,
+    rng: random.Random,
+) -> Tuple[List[int], bool]:
+    """Move the vertices between communities, return the community of each."""
+    node2com = list(range(len(adj)))
+    com_degrees = list(degrees)
+    nodes = list(range(len(adj)))
+    rng.shuffle(nodes)
+    moved = False
+
+    improved = True
+    while improved:
+        improved = False
+        for node in nodes:
+            degree = degrees[node]
+            current = node2com[node]
+            weights2com: Dict[int, float] = {}
+            for nbr, weight in adj[node].items():
+                if nbr != node:
+                    com = node2com[nbr]
+                    weights2com[com] = weights2com.get(com, 0.0) + weight
+
+            com_degrees[current] -= degree
+            factor = resolution * degree / (2 * total_weight)
+            best_com = current
+            best_gain = weights2com.get(current, 0.0) - factor * com_degrees[current]
+            for com, weight in weights2com.items():
+                gain = weight - factor * com_degrees[com]
+                if gain > best_gain + _MIN_GAIN:
+                    best_com, best_gain = com, gain
+            com_degrees[best_com] += degree
+
+            if best_com != current:
+                node2com[node] = best_com
+                improved = moved = True
+    return node2com, moved
+
+
+def _aggregate(adj: _Adjacency, node2com: List[int]) -> Tuple[_Adjacency, List[int]]:
+    """Merge the communities into vertices, the inner edges become self loops."""
+    renumber: Dict[int, int] = {}
+    for com in node2com:
+        renumber.setdefault(com, len(renumber))
+    new_adj: _Adjacency = {i: {} for i in range(len(renumber))}
+    for node, nbrs in adj.items():
+        com = renumber[node2com[node]]
+        for nbr, weight in nbrs.items():
+            if nbr < node:
+                continue
+            nbr_com = renumber[node2com[nbr]]
+            new_adj[com][nbr_com] = new_adj[com].get(nbr_com, 0.0) + weight
+            if nbr_com != com:
+                new_adj[nbr_com][com] = new_adj[nbr_com].get(com, 0.0) + weight
+    return new_adj, [renumber[com] for com in node2com]
+
+
+def _connected_components(adj: _Adjacency, members: Iterable[int]) -> List[Set[int]]:
+    """Split the members into the components connected inside the members."""
+    remaining = set(members)
+    components = []
+    while remaining:
+        start = remaining.pop()
+        component, stack = {start}, [start]
+        while stack:
+            for nbr in adj[stack.pop()]:
+                if nbr in remaining:
+                    remaining.remove(nbr)
+                    component.add(nbr)
+                    stack.append(nbr)
+        components.append(component)
+    return components
+
+
+def louvain_communities(
+    edges: Iterable[Tuple[str, str, float]],
+    vertices: Optional[Iterable[str]] = None,
+    resolution: float = 1.0,
+    seed: Optional[int] = 0,
+    max_levels: Optional[int] = None,
+) -> List[Set[str]]:
+    """Find the communities of an undirected weighted graph.
+
+    Args:
+        edges (Iterable[Tuple[str, str, float]]): The edges (source, target, weight),
+            the weights of the parallel edges are summed.
+        vertices (Optional[Iterable[str]]): Add the isolated vertices, each of them
+            is a community.
+        resolution (float): Larger values find more and smaller communities.
+        seed (Optional[int]): The seed to shuffle the vertices, the result is
+            deterministic for the same seed and graph.
+        max_levels (Optional[int]): The max number of aggregation levels.
+
+    Returns:
+        List[Set[str]]: The communities, the largest first.
+    """
+    index: Dict[str, int] = {}
+    names: List[str] = []
+
+    def _index(vid: str) -> int:
+        idx = index.get(vid)
+        if idx is None:
+            idx = index[vid] = len(names)
+            names.append(vid)
+        return idx
+
+    adj: _Adjacency = {}
+    for sid, tid, weight in edges:
+        s, t = _index(sid), _index(tid)
+        adj.setdefault(s, {})
+        adj.setdefault(t, {})
+        adj[s][t] = adj[s].get(t, 0.0) + weight
+        if s != t:
+            adj[t][s] = adj[t].get(s, 0.0) + weight
+    for vid in vertices or []:
+        adj.setdefault(_index(vid), {})
+    if not names:
+        return []
+    origin_adj = adj
+
+    # The self loops are counted twice in the degree
+    total_weight = sum(
+        weight
+        for node, nbrs in adj.items()
+        for nbr, weight in nbrs.items()
+        if nbr >= node
+    )
+    partition = list(range(len(names)))
+    if total_weight > 0:
+        rng = random.Random(seed)
+        level = 0
+        while max_levels is None or level < max_levels:
+            degrees = [
+                sum(nbrs.values()) + nbrs.get(node, 0.0)
+                for node, nbrs in sorted(adj.items())
+            ]
+            node2com, moved = _one_level(adj, degrees, total_weight, resolution, rng)
+            if not moved:
+                break
+            adj, node2com = _aggregate(adj, node2com)
+            partition = [node2com[com] for com in partition]
+            level += 1
+
+    groups: Dict[int, List[int]] = {}
+    for node, com in enumerate(partition):
+        groups.setdefault(com, []).append(node)
+    communities = [
+        {names[node] for node in component}
+        for members in groups.values()
+        for component in _connected_components(origin_adj, members)
+    ]
+    communities.sort(key=lambda c: (-len(c), min(c)))
+    return communities
+
+
+def detect_graph_communities(
+    graph: Graph,
+    weight_prop: Optional[str] = None,
+    resolution: float = 1.0,
+    seed: Optional[int] = 0,
+) -> Dict[str, List[str]]:
+    """Find the communities of a graph, ignoring the edge directions.
+
+    The id of a community is derived from its members, so it is stable as long as
+    the members don't change.
+
+    Args:
+        graph (Graph): The graph.
+        weight_prop (Optional[str]): The edge property of the weight, every edge
+            weights 1 if not set.
+
+    Returns:
+        Dict[str, List[str]]: The sorted vertex ids of each community.
+    """
+
+    def _weight(edge) -> float:
+        if weight_prop is None:
+            return 1.0
+        try:
+            return float(edge.get_prop(weight_prop) or 1.0)
+        except (TypeError, ValueError):
+            return 1.0
+
+    communities = louvain_communities(
+        ((e.sid, e.tid, _weight(e)) for e in graph.edges()),
+        vertices=(v.vid for v in graph.vertices()),
+        resolution=resolution,
+        seed=seed,
+    )
+    result = {}
+    for community in communities:
+        members = sorted(community)
+        digest = hashlib.sha1("\n".join(members).encode("utf-8")).hexdigest()
+        result[f"community_{digest[:16]}"] = members
+    logger.info(f"Discovered {len(result)} communities in the local graph.")
+    return result
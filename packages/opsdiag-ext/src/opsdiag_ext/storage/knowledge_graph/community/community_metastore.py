@@ -1,11 +1,13 @@
 """Builtin Community metastore."""
 
+import json
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from opsdiag.core import Chunk
 from opsdiag.datasource.rdbms.base import RDBMSConnector
 from opsdiag.storage.vector_store.base import VectorStoreBase
+from opsdiag.storage.vector_store.filters import MetadataFilter, MetadataFilters
 from opsdiag_ext.storage.knowledge_graph.community.base import (
     Community,
     CommunityMetastore,
@@ -13,6 +15,10 @@ from opsdiag_ext.storage.knowledge_graph.community.base import (
 
 logger = logging.getLogger(__name__)
 
+# The chunk of the content hashes of all the saved communities
+_HASHES_CHUNK_ID = "community_content_hashes"
+_HASHES_CONTENT = "community content hashes"
+
 
 class BuiltinCommunityMetastore(CommunityMetastore):
     """Builtin Community metastore."""
@@ -48,14 +54,25 @@ class BuiltinCommunityMetastore(CommunityMetastore):
     async def search(self, query: str) -> List[Community]:
         """Search communities relevant to query."""
         chunks = await self._vector_store.asimilar_search_with_scores(
-            query, self._topk, self._score_threshold
+            query, self._topk + 1, self._score_threshold
         )
-        return [Community(id=chunk.chunk_id, summary=chunk.content) for chunk in chunks]
+        return [
+            Community(id=chunk.chunk_id, summary=chunk.content)
+            for chunk in chunks
+            if chunk.chunk_id != _HASHES_CHUNK_ID
+        ][: self._topk]
 
     async def save(self, communities: List[Community]):
         """Save communities."""
+        if not communities:
+            return
+        # Use the community id as the chunk id, so it can be deleted by id
         chunks = [
-            Chunk(id=c.id, content=c.summary, metadata={"total": len(communities)})
+            Chunk(
+                chunk_id=c.id,
+                content=c.summary,
+                metadata={"total": len(communities), "content_hash": c.content_hash},
+            )
             for c in communities
         ]
         await self._vector_store.aload_document_with_limit(
@@ -63,6 +80,47 @@ class BuiltinCommunityMetastore(CommunityMetastore):
         )
         logger.info(f"Save {len(communities)} communities")
 
+    async def delete(self, community_ids: List[str]):
+        """Delete the communities by id."""
+        if not community_ids:
+            return
+        self._vector_store.delete_by_ids(",".join(community_ids))
+        logger.info(f"Delete {len(community_ids)} communities")
+
+    async def load_hashes(self) -> Optional[Dict[str, str]]:
+        """Load the content hashes of the saved communities, None if not saved."""
+        filters = MetadataFilters(
+            filters=[MetadataFilter(key="kind", value=_HASHES_CHUNK_ID)]
+        )
+        try:
+            # Query by the content of the chunk, it is the most similar one
+            chunks = await self._vector_store.asimilar_search_with_scores(
+                _HASHES_CONTENT, 1, 0.0, filters
+            )
+        except Exception as e:
+            logger.warning(f"Load community content hashes failed: {e}")
+            return None
+        for chunk in chunks:
+            if chunk.chunk_id == _HASHES_CHUNK_ID:
+                return json.loads(chunk.metadata["hashes"])
+        return None
+
+    async def save_hashes(self, hashes: Dict[str, str]):
+        """Save the content hashes of the saved communities."""
+        chunk = Chunk(
+            chunk_id=_HASHES_CHUNK_ID,
+            content=_HASHES_CONTENT,
+            metadata={"kind": _HASHES_CHUNK_ID, "hashes": json.dumps(hashes)},
+        )
+        try:
+            self._vector_store.delete_by_ids(_HASHES_CHUNK_ID)
+            await self._vector_store.aload_document_with_limit(
+                [chunk], self._max_chunks_once_load, self._max_threads
+            )
+        except Exception as e:
+            # Summarize all the communities again after restart
+            logger.warning(f"Save community content hashes failed: {e}")
+
     async def truncate(self):
         """Truncate community metastore."""
         self._vector_store.truncate()
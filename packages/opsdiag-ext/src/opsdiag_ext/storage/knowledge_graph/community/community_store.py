@@ -1,8 +1,9 @@
 """Define the CommunityStore class."""
 
 import asyncio
+import hashlib
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from opsdiag.storage.vector_store.base import VectorStoreBase
 from opsdiag_ext.rag.transformer.community_summarizer import CommunitySummarizer
@@ -42,40 +43,95 @@ class CommunityStore:
             top_k=top_k,
             score_threshold=score_threshold,
         )
+        # The content hash of each saved community, loaded by the first build
+        self._saved_hashes: Optional[Dict[str, str]] = None
+        self._hashes_loaded = False
+        # Summary cache, content hash -> summary
+        self._summaries: Dict[str, str] = {}
 
     async def build_communities(self, batch_size: int = 1):
-        """Discover communities."""
+        """Discover communities and summarize the changed ones.
+
+        A community is summarized again only if its members or their relations
+        changed since the last build, the summaries of the others are reused, also
+        the ones saved before restart.
+
+        Args:
+            batch_size (int): The max number of communities summarized concurrently.
+        """
+        if not self._hashes_loaded:
+            # The summaries saved before restart are reused
+            self._saved_hashes = await self._meta_store.load_hashes()
+            self._hashes_loaded = True
         community_ids = await self._graph_store_adapter.discover_communities()
 
-        # summarize communities
-        communities = []
-        n_communities = len(community_ids)
+        semaphore = asyncio.Semaphore(max(batch_size, 1))
 
-        for i in range(0, n_communities, batch_size):
-            batch_ids = community_ids[i : i + batch_size]
-            batch_results = await asyncio.gather(
-                *[self._summary_community(cid) for cid in batch_ids]
-            )
-            # filter out None returns
-            communities.extend([c for c in batch_results if c is not None])
+        async def _limited_summary(community_id: str):
+            async with semaphore:
+                return await self._summary_community(community_id)
 
-        # truncate then save new summaries
-        await self._meta_store.truncate()
-        await self._meta_store.save(communities)
+        results = await asyncio.gather(
+            *[_limited_summary(cid) for cid in community_ids]
+        )
+        # filter out None returns
+        summarized = [r for r in results if r is not None]
+        hashes = {c.id: content_hash for c, content_hash in summarized}
+
+        if self._saved_hashes is None:
+            # truncate then save new summaries
+            await self._meta_store.truncate()
+            changed = [c for c, _ in summarized]
+        else:
+            stale_ids = [
+                cid
+                for cid, content_hash in self._saved_hashes.items()
+                if hashes.get(cid) != content_hash
+            ]
+            await self._meta_store.delete(stale_ids)
+            changed = [
+                c
+                for c, content_hash in summarized
+                if self._saved_hashes.get(c.id) != content_hash
+            ]
+        await self._meta_store.save(changed)
+        await self._meta_store.save_hashes(hashes)
+        logger.info(
+            f"Build {len(summarized)} communities, {len(changed)} of them changed"
+        )
+
+        self._saved_hashes = hashes
+        self._graph_store_adapter.persist()
+        # Only keep the summaries of the current communities
+        current_hashes = set(hashes.values())
+        self._summaries = {
+            k: v for k, v in self._summaries.items() if k in current_hashes
+        }
 
-    async def _summary_community(self, community_id: str) -> Optional[Community]:
-        """Summarize single community."""
+    async def _summary_community(self, community_id: str):
+        """Summarize single community.
+
+        Returns:
+            Optional[Tuple[Community, str]]: The community and its content hash.
+        """
         community = await self._graph_store_adapter.get_community(community_id)
         if community is None or community.data is None:
             logger.warning(f"Community {community_id} is empty")
             return None
 
         graph = community.data.format()
-        community.summary = (
-            await self._community_summarizer.summarize(graph=graph) or ""
-        )
-        logger.info(f"Summarize community {community_id}: {community.summary[:50]}...")
-        return community
+        content_hash = hashlib.sha256(graph.encode("utf-8")).hexdigest()
+        community.content_hash = content_hash
+        if self._saved_hashes and self._saved_hashes.get(community_id) == content_hash:
+            # Unchanged, the saved summary is kept
+            return community, content_hash
+        summary = self._summaries.get(content_hash)
+        if summary is None:
+            summary = await self._community_summarizer.summarize(graph=graph) or ""
+            self._summaries[content_hash] = summary
+            logger.info(f"Summarize community {community_id}: {summary[:50]}...")
+        community.summary = summary
+        return community, content_hash
 
     async def search_communities(self, query: str) -> List[Community]:
         """Search communities."""
@@ -85,17 +141,24 @@ class CommunityStore:
         """Truncate community store."""
         logger.info("Truncate community metastore")
         self._meta_store.truncate()
+        self._saved_hashes = None
+        self._hashes_loaded = True
+        self._summaries = {}
 
         logger.info("Truncate community summarizer")
         self._community_summarizer.truncate()
 
         logger.info("Truncate graph")
         self._graph_store_adapter.truncate()
+        self._graph_store_adapter.persist()
 
     def drop(self):
         """Drop community store."""
         logger.info("Remove community metastore")
         self._meta_store.drop()
+        self._saved_hashes = None
+        self._hashes_loaded = True
+        self._summaries = {}
 
         logger.info("Remove community summarizer")
         self._community_summarizer.drop()
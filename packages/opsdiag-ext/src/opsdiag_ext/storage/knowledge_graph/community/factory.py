@@ -3,8 +3,12 @@
 import logging
 
 from opsdiag.storage.graph_store.base import GraphStoreBase
+from opsdiag.storage.graph_store.memgraph_store import MemoryGraphStore
 from opsdiag_ext.storage.graph_store.tugraph_store import TuGraphStore
 from opsdiag_ext.storage.knowledge_graph.community.base import GraphStoreAdapter
+from opsdiag_ext.storage.knowledge_graph.community.memgraph_store_adapter import (
+    MemGraphStoreAdapter,
+)
 from opsdiag_ext.storage.knowledge_graph.community.tugraph_store_adapter import (
     TuGraphStoreAdapter,
 )
@@ -24,6 +28,11 @@ class GraphStoreAdapterFactory:
         """
         if isinstance(graph_store, TuGraphStore):
             return TuGraphStoreAdapter(graph_store)
+        elif isinstance(graph_store, MemoryGraphStore):
+            return MemGraphStoreAdapter(
+                enable_summary=graph_store.get_config().enable_summary,
+                graph_store=graph_store,
+            )
         else:
             raise Exception(
                 "create community store adapter for %s failed",
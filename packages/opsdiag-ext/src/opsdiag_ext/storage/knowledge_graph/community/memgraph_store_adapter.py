@@ -4,6 +4,7 @@ import json
 import logging
 from typing import AsyncGenerator, Dict, Iterator, List, Literal, Optional, Tuple, Union
 
+from opsdiag.storage.graph_store.csr_graph import CSRGraph
 from opsdiag.storage.graph_store.graph import (
     Direction,
     Edge,
@@ -17,10 +18,14 @@ from opsdiag.storage.graph_store.memgraph_store import (
     MemoryGraphStoreConfig,
 )
 from opsdiag.storage.knowledge_graph.base import ParagraphChunk
+from opsdiag.util.executor_utils import blocking_func_to_async_no_executor
 from opsdiag_ext.storage.knowledge_graph.community.base import (
     Community,
     GraphStoreAdapter,
 )
+from opsdiag_ext.storage.knowledge_graph.community.community_detector import (
+    detect_graph_communities,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -30,22 +35,67 @@ class MemGraphStoreAdapter(GraphStoreAdapter):
 
     MAX_HIERARCHY_LEVEL = 3
 
-    def __init__(self, enable_summary: bool = False):
-        """Initialize MemGraph Community Store Adapter."""
-        self._graph_store: MemoryGraphStore = MemoryGraphStore(MemoryGraphStoreConfig())
+    def __init__(
+        self,
+        enable_summary: bool = False,
+        graph_path: Optional[str] = None,
+        graph_store: Optional[MemoryGraphStore] = None,
+    ):
+        """Initialize MemGraph Community Store Adapter.
+
+        Args:
+            enable_summary (bool): Enable graph community summary or not.
+            graph_path (Optional[str]): The directory to persist the graph in the
+                compact CSR format, keep the graph in memory only if not set.
+            graph_store (Optional[MemoryGraphStore]): The graph store to adapt, a
+                new one is created if not set.
+        """
+        self._graph_store: MemoryGraphStore = graph_store or MemoryGraphStore(
+            MemoryGraphStoreConfig(graph_path=graph_path)
+        )
 
         super().__init__(self._graph_store)
 
+        # The members of each community found by the last discovery
+        self._communities: Dict[str, List[str]] = {}
+
         # Create the graph
         self.create_graph(self._graph_store.get_config().name)
 
+    @property
+    def thread_safe(self) -> bool:
+        """Only the compact graph is locked, the memory graph is not."""
+        return isinstance(self._graph_store._graph, CSRGraph)
+
     async def discover_communities(self, **kwargs) -> List[str]:
-        """Run community discovery with leiden."""
-        return []
+        """Run community discovery with the in-process Louvain method.
+
+        Args:
+            weight_prop (Optional[str]): The edge property of the weight.
+            resolution (float): Larger values find more and smaller communities.
+        """
+        graph = self._graph_store._graph
+        self._communities = await blocking_func_to_async_no_executor(
+            detect_graph_communities,
+            graph,
+            weight_prop=kwargs.get("weight_prop"),
+            resolution=kwargs.get("resolution", 1.0),
+        )
+        return list(self._communities.keys())
 
     async def get_community(self, community_id: str) -> Community:
-        """Get community."""
-        raise NotImplementedError("Memory graph store does not have community")
+        """Get community, the members and their edges."""
+        graph = self._graph_store._graph
+        members = self._communities.get(community_id, [])
+        community_graph = MemoryGraph()
+        for vid in members:
+            if not graph.has_vertex(vid):
+                continue
+            community_graph.upsert_vertex(graph.get_vertex(vid))
+            for edge in graph.get_neighbor_edges(vid, Direction.BOTH):
+                community_graph.upsert_vertex(graph.get_vertex(edge.nid(vid)))
+                community_graph.append_edge(edge)
+        return Community(id=community_id, data=community_graph)
 
     def get_graph_config(self):
         """Get the graph store config."""
@@ -168,6 +218,11 @@ class MemGraphStoreAdapter(GraphStoreAdapter):
     def drop(self):
         """Delete Graph."""
         self._graph_store._graph = None
+        self._graph_store.remove_persisted()
+
+    def persist(self):
+        """Save the graph if it is persisted."""
+        self._graph_store.persist()
 
     def create_graph(self, graph_name: str):
         """Create a graph."""
@@ -215,6 +270,50 @@ class MemGraphStoreAdapter(GraphStoreAdapter):
         """Explore the graph from given subjects up to a depth."""
         return self._graph_store._graph.search(subs, direct, depth, fan, limit)
 
+    def explore_trigraph(
+        self,
+        subs: Union[List[str], List[List[float]]],
+        topk: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        direct: Direction = Direction.BOTH,
+        depth: int = 3,
+        fan: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> MemoryGraph:
+        """Explore the triplet graph from the keywords up to a depth.
+
+        The memory graph store has no vector index, the embedding vectors are
+        ignored.
+        """
+        keywords = [sub for sub in subs if isinstance(sub, str)]
+        return self.explore(keywords, direct, depth, fan, limit)
+
+    def explore_docgraph_with_entities(
+        self,
+        subs: List[str],
+        topk: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        direct: Direction = Direction.BOTH,
+        depth: int = 3,
+        fan: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> MemoryGraph:
+        """Explore the document graph, the memory graph store has no documents."""
+        return MemoryGraph()
+
+    def explore_docgraph_without_entities(
+        self,
+        subs: Union[List[str], List[List[float]]],
+        topk: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        direct: Direction = Direction.BOTH,
+        depth: int = 3,
+        fan: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> MemoryGraph:
+        """Explore the document graph, the memory graph store has no documents."""
+        return MemoryGraph()
+
     def query(self, query: str, **kwargs) -> MemoryGraph:
         """Execute a query on graph."""
         raise NotImplementedError("Memory graph store does not support query")
@@ -0,0 +1,214 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from opsdiag.storage.graph_store.graph import Edge, MemoryGraph, Vertex
+from opsdiag.storage.graph_store.memgraph_store import (
+    MemoryGraphStore,
+    MemoryGraphStoreConfig,
+)
+from opsdiag_ext.storage.knowledge_graph.community.community_detector import (
+    detect_graph_communities,
+    louvain_communities,
+)
+from opsdiag_ext.storage.knowledge_graph.community.community_store import (
+    CommunityStore,
+)
+from opsdiag_ext.storage.knowledge_graph.community.factory import (
+    GraphStoreAdapterFactory,
+)
+from opsdiag_ext.storage.knowledge_graph.community.memgraph_store_adapter import (
+    MemGraphStoreAdapter,
+)
+
+
+def _clique_edges(prefix: str, size: int):
+    return [
+        (f"{prefix}{i}", f"{prefix}{j}", 1.0)
+        for i in range(size)
+        for j in range(i + 1, size)
+    ]
+
+
+def test_louvain_two_cliques():
+    edges = _clique_edges("a", 5) + _clique_edges("b", 5) + [("a0", "b0", 1.0)]
+    communities = louvain_communities(edges, vertices=["c"])
+    assert communities[:2] == [{f"a{i}" for i in range(5)}, {f"b{i}" for i in range(5)}]
+    assert communities[2] == {"c"}
+    # Deterministic for the same seed
+    assert louvain_communities(edges, vertices=["c"]) == communities
+
+
+def test_louvain_ring_of_cliques():
+    edges = []
+    for k in range(8):
+        edges += _clique_edges(f"k{k}_", 4)
+        edges.append((f"k{k}_0", f"k{(k + 1) % 8}_1", 1.0))
+    communities = louvain_communities(edges)
+    assert len(communities) == 8
+    assert all(len({v.split("_")[0] for v in c}) == 1 for c in communities)
+
+
+def test_louvain_empty():
+    assert louvain_communities([]) == []
+    assert louvain_communities([], vertices=["a", "b"]) == [{"a"}, {"b"}]
+
+
+def _graph(extra_edge: bool = False):
+    graph = MemoryGraph()
+    for sid, tid, _ in _clique_edges("a", 4) + _clique_edges("b", 4):
+        graph.append_edge(Edge(sid, tid, "rel"))
+    graph.append_edge(Edge("a0", "b0", "rel"))
+    graph.upsert_vertex(Vertex("a1", description="A one"))
+    if extra_edge:
+        graph.append_edge(Edge("b3", "b9", "rel"))
+    return graph
+
+
+def test_detect_graph_communities_stable_ids():
+    first = detect_graph_communities(_graph())
+    assert len(first) == 2
+    second = detect_graph_communities(_graph(extra_edge=True))
+    # The community of "a" doesn't change
+    assert len(set(first) & set(second)) == 1
+
+
+class _Summarizer:
+    def __init__(self):
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+
+    async def summarize(self, graph: str) -> str:
+        self.calls += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return f"summary of {len(graph)}"
+
+    def truncate(self):
+        pass
+
+    def drop(self):
+        pass
+
+
+class _VectorStore:
+    def __init__(self):
+        self.chunks = {}
+        self.truncated = 0
+
+    @property
+    def communities(self):
+        return {k: v for k, v in self.chunks.items() if "kind" not in v.metadata}
+
+    async def aload_document_with_limit(self, chunks, *args):
+        for chunk in chunks:
+            self.chunks[chunk.chunk_id] = chunk
+        return [chunk.chunk_id for chunk in chunks]
+
+    async def asimilar_search_with_scores(self, text, topk, threshold, filters=None):
+        chunks = list(self.chunks.values())
+        for f in filters.filters if filters else []:
+            chunks = [c for c in chunks if c.metadata.get(f.key) == f.value]
+        return chunks[:topk]
+
+    def delete_by_ids(self, ids: str) -> List[str]:
+        for cid in ids.split(","):
+            self.chunks.pop(cid, None)
+        return ids.split(",")
+
+    def truncate(self):
+        self.truncated += 1
+        self.chunks.clear()
+
+
+@pytest.mark.asyncio
+async def test_build_communities_incrementally():
+    adapter = MemGraphStoreAdapter()
+    adapter.upsert_graph(_graph())
+    summarizer = _Summarizer()
+    vector_store = _VectorStore()
+    store = CommunityStore(adapter, summarizer, vector_store)
+
+    await store.build_communities(batch_size=4)
+    assert summarizer.calls == 2
+    assert summarizer.max_running == 2
+    assert len(vector_store.communities) == 2
+    first_ids = set(vector_store.communities)
+
+    # Nothing changed
+    await store.build_communities(batch_size=4)
+    assert summarizer.calls == 2
+    assert set(vector_store.communities) == first_ids
+
+    # Only the community "b" changed
+    adapter.insert_triplet("b3", "rel", "b9")
+    await store.build_communities(batch_size=4)
+    assert summarizer.calls == 3
+    assert len(vector_store.communities) == 2
+    assert len(set(vector_store.communities) & first_ids) == 1
+    assert vector_store.truncated == 1
+
+
+@pytest.mark.asyncio
+async def test_build_communities_bounded_concurrency():
+    adapter = MemGraphStoreAdapter()
+    for k in range(6):
+        for sid, tid, _ in _clique_edges(f"k{k}_", 3):
+            adapter.insert_triplet(sid, "rel", tid)
+    summarizer = _Summarizer()
+    store = CommunityStore(adapter, summarizer, _VectorStore())
+    await store.build_communities(batch_size=2)
+    assert summarizer.calls == 6
+    assert summarizer.max_running == 2
+
+    community = await adapter.get_community((await adapter.discover_communities())[0])
+    assert community.data.vertex_count == 3
+    assert community.data.edge_count == 3
+
+
+@pytest.mark.asyncio
+async def test_build_communities_persist_graph(tmp_path):
+    config = MemoryGraphStoreConfig(name="kg", graph_path=str(tmp_path))
+    adapter = GraphStoreAdapterFactory.create(MemoryGraphStore(config))
+    assert isinstance(adapter, MemGraphStoreAdapter)
+    # Only the compact graph is searched in threads
+    assert adapter.thread_safe and not MemGraphStoreAdapter().thread_safe
+    adapter.upsert_graph(_graph())
+    store = CommunityStore(adapter, _Summarizer(), _VectorStore())
+    await store.build_communities(batch_size=4)
+
+    # A new process loads the saved graph
+    reloaded = MemGraphStoreAdapter(graph_store=MemoryGraphStore(config))
+    assert reloaded.get_full_graph().edge_count == _graph().edge_count
+
+    adapter.drop()
+    assert not (tmp_path / "kg").exists()
+
+
+@pytest.mark.asyncio
+async def test_build_communities_after_restart():
+    adapter = MemGraphStoreAdapter()
+    adapter.upsert_graph(_graph())
+    vector_store = _VectorStore()
+    await CommunityStore(adapter, _Summarizer(), vector_store).build_communities()
+    first_ids = set(vector_store.communities)
+
+    # A new store over the saved summaries
+    summarizer = _Summarizer()
+    store = CommunityStore(adapter, summarizer, vector_store)
+    await store.build_communities()
+    assert summarizer.calls == 0
+    assert vector_store.truncated == 1
+    assert set(vector_store.communities) == first_ids
+
+    adapter.insert_triplet("b3", "rel", "b9")
+    await store.build_communities()
+    assert summarizer.calls == 1
+    assert len(vector_store.communities) == 2
+    assert [c.id for c in await store.search_communities("a")] == list(
+        vector_store.communities
+    )
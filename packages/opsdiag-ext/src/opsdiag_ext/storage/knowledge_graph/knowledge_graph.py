@@ -115,6 +115,14 @@ class BuiltinKnowledgeGraphConfig(KnowledgeGraphConfig):
         default="TuGraph", metadata={"description": "graph store type."}
     )
 
+    graph_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "The directory to persist the memory graph store, keep "
+            "the graph in memory only if not set."
+        },
+    )
+
 
 @register_resource(
     _("Builtin Knowledge Graph"),
@@ -188,6 +196,7 @@ class BuiltinKnowledgeGraph(KnowledgeGraphBase):
         asyncio.set_event_loop(loop)
         result = loop.run_until_complete(asyncio.gather(*tasks))
         loop.close()
+        self._graph_store_adapter.persist()
         return result
 
     async def aload_document(self, chunks: List[Chunk]) -> List[str]:  # type: ignore
@@ -205,6 +214,7 @@ class BuiltinKnowledgeGraph(KnowledgeGraphBase):
             for triplet in triplets:
                 self._graph_store_adapter.insert_triplet(*triplet)
             logger.info(f"load {len(triplets)} triplets from chunk {chunk.chunk_id}")
+        self._graph_store_adapter.persist()
         return [chunk.chunk_id for chunk in chunks]
 
     def similar_search_with_scores(
@@ -270,6 +280,7 @@ class BuiltinKnowledgeGraph(KnowledgeGraphBase):
         """Truncate knowledge graph."""
         logger.info(f"Truncate graph {self._graph_name}")
         self._graph_store_adapter.truncate()
+        self._graph_store_adapter.persist()
 
         logger.info("Truncate keyword extractor")
         self._keyword_extractor.truncate()
@@ -293,6 +304,7 @@ class BuiltinKnowledgeGraph(KnowledgeGraphBase):
     def delete_by_ids(self, ids: str) -> List[str]:
         """Delete by ids."""
         self._graph_store_adapter.delete_document(chunk_id=ids)
+        self._graph_store_adapter.persist()
         return []
 
     def vector_name_exists(self) -> bool:
@@ -0,0 +1,177 @@
+"""The compiled agent teams of the apps.
+
+Building the agent team of an app fetches the details of all its sub-apps, which is
+slow for the apps with many employees. The result is compiled once into an immutable
+:class:`AgentTeamBlueprint`, cached by the app code and the app config version, and
+each conversation only builds its resources and binds its context and memory to new
+agents. The resource objects are not shared, preloading a resource binds it to the
+conversation, e.g. the trace id and the tools of a MCP tool pack.
+
+The blueprints containing an app are invalidated when the app is edited, published
+or deleted. The cache entries also expire after a while, for the apps edited by
+another server.
+"""
+
+import asyncio
+import dataclasses
+import logging
+import threading
+import weakref
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, FrozenSet, Optional, Tuple
+
+from cachetools import TTLCache
+
+if TYPE_CHECKING:
+    from opsdiag.agent.resource.base import AgentResource
+    from opsdiag_serve.building.app.api.schema_app import GptsApp
+
+logger = logging.getLogger(__name__)
+
+BlueprintKey = Tuple[str, Optional[str], Optional[str]]
+
+_DEFAULT_MAX_SIZE = 256
+_DEFAULT_TTL_SECONDS = 600
+
+
+def blueprint_key(app: "GptsApp") -> BlueprintKey:
+    """The cache key of an app, its code and its config version."""
+    return app.app_code, app.config_code, app.config_version
+
+
+@dataclasses.dataclass(frozen=True)
+class AgentTeamBlueprint:
+    """The compiled agent team of an app.
+
+    It is shared by all the conversations of the app, the app and the resources
+    must not be modified.
+    """
+
+    app: "GptsApp"
+    # The resources of the app, built into new resource objects by the resource
+    # manager for each conversation
+    agent_resources: Tuple["AgentResource", ...] = ()
+    employees: Tuple["AgentTeamBlueprint", ...] = ()
+
+    @property
+    def key(self) -> BlueprintKey:
+        return blueprint_key(self.app)
+
+    @property
+    def app_codes(self) -> FrozenSet[str]:
+        """The codes of the app and all its sub-apps."""
+        codes = {self.app.app_code}
+        for employee in self.employees:
+            codes.update(employee.app_codes)
+        return frozenset(codes)
+
+
+class AgentBlueprintCache:
+    """Cache the blueprints by app code and app config version.
+
+    Concurrent requests of the same app compile its blueprint only once.
+
+    Args:
+        max_size (int): The max number of blueprints.
+        ttl (float): The seconds before a blueprint expires.
+    """
+
+    def __init__(
+        self, max_size: int = _DEFAULT_MAX_SIZE, ttl: float = _DEFAULT_TTL_SECONDS
+    ):
+        self._cache: TTLCache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        # The compilations in progress, a future is bound to the loop creating it:
+        # loop -> key -> future
+        self._compiling: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        # Increased on each invalidation, a blueprint compiled across an
+        # invalidation may be stale and is not cached
+        self._generation = 0
+
+    def _loop_compiling(self) -> Dict[BlueprintKey, asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            compiling = self._compiling.get(loop)
+            if compiling is None:
+                compiling = {}
+                self._compiling[loop] = compiling
+            return compiling
+
+    def get(self, app: "GptsApp") -> Optional[AgentTeamBlueprint]:
+        with self._lock:
+            return self._cache.get(blueprint_key(app))
+
+    async def get_or_compile(
+        self,
+        app: "GptsApp",
+        compile_func: Callable[["GptsApp"], Awaitable[AgentTeamBlueprint]],
+    ) -> AgentTeamBlueprint:
+        """Get the blueprint of the app, compile it if it is not cached."""
+        key = blueprint_key(app)
+        blueprint = self.get(app)
+        if blueprint is not None:
+            return blueprint
+        compiling = self._loop_compiling()
+        future = compiling.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        compiling[key] = future
+        generation = self._generation
+        try:
+            blueprint = await compile_func(app)
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieve it, no error is logged if nobody waits for it
+            future.exception()
+            raise
+        else:
+            future.set_result(blueprint)
+            with self._lock:
+                if generation == self._generation:
+                    self._cache[key] = blueprint
+            return blueprint
+        finally:
+            compiling.pop(key, None)
+
+    def invalidate(self, app_code: str) -> int:
+        """Remove the blueprints containing the app.
+
+        Returns:
+            int: The number of the removed blueprints.
+        """
+        with self._lock:
+            self._generation += 1
+            keys = [
+                key
+                for key, blueprint in self._cache.items()
+                if app_code in blueprint.app_codes
+            ]
+            for key in keys:
+                self._cache.pop(key, None)
+        if keys:
+            logger.info(f"Invalidate {len(keys)} agent blueprints of app {app_code}")
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cache)
+
+
+_blueprint_cache = AgentBlueprintCache()
+
+
+def get_agent_blueprint_cache() -> AgentBlueprintCache:
+    return _blueprint_cache
+
+
+def invalidate_agent_blueprints(app_code: Optional[str]) -> int:
+    """Invalidate the blueprints containing the app, call it when an app changes."""
+    if app_code:
+        return _blueprint_cache.invalidate(app_code)
+    return 0
@@ -1,6 +1,8 @@
 import asyncio
+import dataclasses
 import json
 import logging
+import os
 import uuid
 from abc import ABC, abstractmethod
 from copy import deepcopy
@@ -21,7 +23,7 @@ from opsdiag.agent.core.base_team import ManagerAgent
 from opsdiag.agent.core.memory.gpts import GptsMessage
 from opsdiag.agent.core.schema import Status
 from opsdiag.agent.resource import get_resource_manager, ResourceManager
-from opsdiag.agent.resource.base import FILE_RESOURCES, AgentResource
+from opsdiag.agent.resource.base import FILE_RESOURCES, AgentResource, Resource
 from opsdiag.component import ComponentType, SystemApp
 from opsdiag.core import HumanMessage, StorageConversation
 from opsdiag.core.awel.flow.flow_factory import FlowCategory
@@ -34,6 +36,10 @@ from opsdiag.util.logger import digest
 from opsdiag.util.tracer.tracer_impl import root_tracer
 from opsdiag.vis.vis_manage import get_vis_manager
 from opsdiag_ext.agent.agents.awel.awel_runner_agent import AwelRunnerAgent
+from opsdiag_serve.agent.agents.chat.agent_blueprint import (
+    AgentTeamBlueprint,
+    get_agent_blueprint_cache,
+)
 from opsdiag_serve.agent.agents.derisks_memory import MetaDerisksPlansMemory, MetaDerisksMessageMemory
 from opsdiag_serve.agent.db import GptsConversationsEntity, GptsConversationsDao, GptsMessagesDao
 from opsdiag_serve.agent.team.base import TeamMode
@@ -90,10 +96,17 @@ class AgentChat(BaseComponent, ABC):
         self.gpts_messages_dao = GptsMessagesDao()
 
         from opsdiag.agent.core.memory.gpts.disk_cache_gpts_memory import DiskGptsMemory
+        from opsdiag.configs.model_config import DATA_DIR
 
+        # The shared memory is started and stopped by its owner
+        self._own_memory = gpts_memory is None
         self.memory = gpts_memory or DiskGptsMemory(
             plans_memory=MetaDerisksPlansMemory(),
             message_memory=MetaDerisksMessageMemory(),
+            write_behind=CFG.GPTS_MEMORY_WRITE_BEHIND,
+            write_behind_wal_dir=os.path.join(
+                DATA_DIR, "gpts_memory_wal", "agent_chat"
+            ),
         )
         self.llm_provider = llm_provider
         self.agent_memory_map = {}
@@ -112,6 +125,14 @@ class AgentChat(BaseComponent, ABC):
                 worker_manager, auto_convert_message=True
             )
 
+    async def async_after_start(self):
+        if self._own_memory:
+            await self.memory.startup()
+
+    async def async_before_stop(self):
+        if self._own_memory:
+            await self.memory.shutdown()
+
     async def save_conversation(
         self,
         conv_session_id: str,
@@ -566,165 +587,243 @@ class AgentChat(BaseComponent, ABC):
         app: GptsApp,
         **kwargs,
     ) -> ConversableAgent:
-        """Build a dialogue target agent through gpts configuration"""
+        """Build a dialogue target agent through gpts configuration
+
+        The agent team of the app is compiled once into a cached blueprint, only
+        the agents are created for each conversation.
+        """
         from datetime import datetime
         logger.info(f"_build_agent_by_gpts:{app.app_code},{app.app_name}, start:{datetime.now()}")
         try:
-            employees: List[ConversableAgent] = []
-            if app.details is not None and len(app.details) > 0:
-                employees: List[ConversableAgent] = await self._build_employees(
-                    context, agent_memory, rm, [deepcopy(item) for item in app.details]
-                )
+            blueprint = await self._get_agent_blueprint(rm, app)
+            return await self._instantiate_blueprint(
+                context, agent_memory, rm, blueprint
+            )
+        finally:
+            logger.info(f"_build_agent_by_gpts:{app.app_code},{app.app_name}, end:{datetime.now()}")
 
-            team_mode = TeamMode(app.team_mode)
-            ## 模型服务
-            if not self.llm_provider:
-                worker_manager = CFG.SYSTEM_APP.get_component(
-                    ComponentType.WORKER_MANAGER_FACTORY, WorkerManagerFactory
-                ).create()
-                self.llm_provider = DefaultLLMClient(
-                    worker_manager, auto_convert_message=True
-                )
+    async def _get_agent_blueprint(
+        self, rm: ResourceManager, app: GptsApp
+    ) -> AgentTeamBlueprint:
+        return await get_agent_blueprint_cache().get_or_compile(
+            app, lambda gpts_app: self._compile_blueprint(rm, gpts_app)
+        )
 
-            if team_mode == TeamMode.SINGLE_AGENT or TeamMode.NATIVE_APP == team_mode:
-                if employees is not None and len(employees) == 1:
-                    recipient = employees[0]
-                else:
-                    cls: Type[ConversableAgent] = self.agent_manage.get_by_name(app.agent)
-                    llm_config = LLMConfig(
-                        llm_client=self.llm_provider,
-                        llm_strategy=LLMStrategyType(app.llm_config.llm_strategy),
-                        strategy_context=app.llm_config.llm_strategy_value
-                    )
-                    ## 处理agent资源内容
-                    depend_resource = await blocking_func_to_async(
-                        CFG.SYSTEM_APP, rm.build_resource, app.all_resources
-                    )
+    async def _compile_blueprint(
+        self, rm: ResourceManager, app: GptsApp
+    ) -> AgentTeamBlueprint:
+        """Fetch the sub-apps and resolve the resources of the agent team of an app."""
+        from datetime import datetime
+        logger.info(
+            f"_compile_blueprint:{app.app_code},{app.config_code},"
+            f"{app.config_version}, start:{datetime.now()}"
+        )
+        # The blueprint is shared, keep a private copy of the app
+        app = deepcopy(app)
+        employees: List[AgentTeamBlueprint] = []
+        if app.details is not None and len(app.details) > 0:
+            employees = await self._build_employee_blueprints(rm, app.details)
+
+        team_mode = TeamMode(app.team_mode)
+        agent_resources = ()
+        if team_mode == TeamMode.SINGLE_AGENT or TeamMode.NATIVE_APP == team_mode:
+            if len(employees) != 1:
+                ## 处理agent资源内容
+                agent_resources = tuple(app.all_resources or ())
+        elif TeamMode.AUTO_PLAN == team_mode:
+            agent_resources = tuple(app.all_resources or ())
+        elif TeamMode.AWEL_LAYOUT != team_mode:
+            raise ValueError(f"Unknown Agent Team Mode!{team_mode}")
+        return AgentTeamBlueprint(
+            app=app, agent_resources=agent_resources, employees=tuple(employees)
+        )
 
-                    agent_context = deepcopy(context)
-                    agent_context.agent_app_code = app.app_code
-
-                    recipient = (
-                        await cls()
-                        .bind(agent_context)
-                        .bind(agent_memory)
-                        .bind(llm_config)
-                        .bind(depend_resource)
-                        # .bind(prompt_template)
-                        .build()
-                    )
+    async def _build_employee_blueprints(
+        self,
+        rm: ResourceManager,
+        app_details: List[GptsAppDetail],
+    ) -> List[AgentTeamBlueprint]:
+        app_service = get_app_service()
 
-                ## 处理Agent实例的基本信息
-                temp_profile = recipient.profile.copy()
-                temp_profile.desc = app.app_describe
-                temp_profile.name = app.app_name
-                temp_profile.avatar = app.icon
-                if app.system_prompt_template is not None:
-                    temp_profile.system_prompt_template = app.system_prompt_template
-                if app.user_prompt_template:
-                    temp_profile.user_prompt_template = app.user_prompt_template
-                recipient.bind(temp_profile)
-                return recipient
-            elif TeamMode.AUTO_PLAN == team_mode:
-
-                agent_manager = get_agent_manager()
-                auto_team_ctx = app.team_context
-
-                manager_cls: Type[ConversableAgent] = agent_manager.get_by_name(
-                    auto_team_ctx.teamleader
+        async def _build_employee_blueprint(
+            record: GptsAppDetail,
+        ) -> AgentTeamBlueprint:
+            if record.type == "app":
+                gpt_app: GptsApp = await app_service.app_detail(
+                    record.agent_role, building_mode=False
                 )
-                manager = manager_cls()
+                if not gpt_app:
+                    raise ValueError(f"Not found app {record.agent_role}!")
+                return await self._get_agent_blueprint(rm, gpt_app)
+            else:
+                raise ValueError("当前应用数据已经无法支持，请重新编辑构建！")
+
+        from opsdiag.util.chat_util import run_async_tasks
+        return await run_async_tasks(
+            tasks=[_build_employee_blueprint(record) for record in app_details],
+            concurrency_limit=10,
+        )
+
+    def _bind_agent_context(self, context: AgentContext, app: GptsApp) -> AgentContext:
+        """Copy the conversation context for an agent of the team."""
+        return dataclasses.replace(
+            context,
+            agent_app_code=app.app_code,
+            extra=dict(context.extra) if context.extra is not None else None,
+            env_context=(
+                dict(context.env_context) if context.env_context is not None else None
+            ),
+        )
+
+    async def _build_blueprint_resource(
+        self, rm: ResourceManager, blueprint: AgentTeamBlueprint
+    ) -> Optional[Resource]:
+        """Build new resource objects of a blueprint for a conversation.
+
+        The resources are changed by preloading them, e.g. the trace id and the
+        tools of a MCP tool pack, so they are not shared between conversations.
+        """
+        if not blueprint.agent_resources:
+            return None
+        return await blocking_func_to_async(
+            CFG.SYSTEM_APP, rm.build_resource, list(blueprint.agent_resources)
+        )
 
+    async def _instantiate_blueprint(
+        self,
+        context: AgentContext,
+        agent_memory: AgentMemory,
+        rm: ResourceManager,
+        blueprint: AgentTeamBlueprint,
+    ) -> ConversableAgent:
+        """Create the agents of a blueprint for a conversation."""
+        app = blueprint.app
+        employees: List[ConversableAgent] = []
+        if blueprint.employees:
+            employees = await self._build_employees(
+                context, agent_memory, rm, blueprint.employees
+            )
+        resource = await self._build_blueprint_resource(rm, blueprint)
+
+        team_mode = TeamMode(app.team_mode)
+        ## 模型服务
+        if not self.llm_provider:
+            worker_manager = CFG.SYSTEM_APP.get_component(
+                ComponentType.WORKER_MANAGER_FACTORY, WorkerManagerFactory
+            ).create()
+            self.llm_provider = DefaultLLMClient(
+                worker_manager, auto_convert_message=True
+            )
+
+        if team_mode == TeamMode.SINGLE_AGENT or TeamMode.NATIVE_APP == team_mode:
+            if employees is not None and len(employees) == 1:
+                recipient = employees[0]
+            else:
+                cls: Type[ConversableAgent] = get_agent_manager().get_by_name(app.agent)
                 llm_config = LLMConfig(
                     llm_client=self.llm_provider,
                     llm_strategy=LLMStrategyType(app.llm_config.llm_strategy),
                     strategy_context=app.llm_config.llm_strategy_value
                 )
-
-                if app.all_resources:
-                    depend_resource = await blocking_func_to_async(
-                        CFG.SYSTEM_APP, rm.build_resource, app.all_resources
-                    )
-                    manager.bind(depend_resource)
-
-                agent_context = deepcopy(context)
-                agent_context.agent_app_code = app.app_code
-
-                manager = await manager.bind(agent_context).bind(llm_config).bind(agent_memory).build()
-
-                ## 处理Agent实例的基本信息
-                temp_profile = manager.profile.copy()
-                temp_profile.desc = app.app_describe
-                temp_profile.name = app.app_name
-                temp_profile.avatar = app.icon
-                if app.system_prompt_template is not None:
-                    temp_profile.system_prompt_template = app.system_prompt_template
-                if app.user_prompt_template:
-                    temp_profile.user_prompt_template = app.user_prompt_template
-                manager.bind(temp_profile)
-
-                if isinstance(manager, ManagerAgent) and len(employees) > 0:
-                    manager.hire(employees)
-                logger.info(
-                    f"_build_agent_by_gpts return:{manager.profile.name},{manager.profile.desc},{id(manager)}"
+                agent_context = self._bind_agent_context(context, app)
+
+                recipient = (
+                    await cls()
+                    .bind(agent_context)
+                    .bind(agent_memory)
+                    .bind(llm_config)
+                    .bind(resource)
+                    # .bind(prompt_template)
+                    .build()
                 )
-                return manager
-            elif TeamMode.AWEL_LAYOUT == team_mode:
-                team_context: AWELTeamContext = app.team_context
-                from opsdiag_app.openapi.api_v1.api_v1 import get_chat_flow
-                agent: ConversableAgent = AwelRunnerAgent(team_context=team_context,
-                                                          flow_service=get_chat_flow())  # todo: 通过team_context配置动态加载agent
 
-                agent_context = deepcopy(context)
-                agent_context.agent_app_code = app.app_code
+            ## 处理Agent实例的基本信息
+            temp_profile = recipient.profile.copy()
+            temp_profile.desc = app.app_describe
+            temp_profile.name = app.app_name
+            temp_profile.avatar = app.icon
+            if app.system_prompt_template is not None:
+                temp_profile.system_prompt_template = app.system_prompt_template
+            if app.user_prompt_template:
+                temp_profile.user_prompt_template = app.user_prompt_template
+            recipient.bind(temp_profile)
+            return recipient
+        elif TeamMode.AUTO_PLAN == team_mode:
+
+            agent_manager = get_agent_manager()
+            auto_team_ctx = app.team_context
+
+            manager_cls: Type[ConversableAgent] = agent_manager.get_by_name(
+                auto_team_ctx.teamleader
+            )
+            manager = manager_cls()
+
+            llm_config = LLMConfig(
+                llm_client=self.llm_provider,
+                llm_strategy=LLMStrategyType(app.llm_config.llm_strategy),
+                strategy_context=app.llm_config.llm_strategy_value
+            )
 
-                agent = await agent.bind(agent_context).bind(agent_memory).build()
+            if resource:
+                manager.bind(resource)
 
-                temp_profile = agent.profile.copy()
-                temp_profile.desc = app.app_describe
-                temp_profile.name = app.app_name
-                temp_profile.avatar = app.icon
-                agent.bind(temp_profile)
+            agent_context = self._bind_agent_context(context, app)
 
-                return agent
-            else:
-                raise ValueError(f"Unknown Agent Team Mode!{team_mode}")
-        finally:
-            logger.info(f"_build_agent_by_gpts:{app.app_code},{app.app_name}, end:{datetime.now()}")
+            manager = await manager.bind(agent_context).bind(llm_config).bind(agent_memory).build()
+
+            ## 处理Agent实例的基本信息
+            temp_profile = manager.profile.copy()
+            temp_profile.desc = app.app_describe
+            temp_profile.name = app.app_name
+            temp_profile.avatar = app.icon
+            if app.system_prompt_template is not None:
+                temp_profile.system_prompt_template = app.system_prompt_template
+            if app.user_prompt_template:
+                temp_profile.user_prompt_template = app.user_prompt_template
+            manager.bind(temp_profile)
+
+            if isinstance(manager, ManagerAgent) and len(employees) > 0:
+                manager.hire(employees)
+            logger.info(
+                f"_build_agent_by_gpts return:{manager.profile.name},{manager.profile.desc},{id(manager)}"
+            )
+            return manager
+        elif TeamMode.AWEL_LAYOUT == team_mode:
+            team_context: AWELTeamContext = app.team_context
+            from opsdiag_app.openapi.api_v1.api_v1 import get_chat_flow
+            agent: ConversableAgent = AwelRunnerAgent(team_context=team_context,
+                                                      flow_service=get_chat_flow())  # todo: 通过team_context配置动态加载agent
+
+            agent_context = self._bind_agent_context(context, app)
+
+            agent = await agent.bind(agent_context).bind(agent_memory).build()
+
+            temp_profile = agent.profile.copy()
+            temp_profile.desc = app.app_describe
+            temp_profile.name = app.app_name
+            temp_profile.avatar = app.icon
+            agent.bind(temp_profile)
+
+            return agent
+        else:
+            raise ValueError(f"Unknown Agent Team Mode!{team_mode}")
 
     async def _build_employees(
         self,
         context: AgentContext,
         agent_memory: AgentMemory,
         rm: ResourceManager,
-        app_details: List[GptsAppDetail],
+        blueprints: Tuple[AgentTeamBlueprint, ...],
     ) -> List[ConversableAgent]:
-        """Constructing dialogue members through gpts-related Agent or gpts app information."""
+        """Constructing dialogue members through the blueprints of the gpts apps."""
         from datetime import datetime
-        logger.info(
-            f"_build_employees:{[item.agent_role + ',' + item.agent_name for item in app_details] if app_details else ''},start:{datetime.now()}"
-        )
-        app_service = get_app_service()
-
-        async def _build_employee_agent(record: GptsAppDetail):
-            logger.info(f"_build_employees循环:{record.agent_role},{record.agent_name}, start:{datetime.now()}")
-            if record.type == "app":
-                gpt_app: GptsApp = deepcopy(await app_service.app_detail(record.agent_role, building_mode=False))
-                if not gpt_app:
-                    raise ValueError(f"Not found app {record.agent_role}!")
-                employee_agent = await self._build_agent_by_gpts(
-                    context, agent_memory, rm, gpt_app
-                )
-
-                logger.info(
-                    f"_build_employees循环:{employee_agent.profile.role},{employee_agent.profile.name},{employee_agent.profile.desc},{id(employee_agent)}, end:{datetime.now()}")
-                return employee_agent
-            else:
-                raise ValueError("当前应用数据已经无法支持，请重新编辑构建！")
+        apps = [f"{item.app.app_code},{item.app.app_name}" for item in blueprints]
+        logger.info(f"_build_employees:{apps},start:{datetime.now()}")
 
-        api_tasks = []
-        for record in app_details:
-            api_tasks.append(_build_employee_agent(record))
+        api_tasks = [
+            self._instantiate_blueprint(context, agent_memory, rm, blueprint)
+            for blueprint in blueprints
+        ]
 
         from opsdiag.util.chat_util import run_async_tasks
         employees = await run_async_tasks(tasks=api_tasks, concurrency_limit=10)
@@ -934,7 +1033,6 @@ class AgentChat(BaseComponent, ABC):
                 break
             else:
                 yield item
-                await asyncio.sleep(0.005)
 
     async def stop_chat(self, conv_session_id: str, user_id:Optional[str] = None):
         """停止对话.
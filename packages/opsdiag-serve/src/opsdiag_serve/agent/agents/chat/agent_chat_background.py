@@ -6,6 +6,7 @@ from fastapi import BackgroundTasks
 
 from opsdiag.core import HumanMessage, StorageConversation
 from opsdiag_serve.agent.agents.chat.agent_chat import AgentChat, _format_vis_msg
+from opsdiag_serve.agent.agents.chat.chunk_stream import ChatChunkStream
 from opsdiag_serve.building.config.api.schemas import ChatInParamValue
 
 logger = logging.getLogger(__name__)
@@ -37,10 +38,11 @@ class BackGroundAgentChat(AgentChat):
     @asynccontextmanager
     async def _manage_chat_session(self, conv_uid: str, user_query: Union[str, HumanMessage],
                                    gpts_name: str, **ext_info) -> AsyncGenerator[
-        Tuple[ChatState, asyncio.Queue, StorageConversation], None]:
+        Tuple[ChatState, ChatChunkStream, StorageConversation], None]:
         """管理聊天会话的上下文"""
         state = ChatState()
-        task_queue: asyncio.Queue = asyncio.Queue()
+        # 不等待合并窗口，消息逐条输出
+        task_queue: ChatChunkStream = ChatChunkStream(window_ms=0)
 
         # 初始化会话
         current_message = await self._initialize_conversation(
@@ -53,17 +55,12 @@ class BackGroundAgentChat(AgentChat):
         try:
             yield state, task_queue, current_message
         finally:
-            # 确保队列中的所有消息都被处理
-            while not task_queue.empty():
-                try:
-                    task_queue.get_nowait()
-                    task_queue.task_done()
-                except asyncio.QueueEmpty:
-                    break
+            # 客户端已断开或读取完成，丢弃剩余消息，后台任务不再阻塞
+            task_queue.close()
 
     async def _process_agent_chat(self,
                                   state: ChatState,
-                                  task_queue: asyncio.Queue,
+                                  task_queue: ChatChunkStream,
                                   conv_uid: str, gpts_name: str,
                                   user_query: Union[str, HumanMessage],
                                   chat_call_back: Optional[Any] = None,
@@ -93,25 +90,17 @@ class BackGroundAgentChat(AgentChat):
             await state.update(error=str(e))
             current_agent_conv_id = (await state.get_state())[0]
             await task_queue.put((_format_vis_msg(str(e)), current_agent_conv_id))
-
-    async def _stream_response(self, state: ChatState, task_queue: asyncio.Queue,
-                               processing_complete: asyncio.Event) -> AsyncGenerator[str, None]:
-        """生成响应流"""
-        while not (processing_complete.is_set() and task_queue.empty()):
-            try:
-                timeout = 1.0 if not processing_complete.is_set() else 0.1
-                chunk, agent_conv_id = await asyncio.wait_for(
-                    task_queue.get(), timeout=timeout
-                )
-
+        finally:
+            # 结束标记，响应流读完剩余消息后结束
+            task_queue.end()
+
+    async def _stream_response(self, state: ChatState, task_queue: ChatChunkStream
+                               ) -> AsyncGenerator[str, None]:
+        """生成响应流，每条消息单独输出，合并写入由 HTTP 层处理"""
+        async for frame in task_queue.frames():
+            for chunk, _ in frame:
                 agent_conv_id, error = await state.get_state()
                 yield chunk + ("\n" + error if error else ""), agent_conv_id
-                task_queue.task_done()
-
-            except asyncio.TimeoutError:
-                if processing_complete.is_set() and task_queue.empty():
-                    break
-                continue
 
     async def _cleanup_conversation(self, processor_task: asyncio.Task,
                                     state: ChatState, conv_uid: str,
@@ -152,8 +141,6 @@ class BackGroundAgentChat(AgentChat):
 
         async with self._manage_chat_session(conv_uid, user_query, gpts_name, **ext_info) as (
             state, task_queue, current_message):
-            processing_complete = asyncio.Event()
-
             # 创建并启动处理任务
             processor_task = asyncio.create_task(
                 self._process_agent_chat(
@@ -169,12 +156,11 @@ class BackGroundAgentChat(AgentChat):
             )
 
             try:
-                async for chunk, agent_conv_id in self._stream_response(state, task_queue, processing_complete):
+                async for chunk, agent_conv_id in self._stream_response(state, task_queue):
                     yield chunk, agent_conv_id
             except asyncio.CancelledError:
                 logger.info(f"Client disconnected: {conv_uid}")
             finally:
-                processing_complete.set()
                 # 添加清理任务
                 background_tasks.add_task(
                     self._cleanup_conversation,
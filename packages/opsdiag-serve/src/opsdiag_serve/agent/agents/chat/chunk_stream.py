@@ -0,0 +1,165 @@
+"""The chunk streams between the agent chats and the SSE responses.
+
+A producer puts the chunks into a bounded :class:`ChatChunkStream` and ends it
+with a sentinel, the consumer waits for the chunks without polling. The chunks
+already queued, or put within a short window, are merged into one frame, so a
+fast producer doesn't cost a network write per chunk. The producer waits when the
+stream is full, and doesn't wait anymore once the consumer is gone.
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Generic, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_END = object()
+
+_DEFAULT_MAX_SIZE = 256
+_DEFAULT_WINDOW_MS = 10
+_DEFAULT_MAX_FRAME_ITEMS = 64
+
+
+class ChatChunkStream(Generic[T]):
+    """A bounded stream of chunks ended by a sentinel.
+
+    Args:
+        maxsize (int): The max number of queued chunks, the producer waits when the
+            stream is full.
+        window_ms (float): After the first chunk of a frame, wait this long for
+            more chunks. The first frame of the stream is not delayed.
+        max_frame_items (int): The max number of chunks merged into a frame.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = _DEFAULT_MAX_SIZE,
+        window_ms: float = _DEFAULT_WINDOW_MS,
+        max_frame_items: int = _DEFAULT_MAX_FRAME_ITEMS,
+    ):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._window = window_ms / 1000
+        self._max_frame_items = max_frame_items
+        self._ended = False
+        self._closed = False
+        self._first_frame = True
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def put(self, item: T) -> bool:
+        """Put a chunk, wait while the stream is full.
+
+        Returns:
+            bool: False if the consumer is gone and the chunk is dropped.
+        """
+        if self._closed or self._ended:
+            return False
+        await self._queue.put(item)
+        return not self._closed
+
+    def end(self):
+        """End the stream, the consumer stops after the queued chunks."""
+        if self._ended:
+            return
+        self._ended = True
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait(_END)
+        except asyncio.QueueFull:
+            # Don't block the producer, the consumer puts it back when it's done
+            asyncio.get_running_loop().create_task(self._queue.put(_END))
+
+    def close(self):
+        """The consumer is gone, drop the queued chunks and release the producer."""
+        self._closed = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+
+    async def frames(self) -> AsyncIterator[List[T]]:
+        """Yield the chunks in frames until the end of the stream."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _END:
+                    return
+                frame = [item]
+                ended = False
+                deadline = None if self._first_frame else loop.time() + self._window
+                self._first_frame = False
+                while len(frame) < self._max_frame_items:
+                    try:
+                        item = self._queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        if deadline is None or loop.time() >= deadline:
+                            break
+                        try:
+                            item = await asyncio.wait_for(
+                                self._queue.get(), deadline - loop.time()
+                            )
+                        except asyncio.TimeoutError:
+                            break
+                    if item is _END:
+                        ended = True
+                        break
+                    frame.append(item)
+                yield frame
+                if ended:
+                    return
+        finally:
+            self.close()
+
+
+async def coalesce_chunks(
+    source: AsyncIterator[T],
+    merge: Callable[[List[T]], T],
+    stream: Optional[ChatChunkStream] = None,
+) -> AsyncIterator[T]:
+    """Read the source in a task and yield its chunks merged in frames.
+
+    The source task is cancelled when the consumer is gone, like the source was
+    iterated by the consumer directly.
+    """
+    stream = stream or ChatChunkStream()
+    error: List[BaseException] = []
+
+    async def _produce():
+        try:
+            async for chunk in source:
+                if not await stream.put(chunk):
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error.append(e)
+        finally:
+            stream.end()
+
+    producer = asyncio.create_task(_produce())
+    try:
+        async for frame in stream.frames():
+            yield merge(frame)
+        if error:
+            raise error[0]
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.warning(f"Chunk producer stopped with error: {e}")
+
+
+def merge_sse_frames(frames: List[str]) -> str:
+    """Merge the SSE events into one write, every event is kept."""
+    return "".join(frames)
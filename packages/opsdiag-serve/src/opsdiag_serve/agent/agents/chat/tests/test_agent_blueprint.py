@@ -0,0 +1,219 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from types import SimpleNamespace
+
+import pytest
+
+from opsdiag.agent import AgentContext
+from opsdiag_serve.agent.team.base import TeamMode
+
+from .. import agent_chat
+from ..agent_blueprint import AgentBlueprintCache, AgentTeamBlueprint
+
+_trace_id: ContextVar[str] = ContextVar("trace_id")
+
+
+def _app(app_code: str, config_version: str = "v1"):
+    return SimpleNamespace(
+        app_code=app_code,
+        config_code=f"{app_code}-config",
+        config_version=config_version,
+    )
+
+
+class _Compiler:
+    def __init__(self, employees=None, delay: float = 0.01):
+        self.calls = 0
+        self.employees = employees or {}
+        self.delay = delay
+
+    async def __call__(self, app) -> AgentTeamBlueprint:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        employees = tuple(
+            AgentTeamBlueprint(app=_app(code))
+            for code in self.employees.get(app.app_code, [])
+        )
+        return AgentTeamBlueprint(app=app, employees=employees)
+
+
+@pytest.mark.asyncio
+async def test_compile_once():
+    cache = AgentBlueprintCache()
+    compiler = _Compiler()
+    blueprints = await asyncio.gather(
+        *[cache.get_or_compile(_app("a"), compiler) for _ in range(5)]
+    )
+    assert compiler.calls == 1
+    assert all(b is blueprints[0] for b in blueprints)
+    assert await cache.get_or_compile(_app("a"), compiler) is blueprints[0]
+    assert compiler.calls == 1
+
+    # A new version of the app is compiled again
+    await cache.get_or_compile(_app("a", "v2"), compiler)
+    assert compiler.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_compile_error_not_cached():
+    cache = AgentBlueprintCache()
+
+    async def _fail(app):
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    results = await asyncio.gather(
+        *[cache.get_or_compile(_app("a"), _fail) for _ in range(3)],
+        return_exceptions=True,
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_invalidate_with_sub_apps():
+    cache = AgentBlueprintCache()
+    compiler = _Compiler(employees={"team": ["a", "b"]})
+    team = await cache.get_or_compile(_app("team"), compiler)
+    assert team.app_codes == {"team", "a", "b"}
+    await cache.get_or_compile(_app("other"), compiler)
+
+    # Editing an employee invalidates the team
+    assert cache.invalidate("b") == 1
+    assert cache.get(_app("team")) is None
+    assert cache.get(_app("other")) is not None
+    await cache.get_or_compile(_app("team"), compiler)
+    assert compiler.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_invalidate_while_compiling():
+    cache = AgentBlueprintCache()
+    compiler = _Compiler(delay=0.05)
+    task = asyncio.create_task(cache.get_or_compile(_app("a"), compiler))
+    await asyncio.sleep(0.01)
+    cache.invalidate("a")
+    await task
+    # The blueprint may be stale, it is not cached
+    assert cache.get(_app("a")) is None
+
+
+@pytest.mark.asyncio
+async def test_expired():
+    cache = AgentBlueprintCache(ttl=0.01)
+    compiler = _Compiler(delay=0)
+    await cache.get_or_compile(_app("a"), compiler)
+    await asyncio.sleep(0.02)
+    await cache.get_or_compile(_app("a"), compiler)
+    assert compiler.calls == 2
+
+
+def test_compile_in_multiple_loops():
+    cache = AgentBlueprintCache()
+    started, release = threading.Event(), threading.Event()
+
+    async def _slow(app):
+        started.set()
+        await asyncio.get_running_loop().run_in_executor(None, release.wait)
+        return AgentTeamBlueprint(app=app)
+
+    async def _fast(app):
+        return AgentTeamBlueprint(app=app)
+
+    with ThreadPoolExecutor(1) as executor:
+        slow = executor.submit(asyncio.run, cache.get_or_compile(_app("a"), _slow))
+        started.wait()
+        # Not waiting for the future of the other loop
+        blueprint = asyncio.run(cache.get_or_compile(_app("a"), _fast))
+        release.set()
+        assert blueprint.app.app_code == slow.result().app.app_code == "a"
+
+
+class _ToolPack:
+    """Bound to the trace of the conversation by preloading, like a MCP tool pack."""
+
+    def __init__(self):
+        self.trace_id = None
+
+    async def preload_resource(self):
+        self.trace_id = _trace_id.get()
+        await asyncio.sleep(0.01)
+
+    async def call_tool(self) -> str:
+        return self.trace_id
+
+
+class _Profile(SimpleNamespace):
+    def copy(self):
+        return _Profile()
+
+
+class _Agent:
+    def __init__(self):
+        self.profile = _Profile()
+        self.resource = None
+
+    def bind(self, target):
+        if isinstance(target, _ToolPack):
+            self.resource = target
+        return self
+
+    async def build(self):
+        await self.resource.preload_resource()
+        return self
+
+
+class _ResourceManager:
+    def build_resource(self, agent_resources):
+        return _ToolPack()
+
+
+class _AgentChat(agent_chat.AgentChat):
+    async def chat(self, *args, **kwargs):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_resources_per_conversation(monkeypatch):
+    async def _blocking_func_to_async(system_app, func, *args):
+        return func(*args)
+
+    monkeypatch.setattr(
+        agent_chat,
+        "get_agent_manager",
+        lambda: SimpleNamespace(get_by_name=lambda name: _Agent),
+    )
+    monkeypatch.setattr(agent_chat, "LLMConfig", SimpleNamespace)
+    monkeypatch.setattr(agent_chat, "blocking_func_to_async", _blocking_func_to_async)
+    chat = _AgentChat.__new__(_AgentChat)
+    chat.llm_provider = object()
+    app = SimpleNamespace(
+        **vars(_app("a")),
+        team_mode=TeamMode.SINGLE_AGENT.value,
+        agent="tool_agent",
+        app_name="a",
+        app_describe="",
+        icon=None,
+        system_prompt_template=None,
+        user_prompt_template=None,
+        llm_config=SimpleNamespace(llm_strategy="default", llm_strategy_value=None),
+    )
+    blueprint = AgentTeamBlueprint(app=app, agent_resources=("tool",))
+
+    async def _conversation(trace_id: str) -> str:
+        _trace_id.set(trace_id)
+        agent = await chat._instantiate_blueprint(
+            AgentContext(conv_id=trace_id, conv_session_id=trace_id),
+            None,
+            _ResourceManager(),
+            blueprint,
+        )
+        await asyncio.sleep(0.02)
+        return await agent.resource.call_tool()
+
+    assert await asyncio.gather(_conversation("t1"), _conversation("t2")) == [
+        "t1",
+        "t2",
+    ]
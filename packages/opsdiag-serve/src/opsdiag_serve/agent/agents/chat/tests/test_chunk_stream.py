@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from ..chunk_stream import ChatChunkStream, coalesce_chunks, merge_sse_frames
+
+
+async def _collect(stream: ChatChunkStream):
+    return [frame async for frame in stream.frames()]
+
+
+@pytest.mark.asyncio
+async def test_end_stops_stream():
+    stream = ChatChunkStream()
+    consumer = asyncio.create_task(_collect(stream))
+    await stream.put("a")
+    stream.end()
+    # Ended without waiting for a timeout
+    assert await asyncio.wait_for(consumer, 1) == [["a"]]
+    assert not await stream.put("b")
+
+
+@pytest.mark.asyncio
+async def test_coalesce_queued_chunks():
+    stream = ChatChunkStream(window_ms=50, max_frame_items=3)
+    for chunk in "abcde":
+        await stream.put(chunk)
+    stream.end()
+    assert await _collect(stream) == [["a", "b", "c"], ["d", "e"]]
+
+
+@pytest.mark.asyncio
+async def test_first_frame_not_delayed():
+    stream = ChatChunkStream(window_ms=1000)
+    frames = stream.frames()
+    await stream.put("a")
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    assert await frames.__anext__() == ["a"]
+    assert loop.time() - start < 0.5
+
+    async def _produce():
+        await asyncio.sleep(0.01)
+        await stream.put("b")
+        await asyncio.sleep(0.01)
+        await stream.put("c")
+        stream.end()
+
+    producer = asyncio.create_task(_produce())
+    # The chunks put within the window are merged
+    assert await frames.__anext__() == ["b", "c"]
+    await producer
+
+
+@pytest.mark.asyncio
+async def test_backpressure_and_close():
+    stream = ChatChunkStream(maxsize=2)
+    await stream.put("a")
+    await stream.put("b")
+    blocked = asyncio.create_task(stream.put("c"))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    # The consumer is gone, the producer is released
+    stream.close()
+    assert await asyncio.wait_for(blocked, 1) is False
+    assert not await stream.put("d")
+
+
+@pytest.mark.asyncio
+async def test_end_when_full():
+    stream = ChatChunkStream(maxsize=1)
+    await stream.put("a")
+    stream.end()
+    assert await asyncio.wait_for(_collect(stream), 1) == [["a"]]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_chunks_cancel_source():
+    cancelled = asyncio.Event()
+
+    async def _source():
+        try:
+            for i in range(1000):
+                yield f"data: {i}\n\n"
+                await asyncio.sleep(0.001)
+        finally:
+            cancelled.set()
+
+    frames = coalesce_chunks(_source(), merge_sse_frames)
+    first = await frames.__anext__()
+    assert first == "data: 0\n\n"
+    await frames.aclose()
+    await asyncio.wait_for(cancelled.wait(), 1)
+
+
+@pytest.mark.asyncio
+async def test_coalesce_chunks_error():
+    async def _source():
+        yield "data: 0\n\n"
+        raise ValueError("broken")
+
+    received = []
+    with pytest.raises(ValueError, match="broken"):
+        async for frame in coalesce_chunks(_source(), merge_sse_frames):
+            received.append(frame)
+    assert "".join(received) == "data: 0\n\n"
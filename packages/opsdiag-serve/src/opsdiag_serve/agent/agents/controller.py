@@ -1,6 +1,7 @@
 import asyncio
 import json
 import logging
+import os
 import uuid
 from abc import ABC
 from copy import deepcopy
@@ -81,10 +82,15 @@ class MultiAgents(BaseComponent, ABC):
     def __init__(self, system_app: SystemApp):
 
         from opsdiag.agent.core.memory.gpts.disk_cache_gpts_memory import DiskGptsMemory
+        from opsdiag.configs.model_config import DATA_DIR
         # from opsdiag.agent.core.memory.gpts.gpts_memory import GptsMemory
         self.memory: GptsMemory = DiskGptsMemory(
             plans_memory=MetaDerisksPlansMemory(),
             message_memory=MetaDerisksMessageMemory(),
+            write_behind=CFG.GPTS_MEMORY_WRITE_BEHIND,
+            write_behind_wal_dir=os.path.join(
+                DATA_DIR, "gpts_memory_wal", "multi_agents"
+            ),
         )
         self.agent_memory_map = {}
         super().__init__(system_app)
@@ -114,6 +120,10 @@ class MultiAgents(BaseComponent, ABC):
         self.quick_chat = QuickAgentChat(self.system_app, self.memory, self.llm_provider)
         self.background_chat = BackGroundAgentChat(self.system_app, self.memory, self.llm_provider)
         self.async_chat = AsyncAgentChat(self.system_app, self.memory, self.llm_provider)
+        await self.memory.startup()
+
+    async def async_before_stop(self):
+        await self.memory.shutdown()
 
     async def quick_app_chat(self, conv_session_id,
                              user_query: Union[str, HumanMessage],
@@ -148,6 +148,9 @@ class MetaDerisksMessageMemory(GptsMessageMemory):
     def update(self, message: GptsMessage) -> None:
         self.gpts_message.update_message(message.to_dict())
 
+    def batch_update(self, messages: List[GptsMessage]) -> None:
+        self.gpts_message.batch_update_messages([m.to_dict() for m in messages])
+
     def get_by_agent(self, conv_id: str, agent: str) -> Optional[List[GptsMessage]]:
         db_results = self.gpts_message.get_by_agent(conv_id, agent)
         results = []
@@ -162,6 +162,36 @@ class GptsMessagesDao(BaseDao):
             show_message=entity.get("show_message", None),
         )
 
+    def _update_values(self, entity: dict) -> dict:
+        return {
+            GptsMessagesEntity.conv_id: entity.get("conv_id"),
+            GptsMessagesEntity.sender: entity.get("sender"),
+            GptsMessagesEntity.receiver: entity.get("receiver"),
+            GptsMessagesEntity.model_name: entity.get("model_name"),
+            GptsMessagesEntity.rounds: entity.get("rounds"),
+            GptsMessagesEntity.is_success: entity.get("is_success"),
+            GptsMessagesEntity.app_code: entity.get("app_code"),
+            GptsMessagesEntity.app_name: entity.get("app_name"),
+            GptsMessagesEntity.content: entity.get("content"),
+            GptsMessagesEntity.content_types: entity.get("content_types"),
+            GptsMessagesEntity.current_goal: entity.get("current_goal"),
+            GptsMessagesEntity.context: entity.get("context"),
+            GptsMessagesEntity.review_info: entity.get("review_info"),
+            GptsMessagesEntity.action_report: entity.get("action_report"),
+            GptsMessagesEntity.resource_info: entity.get("resource_info"),
+            GptsMessagesEntity.role: entity.get("role"),
+            GptsMessagesEntity.message_id: entity.get("message_id"),
+            GptsMessagesEntity.goal_id: entity.get("goal_id"),
+            GptsMessagesEntity.thinking: entity.get("thinking"),
+            GptsMessagesEntity.show_message: entity.get("show_message"),
+            GptsMessagesEntity.system_prompt: entity.get("system_prompt"),
+            GptsMessagesEntity.user_prompt: entity.get("user_prompt"),
+            GptsMessagesEntity.sender_name: entity.get("sender_name"),
+            GptsMessagesEntity.receiver_name: entity.get("receiver_name"),
+            GptsMessagesEntity.avatar: entity.get("avatar"),
+            GptsMessagesEntity.conv_session_id: entity.get("conv_session_id"),
+        }
+
     def update_message(self, entity: dict):
         session = self.get_raw_session()
         message_qry = session.query(GptsMessagesEntity)
@@ -172,34 +202,7 @@ class GptsMessagesDao(BaseDao):
 
         if old_message:
             message_qry.update(
-                {
-                    GptsMessagesEntity.conv_id: entity.get("conv_id"),
-                    GptsMessagesEntity.sender: entity.get("sender"),
-                    GptsMessagesEntity.receiver: entity.get("receiver"),
-                    GptsMessagesEntity.model_name: entity.get("model_name"),
-                    GptsMessagesEntity.rounds: entity.get("rounds"),
-                    GptsMessagesEntity.is_success: entity.get("is_success"),
-                    GptsMessagesEntity.app_code: entity.get("app_code"),
-                    GptsMessagesEntity.app_name: entity.get("app_name"),
-                    GptsMessagesEntity.content: entity.get("content"),
-                    GptsMessagesEntity.content_types: entity.get("content_types"),
-                    GptsMessagesEntity.current_goal: entity.get("current_goal"),
-                    GptsMessagesEntity.context: entity.get("context"),
-                    GptsMessagesEntity.review_info: entity.get("review_info"),
-                    GptsMessagesEntity.action_report: entity.get("action_report"),
-                    GptsMessagesEntity.resource_info: entity.get("resource_info"),
-                    GptsMessagesEntity.role: entity.get("role"),
-                    GptsMessagesEntity.message_id: entity.get("message_id"),
-                    GptsMessagesEntity.goal_id: entity.get("goal_id"),
-                    GptsMessagesEntity.thinking: entity.get("thinking"),
-                    GptsMessagesEntity.show_message: entity.get("show_message"),
-                    GptsMessagesEntity.system_prompt: entity.get("system_prompt"),
-                    GptsMessagesEntity.user_prompt: entity.get("user_prompt"),
-                    GptsMessagesEntity.sender_name: entity.get("sender_name"),
-                    GptsMessagesEntity.receiver_name: entity.get("receiver_name"),
-                    GptsMessagesEntity.avatar: entity.get("avatar"),
-                    GptsMessagesEntity.conv_session_id: entity.get("conv_session_id"),
-                },
+                self._update_values(entity),
                 synchronize_session="fetch",
             )
         else:
@@ -209,6 +212,29 @@ class GptsMessagesDao(BaseDao):
         session.close()
         return id
 
+    def batch_update_messages(self, entities: List[dict]):
+        """Update or add the messages in one transaction."""
+        if not entities:
+            return
+        session = self.get_raw_session()
+        message_ids = [entity["message_id"] for entity in entities]
+        existing = {
+            message_id
+            for (message_id,) in session.query(GptsMessagesEntity.message_id).filter(
+                GptsMessagesEntity.message_id.in_(message_ids)
+            )
+        }
+        for entity in entities:
+            if entity["message_id"] in existing:
+                session.query(GptsMessagesEntity).filter(
+                    GptsMessagesEntity.message_id == entity["message_id"]
+                ).update(self._update_values(entity), synchronize_session=False)
+            else:
+                session.add(self._dict_to_entity(entity))
+                existing.add(entity["message_id"])
+        session.commit()
+        session.close()
+
     def append(self, entity: dict):
         session = self.get_raw_session()
         message = self._dict_to_entity(entity)
@@ -15,6 +15,10 @@ from opsdiag.storage.metadata import BaseDao
 from opsdiag.util.pagination_utils import PaginationResult
 from opsdiag.vis.schema import ChatLayout
 from opsdiag.vis.vis_manage import get_vis_manager
+from opsdiag_serve.agent.agents.chat.agent_blueprint import (
+    get_agent_blueprint_cache,
+    invalidate_agent_blueprints,
+)
 from opsdiag_serve.agent.model import NativeTeamContext
 from opsdiag_serve.agent.team.base import TeamMode
 from opsdiag_serve.core import BaseService
@@ -209,6 +213,7 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
             request.config_code = temp_config.code
             request.config_version = temp_config.version_info
             config_code = temp_config.code
+        invalidate_agent_blueprints(request.app_code)
         return await self.app_detail(app_code=request.app_code, specify_config_code=config_code)
 
     async def publish(self, app_code: str, new_config_code: str, operator: Optional[str] = None, carefully_chosen: bool = False,
@@ -255,6 +260,7 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
 
             else:
                 raise ValueError(f"发布失败，未找到对应的应用信息[{app_code}]")
+        invalidate_agent_blueprints(app_code)
         return await self.app_detail(app_code=app_code)
 
     def get_apps_by_codes(self, app_codes: List[str]):
@@ -802,6 +808,7 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
             "app_code": app_code
         }
         self.dao.delete(query_request)
+        invalidate_agent_blueprints(app_code)
     def delete(self, request: ServeRequest) -> None:
         """Delete a App entity
 
@@ -817,6 +824,10 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
             query_request["app_name"] = request.app_name
 
         self.dao.delete(query_request)
+        if request.app_code:
+            invalidate_agent_blueprints(request.app_code)
+        else:
+            get_agent_blueprint_cache().clear()
 
     def get_list(self, request: ServeRequest) -> List[ServerResponse]:
         """Get a list of App entities
@@ -39,3 +39,19 @@ class ServeConfig(BaseServeConfig):
         default=10,
         metadata={"help": _("knowledge search top k")},
     )
+    concurrency: Optional[int] = field(
+        default=4,
+        metadata={
+            "help": _("The max number of dataset rows evaluated at the same time")
+        },
+    )
+    checkpoint_dir: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": _(
+                "The directory of the evaluation checkpoints, a failed evaluation "
+                "resumes from its evaluated rows. Default is the "
+                "evaluation_checkpoints directory in the data directory"
+            )
+        },
+    )
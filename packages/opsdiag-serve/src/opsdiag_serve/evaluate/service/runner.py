@@ -0,0 +1,141 @@
+"""The runner of the evaluations.
+
+The rows of a dataset are evaluated concurrently, and the results of each row are
+appended to a checkpoint file as soon as they are ready. A failed evaluation
+submitted again only evaluates the rows without results.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from opsdiag._private.pydantic import model_to_dict
+from opsdiag.core.interface.evaluation import (
+    EvaluationMetric,
+    EvaluationResult,
+    Evaluator,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_json(value: Any) -> str:
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class EvaluationCheckpoint:
+    """The results of the evaluated rows, stored in a JSON lines file.
+
+    A line is written for each row, a broken last line (the process is killed while
+    writing it) is ignored when the file is loaded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._results: Dict[int, List[EvaluationResult]] = {}
+        self._lock = asyncio.Lock()
+        self._load()
+
+    @classmethod
+    def from_run(
+        cls, checkpoint_dir: str, run_key: Dict[str, Any]
+    ) -> "EvaluationCheckpoint":
+        """Create the checkpoint of a run, the same run has the same checkpoint."""
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        return cls(os.path.join(checkpoint_dir, f"{_hash_json(run_key)}.jsonl"))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._results[record["index"]] = [
+                        EvaluationResult(**result) for result in record["results"]
+                    ]
+                except Exception as e:
+                    logger.warning(f"Skip the broken checkpoint of {self.path}: {e}")
+        logger.info(f"Load {len(self._results)} evaluated rows from {self.path}")
+
+    def get(self, index: int) -> Optional[List[EvaluationResult]]:
+        """Get the results of a row, None if it is not evaluated."""
+        return self._results.get(index)
+
+    async def save(self, index: int, results: List[EvaluationResult]):
+        """Append the results of a row."""
+        self._results[index] = results
+        line = json.dumps(
+            {"index": index, "results": [model_to_dict(r) for r in results]},
+            ensure_ascii=False,
+            default=str,
+        )
+        async with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def remove(self):
+        """Remove the checkpoint file, the run is finished."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class EvaluationRunner:
+    """Run an evaluator on the rows of a dataset concurrently.
+
+    Each row is prepared (e.g. its contexts are fetched) and evaluated in a task,
+    at most ``concurrency`` rows at the same time. The results are returned in the
+    order of the rows.
+    """
+
+    def __init__(
+        self,
+        evaluator: Evaluator,
+        metrics: List[EvaluationMetric],
+        concurrency: int = 4,
+        prepare_row: Optional[Callable[[dict], Awaitable[None]]] = None,
+        checkpoint: Optional[EvaluationCheckpoint] = None,
+    ):
+        self._evaluator = evaluator
+        self._metrics = metrics
+        self._concurrency = max(concurrency, 1)
+        self._prepare_row = prepare_row
+        self._checkpoint = checkpoint
+
+    async def run(self, datasets: List[dict]) -> List[List[EvaluationResult]]:
+        """Evaluate the rows, the finished rows of the checkpoint are skipped."""
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def _run_row(index: int, row: dict) -> List[EvaluationResult]:
+            if self._checkpoint:
+                results = self._checkpoint.get(index)
+                if results is not None:
+                    return results
+            async with semaphore:
+                if self._prepare_row:
+                    await self._prepare_row(row)
+                row_results = await self._evaluator.evaluate(
+                    [row], metrics=self._metrics, parallel_num=1
+                )
+                results = row_results[0] if row_results else []
+                if self._checkpoint:
+                    await self._checkpoint.save(index, results)
+                return results
+
+        tasks = [
+            asyncio.create_task(_run_row(index, row))
+            for index, row in enumerate(datasets)
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        if self._checkpoint:
+            self._checkpoint.remove()
+        return list(results)
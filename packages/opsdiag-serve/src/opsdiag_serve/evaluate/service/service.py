@@ -1,8 +1,10 @@
 import logging
+import os
 from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
 from opsdiag.component import ComponentType, SystemApp
+from opsdiag.configs.model_config import DATA_DIR
 from opsdiag.core.interface.evaluation import (
     EVALUATE_FILE_COL_ANSWER,
     EvaluationResult,
@@ -20,13 +22,14 @@ from opsdiag_serve.rag.operators.knowledge_space import SpaceRetrieverOperator
 
 from ...agent.agents.controller import multi_agents
 from ...agent.evaluation.evaluation import AgentEvaluator, AgentOutputOperator
-from ...core import BaseService
+from ...core import BaseService, blocking_func_to_async
 from ...prompt.service.service import Service as PromptService
 from ...rag.connector import VectorStoreConnector
 from ...rag.service.service import Service as RagService
 from ..api.schemas import EvaluateServeRequest, EvaluateServeResponse, EvaluationScene
 from ..config import SERVE_SERVICE_COMPONENT_NAME, ServeConfig
 from ..models.models import ServeDao, ServeEntity
+from .runner import EvaluationCheckpoint, EvaluationRunner
 
 logger = logging.getLogger(__name__)
 
@@ -81,21 +84,38 @@ class Service(BaseService[ServeEntity, EvaluateServeRequest, EvaluateServeRespon
         datasets: List[dict],
         context: Optional[dict] = None,
         evaluate_metrics: Optional[List[str]] = None,
-        parallel_num: Optional[int] = 1,
+        parallel_num: Optional[int] = None,
     ) -> List[List[EvaluationResult]]:
         """Evaluate results
 
+        The rows are evaluated concurrently and checkpointed, an evaluation which
+        failed resumes from its evaluated rows when it is run again.
+
         Args:
             scene_key (str): The scene_key
             scene_value (str): The scene_value
             datasets (List[dict]): The datasets
             context (Optional[dict]): The run context
             evaluate_metrics (Optional[str]): The metric_names
-            parallel_num (Optional[int]): The parallel_num
+            parallel_num (Optional[int]): The max number of rows evaluated at the
+                same time, defaults to the concurrency of the config
 
         Returns:
             List[List[EvaluationResult]]: The response
         """
+        # Computed before the rows are prepared
+        checkpoint = EvaluationCheckpoint.from_run(
+            self._serve_config.checkpoint_dir
+            or os.path.join(DATA_DIR, "evaluation_checkpoints"),
+            {
+                "scene_key": scene_key,
+                "scene_value": scene_value,
+                "datasets": datasets,
+                "context": context,
+                "evaluate_metrics": evaluate_metrics,
+            },
+        )
+        concurrency = parallel_num or self._serve_config.concurrency or 1
 
         results = []
         if EvaluationScene.RECALL.value == scene_key:
@@ -133,15 +153,22 @@ class Service(BaseService[ServeEntity, EvaluateServeRequest, EvaluateServeRespon
                 else:
                     metrics.append(metric_manage.get_by_name(name)())
 
-            for dataset in datasets:
-                chunks = self.rag_service.get_chunk_list(
-                    {"doc_name": dataset.get("doc_name")}
+            async def _fetch_contexts(dataset: dict):
+                chunks = await blocking_func_to_async(
+                    self._system_app,
+                    self.rag_service.get_chunk_list,
+                    {"doc_name": dataset.get("doc_name")},
                 )
-                contexts = [chunk.content for chunk in chunks]
-                dataset["contexts"] = contexts
-            results = await evaluator.evaluate(
-                datasets, metrics=metrics, parallel_num=parallel_num
+                dataset["contexts"] = [chunk.content for chunk in chunks]
+
+            runner = EvaluationRunner(
+                evaluator,
+                metrics,
+                concurrency=concurrency,
+                prepare_row=_fetch_contexts,
+                checkpoint=checkpoint,
             )
+            results = await runner.run(datasets)
         elif EvaluationScene.APP.value == scene_key:
             evaluator = AgentEvaluator(
                 operator_cls=AgentOutputOperator,
@@ -151,6 +178,7 @@ class Service(BaseService[ServeEntity, EvaluateServeRequest, EvaluateServeRespon
             )
 
             metrics = []
+            fetch_knowledge = False
             metric_name_list = evaluate_metrics
             for name in metric_name_list:
                 if name == AnswerRelevancyMetric.name():
@@ -166,14 +194,23 @@ class Service(BaseService[ServeEntity, EvaluateServeRequest, EvaluateServeRespon
                             prompt_template=prompt.template,
                         )
                     )
-                    for dataset in datasets:
-                        context = await multi_agents.get_knowledge_resources(
-                            app_code=scene_value, question=dataset.get("query")
-                        )
-                        dataset[EVALUATE_FILE_COL_ANSWER] = context
+                    fetch_knowledge = True
                 else:
                     metrics.append(metric_manage.get_by_name(name)())
-            results = await evaluator.evaluate(
-                dataset=datasets, metrics=metrics, parallel_num=parallel_num
+
+            async def _fetch_knowledge(dataset: dict):
+                if fetch_knowledge:
+                    knowledge = await multi_agents.get_knowledge_resources(
+                        app_code=scene_value, question=dataset.get("query")
+                    )
+                    dataset[EVALUATE_FILE_COL_ANSWER] = knowledge
+
+            runner = EvaluationRunner(
+                evaluator,
+                metrics,
+                concurrency=concurrency,
+                prepare_row=_fetch_knowledge,
+                checkpoint=checkpoint,
             )
+            results = await runner.run(datasets)
         return results
@@ -0,0 +1,148 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from opsdiag.core import Embeddings
+from opsdiag.core.interface.evaluation import EvaluationResult, Evaluator
+from opsdiag.rag.evaluation import RetrieverSimilarityMetric
+
+from ..service.runner import EvaluationCheckpoint, EvaluationRunner
+
+
+class FakeEvaluator(Evaluator):
+    """Answer each row after a short delay, fail the rows in ``fail_rows``."""
+
+    def __init__(self, fail_rows=()):
+        super().__init__()
+        self.fail_rows = set(fail_rows)
+        self.evaluated: List[str] = []
+        self.running = 0
+        self.max_running = 0
+
+    async def evaluate(self, dataset, metrics=None, parallel_num=1, **kwargs):
+        row = dataset[0]
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+            if row["query"] in self.fail_rows:
+                raise RuntimeError(f"Evaluate {row['query']} failed")
+            self.evaluated.append(row["query"])
+            return [
+                [
+                    EvaluationResult(
+                        query=row["query"],
+                        prediction=row.get("contexts"),
+                        score=1.0,
+                        metric_name="fake",
+                    )
+                ]
+            ]
+        finally:
+            self.running -= 1
+
+
+def _datasets(n: int):
+    return [{"query": f"q{i}", "doc_name": f"doc{i}"} for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_runner_bounded_concurrency():
+    evaluator = FakeEvaluator()
+    prepared = []
+
+    async def _prepare(row):
+        prepared.append(row["query"])
+        row["contexts"] = [f"context of {row['doc_name']}"]
+
+    runner = EvaluationRunner(evaluator, [], concurrency=3, prepare_row=_prepare)
+    results = await runner.run(_datasets(10))
+
+    assert [r[0].query for r in results] == [f"q{i}" for i in range(10)]
+    assert results[4][0].prediction == ["context of doc4"]
+    assert sorted(prepared) == sorted(f"q{i}" for i in range(10))
+    assert evaluator.max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_runner_resume_from_checkpoint(tmp_path):
+    run_key = {"scene_key": "recall", "datasets": _datasets(6)}
+    checkpoint = EvaluationCheckpoint.from_run(str(tmp_path), run_key)
+    evaluator = FakeEvaluator(fail_rows={"q4"})
+    runner = EvaluationRunner(evaluator, [], concurrency=2, checkpoint=checkpoint)
+    with pytest.raises(RuntimeError):
+        await runner.run(_datasets(6))
+    assert "q0" in evaluator.evaluated
+
+    # Submitted again, only the rows without results are evaluated
+    checkpoint = EvaluationCheckpoint.from_run(str(tmp_path), run_key)
+    done = {i for i in range(6) if checkpoint.get(i) is not None}
+    assert 0 in done and 4 not in done
+    evaluator = FakeEvaluator()
+    runner = EvaluationRunner(evaluator, [], concurrency=2, checkpoint=checkpoint)
+    results = await runner.run(_datasets(6))
+
+    assert [r[0].query for r in results] == [f"q{i}" for i in range(6)]
+    assert sorted(evaluator.evaluated) == sorted(
+        f"q{i}" for i in range(6) if i not in done
+    )
+    # The checkpoint is removed when the run is finished
+    assert not list(tmp_path.iterdir())
+
+
+def test_checkpoint_ignores_broken_line(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    checkpoint = EvaluationCheckpoint(path)
+    asyncio.run(checkpoint.save(0, [EvaluationResult(query="q0", score=0.5)]))
+    with open(path, "a") as f:
+        f.write('{"index": 1, "resu')
+
+    checkpoint = EvaluationCheckpoint(path)
+    assert checkpoint.get(0)[0].score == 0.5
+    assert checkpoint.get(1) is None
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self):
+        self.document_calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.document_calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), 1.0]
+
+
+class FakeRetrieverEvaluator(Evaluator):
+    """Retrieve fake chunks and compute the metrics like the retriever evaluator."""
+
+    async def evaluate(self, dataset, metrics=None, parallel_num=1, **kwargs):
+        row = dataset[0]
+        await asyncio.sleep(0.01)
+        prediction = [f"chunk {i} of {row['query'][-1]}" for i in range(3)]
+        results = await asyncio.gather(
+            *[metric.compute(prediction, row["contexts"]) for metric in metrics]
+        )
+        return [
+            [
+                EvaluationResult(query=row["query"], score=result.score)
+                for result in results
+            ]
+        ]
+
+
+@pytest.mark.asyncio
+async def test_runner_batches_similarity_embeddings():
+    embeddings = FakeEmbeddings()
+    metric = RetrieverSimilarityMetric(embeddings=embeddings)
+    datasets = [{"query": f"q{i}", "contexts": [f"context {i}"]} for i in range(20)]
+
+    runner = EvaluationRunner(FakeRetrieverEvaluator(), [metric], concurrency=10)
+    results = await runner.run(datasets)
+
+    assert [r[0].query for r in results] == [d["query"] for d in datasets]
+    assert all(r[0].score is not None for r in results)
+    # The chunks of the concurrent rows are embedded together
+    assert embeddings.document_calls < len(datasets)
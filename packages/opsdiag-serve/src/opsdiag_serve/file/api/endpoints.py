@@ -4,9 +4,9 @@ from functools import cache
 from typing import List, Optional
 from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile
 from fastapi.security.http import HTTPAuthorizationCredentials, HTTPBearer
-from starlette.responses import StreamingResponse
+from starlette.responses import Response, StreamingResponse
 
 from opsdiag.component import SystemApp
 from opsdiag_serve.core import Result, blocking_func_to_async
@@ -129,10 +129,35 @@ async def upload_files(
 
 @router.get("/files/{bucket}/{file_id}", dependencies=[Depends(check_api_key)])
 async def download_file(
-    bucket: str, file_id: str, service: Service = Depends(get_service)
+    bucket: str,
+    file_id: str,
+    request: Request,
+    service: Service = Depends(get_service),
 ):
-    """Download a file by file_id."""
+    """Download a file by file_id.
+
+    A single byte range can be requested with the Range header.
+    """
     logger.info(f"download_file: bucket={bucket}, file_id={file_id}")
+    range_header = request.headers.get("range")
+    if range_header:
+        data, content_range = await blocking_func_to_async(
+            global_system_app,
+            service.download_file_range,
+            bucket,
+            file_id,
+            range_header,
+        )
+        return Response(
+            content=data,
+            status_code=206,
+            media_type="application/octet-stream",
+            headers={
+                "Accept-Ranges": "bytes",
+                "Content-Range": content_range,
+            },
+        )
+
     file_data, file_metadata = await blocking_func_to_async(
         global_system_app, service.download_file, bucket, file_id
     )
@@ -151,6 +176,7 @@ async def download_file(
     response.headers["Content-Disposition"] = (
         f"attachment; filename={file_name_encoded}"
     )
+    response.headers["Accept-Ranges"] = "bytes"
 
     # Test
     if file_metadata.file_name.endswith(".svg"):
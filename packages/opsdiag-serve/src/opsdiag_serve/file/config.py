@@ -48,6 +48,15 @@ class ServeConfig(BaseServeConfig):
         default=True,
         metadata={"help": _("Check the hash of the file when downloading")},
     )
+    deduplicate: Optional[bool] = field(
+        default=False,
+        metadata={
+            "help": _(
+                "Store the same file data only once in a bucket, the files with the "
+                "same content share it"
+            )
+        },
+    )
     host: Optional[str] = field(
         default=None, metadata={"help": _("The host of the file server")}
     )
@@ -69,6 +78,15 @@ class ServeConfig(BaseServeConfig):
     transfer_timeout: Optional[int] = field(
         default=360, metadata={"help": _("The timeout when transferring the file")}
     )
+    cache_max_size: Optional[int] = field(
+        default=1024 * 1024 * 1024,
+        metadata={
+            "help": _(
+                "The max size in bytes of the files of other nodes cached locally, "
+                "0 to disable the cache"
+            )
+        },
+    )
     local_storage_path: Optional[str] = field(
         default=None, metadata={"help": _("The local storage path")}
     )
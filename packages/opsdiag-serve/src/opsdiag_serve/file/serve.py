@@ -95,6 +95,7 @@ class Serve(BaseServe):
             save_chunk_size=self._serve_config.save_chunk_size,
             transfer_chunk_size=self._serve_config.transfer_chunk_size,
             transfer_timeout=self._serve_config.transfer_timeout,
+            cache_max_size=self._serve_config.cache_max_size,
         )
         storage_backends = {
             simple_distributed_storage.storage_type: simple_distributed_storage,
@@ -112,6 +113,7 @@ class Serve(BaseServe):
             storage_backends,
             metadata_storage=storage,
             check_hash=self._serve_config.check_hash,
+            deduplicate=self._serve_config.deduplicate,
         )
         self._file_storage_client = FileStorageClient(
             system_app=self._system_app,
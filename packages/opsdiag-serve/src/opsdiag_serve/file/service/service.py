@@ -115,6 +115,45 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
         """Download a file by file_id."""
         return self.file_storage_client.get_file_by_id(bucket, file_id)
 
+    def download_file_range(
+        self, bucket: str, file_id: str, range_header: str
+    ) -> Tuple[bytes, str]:
+        """Download a byte range of a file by file_id.
+
+        Args:
+            bucket (str): The bucket name
+            file_id (str): The file id
+            range_header (str): The value of the HTTP Range header, e.g. "bytes=0-99"
+
+        Returns:
+            Tuple[bytes, str]: The data and the value of its Content-Range header
+        """
+        metadata = self.file_storage_client.storage_system.get_file_metadata(
+            bucket, file_id
+        )
+        if not metadata:
+            raise HTTPException(
+                status_code=404,
+                detail=f"File metadata not found: bucket={bucket}, file_id={file_id}",
+            )
+        file_size = _known_size(metadata.file_size)
+        byte_range = _parse_range(range_header, file_size)
+        if byte_range:
+            start, end = byte_range
+            data = self.file_storage_client.get_file_range(
+                metadata.uri, start, end - start + 1
+            )
+            # The start may be out of the file if its size is unknown
+            if data:
+                return data, (
+                    f"bytes {start}-{start + len(data) - 1}/{_format_size(file_size)}"
+                )
+        raise HTTPException(
+            status_code=416,
+            detail=f"Invalid range: {range_header}",
+            headers={"Content-Range": f"bytes */{_format_size(file_size)}"},
+        )
+
     def delete_file(self, bucket: str, file_id: str) -> None:
         """Delete a file by file_id."""
         self.file_storage_client.delete_file_by_id(bucket, file_id)
@@ -149,3 +188,52 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
             user_name=metadata.user_name,
             sys_code=metadata.sys_code,
         )
+
+
+def _known_size(file_size: Optional[int]) -> Optional[int]:
+    """The file size, None if it is unknown, e.g. "-1" of the old files."""
+    return file_size if file_size is not None and file_size >= 0 else None
+
+
+def _format_size(file_size: Optional[int]) -> str:
+    """The complete length of a Content-Range header."""
+    return "*" if file_size is None else str(file_size)
+
+
+def _parse_range(
+    range_header: str, file_size: Optional[int]
+) -> Optional[Tuple[int, int]]:
+    """Parse a single range of an HTTP Range header.
+
+    If the file size is unknown, only the ranges with both positions are supported.
+
+    Returns:
+        Optional[Tuple[int, int]]: The first and the last byte position, None if the
+            range is invalid or not satisfiable
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start_str, sep, end_str = ranges.strip().partition("-")
+    if not sep:
+        return None
+    if file_size is None:
+        try:
+            start, end = int(start_str), int(end_str)
+        except ValueError:
+            return None
+        return (start, end) if 0 <= start <= end else None
+    try:
+        if not start_str:
+            # The suffix range, e.g. "bytes=-500" for the last 500 bytes
+            suffix = int(end_str)
+            if suffix <= 0:
+                return None
+            return max(file_size - suffix, 0), file_size - 1
+        start = int(start_str)
+        end = int(end_str) if end_str else file_size - 1
+    except ValueError:
+        return None
+    if start < 0 or start > end or start >= file_size:
+        return None
+    return start, min(end, file_size - 1)
@@ -1,6 +1,8 @@
 import pytest
+from fastapi import HTTPException
 
 from opsdiag.component import SystemApp
+from opsdiag.core.interface.file import FileMetadata
 from opsdiag.storage.metadata import db
 from opsdiag_serve.core.tests.conftest import (  # noqa: F401
     asystem_app,
@@ -8,7 +10,8 @@ from opsdiag_serve.core.tests.conftest import (  # noqa: F401
     system_app,
 )
 
-from ..service.service import Service
+from ..config import ServeConfig
+from ..service.service import Service, _parse_range
 
 
 @pytest.fixture(autouse=True)
@@ -76,3 +79,102 @@ def test_service_get_list_by_page(service: Service):
 
 
 # Add more test cases according to your own logic
+
+
+@pytest.mark.parametrize(
+    "range_header, expected",
+    [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=90-", (90, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=-200", (0, 99)),
+        ("bytes=95-200", (95, 99)),
+        ("bytes=100-", None),
+        ("bytes=9-0", None),
+        ("bytes=0-1,5-6", None),
+        ("items=0-9", None),
+        ("bytes=a-b", None),
+    ],
+)
+def test_parse_range(range_header, expected):
+    assert _parse_range(range_header, 100) == expected
+
+
+@pytest.mark.parametrize(
+    "range_header, expected",
+    [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=95-200", (95, 200)),
+        ("bytes=90-", None),
+        ("bytes=-10", None),
+        ("bytes=9-0", None),
+    ],
+)
+def test_parse_range_unknown_size(range_header, expected):
+    assert _parse_range(range_header, None) == expected
+
+
+@pytest.fixture
+def range_service(system_app: SystemApp):
+    return Service(system_app, ServeConfig())
+
+
+class _StorageClient:
+    def __init__(self, data: bytes, file_size: int):
+        self.data = data
+        self.storage_system = self
+        self.metadata = FileMetadata(
+            file_id="f",
+            bucket="b",
+            file_name="f.txt",
+            file_size=file_size,
+            storage_type="local",
+            storage_path="/tmp/f.txt",
+            uri="opsdiag-fs://local/b/f",
+            custom_metadata={},
+            file_hash="",
+        )
+
+    def get_file_metadata(self, bucket, file_id):
+        return self.metadata
+
+    def get_file_range(self, uri, offset, length):
+        return self.data[offset : offset + length]
+
+
+@pytest.mark.parametrize(
+    "file_size, range_header, expected_data, content_range",
+    [
+        (10, "bytes=2-4", b"234", "bytes 2-4/10"),
+        (10, "bytes=-3", b"789", "bytes 7-9/10"),
+        # The old files have an unknown size
+        (-1, "bytes=8-20", b"89", "bytes 8-9/*"),
+    ],
+)
+def test_download_file_range(
+    range_service: Service,
+    monkeypatch,
+    file_size,
+    range_header,
+    expected_data,
+    content_range,
+):
+    storage_client = _StorageClient(b"0123456789", file_size)
+    monkeypatch.setattr(
+        Service, "file_storage_client", property(lambda _: storage_client)
+    )
+    assert range_service.download_file_range("b", "f", range_header) == (
+        expected_data,
+        content_range,
+    )
+
+
+def test_download_file_range_unsatisfiable(range_service: Service, monkeypatch):
+    storage_client = _StorageClient(b"0123456789", -1)
+    monkeypatch.setattr(
+        Service, "file_storage_client", property(lambda _: storage_client)
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        range_service.download_file_range("b", "f", "bytes=20-30")
+    assert exc_info.value.status_code == 416
+    assert exc_info.value.headers["Content-Range"] == "bytes */*"
@@ -37,6 +37,10 @@ class ServeConfig(BaseServeConfig):
         default=5,
         metadata={"help": _("Interval to load derisks from installed packages")},
     )
+    load_dag_concurrency: int = field(
+        default=8,
+        metadata={"help": _("The max number of the DAGs built concurrently")},
+    )
     encrypt_key: Optional[str] = field(
         default=None, metadata={"help": _("The key to encrypt the data")}
     )
@@ -4,7 +4,7 @@ You can define your own models and DAOs here
 
 import json
 from datetime import datetime
-from typing import Any, Dict, Union
+from typing import Any, Dict, List, Union
 
 from sqlalchemy import Column, DateTime, Integer, String, Text, UniqueConstraint
 
@@ -316,6 +316,34 @@ class ServeDao(BaseDao[ServeEntity, ServeRequest, ServerResponse]):
             session.commit()
             return self.get_one(query_request)
 
+    def update_states(
+        self, uids: List[str], state: State, error_message: str = ""
+    ) -> int:
+        """Update the state of the flows in one transaction.
+
+        Args:
+            uids (List[str]): The uids of the flows
+            state (State): The new state
+            error_message (str): The new error message
+
+        Returns:
+            int: The number of the updated flows
+        """
+        if not uids:
+            return 0
+        with self.session() as session:
+            return (
+                session.query(ServeEntity)
+                .filter(ServeEntity.uid.in_(uids))
+                .update(
+                    {
+                        ServeEntity.state: state.value,
+                        ServeEntity.error_message: error_message[:500],
+                    },
+                    synchronize_session=False,
+                )
+            )
+
 
 class VariablesDao(BaseDao[VariablesEntity, VariablesRequest, VariablesResponse]):
     """The DAO class for Variables"""
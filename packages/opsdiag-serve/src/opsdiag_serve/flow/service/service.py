@@ -1,13 +1,16 @@
+import hashlib
 import json
 import logging
 import os
-from typing import AsyncIterator, List, Optional, cast
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union, cast
 
 import schedule
 from fastapi import HTTPException
 
 from opsdiag._private.config import Config
-from opsdiag._private.pydantic import model_to_json
+from opsdiag._private.pydantic import model_to_dict, model_to_json
 from opsdiag.agent import AgentDummyTrigger
 from opsdiag.component import SystemApp
 from opsdiag.core.awel import DAG, BaseOperator, CommonLLMHttpRequestBody
@@ -46,6 +49,22 @@ logger = logging.getLogger(__name__)
 CFG = Config()
 
 
+def _flow_definition_hash(flow: ServeRequest) -> Optional[str]:
+    """The hash of the definition of a json flow, None for the other flows."""
+    if flow.define_type != "json" or not flow.flow_data:
+        return None
+    definition = {
+        "name": flow.name,
+        "label": flow.label,
+        "description": flow.description,
+        "version": flow.version,
+        "flow_data": model_to_dict(flow.flow_data),
+        "variables": [model_to_dict(v) for v in flow.variables or []],
+    }
+    data = json.dumps(definition, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
 class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
     """The service class for Flow"""
 
@@ -59,6 +78,11 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
         self._dao: ServeDao = dao
         self._flow_factory: FlowFactory = FlowFactory()
         self._derisks_loader: Optional[DERISKsLoader] = None
+        # The last built DAG of each flow: uid -> (cache key, DAG)
+        self._dag_cache: Dict[str, Tuple[str, DAG]] = {}
+        self._dag_cache_lock = threading.Lock()
+        # The definition hash of the flows loaded from derisks: uid -> hash
+        self._loaded_hashes: Dict[str, str] = {}
 
         super().__init__(system_app)
 
@@ -142,7 +166,7 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
         try:
             # Build DAG from request
             if request.define_type == "json":
-                dag = self._flow_factory.build(request)
+                dag = self._build_dag(request)
             else:
                 dag = request.flow_dag
             request.dag_id = dag.dag_id
@@ -199,27 +223,86 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
                     f"from db error: {str(e)}"
                 )
 
+    def _dag_cache_key(self, flow: ServeRequest) -> str:
+        return json.dumps(
+            [
+                _flow_definition_hash(flow),
+                self._flow_factory.get_dag_id(flow),
+                flow.user_name,
+                flow.sys_code,
+            ]
+        )
+
+    def _build_dag(self, flow: ServeRequest) -> DAG:
+        """Build the DAG of a json flow.
+
+        The DAG is reused if the flow is built again without changes, e.g. it is
+        validated and then saved by :meth:`update_flow`.
+        """
+        uid = flow.uid
+        cache_key = self._dag_cache_key(flow)
+        with self._dag_cache_lock:
+            cached = self._dag_cache.get(uid)
+        if cached and cached[0] == cache_key:
+            return cached[1]
+        dag = self._flow_factory.build(flow)
+        with self._dag_cache_lock:
+            self._dag_cache[uid] = (cache_key, dag)
+        return dag
+
+    def _build_dags(self, flows: List[ServeRequest]) -> List[Union[DAG, Exception]]:
+        """Build the DAGs of the json flows concurrently.
+
+        Returns:
+            List[Union[DAG, Exception]]: The DAG of each flow, or the error of the
+                failed build.
+        """
+
+        def _build(flow: ServeRequest) -> Union[DAG, Exception]:
+            try:
+                return self._build_dag(flow)
+            except Exception as e:
+                return e
+
+        concurrency = min(self._serve_config.load_dag_concurrency, len(flows))
+        if concurrency <= 1:
+            return [_build(flow) for flow in flows]
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="flow-dag-builder"
+        ) as executor:
+            return list(executor.map(_build, flows))
+
     def load_dag_from_db(self):
-        """Load DAG from db"""
-        entities = self.dao.get_list({})
-        for entity in entities:
+        """Load DAG from db
+
+        The DAGs are built concurrently, and the states of the loaded flows are
+        updated in one transaction.
+        """
+        entities = [
+            entity for entity in self.dao.get_list({}) if entity.define_type == "json"
+        ]
+        dags = self._build_dags(entities)
+        running_uids = []
+        for entity, dag in zip(entities, dags):
             try:
-                if entity.define_type != "json":
-                    continue
-                dag = self._flow_factory.build(entity)
+                if isinstance(dag, Exception):
+                    raise dag
                 if entity.state in [State.DEPLOYED, State.RUNNING] or (
                     entity.version == "0.1.0" and entity.state == State.INITIALIZING
                 ):
                     # Register the DAG
                     self.dag_manager.register_dag(dag, entity.uid)
-                    # Update state to RUNNING
-                    entity.state = State.RUNNING
-                    entity.error_message = ""
-                    self.dao.update({"uid": entity.uid}, entity)
+                    def_hash = _flow_definition_hash(entity)
+                    if def_hash:
+                        self._loaded_hashes[entity.uid] = def_hash
+                    if entity.state != State.RUNNING or entity.error_message:
+                        running_uids.append(entity.uid)
             except Exception as e:
                 logger.warning(
                     f"Load DAG({entity.name}, {entity.dag_id}) from db error: {str(e)}"
                 )
+        # Update state to RUNNING
+        self.dao.update_states(running_uids, State.RUNNING)
 
     def _pre_load_dag_from_derisks(self):
         """Pre load DAG from derisks"""
@@ -234,22 +317,61 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
                     f"derisks error: {str(e)}"
                 )
 
+    def _need_load_from_derisks(
+        self, flow: ServeRequest, exist_inst: ServerResponse, is_first_load: bool
+    ) -> bool:
+        """Whether to update the existing flow with the flow of derisks."""
+        if exist_inst.state != State.RUNNING:
+            return True
+        def_hash = _flow_definition_hash(flow)
+        if def_hash is None:
+            # Not a json flow, the definition can't be compared
+            return is_first_load
+        loaded_hash = self._loaded_hashes.get(exist_inst.uid)
+        if loaded_hash is None:
+            return is_first_load
+        # The running flow is reloaded only if its definition is changed
+        return loaded_hash != def_hash
+
     def load_dag_from_derisks(self, is_first_load: bool = False):
-        """Load DAG from derisks"""
-        flows = self.derisks_loader.get_flows()
+        """Load DAG from derisks
+
+        Only the new flows, the changed flows and the flows not running are loaded,
+        and their DAGs are built concurrently before saving them one by one.
+        """
+        flows = [
+            flow
+            for flow in self.derisks_loader.get_flows()
+            if not (flow.define_type == "python" and flow.flow_dag is None)
+        ]
+        if not flows:
+            return
+        exist_insts = {inst.name: inst for inst in self.dao.get_list({})}
+        to_load: List[Tuple[ServeRequest, Optional[ServerResponse]]] = []
         for flow in flows:
-            try:
-                if flow.define_type == "python" and flow.flow_dag is None:
+            exist_inst = exist_insts.get(flow.name)
+            if exist_inst:
+                if not self._need_load_from_derisks(flow, exist_inst, is_first_load):
                     continue
+                # TODO check version, must be greater than the exist one
+                flow.uid = exist_inst.uid
+            to_load.append((flow, exist_inst))
+        if not to_load:
+            return
+
+        # Warm up the DAG cache, the errors are handled when saving the flows
+        self._build_dags([flow for flow, _ in to_load if flow.define_type == "json"])
+        for flow, exist_inst in to_load:
+            try:
                 # Set state to DEPLOYED
                 flow.state = State.DEPLOYED
-                exist_inst = self.dao.get_one({"name": flow.name})
                 if not exist_inst:
                     self.create_and_save_dag(flow, save_failed_flow=True)
-                elif is_first_load or exist_inst.state != State.RUNNING:
-                    # TODO check version, must be greater than the exist one
-                    flow.uid = exist_inst.uid
+                else:
                     self.update_flow(flow, check_editable=False, save_failed_flow=True)
+                def_hash = _flow_definition_hash(flow)
+                if def_hash and self.dag_manager.get_dag(alias_name=flow.uid):
+                    self._loaded_hashes[flow.uid] = def_hash
             except Exception as e:
                 import traceback
 
@@ -278,7 +400,7 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
         try:
             # Try to build the dag from the request
             if request.define_type == "json":
-                dag = self._flow_factory.build(request)
+                dag = self._build_dag(request)
             else:
                 dag = request.flow_dag
             request.flow_category = self._parse_flow_category(dag)
@@ -369,9 +491,16 @@ class Service(BaseService[ServeEntity, ServeRequest, ServerResponse]):
             )
         try:
             if inst.dag_id:
+                registered_dag = self.dag_manager.get_dag(dag_id=inst.dag_id)
                 self.dag_manager.unregister_dag(inst.dag_id)
+                with self._dag_cache_lock:
+                    cached = self._dag_cache.get(uid)
+                    # Never register an unregistered DAG again
+                    if cached and cached[1] is registered_dag:
+                        del self._dag_cache[uid]
         except Exception as e:
             logger.warning(f"Unregister DAG({inst.dag_id}) error: {str(e)}")
+        self._loaded_hashes.pop(uid, None)
         self.dao.delete(query_request)
         return inst
 
@@ -1,5 +1,6 @@
 import pytest
 
+from opsdiag.core.awel.flow.flow_factory import State
 from opsdiag.storage.metadata import db
 from opsdiag_serve.core.tests.conftest import (  # noqa: F401
     asystem_app,
@@ -7,6 +8,7 @@ from opsdiag_serve.core.tests.conftest import (  # noqa: F401
     system_app,
 )
 
+from ..api.schemas import ServeRequest
 from ..config import ServeConfig
 from ..models.models import ServeDao, ServeEntity
 
@@ -100,3 +102,24 @@ def test_dao_get_list_page(dao):
 
 
 # Add more test cases according to your own logic
+
+
+def test_dao_update_states(dao):
+    for i in range(3):
+        dao.create(
+            ServeRequest(
+                uid=f"uid_{i}",
+                name=f"flow_{i}",
+                label=f"Flow {i}",
+                state=State.DEPLOYED,
+                error_message="error",
+            )
+        )
+    assert dao.update_states(["uid_0", "uid_1", "uid_x"], State.RUNNING) == 2
+    assert dao.update_states([], State.RUNNING) == 0
+    states = {flow.uid: flow for flow in dao.get_list({})}
+    assert states["uid_0"].state == State.RUNNING
+    assert states["uid_0"].error_message == ""
+    assert states["uid_1"].state == State.RUNNING
+    assert states["uid_2"].state == State.DEPLOYED
+    assert states["uid_2"].error_message == "error"
@@ -1,6 +1,11 @@
+import copy
+import threading
+
 import pytest
 
 from opsdiag.component import SystemApp
+from opsdiag.core.awel import DAG
+from opsdiag.core.awel.flow.flow_factory import FlowFactory, State
 from opsdiag.storage.metadata import db
 from opsdiag_serve.core.tests.conftest import (  # noqa: F401
     asystem_app,
@@ -8,6 +13,9 @@ from opsdiag_serve.core.tests.conftest import (  # noqa: F401
     system_app,
 )
 
+from ..api.schemas import ServeRequest
+from ..config import ServeConfig
+from ..models.models import ServeDao
 from ..service.service import Service
 
 
@@ -75,4 +83,110 @@ def test_service_get_list_by_page(service: Service):
     pass
 
 
+class _CountingFlowFactory(FlowFactory):
+    """Build empty DAGs and count the builds of each flow."""
+
+    def __init__(self):
+        super().__init__()
+        self.builds = {}
+        self._lock = threading.Lock()
+
+    def build(self, flow_panel):
+        with self._lock:
+            self.builds[flow_panel.name] = self.builds.get(flow_panel.name, 0) + 1
+        return DAG(self.get_dag_id(flow_panel))
+
+
+class _FakeDAGManager:
+    def __init__(self):
+        self.dags = {}
+
+    def register_dag(self, dag, alias_name=None):
+        self.dags[alias_name] = dag
+
+    def unregister_dag(self, dag_id):
+        self.dags = {k: v for k, v in self.dags.items() if v.dag_id != dag_id}
+
+    def get_dag(self, dag_id=None, alias_name=None):
+        if alias_name in self.dags:
+            return self.dags[alias_name]
+        return next((v for v in self.dags.values() if v.dag_id == dag_id), None)
+
+    def get_dag_metadata(self, dag_id, alias_name=None):
+        return None
+
+
+class _FakeDERISKsLoader:
+    def __init__(self, flows):
+        self.flows = flows
+
+    def get_flows(self):
+        return copy.deepcopy(self.flows)
+
+
+def _json_flow(name: str, description: str = "", **kwargs) -> ServeRequest:
+    return ServeRequest(
+        name=name,
+        label=name,
+        description=description,
+        define_type="json",
+        flow_data={"nodes": [], "edges": [], "viewport": {"x": 0, "y": 0, "zoom": 1}},
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def load_service(system_app: SystemApp):
+    config = ServeConfig(load_dag_concurrency=4)
+    instance = Service(system_app, config, dao=ServeDao(config))
+    instance._flow_factory = _CountingFlowFactory()
+    instance._dag_manager = _FakeDAGManager()
+    return instance
+
+
+def test_load_dag_from_db(load_service: Service):
+    dao = load_service.dao
+    dao.create(_json_flow("deployed", uid="uid_0", state=State.DEPLOYED))
+    dao.create(_json_flow("running", uid="uid_1", state=State.RUNNING))
+    dao.create(_json_flow("failed", uid="uid_2", state=State.LOAD_FAILED))
+
+    load_service.load_dag_from_db()
+    factory = load_service._flow_factory
+    assert factory.builds == {"deployed": 1, "running": 1, "failed": 1}
+    assert set(load_service.dag_manager.dags) == {"uid_0", "uid_1"}
+    states = {flow.uid: flow.state for flow in dao.get_list({})}
+    assert states == {
+        "uid_0": State.RUNNING,
+        "uid_1": State.RUNNING,
+        "uid_2": State.LOAD_FAILED,
+    }
+
+
+def test_load_dag_from_derisks_incremental(load_service: Service):
+    loader = _FakeDERISKsLoader([_json_flow(f"flow_{i}") for i in range(3)])
+    load_service._derisks_loader = loader
+    factory = load_service._flow_factory
+
+    load_service.load_dag_from_derisks(is_first_load=True)
+    # The DAG built concurrently is reused when the flow is saved
+    assert factory.builds == {"flow_0": 1, "flow_1": 1, "flow_2": 1}
+    assert len(load_service.dag_manager.dags) == 3
+    assert all(f.state == State.RUNNING for f in load_service.dao.get_list({}))
+
+    # Nothing changed, nothing is built
+    load_service.load_dag_from_derisks()
+    assert factory.builds == {"flow_0": 1, "flow_1": 1, "flow_2": 1}
+
+    # Only the changed flow is reloaded
+    loader.flows[1] = _json_flow("flow_1", description="changed")
+    load_service.load_dag_from_derisks()
+    assert factory.builds["flow_0"] == 1
+    assert factory.builds["flow_1"] > 1
+    assert factory.builds["flow_2"] == 1
+    flow = load_service.dao.get_one({"name": "flow_1"})
+    assert flow.description == "changed"
+    assert flow.state == State.RUNNING
+    assert load_service.dag_manager.get_dag(alias_name=flow.uid) is not None
+
+
 # Add more test cases according to your own logic
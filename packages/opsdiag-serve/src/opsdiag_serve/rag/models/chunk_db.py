@@ -232,6 +232,20 @@ class DocumentChunkDao(BaseDao):
         session.commit()
         session.close()
 
+    def get_chunks_by_chunk_ids(
+        self, chunk_ids: List[str]
+    ) -> List[DocumentChunkEntity]:
+        """Get the chunks by chunk ids in one query, in the order of the ids."""
+        if not chunk_ids:
+            return []
+        session = self.get_raw_session()
+        document_chunks = session.query(DocumentChunkEntity).filter(
+            DocumentChunkEntity.chunk_id.in_(chunk_ids)
+        )
+        result = {chunk.chunk_id: chunk for chunk in document_chunks.all()}
+        session.close()
+        return [result[chunk_id] for chunk_id in chunk_ids if chunk_id in result]
+
     def raw_delete(self, doc_id: str):
         session = self.get_raw_session()
         if doc_id is None:
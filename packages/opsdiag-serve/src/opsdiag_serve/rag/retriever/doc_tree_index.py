@@ -0,0 +1,123 @@
+"""The persistent header tree indexes of the knowledge spaces.
+
+Each space has a :class:`HeaderTreeIndex` file, updated when a document is synced
+or deleted. The indexes are kept in memory and reloaded when their file is
+changed by another process. A space without an index file (e.g. synced before the
+index existed) is indexed from its chunks once, on its first lookup.
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from opsdiag.configs.model_config import DATA_DIR
+from opsdiag.core import Chunk
+from opsdiag_ext.rag.retriever.doc_tree import HeaderTreeIndex
+
+logger = logging.getLogger(__name__)
+
+DOC_TREE_INDEX_DIR = os.path.join(DATA_DIR, "doc_tree_index")
+
+# Load the chunks of all the documents of a space: doc_id -> chunks
+DocumentsLoader = Callable[[], Dict[str, List[Chunk]]]
+
+
+class DocTreeIndexStore:
+    """Store the header tree index of each knowledge space in a file."""
+
+    def __init__(self, index_dir: str = DOC_TREE_INDEX_DIR):
+        self._index_dir = index_dir
+        self._lock = threading.Lock()
+        # knowledge_id -> (index, mtime of its file)
+        self._indexes: Dict[str, Tuple[HeaderTreeIndex, float]] = {}
+        self._space_locks: Dict[str, threading.Lock] = {}
+
+    def _path(self, knowledge_id: str) -> str:
+        return os.path.join(self._index_dir, f"{knowledge_id}.json")
+
+    def _space_lock(self, knowledge_id: str) -> threading.Lock:
+        with self._lock:
+            return self._space_locks.setdefault(knowledge_id, threading.Lock())
+
+    def _mtime(self, knowledge_id: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._path(knowledge_id))
+        except OSError:
+            return None
+
+    def _load(self, knowledge_id: str) -> Optional[HeaderTreeIndex]:
+        mtime = self._mtime(knowledge_id)
+        cached = self._indexes.get(knowledge_id)
+        if cached and cached[1] == mtime:
+            return cached[0]
+        if mtime is None:
+            return None
+        try:
+            index = HeaderTreeIndex.load(self._path(knowledge_id))
+        except Exception as e:
+            logger.warning(f"Rebuild the broken doc tree index of {knowledge_id}: {e}")
+            return None
+        self._indexes[knowledge_id] = (index, mtime)
+        return index
+
+    def _save(self, knowledge_id: str, index: HeaderTreeIndex):
+        path = self._path(knowledge_id)
+        index.save(path)
+        self._indexes[knowledge_id] = (index, os.path.getmtime(path))
+
+    def get(self, knowledge_id: str, loader: DocumentsLoader) -> HeaderTreeIndex:
+        """Get the index of a space, build it with the loader if there is none."""
+        with self._space_lock(knowledge_id):
+            index = self._load(knowledge_id)
+            if index is None:
+                index = HeaderTreeIndex()
+                for doc_id, chunks in loader().items():
+                    index.upsert_document(doc_id, chunks)
+                self._save(knowledge_id, index)
+                logger.info(
+                    f"Build the doc tree index of {knowledge_id} with "
+                    f"{index.document_count} documents"
+                )
+            return index
+
+    def upsert_document(
+        self,
+        knowledge_id: str,
+        doc_id: str,
+        chunks: Iterable[Chunk],
+        loader: DocumentsLoader,
+    ):
+        """Index the chunks of a synced document."""
+        index = self.get(knowledge_id, loader)
+        with self._space_lock(knowledge_id):
+            index.upsert_document(doc_id, chunks)
+            self._save(knowledge_id, index)
+
+    def remove_document(self, knowledge_id: str, doc_id: str):
+        """Remove a deleted document, nothing to do if the space is not indexed."""
+        with self._space_lock(knowledge_id):
+            index = self._load(knowledge_id)
+            if index is not None and index.remove_document(doc_id):
+                self._save(knowledge_id, index)
+
+    def drop(self, knowledge_id: str):
+        """Remove the index of a deleted space."""
+        with self._space_lock(knowledge_id):
+            self._indexes.pop(knowledge_id, None)
+            try:
+                os.remove(self._path(knowledge_id))
+            except FileNotFoundError:
+                pass
+
+
+_doc_tree_index_store: Optional[DocTreeIndexStore] = None
+_store_lock = threading.Lock()
+
+
+def get_doc_tree_index_store() -> DocTreeIndexStore:
+    global _doc_tree_index_store
+    with _store_lock:
+        if _doc_tree_index_store is None:
+            _doc_tree_index_store = DocTreeIndexStore()
+        return _doc_tree_index_store
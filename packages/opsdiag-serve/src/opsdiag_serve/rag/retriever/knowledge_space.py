@@ -1,9 +1,8 @@
-import json
 import logging
 from typing import List, Optional
 
 from opsdiag.component import ComponentType, SystemApp
-from opsdiag.core import Chunk, LLMClient, Document
+from opsdiag.core import Chunk, LLMClient
 from opsdiag.model import DefaultLLMClient
 from opsdiag.model.cluster import WorkerManagerFactory
 from opsdiag.rag.embedding.embedding_factory import EmbeddingFactory
@@ -13,8 +12,11 @@ from opsdiag.rag.transformer.keyword_extractor import KeywordExtractor
 from opsdiag.rag.transformer.tag_extractor import MetadataTag
 from opsdiag.storage.vector_store.filters import MetadataFilters, MetadataFilter
 from opsdiag.util.executor_utils import ExecutorFactory, blocking_func_to_async
-from opsdiag_ext.rag.retriever.doc_tree import TreeNode
+from opsdiag_ext.rag.retriever.doc_tree import (
+    RETRIEVER_NAME as DOC_TREE_RETRIEVER_NAME,
+)
 from opsdiag_serve.rag.models.models import KnowledgeSpaceDao
+from opsdiag_serve.rag.retriever.doc_tree_index import get_doc_tree_index_store
 from opsdiag_serve.rag.retriever.qa_retriever import QARetriever
 from opsdiag_serve.rag.retriever.retriever_chain import RetrieverChain
 from opsdiag_serve.rag.storage_manager import StorageManager
@@ -38,6 +40,7 @@ class KnowledgeSpaceRetriever(BaseRetriever):
         embedding_model: Optional[str] = None,
         tag_filters: Optional[List[MetadataTag]] = None,
         system_app: SystemApp = None,
+        tree_match_mode: str = "exact",
     ):
         """
         Args:
@@ -45,6 +48,8 @@ class KnowledgeSpaceRetriever(BaseRetriever):
             top_k (Optional[int]): top k
             query_rewrite: (Optional[QueryRewrite]) query rewrite
             rerank: (Optional[Ranker]) rerank
+            tree_match_mode (str): how the keywords match the header titles in the
+                tree index, "exact", "prefix" or "fuzzy"
         """
         if space_id is None:
             raise ValueError("space_id is required")
@@ -58,6 +63,7 @@ class KnowledgeSpaceRetriever(BaseRetriever):
         self._embedding_model = embedding_model or app_config.models.default_embedding
         self._system_app = system_app
         self._tag_filters = tag_filters
+        self._tree_match_mode = tree_match_mode
         embedding_factory = self._system_app.get_component(
             "embedding_factory", EmbeddingFactory
         )
@@ -290,57 +296,32 @@ class KnowledgeSpaceRetriever(BaseRetriever):
     async def tree_index_retrieve(
         self, query: str, top_k: int, filters: Optional[MetadataFilters] = None
     ):
-        """Search for keywords in the tree index."""
-        # Check if the keyword is in the node title
-        # If the node has children, recursively search in them
-        # If the node is a leaf, check if it contains the keyword
+        """Search for keywords in the header tree index of the space.
+
+        The index maps the normalized document and header titles to their chunk
+        ids, the matched chunks are fetched by ids in one query.
+        """
         try:
-            docs_res = self.rag_service.get_document_list(
-                {
-                    "knowledge_id": self._knowledge_id,
-                }
-            )
-            docs = []
-            for doc_res in docs_res:
-                doc = Document(
-                    content=doc_res.content,
-                )
-                chunks_res = self.rag_service.get_chunk_list(
-                    {
-                        "doc_id": doc_res.doc_id,
-                    }
-                )
-                chunks = [
-                    Chunk(
-                        chunk_id=chunk_res.chunk_id,
-                        content=chunk_res.content,
-                        metadata=json.loads(chunk_res.meta_data),
-                    )
-                    for chunk_res in chunks_res
-                ]
-                doc.chunks = chunks
-                docs.append(doc)
             keyword_extractor = KeywordExtractor(
                 llm_client=self.llm_client, model_name=self._llm_model
             )
-            from opsdiag_ext.rag.retriever.doc_tree import DocTreeRetriever
-
-            tree_retriever = DocTreeRetriever(
-                docs=docs,
-                keywords_extractor=keyword_extractor,
-                top_k=self._top_k,
-                query_rewrite=self._query_rewrite,
-                rerank=self._rerank,
+            keywords = await keyword_extractor.extract(query)
+            logger.info(f"Tree index retrieve, query:{query} keywords: {keywords}")
+            index = await blocking_func_to_async(
+                self._system_app,
+                get_doc_tree_index_store().get,
+                self._knowledge_id,
+                lambda: self.rag_service.load_doc_tree_chunks(self._knowledge_id),
             )
-            candidates = []
-            tree_nodes = await tree_retriever.aretrieve_with_scores(
-                query, top_k, filters
+            chunk_ids = index.search(keywords, self._tree_match_mode)
+            if not chunk_ids:
+                return []
+            chunks = await blocking_func_to_async(
+                self._system_app, self.rag_service.get_chunks_by_chunk_ids, chunk_ids
             )
-            # Convert tree nodes to chunks
-            for node in tree_nodes:
-                chunks = self._traverse(node)
-                candidates.extend(chunks)
-            return candidates
+            for chunk in chunks:
+                chunk.retriever = DOC_TREE_RETRIEVER_NAME
+            return chunks
         except Exception as e:
             logger.error(f"Error in tree index retrieval: {e}")
             return []
@@ -384,31 +365,6 @@ class KnowledgeSpaceRetriever(BaseRetriever):
         extract_tags = await self._tag_extractor.extract(query)
         return extract_tags
 
-    def _traverse(self, node: TreeNode):
-        """Traverse the tree and search for the keyword."""
-        # Check if the node has children
-        result = []
-        if node.children:
-            for child in node.children:
-                result.extend(self._traverse(child))
-        else:
-            # If the node is a leaf, check if it contains the keyword
-            chunk_res = self.rag_service.get_chunk_list(
-                {
-                    "chunk_id": node.node_id,
-                }
-            )
-            if chunk_res:
-                result.append(
-                    Chunk(
-                        chunk_id=chunk_res[0].chunk_id,
-                        content=chunk_res[0].content,
-                        metadata=json.loads(chunk_res[0].meta_data),
-                        retriever=node.retriever,
-                    )
-                )
-        return result
-
 
 def _add_excel_headers(
     excel_chunk: Chunk,
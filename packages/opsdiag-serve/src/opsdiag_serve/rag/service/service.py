@@ -12,7 +12,8 @@ from asyncio import Semaphore
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import List, Optional, cast, Any, Dict
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, cast
 
 from fastapi import HTTPException
 
@@ -92,6 +93,7 @@ from ..models.yuque_db import KnowledgeYuqueEntity, KnowledgeYuqueDao
 from ..operators.knowledge_space import SpaceRetrieverOperator
 from ..operators.split_query import SplitQueryOperator
 from ..operators.summary import SummaryOperator
+from ..retriever.doc_tree_index import get_doc_tree_index_store
 from ..retriever.knowledge_space import KnowledgeSpaceRetriever
 from ..storage_manager import StorageManager
 from ..transformer.tag_extractor import TagsExtractor
@@ -616,6 +618,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
 
         # delete space
         self._dao.delete(query_request)
+        get_doc_tree_index_store().drop(space.knowledge_id)
         return True
 
     def update_document(self, request: DocumentServeRequest):
@@ -705,6 +708,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
             vector_store_connector.delete_by_ids(vector_ids)
         # delete chunks
         self._chunk_dao.raw_delete(docuemnt.doc_id)
+        get_doc_tree_index_store().remove_document(knowledge_id, docuemnt.doc_id)
         # delete document
         self._document_dao.raw_delete(docuemnt)
         return docuemnt
@@ -808,6 +812,62 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
         """
         return self._chunk_dao.get_list(request)
 
+    def get_chunks_by_chunk_ids(self, chunk_ids: List[str]) -> List[Chunk]:
+        """get the chunks by chunk ids, in the order of the ids
+        Args:
+            - chunk_ids: chunk ids
+        """
+        return [
+            Chunk(
+                chunk_id=chunk.chunk_id,
+                content=chunk.content,
+                metadata=json.loads(chunk.meta_data) if chunk.meta_data else {},
+            )
+            for chunk in self._chunk_dao.get_chunks_by_chunk_ids(chunk_ids)
+        ]
+
+    def load_doc_tree_chunks(self, knowledge_id: str) -> Dict[str, List[Chunk]]:
+        """load the chunk metadata of all the documents of a space, to build its
+        doc tree index
+        Args:
+            - knowledge_id: knowledge id
+        """
+        documents = {}
+        for doc in self.get_document_list({"knowledge_id": knowledge_id}):
+            documents[doc.doc_id] = self._load_doc_tree_document(doc.doc_id)
+        return documents
+
+    def _load_doc_tree_document(self, doc_id: str) -> List[Chunk]:
+        return [
+            Chunk(
+                chunk_id=chunk.chunk_id,
+                metadata=json.loads(chunk.meta_data) if chunk.meta_data else {},
+            )
+            for chunk in self._chunk_dao.get_list({"doc_id": doc_id})
+        ]
+
+    def update_doc_tree_index(self, chunks: Iterable[Any]):
+        """index the documents of the updated or deleted chunks again
+        Args:
+            - chunks: the chunk entities, with their knowledge id and doc id
+        """
+        documents = {
+            (chunk.knowledge_id, chunk.doc_id)
+            for chunk in chunks
+            if getattr(chunk, "knowledge_id", None) and getattr(chunk, "doc_id", None)
+        }
+        store = get_doc_tree_index_store()
+        for knowledge_id, doc_id in documents:
+            try:
+                store.upsert_document(
+                    knowledge_id,
+                    doc_id,
+                    self._load_doc_tree_document(doc_id),
+                    partial(self.load_doc_tree_chunks, knowledge_id),
+                )
+            except Exception as e:
+                logger.warning(f"update doc tree index of {doc_id} failed: {e}")
+
     def update_chunk(self, request: ChunkServeRequest):
         """update knowledge document chunk"""
         if not request.id:
@@ -822,6 +882,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
             ]
             entity.questions = json.dumps(questions, ensure_ascii=False)
         self._chunk_dao.update_chunk(entity)
+        self.update_doc_tree_index([entity])
 
     def update_chunks(self, request: ChunkServeRequest):
         """update knowledge document chunk"""
@@ -837,6 +898,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
             ]
             entity.questions = json.dumps(questions, ensure_ascii=False)
         self._chunk_dao.update_chunk(entity)
+        self.update_doc_tree_index([entity])
 
     async def _batch_document_sync(
         self, space_id, sync_requests: List[KnowledgeSyncRequest]
@@ -1010,6 +1072,17 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
 
         self._chunk_dao.create_documents_chunks(chunk_entities)
         doc.chunk_size = len(chunks)
+        try:
+            await blocking_func_to_async(
+                self._system_app,
+                get_doc_tree_index_store().upsert_document,
+                knowledge_id,
+                doc.doc_id,
+                chunks,
+                lambda: self.load_doc_tree_chunks(knowledge_id),
+            )
+        except Exception as e:
+            logger.warning(f"update doc tree index of {doc.doc_id} failed: {e}")
 
         await blocking_func_to_async(
             self._system_app, self._document_dao.update_knowledge_document, doc
@@ -1041,6 +1114,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
                 insert_chunks.append(save_chunk)
             vector_ids.append(save_chunk.vector_id)
         self._chunk_dao.create_documents_chunks(insert_chunks)
+        self.update_doc_tree_index(save_chunks)
         logger.info(f"get_vector_and_update_chunk vector_ids:{vector_ids}")
 
         return vector_ids
@@ -3752,6 +3826,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
 
         # delete chunks
         self._chunk_dao.raw_delete(doc_id=doc_id)
+        get_doc_tree_index_store().remove_document(knowledge_id, doc_id)
 
         # delete yuque docs
         self._yuque_dao.raw_delete(query=KnowledgeYuqueEntity(doc_id=doc_id))
@@ -3959,6 +4034,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
 
         # delete chunks
         self._chunk_dao.raw_delete(doc_id)
+        get_doc_tree_index_store().remove_document(knowledge_id, doc_id)
 
         if document.doc_type == KnowledgeType.YUQUEURL.name:
             # get yuque doc uuid
@@ -5065,6 +5141,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
             entity = self.update_chunk_content(entity=entity, request=request)
 
         self._chunk_dao.update_chunk(entity)
+        self.update_doc_tree_index([entity])
         logger.info(f"update chunk success {entity.chunk_id}")
 
         return True
@@ -5096,6 +5173,7 @@ class Service(BaseService[KnowledgeSpaceEntity, SpaceServeRequest, SpaceServeRes
 
         # delete chunk
         self._chunk_dao.delete_chunk(chunk_id=request.chunk_id)
+        self.update_doc_tree_index([chunk])
 
         return True
 
@@ -0,0 +1,64 @@
+import os
+
+from opsdiag.core import Chunk
+
+from ..retriever.doc_tree_index import DocTreeIndexStore
+
+
+def _chunks(*headers: str):
+    return [
+        Chunk(
+            chunk_id=header,
+            content=header,
+            metadata={"title": "Guide", "Header1": header},
+        )
+        for header in headers
+    ]
+
+
+class _Loader:
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.documents
+
+
+def test_build_once(tmp_path):
+    store = DocTreeIndexStore(str(tmp_path))
+    loader = _Loader({"d1": _chunks("Install")})
+    assert store.get("k1", loader).search(["Install"]) == ["Install"]
+    assert store.get("k1", loader).search(["Install"]) == ["Install"]
+    assert loader.calls == 1
+
+    # Loaded from the file by a new store
+    other = DocTreeIndexStore(str(tmp_path))
+    assert other.get("k1", _Loader({})).search(["Install"]) == ["Install"]
+
+
+def test_incremental_update(tmp_path):
+    store = DocTreeIndexStore(str(tmp_path))
+    loader = _Loader({"d1": _chunks("Install")})
+    store.upsert_document("k1", "d2", _chunks("Deploy"), loader)
+    index = store.get("k1", loader)
+    assert index.search(["Install", "Deploy"]) == ["Install", "Deploy"]
+
+    store.remove_document("k1", "d1")
+    assert store.get("k1", loader).search(["Install", "Deploy"]) == ["Deploy"]
+    assert loader.calls == 1
+
+    store.drop("k1")
+    assert not os.path.exists(tmp_path / "k1.json")
+    # Nothing to do for a space without index
+    store.remove_document("k2", "d1")
+    assert not os.path.exists(tmp_path / "k2.json")
+
+
+def test_rebuild_broken_file(tmp_path):
+    (tmp_path / "k1.json").write_text("{")
+    store = DocTreeIndexStore(str(tmp_path))
+    loader = _Loader({"d1": _chunks("Install")})
+    assert store.get("k1", loader).search(["Install"]) == ["Install"]
+    assert loader.calls == 1